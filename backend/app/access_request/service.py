@@ -10,6 +10,7 @@ from typing import Optional
 
 from app.core.config import settings
 from app.core.db import get_db
+from app.core.principal_cache import invalidate_principal
 from app.access_request.schemas import AccessRequestCreate
 
 logger = logging.getLogger(__name__)
@@ -160,6 +161,7 @@ class AccessRequestService:
                     where={"id": target_user_id},
                     data={"horusAccess": True},
                 )
+                await invalidate_principal(target_user_id)
                 logger.info(
                     "Horus access granted to user %s via request %s",
                     target_user_id, request_id,
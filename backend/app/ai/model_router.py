@@ -33,6 +33,15 @@ class MultiModelAIRouter:
     REASONING_MODEL = os.getenv("OPENROUTER_REASONING_MODEL", "google/gemini-2.0-flash-001")
     VISION_MODEL = os.getenv("OPENROUTER_VISION_MODEL", FAST_MODEL)
 
+    # Input token budget per route task for packed prompts (system prompt,
+    # context and history; attachments are not counted).
+    PROMPT_TOKEN_BUDGETS = {
+        "fast_chat": int(os.getenv("AI_PROMPT_BUDGET_FAST_CHAT", "6000")),
+        "balanced": int(os.getenv("AI_PROMPT_BUDGET_BALANCED", "16000")),
+        "reasoning": int(os.getenv("AI_PROMPT_BUDGET_REASONING", "32000")),
+        "multimodal": int(os.getenv("AI_PROMPT_BUDGET_MULTIMODAL", "12000")),
+    }
+
     @classmethod
     def route(
         cls,
@@ -100,6 +109,10 @@ class MultiModelAIRouter:
             cls._estimate(input_tokens, cls.GEMINI_FLASH_COST),
         )
 
+    @classmethod
+    def prompt_budget(cls, task: str) -> int:
+        return cls.PROMPT_TOKEN_BUDGETS.get(task, cls.PROMPT_TOKEN_BUDGETS["balanced"])
+
     @staticmethod
     def _estimate(tokens: int, rate_per_1m: float) -> float:
         return round((tokens / 1_000_000) * rate_per_1m, 8)
@@ -0,0 +1,139 @@
+"""Token-budgeted prompt packing.
+
+A prompt is declared as prioritized segments (system prompt, platform state,
+mappings, retrieved chunks, memory, history, ...), each made of parts: one
+text, a list of ranked chunks, or chat messages. When the estimated total
+exceeds the route's budget, the lowest-priority segment degrades first: parts
+are dropped from its least useful end (oldest messages, lowest-ranked chunks)
+down to `min_parts`, and the boundary part is truncated rather than dropped
+when only some of it has to go. Higher-priority segments are touched only once
+everything below them is exhausted.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from app.core.tokens import token_estimator
+
+logger = logging.getLogger(__name__)
+
+# Role markers and separators the providers add around each part.
+PART_OVERHEAD_TOKENS = 4
+# Truncating a part below this leaves nothing useful; drop it instead.
+MIN_TRUNCATED_TOKENS = 48
+
+
+def _part_text(part: Any) -> str:
+    if isinstance(part, dict):
+        return str(part.get("content") or "")
+    return str(part or "")
+
+
+def _with_text(part: Any, text: str) -> Any:
+    if isinstance(part, dict):
+        return {**part, "content": text}
+    return text
+
+
+@dataclass
+class PromptSegment:
+    name: str
+    # Higher survives longer.
+    priority: int
+    # Text chunks or {"role", "content"} messages, in prompt order.
+    parts: list[Any]
+    # "end" drops trailing parts first (ranked chunks); "start" drops the
+    # oldest first (history).
+    drop_from: str = "end"
+    min_parts: int = 0
+    truncatable: bool = True
+    # Joins the surviving parts of a text segment.
+    separator: str = "\n\n"
+
+    @classmethod
+    def text(cls, name: str, priority: int, text: str | None, **kwargs: Any) -> "PromptSegment":
+        return cls(name, priority, [text] if text and text.strip() else [], **kwargs)
+
+
+@dataclass
+class PackedPrompt:
+    budget: int
+    tokens: int
+    segments: dict[str, list[Any]]
+    separators: dict[str, str] = field(default_factory=dict)
+    # Per-segment {"tokens", "dropped", "truncated"} for segments that degraded.
+    degraded: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def text(self, *names: str, separator: str = "\n\n") -> str:
+        """Join the surviving text of `names` (in the order given), skipping empty segments."""
+        texts = []
+        for name in names:
+            parts = [_part_text(part).strip() for part in self.segments.get(name, [])]
+            text = self.separators.get(name, "\n\n").join(part for part in parts if part)
+            if text:
+                texts.append(text)
+        return separator.join(texts)
+
+    def messages(self, name: str) -> list[dict[str, Any]]:
+        return list(self.segments.get(name, []))
+
+
+class PromptPacker:
+    def __init__(self, budget_tokens: int) -> None:
+        self.budget = max(1, int(budget_tokens))
+
+    @staticmethod
+    def cost(part: Any) -> int:
+        return token_estimator.estimate(_part_text(part)) + PART_OVERHEAD_TOKENS
+
+    def pack(self, segments: Iterable[PromptSegment]) -> PackedPrompt:
+        segments = list(segments)
+        kept = {segment.name: list(segment.parts) for segment in segments}
+        costs = {segment.name: [self.cost(part) for part in segment.parts] for segment in segments}
+        total = sum(sum(values) for values in costs.values())
+        overflow = total - self.budget
+        degraded: dict[str, dict[str, int]] = {}
+
+        for segment in sorted(segments, key=lambda s: s.priority):
+            if overflow <= 0:
+                break
+            parts, part_costs = kept[segment.name], costs[segment.name]
+            before = sum(part_costs)
+            dropped = truncated = 0
+            while overflow > 0 and parts:
+                index = 0 if segment.drop_from == "start" else len(parts) - 1
+                cost = part_costs[index]
+                can_drop = len(parts) > segment.min_parts
+                target = cost - overflow
+                if segment.truncatable and (target >= MIN_TRUNCATED_TOKENS or not can_drop) and target > PART_OVERHEAD_TOKENS:
+                    text = token_estimator.truncate(_part_text(parts[index]), target - PART_OVERHEAD_TOKENS)
+                    parts[index] = _with_text(parts[index], text)
+                    part_costs[index] = self.cost(parts[index])
+                    overflow -= cost - part_costs[index]
+                    truncated += 1
+                    break
+                if not can_drop:
+                    break
+                parts.pop(index)
+                part_costs.pop(index)
+                overflow -= cost
+                dropped += 1
+            if dropped or truncated:
+                degraded[segment.name] = {"tokens": before - sum(part_costs), "dropped": dropped, "truncated": truncated}
+
+        packed = PackedPrompt(
+            budget=self.budget,
+            tokens=self.budget + overflow,
+            segments=kept,
+            separators={segment.name: segment.separator for segment in segments},
+            degraded=degraded,
+        )
+        if degraded or overflow > 0:
+            logger.info(
+                "Prompt packed under budget" if overflow <= 0 else "Prompt still over budget after packing",
+                extra={"budget": self.budget, "tokens": packed.tokens, "degraded": degraded},
+            )
+        return packed
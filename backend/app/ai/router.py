@@ -5,7 +5,14 @@ from app.ai.models import ChatRequest, AIResponse, DraftRequest, MockAuditStartR
 from app.ai.service import get_gemini_client
 from app.ai.remediation_service import draft_remediation_document
 from app.ai.mock_audit_service import start_mock_audit, submit_mock_audit_message
-from app.core.rate_limit import limiter
+from app.core.rate_limit import (
+    AI_CHAT_WITH_FILES_POLICY,
+    ai_governor,
+    limiter,
+    raise_ai_busy,
+    rate_limit,
+    tenant_key,
+)
 import base64
 
 from app.core.middlewares import get_current_user
@@ -29,8 +36,11 @@ async def chat(
     return AIResponse(raw_text=result, model="gemini-2.0-flash")
 
 
-@router.post("/chat-with-files", response_model=AIResponse)
-@limiter.limit("5/minute")
+@router.post(
+    "/chat-with-files",
+    response_model=AIResponse,
+    dependencies=[Depends(rate_limit(AI_CHAT_WITH_FILES_POLICY))],
+)
 async def chat_with_files(
     request: Request,
     background_tasks: BackgroundTasks,
@@ -94,9 +104,18 @@ async def chat_with_files(
     
     full_message = f"{message}\n\n{json_instruction}"
     
+    # Taken before the try below, which turns every error into an AIResponse.
+    slot_tenant = tenant_key(current_user)
+    slot_token = await ai_governor.acquire(slot_tenant)
+    if slot_token is None:
+        raise_ai_busy()
+
     raw_result = ""
     try:
-        raw_result = await client.chat_with_files(message=full_message, files=file_contents)
+        try:
+            raw_result = await client.chat_with_files(message=full_message, files=file_contents)
+        finally:
+            await ai_governor.release(slot_tenant, slot_token)
         
         # Robust Parsing Strategy
         import re
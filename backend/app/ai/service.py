@@ -8,14 +8,18 @@ import os
 import asyncio
 import time
 import re
+from functools import partial
 from fastapi import HTTPException, status
 from app.ai.model_router import MultiModelAIRouter
 from app.core.metrics import estimate_tokens, record_ai_usage
+from app.core.embedding_cache import embedding_cache
 from app.ai.search import perform_web_search
 
 logger = logging.getLogger(__name__)
 
 _GEMINI_COOLDOWN_UNTIL: float = 0.0
+# Matches the pgvector column width (vector(768)).
+EMBEDDING_DIM = 768
 
 def _gemini_rate_limited(err: Exception) -> bool:
     msg = str(err)
@@ -1184,36 +1188,42 @@ class GeminiClient:
                 yield chunk
 
     async def create_embedding(self, text: str) -> list[float]:
-        """Generate a vector embedding for a given text chunk."""
+        """Generate a vector embedding for a given text chunk (memoized per model and text)."""
         if USE_NEW_API:
-            # Using the new google-genai library
-            # Keep embeddings aligned to the pgvector column width (vector(768)).
-            for model_name in [self.embedding_model, "models/gemini-embedding-001"]:
-                try:
-                    response = await self.client.aio.models.embed_content(
-                        model=model_name,
-                        contents=text,
-                        config=genai_types.EmbedContentConfig(output_dimensionality=768),
-                    )
-                    return response.embeddings[0].values
-                except Exception as e:
-                    logger.warning(f"Embedding failed with {model_name}: {e}")
-            # All models failed — return empty vector so RAG degrades gracefully
-            logger.error("All embedding models failed. Returning empty vector.")
-            return []
+            models = [self.embedding_model, "models/gemini-embedding-001"]
         else:
+            models = ["models/text-embedding-004", "models/embedding-001"]
+        # Each vector is cached under the model that produced it, so a fallback
+        # model's vector is never served as the primary model's.
+        for model_name in models:
+            vector = await embedding_cache.get_or_embed(
+                model_name, EMBEDDING_DIM, text, partial(self._embed_with_model, model_name)
+            )
+            if vector:
+                return vector
+        # All models failed — return empty vector so RAG degrades gracefully
+        logger.error("All embedding models failed. Returning empty vector.")
+        return []
+
+    async def _embed_with_model(self, model_name: str, text: str) -> list[float]:
+        try:
+            if USE_NEW_API:
+                # Using the new google-genai library
+                response = await self.client.aio.models.embed_content(
+                    model=model_name,
+                    contents=text,
+                    config=genai_types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIM),
+                )
+                return response.embeddings[0].values
             # Using the legacy google-generativeai library
-            for model_name in ["models/text-embedding-004", "models/embedding-001"]:
-                try:
-                    result = await asyncio.to_thread(
-                        old_genai.embed_content,
-                        model=model_name,
-                        content=text
-                    )
-                    return result['embedding']
-                except Exception as e:
-                    logger.warning(f"Embedding failed with {model_name}: {e}")
-            logger.error("All legacy embedding models failed. Returning empty vector.")
+            result = await asyncio.to_thread(
+                old_genai.embed_content,
+                model=model_name,
+                content=text
+            )
+            return result['embedding']
+        except Exception as e:
+            logger.warning(f"Embedding failed with {model_name}: {e}")
             return []
 
 
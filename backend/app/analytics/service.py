@@ -13,6 +13,7 @@ from reportlab.lib.styles import getSampleStyleSheet
 
 from fastapi import HTTPException, status
 from app.core.db import get_db
+from app.core.redis import redis_client
 from app.analytics.models import (
     AnalyticsResponse,
     TimeSeriesPoint,
@@ -29,6 +30,8 @@ from app.compliance.alignment_metrics import (
 
 logger = logging.getLogger(__name__)
 
+ANALYTICS_CACHE_TTL_SECONDS = 120
+
 
 class AnalyticsService:
     """Computes analytics from live Prisma data — no mocks, no fakes."""
@@ -38,11 +41,31 @@ class AnalyticsService:
         current_user: dict,
         period_days: Optional[int] = 30,
     ) -> AnalyticsResponse:
-        db = get_db()
-        now = datetime.now(timezone.utc)
         institution_id = current_user.get("institutionId")
         if not institution_id:
-            return AnalyticsService._empty_response(period_days, now)
+            return AnalyticsService._empty_response(period_days, datetime.now(timezone.utc))
+
+        # Analytics are institution-wide; the key embeds the institution's data generation.
+        generation = await redis_client.generation_token(institution_id=institution_id)
+        cache_key = f"analytics:{institution_id}:{period_days or 'all'}:{generation}"
+        cached = await redis_client.get(cache_key)
+        if cached:
+            try:
+                return AnalyticsResponse.model_validate_json(cached)
+            except Exception as e:
+                logger.debug(f"Analytics cache parse error: {e}")
+
+        response = await AnalyticsService._compute_analytics(institution_id, period_days)
+        await redis_client.set(cache_key, response.model_dump_json(), ex=ANALYTICS_CACHE_TTL_SECONDS)
+        return response
+
+    @staticmethod
+    async def _compute_analytics(
+        institution_id: str,
+        period_days: Optional[int],
+    ) -> AnalyticsResponse:
+        db = get_db()
+        now = datetime.now(timezone.utc)
 
         # ── Build query filters upfront (pure Python, no I/O) ──────────
         ga_where: Dict[str, Any] = {"institutionId": institution_id}
@@ -14,6 +14,7 @@ from app.auth.models import (
 from app.auth.service import AuthService
 from app.core.config import settings
 from app.core.middlewares import get_current_user
+from app.core.principal_cache import invalidate_principal
 from app.core.rate_limit import limiter
 import logging
 
@@ -151,6 +152,7 @@ async def setup_institution(current_user: dict = Depends(get_current_user)):
         where={"id": user.id},
         data={"institutionId": default_institution.id}
     )
+    await invalidate_principal(user.id)
     
     return {"message": "Institution created", "institution": default_institution}
 
@@ -2,6 +2,7 @@
 from fastapi import HTTPException, status
 import httpx
 from app.core.db import get_db
+from app.core.principal_cache import invalidate_principal
 from app.core.utils import get_password_hash, verify_password, create_access_token
 from app.auth.models import (
     RegisterRequest,
@@ -332,6 +333,7 @@ class AuthService:
                 where={"id": user_id},
                 data={"name": body.name},
             )
+            await invalidate_principal(user_id)
             return UserResponse.model_validate(updated)
         except Exception as e:
             logger.error(f"Error updating user: {e}")
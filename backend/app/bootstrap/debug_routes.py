@@ -94,3 +94,10 @@ def register_debug_routes(app: FastAPI) -> None:
             return {"result": result[:200], "status": "success"}
         except Exception:
             return {"error": "Debug chat test failed"}
+
+    @app.get("/api/debug/cache-stats")
+    async def cache_stats_route(admin: dict = Depends(require_admin)):
+        """Per-namespace hit/miss/eviction counters for this process (ADMIN only, debug only)."""
+        from app.core.cache import cache_stats
+
+        return cache_stats()
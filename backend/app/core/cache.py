@@ -0,0 +1,404 @@
+"""Bounded two-tier cache: in-process LRU (L1) in front of Redis (L2).
+
+Values are JSON-serialized once and the same string is kept in both tiers, so
+L1 entries are immutable, their size is known exactly, and a hit in either tier
+decodes the same way. Each cache registers under a namespace whose hit/miss/
+eviction counters are available from `cache_stats()`.
+
+`get_or_compute` adds miss coalescing (in-process single-flight, optionally a
+Redis lock across processes) and stale-while-revalidate on top of the same
+tiers. Keys written through it hold an envelope, so use one API per key.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable
+
+from app.core.redis import redis_client
+from app.core.server_timing import timed
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_CACHES: dict[str, Any] = {}
+
+LOCK_PREFIX = "lock:cache:"
+# How long a process waits for another process's computation before doing it itself.
+DISTRIBUTED_WAIT_SECONDS = 5.0
+DISTRIBUTED_POLL_SECONDS = 0.05
+
+
+@dataclass
+class CacheStats:
+    l1_hits: int = 0
+    l2_hits: int = 0
+    stale_hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    coalesced: int = 0
+    refreshes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        hits = self.l1_hits + self.l2_hits + self.stale_hits
+        total = hits + self.misses
+        return round(hits / total, 4) if total else 0.0
+
+
+def serialize(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def deserialize(raw: str) -> Any:
+    return json.loads(raw)
+
+
+class LRUCache:
+    """In-process LRU bounded by entry count, TTL and (optionally) total bytes."""
+
+    def __init__(
+        self,
+        *,
+        max_entries: int,
+        ttl_seconds: float,
+        max_bytes: int | None = None,
+        stats: CacheStats | None = None,
+    ) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.max_bytes = max_bytes
+        self.stats = stats or CacheStats()
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return raw
+
+    def set(self, key: str, raw: str, ttl_seconds: float | None = None) -> None:
+        size = len(raw)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Never let one oversized value flush the whole tier.
+            self._remove(key)
+            return
+        self._remove(key)
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        self._entries[key] = (time.monotonic() + ttl, raw)
+        self._bytes += size
+        self._evict()
+
+    def delete(self, key: str) -> None:
+        self._remove(key)
+
+    def delete_prefix(self, prefix: str) -> int:
+        """Drop every entry whose key starts with `prefix`; O(entries), for rare invalidations."""
+        keys = [key for key in self._entries if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes
+        ):
+            _, (_, raw) = self._entries.popitem(last=False)
+            self._bytes -= len(raw)
+            self.stats.evictions += 1
+
+
+class TwoTierCache:
+    """
+    Namespaced cache with an in-process LRU in front of Redis.
+
+    `l1_ttl_seconds` bounds how long another process may keep serving a value
+    after it was invalidated elsewhere; keep it short for explicitly
+    invalidated data. When Redis is disabled only L1 is used.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        *,
+        ttl_seconds: int,
+        max_entries: int = 1024,
+        max_bytes: int | None = None,
+        l1_ttl_seconds: float | None = None,
+        use_redis: bool = True,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl_seconds = int(ttl_seconds)
+        self.use_redis = use_redis
+        self.stats = CacheStats()
+        self._flight = SingleFlight()
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self.l1 = LRUCache(
+            max_entries=max_entries,
+            ttl_seconds=l1_ttl_seconds if l1_ttl_seconds is not None else ttl_seconds,
+            max_bytes=max_bytes,
+            stats=self.stats,
+        )
+        register_cache(namespace, self)
+
+    @property
+    def _redis_enabled(self) -> bool:
+        return self.use_redis and redis_client.enabled
+
+    async def get(self, key: str) -> Any | None:
+        raw = self.l1.get(key)
+        if raw is not None:
+            self.stats.l1_hits += 1
+            return deserialize(raw)
+        if self._redis_enabled:
+            with timed("cache"):
+                raw = await redis_client.get(key)
+            if raw is not None:
+                try:
+                    value = deserialize(raw)
+                except (TypeError, ValueError):
+                    value = None
+                if value is not None:
+                    self.stats.l2_hits += 1
+                    self.l1.set(key, raw)
+                    return value
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any, ttl_seconds: int | None = None) -> None:
+        raw = serialize(value)
+        ttl = int(ttl_seconds or self.ttl_seconds)
+        self.stats.sets += 1
+        self.l1.set(key, raw, ttl)
+        if self._redis_enabled:
+            with timed("cache"):
+                await redis_client.set(key, raw, ex=ttl)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Look up several keys: L1 first, then one MGET for the rest. Misses are omitted."""
+        found: dict[str, Any] = {}
+        missing: list[str] = []
+        for key in keys:
+            raw = self.l1.get(key)
+            if raw is not None:
+                self.stats.l1_hits += 1
+                found[key] = deserialize(raw)
+            else:
+                missing.append(key)
+        if missing and self._redis_enabled:
+            with timed("cache"):
+                raws = await redis_client.mget(missing)
+            for key, raw in zip(missing, raws):
+                if raw is None:
+                    continue
+                try:
+                    value = deserialize(raw)
+                except (TypeError, ValueError):
+                    continue
+                self.stats.l2_hits += 1
+                self.l1.set(key, raw)
+                found[key] = value
+        self.stats.misses += len(keys) - len(found)
+        return found
+
+    async def set_many(self, values: dict[str, Any], ttl_seconds: int | None = None) -> None:
+        if not values:
+            return
+        ttl = int(ttl_seconds or self.ttl_seconds)
+        raws = {key: serialize(value) for key, value in values.items()}
+        self.stats.sets += len(raws)
+        for key, raw in raws.items():
+            self.l1.set(key, raw, ttl)
+        if self._redis_enabled:
+            with timed("cache"):
+                await redis_client.mset(raws, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        self.l1.delete(key)
+        if self._redis_enabled:
+            await redis_client.delete(key)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        *,
+        ttl_seconds: int | None = None,
+        stale_ttl_seconds: int = 0,
+        distributed: bool = False,
+    ) -> Any:
+        """
+        Return the cached value for `key`, computing it at most once per miss.
+
+        Concurrent misses in this process await one `compute()`; with
+        `distributed=True` other processes wait on a Redis lock and pick up the
+        winner's value. For `stale_ttl_seconds` after expiry the old value is
+        still returned while a single background refresh runs. A `compute()`
+        result of None is returned but not cached.
+        """
+        ttl = int(ttl_seconds or self.ttl_seconds)
+        envelope = await self._get_envelope(key)
+        if envelope is not None:
+            if envelope["fresh_until"] > time.time():
+                return envelope["value"]
+            self.stats.stale_hits += 1
+            self._refresh_in_background(key, compute, ttl, stale_ttl_seconds, distributed)
+            return envelope["value"]
+
+        self.stats.misses += 1
+        if self._flight.in_flight(key):
+            self.stats.coalesced += 1
+        return await self._flight.do(
+            key, lambda: self._compute_and_store(key, compute, ttl, stale_ttl_seconds, distributed)
+        )
+
+    async def _get_envelope(self, key: str) -> dict[str, Any] | None:
+        raw = self.l1.get(key)
+        if raw is not None:
+            self.stats.l1_hits += 1
+            return deserialize(raw)
+        if self._redis_enabled:
+            with timed("cache"):
+                raw = await redis_client.get(key)
+            if raw is not None:
+                try:
+                    envelope = deserialize(raw)
+                except (TypeError, ValueError):
+                    envelope = None
+                if isinstance(envelope, dict) and "fresh_until" in envelope:
+                    self.stats.l2_hits += 1
+                    self.l1.set(key, raw, max(1.0, envelope["stale_until"] - time.time()))
+                    return envelope
+        return None
+
+    async def _store_envelope(self, key: str, value: Any, ttl: int, stale_ttl: int) -> None:
+        now = time.time()
+        stale_ttl = max(0, stale_ttl)
+        raw = serialize({"value": value, "fresh_until": now + ttl, "stale_until": now + ttl + stale_ttl})
+        self.stats.sets += 1
+        self.l1.set(key, raw, ttl + stale_ttl)
+        if self._redis_enabled:
+            with timed("cache"):
+                await redis_client.set(key, raw, ex=ttl + stale_ttl)
+
+    async def _compute_and_store(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int,
+        distributed: bool,
+        *,
+        wait_for_holder: bool = True,
+    ) -> Any:
+        token = None
+        lock_key = f"{LOCK_PREFIX}{key}"
+        if distributed and self._redis_enabled:
+            token = await redis_client.acquire_lock(lock_key, DISTRIBUTED_WAIT_SECONDS * 2)
+            if token is None:
+                if not wait_for_holder:
+                    return None
+                value = await self._wait_for_holder(key)
+                if value is not None:
+                    return value
+        try:
+            value = await compute()
+            if value is not None:
+                await self._store_envelope(key, value, ttl, stale_ttl)
+            return value
+        finally:
+            if token:
+                await redis_client.release_lock(lock_key, token)
+
+    async def _wait_for_holder(self, key: str) -> Any | None:
+        deadline = time.monotonic() + DISTRIBUTED_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            await asyncio.sleep(DISTRIBUTED_POLL_SECONDS)
+            raw = await redis_client.get(key)
+            if raw is None:
+                continue
+            try:
+                envelope = deserialize(raw)
+            except (TypeError, ValueError):
+                return None
+            if isinstance(envelope, dict) and envelope.get("fresh_until", 0) > time.time():
+                self.stats.coalesced += 1
+                self.l1.set(key, raw, max(1.0, envelope["stale_until"] - time.time()))
+                return envelope["value"]
+        return None
+
+    def _refresh_in_background(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int,
+        distributed: bool,
+    ) -> None:
+        if key in self._refresh_tasks or self._flight.in_flight(key):
+            return
+        self.stats.refreshes += 1
+
+        async def refresh() -> None:
+            try:
+                # Another process already refreshing is fine: keep serving stale.
+                await self._flight.do(
+                    key,
+                    lambda: self._compute_and_store(
+                        key, compute, ttl, stale_ttl, distributed, wait_for_holder=False
+                    ),
+                )
+            except Exception as exc:
+                logger.warning("Cache refresh failed for %s:%s: %s", self.namespace, key, exc)
+
+        task = asyncio.create_task(refresh())
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda _task: self._refresh_tasks.pop(key, None))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "hit_rate": self.stats.hit_rate,
+            "l1_entries": len(self.l1),
+            "l1_bytes": self.l1.size_bytes,
+        }
+
+
+def register_cache(namespace: str, cache: Any) -> None:
+    """Expose a cache with a `snapshot()` method through `cache_stats()`."""
+    _CACHES[namespace] = cache
+
+
+def cache_stats() -> dict[str, dict[str, Any]]:
+    """Per-namespace counters for every registered cache."""
+    return {namespace: cache.snapshot() for namespace, cache in sorted(_CACHES.items())}
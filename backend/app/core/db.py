@@ -6,6 +6,8 @@ from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 from prisma import Prisma
 
+from app.core.server_timing import timed
+
 logger = logging.getLogger(__name__)
 
 # Retry config for Supabase cold start / intermittent connectivity
@@ -54,7 +56,15 @@ def _build_database_url() -> str | None:
 _db_url = _build_database_url()
 
 # Global Prisma client instance — datasource_url overrides schema's DATABASE_URL
-prisma = Prisma(datasource={"url": _db_url} if _db_url else None)
+class _TimedPrisma(Prisma):
+    """Prisma client that adds query time to the request's Server-Timing header."""
+
+    async def _execute(self, *args, **kwargs):
+        with timed("db"):
+            return await super()._execute(*args, **kwargs)
+
+
+prisma = _TimedPrisma(datasource={"url": _db_url} if _db_url else None)
 db = prisma
 
 
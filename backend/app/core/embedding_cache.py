@@ -0,0 +1,130 @@
+"""Shared memoization of text embeddings.
+
+Embeddings are keyed by (model, dimensionality, SHA-256 of the normalized
+text) and stored as packed float32 (base64), about a quarter of the size of a
+JSON float list. Lookups go through an in-process LRU, then Redis; concurrent
+requests for the same text share one provider call. Empty results (provider
+failures) are never cached.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import os
+import unicodedata
+from array import array
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Sequence
+
+from app.core.cache import CacheStats, LRUCache, register_cache
+from app.core.redis import redis_client
+from app.core.server_timing import timed
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+EMBEDDING_CACHE_L1_TTL_SECONDS = float(os.getenv("EMBEDDING_CACHE_L1_TTL_SECONDS", "3600"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+EMBEDDING_CACHE_PREFIX = "emb:"
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFC with whitespace runs collapsed; case is kept."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def pack_vector(vector: Sequence[float]) -> str:
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def unpack_vector(raw: str) -> list[float]:
+    values = array("f")
+    values.frombytes(base64.b64decode(raw))
+    return values.tolist()
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        *,
+        ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+        l1_ttl_seconds: float = EMBEDDING_CACHE_L1_TTL_SECONDS,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self.l1 = LRUCache(max_entries=max_entries, ttl_seconds=l1_ttl_seconds, stats=self.stats)
+        self._flight = SingleFlight()
+        register_cache("ai.embedding", self)
+
+    @staticmethod
+    def key(model: str, dim: int, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{EMBEDDING_CACHE_PREFIX}{model}:{dim}:{digest}"
+
+    async def get(self, key: str) -> list[float] | None:
+        raw = self.l1.get(key)
+        if raw is not None:
+            self.stats.l1_hits += 1
+            return unpack_vector(raw)
+        if redis_client.enabled:
+            with timed("cache"):
+                raw = await redis_client.get(key)
+            if raw:
+                try:
+                    vector = unpack_vector(raw)
+                except (TypeError, ValueError):
+                    vector = None
+                if vector:
+                    self.stats.l2_hits += 1
+                    self.l1.set(key, raw)
+                    return vector
+        self.stats.misses += 1
+        return None
+
+    async def set(self, key: str, vector: Sequence[float]) -> None:
+        raw = pack_vector(vector)
+        self.stats.sets += 1
+        self.l1.set(key, raw)
+        if redis_client.enabled:
+            with timed("cache"):
+                await redis_client.set(key, raw, ex=self.ttl_seconds)
+
+    async def get_or_embed(
+        self,
+        model: str,
+        dim: int,
+        text: str,
+        embed: Callable[[str], Awaitable[Sequence[float] | None]],
+    ) -> list[float]:
+        """Return the cached embedding of `text`, calling `embed(text)` once on a miss."""
+        key = self.key(model, dim, text)
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        async def compute() -> list[float]:
+            vector = list(await embed(text) or [])
+            if vector:
+                try:
+                    await self.set(key, vector)
+                except Exception as exc:
+                    logger.warning("Embedding cache write failed: %s", exc)
+            return vector
+
+        return await self._flight.do(key, compute)
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "hit_rate": self.stats.hit_rate,
+            "coalesced": self._flight.coalesced,
+            "l1_entries": len(self.l1),
+            "l1_bytes": self.l1.size_bytes,
+        }
+
+
+embedding_cache = EmbeddingCache()
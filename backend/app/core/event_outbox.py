@@ -9,7 +9,7 @@ from typing import Any
 from uuid import uuid4
 
 from app.core.db import get_db
-from app.core.jobs import enqueue_job
+from app.core.jobs import JOB_NOTIFY_CHANNEL, ensure_jobs_table
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +30,18 @@ CREATE TABLE IF NOT EXISTS "EventOutbox" (
 """
 
 EVENT_OUTBOX_INDEX_SQL = [
-    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_status_created" ON "EventOutbox"(status, "createdAt")',
+    # Processed rows are archived by app.core.retention; status indexes cover live rows only.
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_pending_created" ON "EventOutbox"("createdAt") WHERE status <> \'processed\'',
     'CREATE INDEX IF NOT EXISTS "idx_event_outbox_user_created" ON "EventOutbox"("userId", "createdAt" DESC)',
-    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_type_status" ON "EventOutbox"(type, status)',
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_pending_type" ON "EventOutbox"(type) WHERE status <> \'processed\'',
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_processed" ON "EventOutbox"("processedAt") WHERE status = \'processed\'',
+    'DROP INDEX IF EXISTS "idx_event_outbox_status_created"',
+    'DROP INDEX IF EXISTS "idx_event_outbox_type_status"',
 ]
 
+OBSERVE_EVENT_JOB_TYPE = "horus.observe_event"
+OBSERVE_EVENT_PRIORITY = 40
+
 _ENSURED = False
 
 
@@ -57,16 +64,42 @@ async def append_event(
     stream_id: str | None = None,
     source: str = "backend",
 ) -> str:
-    """Persist a durable event and enqueue Horus observation."""
+    """
+    Persist a durable event and enqueue its Horus observer job.
+
+    Both rows are written by one statement, so they commit together and cost
+    a single round trip; the job is announced with NOTIFY like `enqueue_jobs`.
+    """
     await ensure_event_outbox_table()
+    await ensure_jobs_table()
     event_id = str(uuid4())
+    job_payload = {
+        "event_id": event_id,
+        "user_id": user_id,
+        "type": event_type,
+        "payload": payload,
+        "stream_id": stream_id,
+        "source": source,
+    }
     db = get_db()
-    await db.execute_raw(
+    await db.query_raw(
         """
-        INSERT INTO "EventOutbox"
-          (id, "userId", type, source, payload, "streamId", status, attempts, "createdAt")
-        VALUES
-          ($1, $2, $3, $4, $5::jsonb, $6, 'pending', 0, NOW())
+        WITH event AS (
+            INSERT INTO "EventOutbox"
+              (id, "userId", type, source, payload, "streamId", status, attempts, "createdAt")
+            VALUES
+              ($1, $2, $3, $4, $5::jsonb, $6, 'pending', 0, NOW())
+            RETURNING id
+        ),
+        job AS (
+            INSERT INTO "AsyncJob"
+              (id, type, status, priority, attempts, "maxAttempts", payload, "runAfter",
+               "createdAt", "updatedAt")
+            SELECT $7, $8, 'queued', $9, 0, 3, $10::jsonb, NOW(), NOW(), NOW()
+            FROM event
+            RETURNING type
+        )
+        SELECT pg_notify($11, type)::text AS notified FROM job
         """,
         event_id,
         user_id,
@@ -74,22 +107,12 @@ async def append_event(
         source,
         json.dumps(payload),
         stream_id,
+        str(uuid4()),
+        OBSERVE_EVENT_JOB_TYPE,
+        OBSERVE_EVENT_PRIORITY,
+        json.dumps(job_payload, default=str),
+        JOB_NOTIFY_CHANNEL,
     )
-    try:
-        await enqueue_job(
-            "horus.observe_event",
-            {
-                "event_id": event_id,
-                "user_id": user_id,
-                "type": event_type,
-                "payload": payload,
-                "stream_id": stream_id,
-                "source": source,
-            },
-            priority=40,
-        )
-    except Exception as exc:
-        logger.debug("Could not enqueue Horus observer job for event %s: %s", event_id, exc)
     return event_id
 
 
@@ -3,6 +3,10 @@
 The public `event_bus` API intentionally remains small and compatible with the
 old in-memory bus. Redis Streams are used when configured; local development and
 tests fall back to process-local queues.
+
+Stream readers in one process share a single `StreamMultiplexer` task that
+XREADs every subscribed user's stream key in one call and routes entries to
+per-connection queues, so an idle connection costs a queue and nothing else.
 """
 
 from __future__ import annotations
@@ -23,6 +27,10 @@ MAX_SUBSCRIBERS_PER_USER = int(os.getenv("HORUS_MAX_SSE_SUBSCRIBERS_PER_USER", "
 HEARTBEAT_INTERVAL = int(os.getenv("HORUS_EVENT_HEARTBEAT_SECONDS", "30"))
 STREAM_PREFIX = os.getenv("HORUS_EVENT_STREAM_PREFIX", "horus:events:user:")
 STREAM_MAXLEN = int(os.getenv("HORUS_EVENT_STREAM_MAXLEN", "1000"))
+# Upper bound for one multiplexed XREAD; keys added meanwhile join the next call.
+MUX_BLOCK_MS = int(os.getenv("HORUS_EVENT_MUX_BLOCK_MS", "1000"))
+MUX_READ_COUNT = int(os.getenv("HORUS_EVENT_MUX_READ_COUNT", "100"))
+MUX_QUEUE_SIZE = int(os.getenv("HORUS_EVENT_MUX_QUEUE_SIZE", "100"))
 
 
 @dataclass(frozen=True)
@@ -31,12 +39,173 @@ class StreamEvent:
     payload: dict[str, Any]
 
 
+def _parse_stream_id(stream_id: str) -> tuple[int, int]:
+    ms, _, seq = str(stream_id).partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return 0, 0
+
+
+def _parse_entries(entries: Any) -> list[StreamEvent]:
+    parsed: list[StreamEvent] = []
+    for event_id, fields in entries or []:
+        raw = fields.get("event") if isinstance(fields, dict) else None
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8")
+        try:
+            payload = json.loads(raw or "{}")
+        except json.JSONDecodeError:
+            payload = {"type": "event", "data": raw}
+        parsed.append(StreamEvent(id=str(event_id), payload=payload))
+    return parsed
+
+
+class StreamSubscription:
+    """One connection's view of a user stream, fed by the multiplexer."""
+
+    def __init__(self, key: str, *, maxsize: int = MUX_QUEUE_SIZE) -> None:
+        self.key = key
+        self.queue: asyncio.Queue[StreamEvent] = asyncio.Queue(maxsize=maxsize)
+        # Set when entries were dropped because the consumer fell behind; the
+        # consumer re-reads the gap from the stream itself.
+        self.lagged = False
+        self.evicted = False
+
+    def deliver(self, event: StreamEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+
+class StreamMultiplexer:
+    """
+    Per-process reader for all subscribed user streams.
+
+    A single task issues `XREAD` over `{key: cursor}` for every key with at
+    least one subscription and fans entries out to the subscriptions' queues.
+    Each key's cursor starts at the stream's last entry when the first
+    subscription for it arrives; catching up from an older id is the
+    subscriber's job (see `EventBus.stream`). The task exits when the last
+    subscription goes away and is restarted by the next one.
+    """
+
+    def __init__(self, *, block_ms: int = MUX_BLOCK_MS, count: int = MUX_READ_COUNT) -> None:
+        self.block_ms = block_ms
+        self.count = count
+        self._subscriptions: dict[str, list[StreamSubscription]] = {}
+        self._cursors: dict[str, str] = {}
+        self._task: asyncio.Task | None = None
+        self.reads = 0
+        self.delivered = 0
+
+    @property
+    def keys(self) -> list[str]:
+        return list(self._subscriptions)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def subscribe(self, key: str) -> StreamSubscription:
+        subscription = StreamSubscription(key)
+        subscriptions = self._subscriptions.get(key)
+        if subscriptions is None:
+            cursor = await self._latest_id(key)
+            # Another connection may have registered the key while we awaited.
+            subscriptions = self._subscriptions.setdefault(key, [])
+            self._cursors.setdefault(key, cursor)
+        while len(subscriptions) >= MAX_SUBSCRIBERS_PER_USER:
+            evicted = subscriptions.pop(0)
+            evicted.evicted = True
+            evicted.deliver(StreamEvent(id="", payload={"type": "__evicted__"}))
+        subscriptions.append(subscription)
+        self._ensure_task()
+        return subscription
+
+    def deliver_local(self, key: str, event: StreamEvent) -> None:
+        """Hand an event that never reached Redis to this process's subscriptions."""
+        for subscription in list(self._subscriptions.get(key, [])):
+            subscription.deliver(event)
+
+    def unsubscribe(self, subscription: StreamSubscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.key)
+        if not subscriptions:
+            return
+        try:
+            subscriptions.remove(subscription)
+        except ValueError:
+            return
+        if not subscriptions:
+            self._subscriptions.pop(subscription.key, None)
+            self._cursors.pop(subscription.key, None)
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _ensure_task(self) -> None:
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def _latest_id(self, key: str) -> str:
+        try:
+            client = redis_client.redis
+            rows = await client.xrevrange(key, count=1) if client else []
+        except Exception as exc:
+            logger.warning("Redis XREVRANGE failed: %s", exc)
+            rows = []
+        return str(rows[0][0]) if rows else "0-0"
+
+    async def _run(self) -> None:
+        while self._subscriptions:
+            client = redis_client.redis
+            if not client:
+                return
+            streams = {key: self._cursors.get(key, "0-0") for key in self._subscriptions}
+            try:
+                response = await client.xread(streams, count=self.count, block=self.block_ms)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Redis multiplexed XREAD failed: %s", exc)
+                await asyncio.sleep(1.0)
+                continue
+            self.reads += 1
+            for stream_name, entries in response or []:
+                key = stream_name.decode("utf-8") if isinstance(stream_name, bytes) else str(stream_name)
+                events = _parse_entries(entries)
+                if not events or key not in self._subscriptions:
+                    continue
+                self._cursors[key] = events[-1].id
+                for subscription in list(self._subscriptions[key]):
+                    for event in events:
+                        subscription.deliver(event)
+                        self.delivered += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "running": self.running,
+            "keys": len(self._subscriptions),
+            "subscriptions": sum(len(subs) for subs in self._subscriptions.values()),
+            "reads": self.reads,
+            "delivered": self.delivered,
+        }
+
+
 class EventBus:
     """Per-user realtime event bus with Redis Streams and local fallback."""
 
     def __init__(self) -> None:
         self.subscribers: dict[str, list[asyncio.Queue]] = {}
         self._last_active: dict[int, float] = {}
+        self.multiplexer = StreamMultiplexer()
 
     @staticmethod
     def stream_key(user_id: str) -> str:
@@ -103,9 +272,13 @@ class EventBus:
 
         stream_id: str | None = None
         if redis_client.enabled:
-            stream_id = await asyncio.to_thread(self._xadd, user_id, event)
+            stream_id = await self._xadd(user_id, event)
             if stream_id:
                 event["streamId"] = stream_id
+            else:
+                # Streams on this process still get the event; it has no
+                # stream position, so it cannot be replayed on reconnect.
+                self.multiplexer.deliver_local(self.stream_key(user_id), StreamEvent(id="", payload=event))
 
         await self._emit_local(user_id, event)
 
@@ -125,28 +298,18 @@ class EventBus:
 
         return event
 
-    def _xadd(self, user_id: str, event: dict[str, Any]) -> str | None:
+    async def _xadd(self, user_id: str, event: dict[str, Any]) -> str | None:
         try:
             client = redis_client.redis
             if not client:
                 return None
-            result = client.xadd(
+            result = await client.xadd(
                 self.stream_key(user_id),
                 {"event": json.dumps(event, separators=(",", ":"), default=str)},
                 maxlen=STREAM_MAXLEN,
                 approximate=True,
             )
             return str(result) if result else None
-        except TypeError:
-            try:
-                result = redis_client.redis.xadd(
-                    self.stream_key(user_id),
-                    {"event": json.dumps(event, separators=(",", ":"), default=str)},
-                )
-                return str(result) if result else None
-            except Exception as exc:
-                logger.warning("Redis XADD failed: %s", exc)
-                return None
         except Exception as exc:
             logger.warning("Redis XADD failed: %s", exc)
             return None
@@ -184,42 +347,58 @@ class EventBus:
                 self.unsubscribe(user_id, queue)
             return
 
-        current_id = last_id or "$"
-        while True:
-            rows = await asyncio.to_thread(self._xread, user_id, current_id, heartbeat_interval)
-            if not rows:
-                yield None
-                continue
-            for event_id, payload in rows:
-                current_id = event_id
-                yield StreamEvent(id=event_id, payload=payload)
+        key = self.stream_key(user_id)
+        subscription = await self.multiplexer.subscribe(key)
+        # Live entries can overlap the catch-up read; anything at or before
+        # the last delivered id is skipped.
+        delivered = _parse_stream_id(last_id) if last_id and last_id != "$" else None
+        try:
+            if delivered is not None:
+                for event in await self._xrange_after(key, last_id):
+                    delivered = _parse_stream_id(event.id)
+                    last_id = event.id
+                    yield event
+            while True:
+                if subscription.evicted:
+                    return
+                if subscription.lagged and delivered is not None:
+                    subscription.lagged = False
+                    for event in await self._xrange_after(key, last_id):
+                        if _parse_stream_id(event.id) > delivered:
+                            delivered = _parse_stream_id(event.id)
+                            last_id = event.id
+                            yield event
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat_interval)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if subscription.evicted:
+                    return
+                if not event.id:
+                    # Delivered in-process while Redis XADD was failing.
+                    yield event
+                    continue
+                event_key = _parse_stream_id(event.id)
+                if delivered is not None and event_key <= delivered:
+                    continue
+                delivered = event_key
+                last_id = event.id
+                yield event
+        finally:
+            self.multiplexer.unsubscribe(subscription)
 
-    def _xread(self, user_id: str, last_id: str, heartbeat_interval: int) -> list[tuple[str, dict[str, Any]]]:
+    async def _xrange_after(self, key: str, last_id: str, *, count: int = STREAM_MAXLEN) -> list[StreamEvent]:
+        """Entries strictly after `last_id` that are still retained in the stream."""
         try:
             client = redis_client.redis
             if not client:
                 return []
-            response = client.xread(
-                {self.stream_key(user_id): last_id},
-                count=25,
-                block=max(1000, heartbeat_interval * 1000),
-            )
+            entries = await client.xrange(key, min=f"({last_id}", max="+", count=count)
         except Exception as exc:
-            logger.warning("Redis XREAD failed: %s", exc)
+            logger.warning("Redis XRANGE failed: %s", exc)
             return []
-
-        parsed: list[tuple[str, dict[str, Any]]] = []
-        for _stream_name, entries in response or []:
-            for event_id, fields in entries or []:
-                raw = fields.get("event") if isinstance(fields, dict) else None
-                if isinstance(raw, bytes):
-                    raw = raw.decode("utf-8")
-                try:
-                    payload = json.loads(raw or "{}")
-                except json.JSONDecodeError:
-                    payload = {"type": "event", "data": raw}
-                parsed.append((str(event_id), payload))
-        return parsed
+        return _parse_entries(entries)
 
 
 event_bus = EventBus()
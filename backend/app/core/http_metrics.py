@@ -0,0 +1,240 @@
+"""HTTP request metrics in Prometheus text format.
+
+Each process keeps latency histograms keyed by route template, method and
+status class, in-flight request gauges and an event-loop lag probe. A
+background task publishes the process snapshot to one Redis hash
+(`metrics:http`, one field per process); `GET /metrics` merges every live
+process's snapshot so a scrape of any worker sees the whole deployment.
+Without Redis only the local process is reported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any
+
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+HTTP_LATENCY_BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_PUBLISH_INTERVAL_SECONDS = float(os.getenv("METRICS_PUBLISH_INTERVAL_SECONDS", "10"))
+# A process whose snapshot is older than this is treated as gone.
+METRICS_PROCESS_TTL_SECONDS = float(os.getenv("METRICS_PROCESS_TTL_SECONDS", "60"))
+EVENT_LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("EVENT_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+METRICS_REDIS_KEY = "metrics:http"
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def status_class(status_code: int) -> str:
+    return f"{int(status_code) // 100}xx"
+
+
+class HttpMetrics:
+    def __init__(self, *, process_id: str | None = None) -> None:
+        self.process_id = process_id or f"{socket.gethostname()}:{os.getpid()}"
+        # (route, method, status class) -> per-bucket counts, +Inf last
+        self._buckets: dict[tuple[str, str, str], list[int]] = {}
+        self._sums: dict[tuple[str, str, str], float] = {}
+        self.in_flight: dict[str, int] = {}
+        self.loop_lag_seconds = 0.0
+        self.loop_lag_max_seconds = 0.0
+        self._tasks: list[asyncio.Task] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def request_started(self, method: str) -> None:
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+        self._ensure_tasks()
+
+    def request_finished(self, method: str, route: str, status_code: int, seconds: float) -> None:
+        self.in_flight[method] = max(0, self.in_flight.get(method, 0) - 1)
+        self.observe(route, method, status_code, seconds)
+
+    def observe(self, route: str, method: str, status_code: int, seconds: float) -> None:
+        key = (route, method, status_class(status_code))
+        counts = self._buckets.get(key)
+        if counts is None:
+            counts = self._buckets[key] = [0] * (len(HTTP_LATENCY_BUCKETS_SECONDS) + 1)
+            self._sums[key] = 0.0
+        index = len(HTTP_LATENCY_BUCKETS_SECONDS)
+        for position, bound in enumerate(HTTP_LATENCY_BUCKETS_SECONDS):
+            if seconds <= bound:
+                index = position
+                break
+        counts[index] += 1
+        self._sums[key] += seconds
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "process": self.process_id,
+            "updatedAt": time.time(),
+            "requests": [
+                {
+                    "route": route,
+                    "method": method,
+                    "status": status,
+                    "buckets": list(counts),
+                    "sum": self._sums[(route, method, status)],
+                }
+                for (route, method, status), counts in self._buckets.items()
+            ],
+            "inFlight": dict(self.in_flight),
+            "loopLagSeconds": self.loop_lag_seconds,
+            "loopLagMaxSeconds": self.loop_lag_max_seconds,
+        }
+
+    async def publish(self) -> None:
+        if not redis_client.enabled:
+            return
+        pipe = redis_client.pipeline()
+        pipe.hset(METRICS_REDIS_KEY, self.process_id, json.dumps(self.snapshot(), separators=(",", ":")))
+        pipe.expire(METRICS_REDIS_KEY, int(METRICS_PROCESS_TTL_SECONDS * 10))
+        await redis_client.execute(pipe)
+
+    async def collect(self) -> list[dict[str, Any]]:
+        """This process's snapshot plus every other live process's published one."""
+        local = self.snapshot()
+        if not redis_client.enabled:
+            return [local]
+        await self.publish()
+        try:
+            published = await redis_client.redis.hgetall(METRICS_REDIS_KEY)
+        except Exception as exc:
+            logger.warning("Redis HGETALL error: %s", exc)
+            return [local]
+        snapshots, stale = [local], []
+        cutoff = time.time() - METRICS_PROCESS_TTL_SECONDS
+        for process_id, raw in (published or {}).items():
+            if process_id == self.process_id:
+                continue
+            try:
+                snapshot = json.loads(raw)
+            except (TypeError, ValueError):
+                snapshot = None
+            if not snapshot or snapshot.get("updatedAt", 0) < cutoff:
+                stale.append(process_id)
+                continue
+            snapshots.append(snapshot)
+        if stale:
+            try:
+                await redis_client.redis.hdel(METRICS_REDIS_KEY, *stale)
+            except Exception as exc:
+                logger.debug("Redis HDEL error: %s", exc)
+        return snapshots
+
+    def _ensure_tasks(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._loop is loop and all(not task.done() for task in self._tasks):
+            return
+        self._loop = loop
+        self._tasks = [loop.create_task(self._probe_loop_lag()), loop.create_task(self._publish_periodically())]
+
+    async def _probe_loop_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL_SECONDS)
+            lag = max(0.0, loop.time() - started - EVENT_LOOP_LAG_INTERVAL_SECONDS)
+            self.loop_lag_seconds = lag
+            self.loop_lag_max_seconds = max(self.loop_lag_max_seconds, lag)
+
+    async def _publish_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_PUBLISH_INTERVAL_SECONDS)
+            try:
+                await self.publish()
+            except Exception as exc:
+                logger.warning("HTTP metrics publish failed: %s", exc)
+            # The max is reported per publish window.
+            self.loop_lag_max_seconds = self.loop_lag_seconds
+
+    async def close(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if redis_client.enabled:
+            try:
+                await redis_client.redis.hdel(METRICS_REDIS_KEY, self.process_id)
+            except Exception as exc:
+                logger.debug("Redis HDEL error: %s", exc)
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+def render_prometheus(snapshots: list[dict[str, Any]]) -> str:
+    """Merge process snapshots and render them in Prometheus text exposition format."""
+    buckets: dict[tuple[str, str, str], list[int]] = {}
+    sums: dict[tuple[str, str, str], float] = {}
+    in_flight: dict[str, int] = {}
+    for snapshot in snapshots:
+        for row in snapshot.get("requests") or []:
+            key = (row["route"], row["method"], row["status"])
+            merged = buckets.setdefault(key, [0] * (len(HTTP_LATENCY_BUCKETS_SECONDS) + 1))
+            for index, count in enumerate(row.get("buckets") or []):
+                if index < len(merged):
+                    merged[index] += int(count)
+            sums[key] = sums.get(key, 0.0) + float(row.get("sum") or 0.0)
+        for method, count in (snapshot.get("inFlight") or {}).items():
+            in_flight[method] = in_flight.get(method, 0) + int(count)
+
+    lines = [
+        "# HELP ayn_http_request_duration_seconds HTTP request latency by route template, method and status class.",
+        "# TYPE ayn_http_request_duration_seconds histogram",
+    ]
+    for (route, method, status), counts in sorted(buckets.items()):
+        cumulative = 0
+        for bound, count in zip(HTTP_LATENCY_BUCKETS_SECONDS, counts):
+            cumulative += count
+            labels = _labels(route=route, method=method, status=status, le=bound)
+            lines.append(f"ayn_http_request_duration_seconds_bucket{labels} {cumulative}")
+        cumulative += counts[-1]
+        labels = _labels(route=route, method=method, status=status, le="+Inf")
+        lines.append(f"ayn_http_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(route=route, method=method, status=status)
+        lines.append(f"ayn_http_request_duration_seconds_sum{labels} {sums[(route, method, status)]:.6f}")
+        lines.append(f"ayn_http_request_duration_seconds_count{labels} {cumulative}")
+
+    lines += [
+        "# HELP ayn_http_requests_in_flight Requests currently being handled.",
+        "# TYPE ayn_http_requests_in_flight gauge",
+    ]
+    for method, count in sorted(in_flight.items()):
+        lines.append(f"ayn_http_requests_in_flight{_labels(method=method)} {count}")
+
+    lines += [
+        "# HELP ayn_event_loop_lag_seconds Latest event-loop scheduling delay per process.",
+        "# TYPE ayn_event_loop_lag_seconds gauge",
+    ]
+    for snapshot in snapshots:
+        labels = _labels(process=snapshot.get("process", "unknown"))
+        lines.append(f"ayn_event_loop_lag_seconds{labels} {float(snapshot.get('loopLagSeconds') or 0.0):.6f}")
+    lines += [
+        "# HELP ayn_event_loop_lag_max_seconds Worst event-loop scheduling delay in the last publish window.",
+        "# TYPE ayn_event_loop_lag_max_seconds gauge",
+    ]
+    for snapshot in snapshots:
+        labels = _labels(process=snapshot.get("process", "unknown"))
+        lines.append(f"ayn_event_loop_lag_max_seconds{labels} {float(snapshot.get('loopLagMaxSeconds') or 0.0):.6f}")
+    return "\n".join(lines) + "\n"
+
+
+http_metrics = HttpMetrics()
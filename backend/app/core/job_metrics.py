@@ -0,0 +1,177 @@
+"""Job queue observability: depth, age and wait/run-time distributions per job type.
+
+Depth comes from "AsyncJob"; timings come from "AsyncJobAttempt", which the
+queue writes in the same statements that claim and finish jobs. Workers publish
+a periodic snapshot to Redis and the log; admins can also read live numbers from
+GET /api/jobs/stats.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from typing import Any
+
+from app.core.db import get_db
+from app.core.jobs import ensure_jobs_table
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+JOB_METRICS_INTERVAL_SECONDS = float(os.getenv("JOB_METRICS_INTERVAL_SECONDS", "60"))
+JOB_METRICS_SNAPSHOT_KEY = "jobs:metrics:snapshot"
+_SNAPSHOT_LOCK_KEY = "lock:jobs:metrics"
+
+# Cumulative histogram bucket upper bounds, in milliseconds.
+HISTOGRAM_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000)
+
+
+def _histogram_columns(column: str, prefix: str) -> str:
+    buckets = ",\n            ".join(
+        f'COUNT(*) FILTER (WHERE "{column}" <= {bound})::int AS {prefix}_le_{index}'
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS)
+    )
+    percentiles = ",\n            ".join(
+        f'percentile_cont({quantile}) WITHIN GROUP (ORDER BY "{column}")::float8 AS {prefix}_p{label}'
+        for quantile, label in ((0.5, "50"), (0.95, "95"), (0.99, "99"))
+    )
+    return f"{buckets},\n            {percentiles}"
+
+
+DEPTH_SQL = """
+SELECT type,
+       COUNT(*) FILTER (WHERE status = 'queued')::int AS queued,
+       COUNT(*) FILTER (WHERE status = 'queued' AND "runAfter" <= NOW())::int AS due,
+       COUNT(*) FILTER (WHERE status = 'running')::int AS running,
+       COUNT(*) FILTER (WHERE status = 'failed')::int AS failed,
+       EXTRACT(EPOCH FROM (NOW() - MIN("runAfter") FILTER (
+           WHERE status = 'queued' AND "runAfter" <= NOW()
+       )))::float8 AS oldest_queued_seconds
+FROM "AsyncJob"
+WHERE status IN ('queued', 'running', 'failed')
+GROUP BY type
+"""
+
+# Wait time is measured from when a job became runnable to when it was claimed;
+# run time only covers attempts that actually ran to an outcome.
+TIMINGS_SQL = f"""
+SELECT type,
+       COUNT(*)::int AS attempts,
+       COUNT(*) FILTER (WHERE status = 'succeeded')::int AS succeeded,
+       COUNT(*) FILTER (WHERE status = 'failed')::int AS failed_attempts,
+       COUNT(*) FILTER (WHERE status = 'expired')::int AS expired,
+       {_histogram_columns("waitMs", "wait")},
+       {_histogram_columns("runMs", "run")}
+FROM "AsyncJobAttempt"
+WHERE "finishedAt" >= NOW() - ($1 || ' minutes')::interval
+  AND status IN ('succeeded', 'failed', 'expired')
+GROUP BY type
+"""
+
+
+def _histogram(row: dict[str, Any], prefix: str) -> dict[str, Any]:
+    return {
+        "buckets": [
+            {"le_ms": bound, "count": int(row.get(f"{prefix}_le_{index}") or 0)}
+            for index, bound in enumerate(HISTOGRAM_BUCKETS_MS)
+        ],
+        "p50_ms": row.get(f"{prefix}_p50"),
+        "p95_ms": row.get(f"{prefix}_p95"),
+        "p99_ms": row.get(f"{prefix}_p99"),
+    }
+
+
+def _empty_type_stats() -> dict[str, Any]:
+    return {
+        "queued": 0,
+        "due": 0,
+        "running": 0,
+        "failed": 0,
+        "oldest_queued_seconds": None,
+        "attempts": 0,
+        "succeeded": 0,
+        "failed_attempts": 0,
+        "expired": 0,
+        "wait": None,
+        "run": None,
+    }
+
+
+def build_job_stats(
+    depth_rows: list[dict[str, Any]],
+    timing_rows: list[dict[str, Any]],
+    *,
+    window_minutes: int,
+) -> dict[str, Any]:
+    """Merge the depth and timing queries into one document keyed by job type."""
+    types: dict[str, dict[str, Any]] = {}
+    for row in depth_rows:
+        stats = types.setdefault(row["type"], _empty_type_stats())
+        for key in ("queued", "due", "running", "failed"):
+            stats[key] = int(row.get(key) or 0)
+        oldest = row.get("oldest_queued_seconds")
+        stats["oldest_queued_seconds"] = round(float(oldest), 3) if oldest is not None else None
+    for row in timing_rows:
+        stats = types.setdefault(row["type"], _empty_type_stats())
+        for key in ("attempts", "succeeded", "failed_attempts", "expired"):
+            stats[key] = int(row.get(key) or 0)
+        stats["wait"] = _histogram(row, "wait")
+        stats["run"] = _histogram(row, "run")
+    oldest_overall = [s["oldest_queued_seconds"] for s in types.values() if s["oldest_queued_seconds"] is not None]
+    return {
+        "window_minutes": window_minutes,
+        "histogram_buckets_ms": list(HISTOGRAM_BUCKETS_MS),
+        "totals": {
+            "queued": sum(s["queued"] for s in types.values()),
+            "running": sum(s["running"] for s in types.values()),
+            "failed": sum(s["failed"] for s in types.values()),
+            "oldest_queued_seconds": max(oldest_overall) if oldest_overall else None,
+        },
+        "types": dict(sorted(types.items())),
+    }
+
+
+async def job_queue_stats(*, window_minutes: int = 60) -> dict[str, Any]:
+    """Live per-type queue depth plus wait/run histograms over the last `window_minutes`."""
+    await ensure_jobs_table()
+    db = get_db()
+    depth_rows = await db.query_raw(DEPTH_SQL)
+    timing_rows = await db.query_raw(TIMINGS_SQL, int(window_minutes))
+    return build_job_stats(list(depth_rows or []), list(timing_rows or []), window_minutes=window_minutes)
+
+
+async def publish_job_metrics_snapshot(*, window_minutes: int = 15) -> dict[str, Any] | None:
+    """
+    Compute and publish a snapshot, at most once per interval across all workers.
+
+    The Redis lock is deliberately left to expire rather than released, so it
+    doubles as the cross-process rate limit.
+    """
+    if redis_client.enabled:
+        token = await redis_client.acquire_lock(_SNAPSHOT_LOCK_KEY, JOB_METRICS_INTERVAL_SECONDS * 0.9)
+        if token is None:
+            return None
+    stats = await job_queue_stats(window_minutes=window_minutes)
+    await redis_client.set(
+        JOB_METRICS_SNAPSHOT_KEY,
+        json.dumps(stats, separators=(",", ":"), default=str),
+        ex=int(JOB_METRICS_INTERVAL_SECONDS * 5),
+    )
+    for job_type, type_stats in stats["types"].items():
+        run = type_stats.get("run") or {}
+        logger.info(
+            "jobs %s queued=%d running=%d failed=%d oldest=%ss run_p95=%sms",
+            job_type,
+            type_stats["queued"],
+            type_stats["running"],
+            type_stats["failed"],
+            type_stats["oldest_queued_seconds"],
+            run.get("p95_ms"),
+        )
+    return stats
+
+
+async def latest_job_metrics_snapshot() -> dict[str, Any] | None:
+    raw = await redis_client.get(JOB_METRICS_SNAPSHOT_KEY)
+    return json.loads(raw) if raw else None
@@ -3,6 +3,13 @@
 The project currently avoids adding a worker dependency. This module provides a
 production-friendly queue boundary using raw SQL so it works before Prisma model
 generation and can later be swapped for ARQ/Celery without changing callers.
+
+`enqueue_jobs` inserts any number of jobs in one statement and issues a
+`pg_notify` on JOB_NOTIFY_CHANNEL from the same statement, so notifications are
+only delivered once the rows commit. Jobs with a `dedupe_key` are skipped while
+an equal key is still queued or running.
+Workers LISTEN on a dedicated asyncpg connection and fall back to a long poll
+when it is unavailable (or for retries scheduled in the future).
 """
 
 from __future__ import annotations
@@ -11,8 +18,11 @@ import asyncio
 import json
 import logging
 import os
+import time
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Any, Awaitable, Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 from uuid import uuid4
 
 from app.core.db import get_db
@@ -23,6 +33,14 @@ JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
 _HANDLERS: dict[str, JobHandler] = {}
 _ENSURED = False
 
+JOB_NOTIFY_CHANNEL = "ayn_async_jobs"
+# Upper bound on how long an idle worker sleeps when no notification arrives.
+JOB_FALLBACK_POLL_SECONDS = float(os.getenv("JOB_FALLBACK_POLL_SECONDS", "30"))
+# A claimed job is leased until "lockedUntil"; running workers extend the lease
+# every JOB_LEASE_SECONDS / 3 and expired leases are reaped back to the queue.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_REAP_INTERVAL_SECONDS = float(os.getenv("JOB_REAP_INTERVAL_SECONDS", "60"))
+
 
 CREATE_JOBS_TABLE_SQL = """
 CREATE TABLE IF NOT EXISTS "AsyncJob" (
@@ -37,15 +55,50 @@ CREATE TABLE IF NOT EXISTS "AsyncJob" (
     "runAfter" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     "lockedAt" TIMESTAMPTZ,
     "lockedBy" TEXT,
+    "lockedUntil" TIMESTAMPTZ,
+    "dedupeKey" TEXT,
     "createdAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     "updatedAt" TIMESTAMPTZ NOT NULL DEFAULT NOW()
 )
 """
 
 JOB_INDEX_SQL = [
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_status_run_after" ON "AsyncJob"(status, "runAfter", priority)',
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_type_status" ON "AsyncJob"(type, status)',
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_created_at" ON "AsyncJob"("createdAt" DESC)',
+    'ALTER TABLE "AsyncJob" ADD COLUMN IF NOT EXISTS "lockedUntil" TIMESTAMPTZ',
+    'ALTER TABLE "AsyncJob" ADD COLUMN IF NOT EXISTS "dedupeKey" TEXT',
+    # Hot-path indexes only cover live rows; finished rows are archived by
+    # app.core.retention and only need the index that retention scans.
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_queued" ON "AsyncJob"("runAfter", priority) WHERE status = \'queued\'',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_live_type" ON "AsyncJob"(type, status) WHERE status <> \'succeeded\'',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_finished" ON "AsyncJob"("updatedAt") WHERE status IN (\'succeeded\', \'failed\')',
+    'DROP INDEX IF EXISTS "idx_async_job_status_run_after"',
+    'DROP INDEX IF EXISTS "idx_async_job_type_status"',
+    'DROP INDEX IF EXISTS "idx_async_job_created_at"',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_lease" ON "AsyncJob"("lockedUntil") WHERE status = \'running\'',
+    # Only live jobs are deduplicated: once a job finishes the same key can run again.
+    'CREATE UNIQUE INDEX IF NOT EXISTS "uq_async_job_dedupe_live" ON "AsyncJob"("dedupeKey") '
+    'WHERE "dedupeKey" IS NOT NULL AND status IN (\'queued\', \'running\')',
+]
+
+# One row per execution attempt, written in the same statements that claim and
+# finish jobs, so queue wait and run time are exact (see app.core.job_metrics).
+CREATE_JOB_ATTEMPTS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS "AsyncJobAttempt" (
+    id BIGSERIAL PRIMARY KEY,
+    "jobId" TEXT NOT NULL,
+    type TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    "workerId" TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    "waitMs" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "runMs" DOUBLE PRECISION,
+    "startedAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    "finishedAt" TIMESTAMPTZ
+)
+"""
+
+JOB_ATTEMPT_INDEX_SQL = [
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_attempt_open" ON "AsyncJobAttempt"("jobId") WHERE "finishedAt" IS NULL',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_attempt_finished" ON "AsyncJobAttempt"("finishedAt", type)',
 ]
 
 
@@ -57,6 +110,9 @@ async def ensure_jobs_table() -> None:
     await db.execute_raw(CREATE_JOBS_TABLE_SQL)
     for sql in JOB_INDEX_SQL:
         await db.execute_raw(sql)
+    await db.execute_raw(CREATE_JOB_ATTEMPTS_TABLE_SQL)
+    for sql in JOB_ATTEMPT_INDEX_SQL:
+        await db.execute_raw(sql)
     _ENSURED = True
 
 
@@ -64,6 +120,18 @@ def register_job_handler(job_type: str, handler: JobHandler) -> None:
     _HANDLERS[job_type] = handler
 
 
+@dataclass(frozen=True)
+class JobRequest:
+    """One job for `enqueue_jobs`; mirrors the keyword arguments of `enqueue_job`."""
+
+    type: str
+    payload: dict[str, Any]
+    priority: int = 100
+    max_attempts: int = 3
+    run_after: datetime | None = None
+    dedupe_key: str | None = None
+
+
 async def enqueue_job(
     job_type: str,
     payload: dict[str, Any],
@@ -71,28 +139,105 @@ async def enqueue_job(
     priority: int = 100,
     max_attempts: int = 3,
     run_after: datetime | None = None,
+    dedupe_key: str | None = None,
 ) -> str:
+    """
+    Enqueue one job and return its id.
+
+    With `dedupe_key`, enqueueing while a job with the same key is still queued
+    or running is a no-op that returns the existing job's id.
+    """
+    ids = await enqueue_jobs(
+        [
+            JobRequest(
+                type=job_type,
+                payload=payload,
+                priority=priority,
+                max_attempts=max_attempts,
+                run_after=run_after,
+                dedupe_key=dedupe_key,
+            )
+        ]
+    )
+    return ids[0]
+
+
+async def enqueue_jobs(requests: list[JobRequest]) -> list[str]:
+    """
+    Enqueue many jobs with one multi-row INSERT; returns ids in request order.
+
+    Rows are passed as a single JSONB array and expanded with
+    jsonb_to_recordset, so the statement size does not depend on the batch.
+    Deduplicated requests get the id of the live job they collided with.
+    """
+    if not requests:
+        return []
     await ensure_jobs_table()
-    job_id = str(uuid4())
+    rows = []
+    for request in requests:
+        rows.append(
+            {
+                "id": str(uuid4()),
+                "type": request.type,
+                "priority": request.priority,
+                "maxAttempts": request.max_attempts,
+                "payload": request.payload,
+                "runAfter": request.run_after.isoformat() if request.run_after else None,
+                "dedupeKey": request.dedupe_key,
+            }
+        )
     db = get_db()
-    await db.execute_raw(
+    # Jobs scheduled for later are not announced; workers pick them up via
+    # `seconds_until_next_job`.
+    inserted = await db.query_raw(
         """
-        INSERT INTO "AsyncJob"
-          (id, type, status, priority, attempts, "maxAttempts", payload, "runAfter", "createdAt", "updatedAt")
-        VALUES
-          ($1, $2, 'queued', $3, 0, $4, $5::jsonb, COALESCE($6, NOW()), NOW(), NOW())
+        WITH inserted AS (
+            INSERT INTO "AsyncJob"
+              (id, type, status, priority, attempts, "maxAttempts", payload, "runAfter",
+               "dedupeKey", "createdAt", "updatedAt")
+            SELECT r.id, r.type, 'queued', r.priority, 0, r."maxAttempts", r.payload,
+                   COALESCE(r."runAfter", NOW()), r."dedupeKey", NOW(), NOW()
+            FROM jsonb_to_recordset($1::jsonb) AS r(
+                id TEXT, type TEXT, priority INTEGER, "maxAttempts" INTEGER, payload JSONB,
+                "runAfter" TIMESTAMPTZ, "dedupeKey" TEXT
+            )
+            ON CONFLICT ("dedupeKey") WHERE "dedupeKey" IS NOT NULL AND status IN ('queued', 'running')
+            DO NOTHING
+            RETURNING id, type, "runAfter"
+        )
+        SELECT id, CASE WHEN "runAfter" <= NOW() THEN pg_notify($2, type)::text END AS notified
+        FROM inserted
         """,
-        job_id,
-        job_type,
-        priority,
-        max_attempts,
-        json.dumps(payload),
-        run_after,
+        json.dumps(rows, default=str),
+        JOB_NOTIFY_CHANNEL,
     )
-    return job_id
+    inserted_ids = {row["id"] for row in inserted or []}
+    missing_keys = [
+        row["dedupeKey"] for row in rows if row["id"] not in inserted_ids and row["dedupeKey"]
+    ]
+    existing: dict[str, str] = {}
+    if missing_keys:
+        found = await db.query_raw(
+            """
+            SELECT id, "dedupeKey" FROM "AsyncJob"
+            WHERE "dedupeKey" IN (SELECT jsonb_array_elements_text($1::jsonb))
+              AND status IN ('queued', 'running')
+            """,
+            json.dumps(missing_keys),
+        )
+        existing = {row["dedupeKey"]: row["id"] for row in found or []}
+    return [
+        row["id"] if row["id"] in inserted_ids else existing.get(row["dedupeKey"], row["id"])
+        for row in rows
+    ]
 
 
-async def claim_jobs(*, worker_id: str, limit: int = 5) -> list[dict[str, Any]]:
+async def claim_jobs(
+    *,
+    worker_id: str,
+    limit: int = 5,
+    exclude_types: list[str] | None = None,
+) -> list[dict[str, Any]]:
     await ensure_jobs_table()
     db = get_db()
     rows = await db.query_raw(
@@ -101,60 +246,247 @@ async def claim_jobs(*, worker_id: str, limit: int = 5) -> list[dict[str, Any]]:
             SELECT id
             FROM "AsyncJob"
             WHERE status = 'queued' AND "runAfter" <= NOW()
+              AND type NOT IN (SELECT jsonb_array_elements_text($3::jsonb))
             ORDER BY priority ASC, "createdAt" ASC
             LIMIT $1
             FOR UPDATE SKIP LOCKED
+        ),
+        claimed AS (
+            UPDATE "AsyncJob" j
+            SET status = 'running',
+                "lockedAt" = NOW(),
+                "lockedBy" = $2,
+                "lockedUntil" = NOW() + ($4 || ' seconds')::interval,
+                attempts = attempts + 1,
+                "updatedAt" = NOW()
+            FROM picked
+            WHERE j.id = picked.id
+            RETURNING j.id, j.type, j.payload, j.attempts, j."maxAttempts", j."runAfter"
+        ),
+        started AS (
+            INSERT INTO "AsyncJobAttempt" ("jobId", type, attempt, "workerId", status, "waitMs", "startedAt")
+            SELECT id, type, attempts, $2, 'running',
+                   GREATEST(EXTRACT(EPOCH FROM (NOW() - "runAfter")) * 1000, 0), NOW()
+            FROM claimed
         )
-        UPDATE "AsyncJob" j
-        SET status = 'running',
-            "lockedAt" = NOW(),
-            "lockedBy" = $2,
-            attempts = attempts + 1,
-            "updatedAt" = NOW()
-        FROM picked
-        WHERE j.id = picked.id
-        RETURNING j.id, j.type, j.payload, j.attempts, j."maxAttempts"
+        SELECT id, type, payload, attempts, "maxAttempts" FROM claimed
         """,
         limit,
         worker_id,
+        json.dumps(exclude_types or []),
+        JOB_LEASE_SECONDS,
     )
     return list(rows or [])
 
 
-async def complete_job(job_id: str) -> None:
+async def release_jobs(job_ids: list[str], *, worker_id: str) -> None:
+    """Hand claimed-but-unfinished jobs back to the queue without spending an attempt."""
+    if not job_ids:
+        return
     db = get_db()
-    await db.execute_raw(
+    await db.query_raw(
+        """
+        WITH released AS (
+            UPDATE "AsyncJob"
+            SET status = 'queued',
+                attempts = GREATEST(attempts - 1, 0),
+                "runAfter" = NOW(),
+                "lockedAt" = NULL,
+                "lockedBy" = NULL,
+                "lockedUntil" = NULL,
+                "updatedAt" = NOW()
+            WHERE id IN (SELECT jsonb_array_elements_text($1::jsonb))
+              AND status = 'running' AND "lockedBy" = $2
+            RETURNING id, type
+        ),
+        finished AS (
+            UPDATE "AsyncJobAttempt" a
+            SET status = 'released',
+                "finishedAt" = NOW(),
+                "runMs" = EXTRACT(EPOCH FROM (NOW() - a."startedAt")) * 1000
+            FROM released
+            WHERE a."jobId" = released.id AND a."finishedAt" IS NULL
+        )
+        SELECT pg_notify($3, type)::text AS notified FROM released
+        """,
+        json.dumps(job_ids),
+        worker_id,
+        JOB_NOTIFY_CHANNEL,
+    )
+
+
+async def extend_leases(job_ids: list[str], *, worker_id: str) -> set[str]:
+    """Heartbeat: push out the lease of jobs this worker still runs; returns the ids still held."""
+    if not job_ids:
+        return set()
+    db = get_db()
+    rows = await db.query_raw(
         """
         UPDATE "AsyncJob"
-        SET status = 'succeeded', "updatedAt" = NOW(), "lockedAt" = NULL, "lockedBy" = NULL
-        WHERE id = $1
+        SET "lockedUntil" = NOW() + ($3 || ' seconds')::interval, "updatedAt" = NOW()
+        WHERE id IN (SELECT jsonb_array_elements_text($1::jsonb))
+          AND status = 'running' AND "lockedBy" = $2
+        RETURNING id
+        """,
+        json.dumps(job_ids),
+        worker_id,
+        JOB_LEASE_SECONDS,
+    )
+    return {row["id"] for row in rows or []}
+
+
+async def reap_expired_jobs(*, limit: int = 100) -> int:
+    """
+    Reclaim running jobs whose lease expired (the worker died or stalled).
+
+    The lost run counts as an attempt: jobs with attempts left are requeued and
+    announced, the rest are marked failed. Rows from before leases existed fall
+    back to "lockedAt". Safe to run from every worker concurrently.
+    """
+    await ensure_jobs_table()
+    db = get_db()
+    rows = await db.query_raw(
+        """
+        WITH expired AS (
+            SELECT id
+            FROM "AsyncJob"
+            WHERE status = 'running'
+              AND COALESCE("lockedUntil", "lockedAt" + ($2 || ' seconds')::interval) < NOW()
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        ),
+        reaped AS (
+            UPDATE "AsyncJob" j
+            SET status = CASE WHEN j.attempts >= j."maxAttempts" THEN 'failed' ELSE 'queued' END,
+                "lastError" = 'Lease expired (worker ' || COALESCE(j."lockedBy", '?') || ' stopped heartbeating)',
+                "runAfter" = NOW(),
+                "lockedAt" = NULL,
+                "lockedBy" = NULL,
+                "lockedUntil" = NULL,
+                "updatedAt" = NOW()
+            FROM expired
+            WHERE j.id = expired.id
+            RETURNING j.id, j.type, j.status
+        ),
+        finished AS (
+            UPDATE "AsyncJobAttempt" a
+            SET status = 'expired',
+                "finishedAt" = NOW(),
+                "runMs" = EXTRACT(EPOCH FROM (NOW() - a."startedAt")) * 1000
+            FROM reaped
+            WHERE a."jobId" = reaped.id AND a."finishedAt" IS NULL
+        )
+        SELECT type, status, CASE WHEN status = 'queued' THEN pg_notify($3, type)::text END AS notified
+        FROM reaped
+        """,
+        limit,
+        JOB_LEASE_SECONDS,
+        JOB_NOTIFY_CHANNEL,
+    )
+    rows = list(rows or [])
+    if rows:
+        failed = sum(1 for row in rows if row.get("status") == "failed")
+        logger.warning("Reaped %d expired job lease(s), %d out of attempts", len(rows), failed)
+    return len(rows)
+
+
+async def seconds_until_next_job() -> float | None:
+    """Seconds until the earliest queued job becomes runnable (0 if one is due), or None."""
+    db = get_db()
+    rows = await db.query_raw(
+        """
+        SELECT GREATEST(EXTRACT(EPOCH FROM (MIN("runAfter") - NOW())), 0)::float8 AS wait
+        FROM "AsyncJob"
+        WHERE status = 'queued'
+        """
+    )
+    wait = rows[0].get("wait") if rows else None
+    return float(wait) if wait is not None else None
+
+
+def _fenced_out(job: dict[str, Any], worker_id: str, rows: Any, outcome: str) -> bool:
+    if rows:
+        return False
+    # The lease expired and the job was reaped (and possibly claimed again).
+    logger.warning(
+        "Worker %s no longer holds job %s (attempt %s); its %s was not recorded",
+        worker_id, job.get("id"), job.get("attempts"), outcome,
+    )
+    return True
+
+
+async def complete_job(job: dict[str, Any], *, worker_id: str) -> bool:
+    """
+    Mark a claimed job succeeded.
+
+    Only the claim that is still current (same worker, same attempt, still
+    running) may finish a job; returns False when this worker lost it.
+    """
+    db = get_db()
+    rows = await db.query_raw(
+        """
+        WITH done AS (
+            UPDATE "AsyncJob"
+            SET status = 'succeeded', "updatedAt" = NOW(), "lockedAt" = NULL, "lockedBy" = NULL, "lockedUntil" = NULL
+            WHERE id = $1 AND status = 'running' AND "lockedBy" = $2 AND attempts = $3
+            RETURNING id
+        ),
+        finished AS (
+            UPDATE "AsyncJobAttempt" a
+            SET status = 'succeeded',
+                "finishedAt" = NOW(),
+                "runMs" = EXTRACT(EPOCH FROM (NOW() - a."startedAt")) * 1000
+            FROM done
+            WHERE a."jobId" = done.id AND a.attempt = $3 AND a."workerId" = $2 AND a."finishedAt" IS NULL
+        )
+        SELECT id FROM done
         """,
-        job_id,
+        job["id"],
+        worker_id,
+        int(job.get("attempts") or 1),
     )
+    return not _fenced_out(job, worker_id, rows, "success")
 
 
-async def fail_job(job: dict[str, Any], error: Exception) -> None:
+async def fail_job(job: dict[str, Any], error: Exception, *, worker_id: str) -> bool:
+    """Requeue a failed claim with backoff, or fail it for good; fenced like `complete_job`."""
     db = get_db()
     attempts = int(job.get("attempts") or 1)
     max_attempts = int(job.get("maxAttempts") or job.get("max_attempts") or 3)
     terminal = attempts >= max_attempts
     delay_seconds = min(60 * attempts, 300)
-    await db.execute_raw(
+    rows = await db.query_raw(
         """
-        UPDATE "AsyncJob"
-        SET status = $2,
-            "lastError" = $3,
-            "runAfter" = CASE WHEN $2 = 'queued' THEN NOW() + ($4 || ' seconds')::interval ELSE "runAfter" END,
-            "updatedAt" = NOW(),
-            "lockedAt" = NULL,
-            "lockedBy" = NULL
-        WHERE id = $1
+        WITH failed AS (
+            UPDATE "AsyncJob"
+            SET status = $2,
+                "lastError" = $3,
+                "runAfter" = CASE WHEN $2 = 'queued' THEN NOW() + ($4 || ' seconds')::interval ELSE "runAfter" END,
+                "updatedAt" = NOW(),
+                "lockedAt" = NULL,
+                "lockedBy" = NULL,
+                "lockedUntil" = NULL
+            WHERE id = $1 AND status = 'running' AND "lockedBy" = $5 AND attempts = $6
+            RETURNING id
+        ),
+        finished AS (
+            UPDATE "AsyncJobAttempt" a
+            SET status = 'failed',
+                "finishedAt" = NOW(),
+                "runMs" = EXTRACT(EPOCH FROM (NOW() - a."startedAt")) * 1000
+            FROM failed
+            WHERE a."jobId" = failed.id AND a.attempt = $6 AND a."workerId" = $5 AND a."finishedAt" IS NULL
+        )
+        SELECT id FROM failed
         """,
         job["id"],
         "failed" if terminal else "queued",
         str(error)[:4000],
         delay_seconds,
+        worker_id,
+        attempts,
     )
+    return not _fenced_out(job, worker_id, rows, "failure")
 
 
 async def run_claimed_job(job: dict[str, Any]) -> None:
@@ -173,15 +505,305 @@ async def run_worker_once(*, worker_id: str | None = None, limit: int = 5) -> in
     for job in jobs:
         try:
             await run_claimed_job(job)
-            await complete_job(job["id"])
+            await complete_job(job, worker_id=worker_id)
         except Exception as exc:
             logger.error("Async job failed: %s (%s)", job.get("type"), exc, exc_info=True)
-            await fail_job(job, exc)
+            await fail_job(job, exc, worker_id=worker_id)
     return len(jobs)
 
 
-async def run_worker_loop(*, worker_id: str | None = None, poll_interval: float = 1.0, limit: int = 5) -> None:
-    while True:
-        count = await run_worker_once(worker_id=worker_id, limit=limit)
-        if count == 0:
-            await asyncio.sleep(poll_interval)
+def _listen_dsn() -> str | None:
+    """
+    DSN for the LISTEN connection.
+
+    DIRECT_URL is preferred because transaction-mode poolers (Supabase on port
+    6543) do not keep LISTEN registrations. Prisma-only query params are dropped.
+    """
+    url = os.environ.get("DIRECT_URL") or os.environ.get("DATABASE_URL")
+    if not url:
+        return None
+    parts = urlsplit(url)
+    query = {k: v for k, v in parse_qsl(parts.query, keep_blank_values=True) if k in ("sslmode",)}
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ""))
+
+
+class JobWakeup:
+    """
+    Wakes idle workers when a job is enqueued.
+
+    Holds one LISTEN connection per worker process. If asyncpg is missing or the
+    connection fails, `wait` simply sleeps for its timeout so the worker keeps
+    polling; reconnects are attempted on later waits. With `enabled=False` no
+    connection is ever opened and only in-process `wake` calls end a wait early.
+    """
+
+    def __init__(self, channel: str = JOB_NOTIFY_CHANNEL, *, enabled: bool = True) -> None:
+        self.channel = channel
+        self.enabled = enabled
+        self._event = asyncio.Event()
+        self._conn: Any = None
+        self._retry_at = 0.0
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None and not self._conn.is_closed()
+
+    async def start(self) -> bool:
+        if self.listening:
+            return True
+        if not self.enabled:
+            return False
+        dsn = _listen_dsn()
+        if not dsn or time.monotonic() < self._retry_at:
+            return False
+        self._retry_at = time.monotonic() + JOB_FALLBACK_POLL_SECONDS
+        try:
+            import asyncpg
+
+            conn = await asyncpg.connect(dsn, statement_cache_size=0)
+            await conn.add_listener(self.channel, self._on_notify)
+            conn.add_termination_listener(self._on_terminated)
+        except Exception as exc:
+            logger.warning("Job LISTEN unavailable, falling back to polling: %s", exc)
+            return False
+        self._conn = conn
+        # Anything enqueued while we were not listening is found by the next claim.
+        self._event.set()
+        return True
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, _payload: str) -> None:
+        self._event.set()
+
+    def wake(self) -> None:
+        """Wake a pending `wait` from inside the process (job finished, shutdown)."""
+        self._event.set()
+
+    def _on_terminated(self, _conn: Any) -> None:
+        logger.warning("Job LISTEN connection closed")
+        self._conn = None
+        self._event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Block until a notification or `timeout`; True when woken by a notification."""
+        if self.enabled and not self.listening:
+            await self.start()
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+    async def close(self) -> None:
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                await conn.close()
+            except Exception as exc:
+                logger.debug("Job LISTEN close error: %s", exc)
+
+
+def parse_type_limits(spec: str | None) -> dict[str, int]:
+    """Parse ``"rag.index_document=2,horus.observe_event=8"`` into per-type caps."""
+    limits: dict[str, int] = {}
+    for item in (spec or "").split(","):
+        job_type, _, value = item.strip().partition("=")
+        if job_type and value.strip().isdigit():
+            limits[job_type.strip()] = max(1, int(value))
+    return limits
+
+
+class JobWorker:
+    """
+    Runs claimed jobs concurrently.
+
+    Up to `concurrency` jobs run at once, and `type_limits` caps individual job
+    types (e.g. provider-bound embedding jobs). Claiming is continuous: whenever
+    a slot frees, the worker claims more work, skipping types that are at their
+    cap. A background heartbeat keeps the leases of running jobs alive (and
+    cancels any whose lease was lost to the reaper), periodically reaps jobs abandoned by dead workers, publishes the queue
+    metrics snapshot and schedules table retention. `stop()` stops claiming, lets running jobs finish for up to
+    `shutdown_timeout` seconds, then cancels the rest and hands them back to the
+    queue without spending an attempt.
+    """
+
+    def __init__(
+        self,
+        *,
+        worker_id: str | None = None,
+        concurrency: int = 4,
+        type_limits: dict[str, int] | None = None,
+        batch_size: int = 5,
+        poll_interval: float = 1.0,
+        listen: bool = True,
+        fallback_poll_interval: float = JOB_FALLBACK_POLL_SECONDS,
+        shutdown_timeout: float = 30.0,
+    ) -> None:
+        self.worker_id = worker_id or f"worker-{os.getpid()}"
+        self.concurrency = max(1, int(concurrency))
+        self.type_limits = dict(type_limits or {})
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = poll_interval
+        self.listen = listen
+        self.fallback_poll_interval = fallback_poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.wakeup = JobWakeup(enabled=listen)
+        self._running: dict[str, tuple[dict[str, Any], asyncio.Task]] = {}
+        self._running_by_type: dict[str, int] = {}
+        self._stopping = False
+
+    def stop(self) -> None:
+        """Request a graceful shutdown; safe to call from a signal handler."""
+        self._stopping = True
+        self.wakeup.wake()
+
+    def _saturated_types(self) -> list[str]:
+        return [t for t, cap in self.type_limits.items() if self._running_by_type.get(t, 0) >= cap]
+
+    async def run(self) -> None:
+        await self.wakeup.start()
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while not self._stopping:
+                free = self.concurrency - len(self._running)
+                if free <= 0:
+                    # Woken by the next job to finish.
+                    await self.wakeup.wait(self.fallback_poll_interval)
+                    continue
+                requested = min(free, self.batch_size)
+                try:
+                    jobs = await claim_jobs(
+                        worker_id=self.worker_id,
+                        limit=requested,
+                        exclude_types=self._saturated_types(),
+                    )
+                except Exception as exc:
+                    logger.error("Claiming jobs failed: %s", exc)
+                    jobs = []
+                jobs = await self._start_jobs(jobs)
+                if len(jobs) < requested and not self._stopping:
+                    await self._idle_wait()
+        finally:
+            await self._drain()
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+            await self.wakeup.close()
+
+    async def _heartbeat(self) -> None:
+        from app.core import job_metrics, retention
+
+        interval = max(1.0, JOB_LEASE_SECONDS / 3)
+        next_reap = next_metrics = next_retention = time.monotonic()
+        while True:
+            try:
+                if self._running:
+                    job_ids = list(self._running)
+                    held = await extend_leases(job_ids, worker_id=self.worker_id)
+                    # Ignore jobs that simply finished while the heartbeat ran.
+                    lost = (set(job_ids) - held) & set(self._running)
+                    if lost:
+                        # Another worker may already run them; stop ours. Their
+                        # writes are fenced anyway, so a late finish is a no-op.
+                        logger.warning("Worker %s lost the lease on job(s) %s, cancelling", self.worker_id, sorted(lost))
+                        for job_id in lost:
+                            self._running[job_id][1].cancel()
+                if time.monotonic() >= next_reap:
+                    next_reap = time.monotonic() + JOB_REAP_INTERVAL_SECONDS
+                    await reap_expired_jobs()
+                if time.monotonic() >= next_metrics:
+                    next_metrics = time.monotonic() + job_metrics.JOB_METRICS_INTERVAL_SECONDS
+                    await job_metrics.publish_job_metrics_snapshot()
+                if time.monotonic() >= next_retention:
+                    next_retention = time.monotonic() + retention.RETENTION_INTERVAL_SECONDS
+                    await retention.schedule_retention()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Job heartbeat failed: %s", exc)
+            await asyncio.sleep(interval)
+
+    async def _start_jobs(self, jobs: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Start claimed jobs; any a batch claimed past its type cap go back to the queue."""
+        started: list[dict[str, Any]] = []
+        overflow: list[str] = []
+        for job in jobs:
+            job_type = job["type"]
+            cap = self.type_limits.get(job_type)
+            if cap is not None and self._running_by_type.get(job_type, 0) >= cap:
+                overflow.append(job["id"])
+                continue
+            self._running_by_type[job_type] = self._running_by_type.get(job_type, 0) + 1
+            task = asyncio.create_task(self._execute(job))
+            # A done callback, so bookkeeping also runs for tasks cancelled before they start.
+            task.add_done_callback(lambda _task, job=job: self._finished(job))
+            self._running[job["id"]] = (job, task)
+            started.append(job)
+        if overflow:
+            await release_jobs(overflow, worker_id=self.worker_id)
+        return started
+
+    async def _execute(self, job: dict[str, Any]) -> None:
+        try:
+            await run_claimed_job(job)
+            await complete_job(job, worker_id=self.worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.error("Async job failed: %s (%s)", job.get("type"), exc, exc_info=True)
+            await fail_job(job, exc, worker_id=self.worker_id)
+
+    def _finished(self, job: dict[str, Any]) -> None:
+        self._running.pop(job["id"], None)
+        self._running_by_type[job["type"]] = max(0, self._running_by_type.get(job["type"], 1) - 1)
+        self.wakeup.wake()
+
+    async def _idle_wait(self) -> None:
+        timeout = self.fallback_poll_interval if self.wakeup.listening else self.poll_interval
+        try:
+            next_due = await seconds_until_next_job()
+        except Exception as exc:
+            logger.debug("Could not read next job due time: %s", exc)
+            next_due = None
+        if next_due is not None:
+            # A due job we could not claim is held by another worker or a capped
+            # type; job completions wake us anyway, so don't spin on it.
+            timeout = min(timeout, max(next_due, 0.05 if not self._running else self.poll_interval))
+        await self.wakeup.wait(timeout)
+
+    async def _drain(self) -> None:
+        if not self._running:
+            return
+        tasks = [task for _, task in self._running.values()]
+        logger.info("Worker %s waiting for %d running job(s)", self.worker_id, len(tasks))
+        _, pending = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        if not pending:
+            return
+        unfinished = [job_id for job_id, (_, task) in self._running.items() if task in pending]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await release_jobs(unfinished, worker_id=self.worker_id)
+        logger.warning("Worker %s requeued %d unfinished job(s)", self.worker_id, len(unfinished))
+
+
+async def run_worker_loop(
+    *,
+    worker_id: str | None = None,
+    poll_interval: float = 1.0,
+    limit: int = 5,
+    listen: bool = True,
+    fallback_poll_interval: float = JOB_FALLBACK_POLL_SECONDS,
+    concurrency: int = 1,
+    type_limits: dict[str, int] | None = None,
+) -> None:
+    """Claim and run jobs forever (see `JobWorker`; concurrency=1 keeps jobs sequential)."""
+    await JobWorker(
+        worker_id=worker_id,
+        concurrency=concurrency,
+        type_limits=type_limits,
+        batch_size=limit,
+        poll_interval=poll_interval,
+        listen=listen,
+        fallback_poll_interval=fallback_poll_interval,
+    ).run()
@@ -1,14 +1,24 @@
-"""Lightweight AI/product metrics hooks for Horus."""
+"""Lightweight AI/product metrics hooks for Horus.
+
+Usage rows are buffered in-process and written in batches (see
+`AIUsageMetricBuffer`), so recording a metric never adds a database round trip
+to the request that produced it.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
+import os
+from collections import deque
 from datetime import datetime, timezone
 from typing import Any
 from uuid import uuid4
 
 from app.core.db import get_db
+from app.core.server_timing import add_timing
+from app.core.tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +50,10 @@ AI_USAGE_INDEX_SQL = [
 
 _ENSURED = False
 
+AI_METRICS_BUFFER_MAX = int(os.getenv("AI_METRICS_BUFFER_MAX", "5000"))
+AI_METRICS_FLUSH_SIZE = int(os.getenv("AI_METRICS_FLUSH_SIZE", "200"))
+AI_METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("AI_METRICS_FLUSH_INTERVAL_SECONDS", "2"))
+
 
 async def ensure_ai_usage_metric_table() -> None:
     global _ENSURED
@@ -52,12 +66,6 @@ async def ensure_ai_usage_metric_table() -> None:
     _ENSURED = True
 
 
-def estimate_tokens(text: str | None) -> int:
-    if not text:
-        return 0
-    return max(1, int(len(text) / 4))
-
-
 def estimate_message_tokens(messages: list[dict[str, Any]] | None, context: str | None = None) -> int:
     total = estimate_tokens(context)
     for msg in messages or []:
@@ -69,6 +77,136 @@ def estimate_message_tokens(messages: list[dict[str, Any]] | None, context: str
     return total
 
 
+class AIUsageMetricBuffer:
+    """
+    In-process buffer that persists AIUsageMetric rows in batches.
+
+    `add` never blocks or touches the database: records are appended to a
+    bounded deque and a background task writes them with one multi-row INSERT
+    when `flush_size` records are pending or every `flush_interval` seconds.
+    When the deque is full new records are dropped and counted. `close()`
+    drains everything that is still pending (called on shutdown).
+    """
+
+    def __init__(
+        self,
+        *,
+        max_pending: int = AI_METRICS_BUFFER_MAX,
+        flush_size: int = AI_METRICS_FLUSH_SIZE,
+        flush_interval: float = AI_METRICS_FLUSH_INTERVAL_SECONDS,
+    ) -> None:
+        self.max_pending = max(1, max_pending)
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self._pending: deque[dict[str, Any]] = deque()
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._closing = False
+        self.stats = {"accepted": 0, "written": 0, "dropped": 0, "write_errors": 0, "batches": 0}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, record: dict[str, Any]) -> bool:
+        if len(self._pending) >= self.max_pending:
+            self.stats["dropped"] += 1
+            if self.stats["dropped"] % 1000 == 1:
+                logger.warning("AI usage metric buffer full; %d record(s) dropped so far", self.stats["dropped"])
+            return False
+        self._pending.append(record)
+        self.stats["accepted"] += 1
+        self._ensure_flusher()
+        if len(self._pending) >= self.flush_size and self._wake is not None:
+            self._wake.set()
+        return True
+
+    def _ensure_flusher(self) -> None:
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop (e.g. a sync script); the next add or close() flushes.
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._closing:
+                return
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write everything pending in `flush_size` batches; returns rows written."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.flush_size, len(self._pending)))]
+                try:
+                    await _insert_ai_usage_rows(batch)
+                except asyncio.CancelledError:
+                    # Not written: keep the batch for the next flush.
+                    self._pending.extendleft(reversed(batch))
+                    raise
+                except Exception as exc:
+                    # Telemetry must never back up into request handling: count and move on.
+                    self.stats["write_errors"] += 1
+                    self.stats["dropped"] += len(batch)
+                    logger.debug("AI usage metric batch skipped: %s", exc)
+                    continue
+                self.stats["batches"] += 1
+                self.stats["written"] += len(batch)
+                written += len(batch)
+        return written
+
+    async def close(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            # Let an in-flight flush finish its batch instead of cancelling it.
+            self._closing = True
+            self._wake.set()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    def snapshot(self) -> dict[str, int]:
+        return {**self.stats, "pending": len(self._pending)}
+
+
+async def _insert_ai_usage_rows(rows: list[dict[str, Any]]) -> None:
+    await ensure_ai_usage_metric_table()
+    db = get_db()
+    await db.execute_raw(
+        """
+        INSERT INTO "AIUsageMetric"
+          (id, "userId", "institutionId", feature, operation, provider, model, "routeReason",
+           "inputTokens", "outputTokens", "estimatedCostUsd", "latencyMs", "cacheHit", metadata, "createdAt")
+        SELECT r.id, r."userId", r."institutionId", r.feature, r.operation, r.provider, r.model, r."routeReason",
+               r."inputTokens", r."outputTokens", r."estimatedCostUsd", r."latencyMs", r."cacheHit",
+               COALESCE(r.metadata, '{}'::jsonb), r."createdAt"
+        FROM jsonb_to_recordset($1::jsonb) AS r(
+            id TEXT, "userId" TEXT, "institutionId" TEXT, feature TEXT, operation TEXT, provider TEXT,
+            model TEXT, "routeReason" TEXT, "inputTokens" INTEGER, "outputTokens" INTEGER,
+            "estimatedCostUsd" DOUBLE PRECISION, "latencyMs" INTEGER, "cacheHit" BOOLEAN,
+            metadata JSONB, "createdAt" TIMESTAMPTZ
+        )
+        """,
+        json.dumps(rows, default=str),
+    )
+
+
+ai_usage_buffer = AIUsageMetricBuffer()
+
+
 async def record_ai_usage(
     *,
     operation: str,
@@ -85,32 +223,24 @@ async def record_ai_usage(
     cache_hit: bool = False,
     metadata: dict[str, Any] | None = None,
 ) -> None:
-    try:
-        await ensure_ai_usage_metric_table()
-        db = get_db()
-        await db.execute_raw(
-            """
-            INSERT INTO "AIUsageMetric"
-              (id, "userId", "institutionId", feature, operation, provider, model, "routeReason",
-               "inputTokens", "outputTokens", "estimatedCostUsd", "latencyMs", "cacheHit", metadata, "createdAt")
-            VALUES
-              ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14::jsonb, $15)
-            """,
-            str(uuid4()),
-            user_id,
-            institution_id,
-            feature,
-            operation,
-            provider,
-            model,
-            route_reason,
-            int(input_tokens or 0),
-            int(output_tokens or 0),
-            float(estimated_cost_usd or 0),
-            int(latency_ms or 0),
-            bool(cache_hit),
-            json.dumps(metadata or {}),
-            datetime.now(timezone.utc),
-        )
-    except Exception as exc:
-        logger.debug("AI usage metric skipped: %s", exc)
+    """Queue one usage row on `ai_usage_buffer`; returns immediately without DB I/O."""
+    add_timing("ai", latency_ms or 0)
+    ai_usage_buffer.add(
+        {
+            "id": str(uuid4()),
+            "userId": user_id,
+            "institutionId": institution_id,
+            "feature": feature,
+            "operation": operation,
+            "provider": provider,
+            "model": model,
+            "routeReason": route_reason,
+            "inputTokens": int(input_tokens or 0),
+            "outputTokens": int(output_tokens or 0),
+            "estimatedCostUsd": float(estimated_cost_usd or 0),
+            "latencyMs": int(latency_ms or 0),
+            "cacheHit": bool(cache_hit),
+            "metadata": metadata or {},
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+        }
+    )
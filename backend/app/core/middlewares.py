@@ -1,9 +1,18 @@
 """Custom middleware for FastAPI."""
 from fastapi import Request, HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from time import perf_counter
 from typing import Optional
 from app.core.utils import decode_access_token
 from app.core.db import get_db
+from app.core.http_metrics import UNMATCHED_ROUTE, http_metrics
+from app.core.principal_cache import principal_cache
+from app.core.server_timing import (
+    current_timings,
+    format_server_timing,
+    reset_request_timings,
+    start_request_timings,
+)
 import logging
 
 from app.ai.provider_context import request_ai_provider, request_ai_provider_mode
@@ -46,6 +55,12 @@ async def get_current_user(
             detail="Invalid token payload",
         )
     
+    # Tokens issued before "iat" was added are keyed by their expiry instead.
+    issued_at = str(payload.get("iat") or payload.get("exp") or "0")
+    principal = await principal_cache.get(user_id, issued_at)
+    if principal is not None:
+        return principal
+
     # Fetch user from database
     db = get_db()
     user = await db.user.find_unique(where={"id": user_id})
@@ -55,7 +70,14 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
-    
+
+    principal = _build_principal(user)
+    await principal_cache.set(user_id, issued_at, principal)
+    return principal
+
+
+def _build_principal(user) -> dict:
+    """Shape a User row into the principal dict routes receive as `current_user`."""
     # Prisma returns dict - handle both dict and object access
     user_id = user["id"] if isinstance(user, dict) else user.id
     user_name = user.get("name") if isinstance(user, dict) else getattr(user, "name", None)
@@ -87,18 +109,28 @@ async def get_current_user(
 async def request_timing_middleware(request: Request, call_next):
     start_time = request.state.start_time if hasattr(request.state, 'start_time') else None
     if start_time is None:
-        from time import perf_counter
         start_time = perf_counter()
         request.state.start_time = start_time
 
-    response = await call_next(request)
-
-    from time import perf_counter
-    elapsed_ms = (perf_counter() - start_time) * 1000
-    response.headers["X-Response-Time-ms"] = f"{elapsed_ms:.2f}"
-    logger.info(f"{request.method} {request.url.path} status={response.status_code} {elapsed_ms:.2f}ms")
-
-    return response
+    method = request.method
+    http_metrics.request_started(method)
+    timings_token = start_request_timings()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+
+        elapsed_ms = (perf_counter() - start_time) * 1000
+        response.headers["X-Response-Time-ms"] = f"{elapsed_ms:.2f}"
+        response.headers["Server-Timing"] = format_server_timing(current_timings(), elapsed_ms)
+        logger.info(f"{request.method} {request.url.path} status={response.status_code} {elapsed_ms:.2f}ms")
+        return response
+    finally:
+        reset_request_timings(timings_token)
+        # The route template keeps label cardinality bounded (no ids in paths).
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+        http_metrics.request_finished(method, route_path, status_code, perf_counter() - start_time)
 
 
 async def ai_provider_preference_middleware(request: Request, call_next):
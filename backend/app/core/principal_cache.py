@@ -0,0 +1,104 @@
+"""Short-TTL cache of authenticated principals.
+
+`get_current_user` resolves the JWT subject to the principal dict every route
+receives. The principal is cached per (user id, token issue time): in an
+in-process LRU first, then in one Redis hash per user whose fields are the
+token issue times. A single DEL on that hash therefore drops every cached
+principal of the user; call `invalidate_principal` after anything that changes
+the user's profile, role, institution or access flags. Other processes may
+serve their L1 copy for up to AUTH_PRINCIPAL_L1_TTL_SECONDS afterwards.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import asdict
+from typing import Any
+
+from app.core.cache import CacheStats, LRUCache, register_cache
+from app.core.redis import redis_client
+from app.core.server_timing import timed
+
+logger = logging.getLogger(__name__)
+
+AUTH_PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+AUTH_PRINCIPAL_L1_TTL_SECONDS = float(os.getenv("AUTH_PRINCIPAL_L1_TTL_SECONDS", "10"))
+AUTH_PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+PRINCIPAL_KEY_PREFIX = "auth:principal:"
+
+
+class PrincipalCache:
+    def __init__(
+        self,
+        *,
+        ttl_seconds: int = AUTH_PRINCIPAL_CACHE_TTL_SECONDS,
+        l1_ttl_seconds: float = AUTH_PRINCIPAL_L1_TTL_SECONDS,
+        max_entries: int = AUTH_PRINCIPAL_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self.l1 = LRUCache(max_entries=max_entries, ttl_seconds=l1_ttl_seconds, stats=self.stats)
+        register_cache("auth.principal", self)
+
+    @staticmethod
+    def _redis_key(user_id: str) -> str:
+        return f"{PRINCIPAL_KEY_PREFIX}{user_id}"
+
+    async def get(self, user_id: str, issued_at: str) -> dict[str, Any] | None:
+        l1_key = f"{user_id}:{issued_at}"
+        raw = self.l1.get(l1_key)
+        if raw is not None:
+            self.stats.l1_hits += 1
+            return json.loads(raw)
+        if redis_client.enabled:
+            try:
+                with timed("cache"):
+                    raw = await redis_client.redis.hget(self._redis_key(user_id), issued_at)
+            except Exception as exc:
+                logger.warning("Redis HGET error: %s", exc)
+                raw = None
+            if raw:
+                self.stats.l2_hits += 1
+                self.l1.set(l1_key, raw)
+                return json.loads(raw)
+        self.stats.misses += 1
+        return None
+
+    async def set(self, user_id: str, issued_at: str, principal: dict[str, Any]) -> None:
+        raw = json.dumps(principal, separators=(",", ":"), default=str)
+        self.stats.sets += 1
+        self.l1.set(f"{user_id}:{issued_at}", raw)
+        pipe = redis_client.pipeline()
+        if pipe is None:
+            return
+        key = self._redis_key(user_id)
+        pipe.hset(key, issued_at, raw)
+        pipe.expire(key, self.ttl_seconds)
+        await redis_client.execute(pipe)
+
+    async def invalidate(self, user_id: str) -> None:
+        self.l1.delete_prefix(f"{user_id}:")
+        await redis_client.delete(self._redis_key(user_id))
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "hit_rate": self.stats.hit_rate,
+            "l1_entries": len(self.l1),
+            "l1_bytes": self.l1.size_bytes,
+        }
+
+
+principal_cache = PrincipalCache()
+
+
+async def invalidate_principal(user_id: str | None) -> None:
+    """Drop cached principals for a user after their profile, role or institution changed."""
+    if not user_id:
+        return
+    try:
+        await principal_cache.invalidate(user_id)
+    except Exception as exc:
+        logger.warning("Principal cache invalidation failed for %s: %s", user_id, exc)
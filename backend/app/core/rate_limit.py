@@ -1,5 +1,331 @@
-"""Rate limiting for FastAPI using slowapi."""
+"""Rate limiting for FastAPI.
+
+`limiter` (slowapi, per client IP, in-process) still guards the unauthenticated
+auth endpoints. Authenticated, expensive routes use `rate_limit(policy)`: a
+Redis token bucket charged to both the user and their institution, so limits
+hold across workers and a campus NAT no longer shares one bucket. `ai_slot`
+caps concurrent AI calls per tenant so one institution cannot monopolize the
+providers. Without Redis both fall back to per-process state; Redis errors fail
+open.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+from uuid import uuid4
+
+from fastapi import Depends, HTTPException, status
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
+from app.core.middlewares import get_current_user
+from app.core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
 limiter = Limiter(key_func=get_remote_address)
+
+RATE_LIMIT_PREFIX = "ratelimit:"
+AI_SLOT_PREFIX = "ai_slots:"
+AI_MAX_IN_FLIGHT_PER_TENANT = int(os.getenv("AI_MAX_IN_FLIGHT_PER_TENANT", "8"))
+# How long a request waits for a free slot before getting a 429.
+AI_SLOT_WAIT_SECONDS = float(os.getenv("AI_SLOT_WAIT_SECONDS", "10"))
+AI_SLOT_POLL_SECONDS = 0.25
+# Slots of crashed processes expire after this long; held slots are renewed
+# every third of it, so long streams keep counting against the tenant.
+AI_SLOT_LEASE_SECONDS = int(os.getenv("AI_SLOT_LEASE_SECONDS", "300"))
+AI_SLOT_RENEW_SECONDS = AI_SLOT_LEASE_SECONDS / 3
+
+# KEYS: one bucket per scope. ARGV: cost, then capacity and refill-per-ms per key.
+# Tokens are taken from every bucket or from none.
+_TOKEN_BUCKET_LUA = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local levels = {}
+local allowed = 1
+local retry_ms = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local state = redis.call("HMGET", key, "tokens", "ts")
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    levels[i] = tokens
+    if tokens < cost then
+        allowed = 0
+        retry_ms = math.max(retry_ms, math.ceil((cost - tokens) / rate))
+    end
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2])
+    local rate = tonumber(ARGV[i * 2 + 1])
+    local tokens = levels[i]
+    if allowed == 1 then
+        tokens = tokens - cost
+    end
+    redis.call("HSET", key, "tokens", tostring(tokens), "ts", tostring(now))
+    redis.call("PEXPIRE", key, math.ceil(capacity / rate) + 1000)
+end
+return {allowed, retry_ms}
+"""
+
+# KEYS[1]: tenant slot set. ARGV: token, limit, lease ms.
+_ACQUIRE_SLOT_LUA = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - tonumber(ARGV[3]))
+if redis.call("ZCARD", KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call("ZADD", KEYS[1], now, ARGV[1])
+redis.call("PEXPIRE", KEYS[1], tonumber(ARGV[3]))
+return 1
+"""
+
+# KEYS[1]: tenant slot set. ARGV: token, lease ms. Released slots stay released.
+_RENEW_SLOT_LUA = """
+if not redis.call("ZSCORE", KEYS[1], ARGV[1]) then
+    return 0
+end
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+redis.call("ZADD", KEYS[1], now, ARGV[1])
+redis.call("PEXPIRE", KEYS[1], tonumber(ARGV[2]))
+return 1
+"""
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    """Requests per minute for one route family; each scope's burst is one minute's worth."""
+
+    name: str
+    user_per_minute: int
+    institution_per_minute: int
+
+    @classmethod
+    def from_env(cls, name: str, user_per_minute: int, institution_per_minute: int) -> "BucketPolicy":
+        env_name = name.upper().replace(".", "_")
+        return cls(
+            name=name,
+            user_per_minute=int(os.getenv(f"RATE_LIMIT_{env_name}_USER_PER_MINUTE", str(user_per_minute))),
+            institution_per_minute=int(
+                os.getenv(f"RATE_LIMIT_{env_name}_INSTITUTION_PER_MINUTE", str(institution_per_minute))
+            ),
+        )
+
+
+HORUS_CHAT_POLICY = BucketPolicy.from_env("horus.chat", 20, 200)
+AI_CHAT_WITH_FILES_POLICY = BucketPolicy.from_env("ai.chat_with_files", 6, 60)
+GAP_ANALYSIS_POLICY = BucketPolicy.from_env("gap_analysis.generate", 5, 30)
+
+
+def _buckets(policy: BucketPolicy, user_id: str | None, institution_id: str | None) -> list[tuple[str, int]]:
+    buckets = []
+    if user_id and policy.user_per_minute > 0:
+        buckets.append((f"{RATE_LIMIT_PREFIX}{policy.name}:user:{user_id}", policy.user_per_minute))
+    if institution_id and policy.institution_per_minute > 0:
+        buckets.append(
+            (f"{RATE_LIMIT_PREFIX}{policy.name}:institution:{institution_id}", policy.institution_per_minute)
+        )
+    return buckets
+
+
+class TokenBucketLimiter:
+    def __init__(self) -> None:
+        # Per-process fallback: key -> (tokens, monotonic ms)
+        self._local: dict[str, tuple[float, float]] = {}
+
+    async def take(
+        self,
+        policy: BucketPolicy,
+        *,
+        user_id: str | None,
+        institution_id: str | None,
+        cost: int = 1,
+    ) -> tuple[bool, float]:
+        """Take `cost` tokens from the user and institution buckets; returns (allowed, retry_after_seconds)."""
+        buckets = _buckets(policy, user_id, institution_id)
+        if not buckets:
+            return True, 0.0
+        if redis_client.enabled:
+            args: list = [cost]
+            for _key, per_minute in buckets:
+                args += [per_minute, per_minute / 60000.0]
+            try:
+                allowed, retry_ms = await redis_client.redis.eval(
+                    _TOKEN_BUCKET_LUA, len(buckets), *[key for key, _ in buckets], *args
+                )
+                return bool(int(allowed)), int(retry_ms) / 1000.0
+            except Exception as exc:
+                logger.warning("Rate limit check failed for %s: %s", policy.name, exc)
+                return True, 0.0
+        return self._take_local(buckets, cost)
+
+    def _take_local(self, buckets: list[tuple[str, int]], cost: int) -> tuple[bool, float]:
+        now = time.monotonic() * 1000
+        levels = []
+        retry_ms = 0.0
+        for key, per_minute in buckets:
+            rate = per_minute / 60000.0
+            tokens, ts = self._local.get(key, (float(per_minute), now))
+            tokens = min(per_minute, tokens + max(0.0, now - ts) * rate)
+            levels.append(tokens)
+            if tokens < cost:
+                retry_ms = max(retry_ms, (cost - tokens) / rate)
+        allowed = retry_ms == 0
+        for (key, _per_minute), tokens in zip(buckets, levels):
+            self._local[key] = (tokens - cost if allowed else tokens, now)
+        return allowed, retry_ms / 1000.0
+
+
+token_bucket_limiter = TokenBucketLimiter()
+
+
+def rate_limit(policy: BucketPolicy):
+    """
+    Dependency factory charging a request to the caller's user and institution buckets.
+
+    Usage:
+        @router.post("/expensive", dependencies=[Depends(rate_limit(HORUS_CHAT_POLICY))])
+    """
+
+    async def check(current_user: dict = Depends(get_current_user)) -> None:
+        allowed, retry_after = await token_bucket_limiter.take(
+            policy,
+            user_id=current_user.get("id"),
+            institution_id=current_user.get("institutionId"),
+        )
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded. Please slow down and try again shortly.",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+            )
+
+    return check
+
+
+def tenant_key(current_user: dict) -> str:
+    """Concurrency scope for a caller: their institution, or the user when unaffiliated."""
+    institution_id = current_user.get("institutionId")
+    return f"institution:{institution_id}" if institution_id else f"user:{current_user.get('id')}"
+
+
+class AIConcurrencyGovernor:
+    """Caps in-flight AI calls per tenant with a Redis sorted set of leased slots."""
+
+    def __init__(self, *, limit: int = AI_MAX_IN_FLIGHT_PER_TENANT) -> None:
+        self.limit = limit
+        # tenant -> slot token -> monotonic time of the last lease renewal.
+        self._local: dict[str, dict[str, float]] = {}
+
+    async def acquire(self, tenant: str, *, wait_seconds: float = AI_SLOT_WAIT_SECONDS) -> str | None:
+        """Return a slot token, waiting up to `wait_seconds`; None when the tenant stays saturated."""
+        token = uuid4().hex
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            if await self._try_acquire(tenant, token):
+                return token
+            if time.monotonic() >= deadline:
+                return None
+            await asyncio.sleep(AI_SLOT_POLL_SECONDS)
+
+    async def _try_acquire(self, tenant: str, token: str) -> bool:
+        if self.limit <= 0:
+            return True
+        if redis_client.enabled:
+            try:
+                acquired = await redis_client.redis.eval(
+                    _ACQUIRE_SLOT_LUA, 1, f"{AI_SLOT_PREFIX}{tenant}", token, self.limit,
+                    AI_SLOT_LEASE_SECONDS * 1000,
+                )
+                return bool(int(acquired))
+            except Exception as exc:
+                logger.warning("AI slot acquire failed for %s: %s", tenant, exc)
+                return True
+        now = time.monotonic()
+        slots = {
+            held: renewed_at
+            for held, renewed_at in self._local.get(tenant, {}).items()
+            if now - renewed_at < AI_SLOT_LEASE_SECONDS
+        }
+        if len(slots) >= self.limit:
+            self._local[tenant] = slots
+            return False
+        slots[token] = now
+        self._local[tenant] = slots
+        return True
+
+    async def renew(self, tenant: str, token: str) -> None:
+        """Extend the lease of a slot that is still held."""
+        if self.limit <= 0:
+            return
+        if redis_client.enabled:
+            try:
+                await redis_client.redis.eval(
+                    _RENEW_SLOT_LUA, 1, f"{AI_SLOT_PREFIX}{tenant}", token, AI_SLOT_LEASE_SECONDS * 1000,
+                )
+            except Exception as exc:
+                logger.warning("AI slot renew failed for %s: %s", tenant, exc)
+            return
+        slots = self._local.get(tenant, {})
+        if token in slots:
+            slots[token] = time.monotonic()
+
+    async def release(self, tenant: str, token: str) -> None:
+        """Free a slot; releasing the same token twice is a no-op."""
+        if self.limit <= 0:
+            return
+        if redis_client.enabled:
+            try:
+                await redis_client.redis.zrem(f"{AI_SLOT_PREFIX}{tenant}", token)
+            except Exception as exc:
+                logger.warning("AI slot release failed for %s: %s", tenant, exc)
+            return
+        slots = self._local.get(tenant, {})
+        slots.pop(token, None)
+        if not slots:
+            self._local.pop(tenant, None)
+
+    @asynccontextmanager
+    async def hold(self, tenant: str, token: str) -> AsyncIterator[None]:
+        """Keep an acquired slot's lease alive for the duration of the block, then release it."""
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(AI_SLOT_RENEW_SECONDS)
+                await self.renew(tenant, token)
+
+        renewer = asyncio.create_task(heartbeat())
+        try:
+            yield
+        finally:
+            renewer.cancel()
+            await self.release(tenant, token)
+
+    @asynccontextmanager
+    async def slot(self, tenant: str) -> AsyncIterator[None]:
+        token = await self.acquire(tenant)
+        if token is None:
+            raise_ai_busy()
+        async with self.hold(tenant, token):
+            yield
+
+
+def raise_ai_busy() -> None:
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many AI requests are running for your institution. Please try again shortly.",
+        headers={"Retry-After": "5"},
+    )
+
+
+ai_governor = AIConcurrencyGovernor()
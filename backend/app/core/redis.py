@@ -1,85 +1,270 @@
-
+import logging
 import os
-from typing import Optional
-from upstash_redis import Redis
+from typing import Any, Mapping, Optional, Sequence
+from urllib.parse import urlsplit
+from uuid import uuid4
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+REDIS_CONNECT_TIMEOUT_SECONDS = float(os.getenv("REDIS_CONNECT_TIMEOUT_SECONDS", "5"))
+
+# Data-generation counters: cache keys embed the current generation of the
+# tenant they describe, so a write only has to bump one counter.
+GENERATION_KEY_PREFIX = "cache_gen:"
+GENERATION_TTL_SECONDS = 7 * 24 * 60 * 60
+# Used when Redis is disabled so single-process dev keeps the same semantics.
+_LOCAL_GENERATIONS: dict[str, int] = {}
+
+# Compare-and-delete so a lock is only released by the holder that set it.
+_RELEASE_LOCK_LUA = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def _build_redis_url() -> Optional[str]:
+    """
+    Resolve the Redis TCP url.
+
+    An explicit REDIS_URL wins. Otherwise the Upstash REST credentials are
+    translated to the TLS endpoint of the same database (see v2.core.redis).
+    """
+    url = os.environ.get("REDIS_URL")
+    if url:
+        return url
+    rest_url = os.environ.get("UPSTASH_REDIS_REST_URL")
+    token = os.environ.get("UPSTASH_REDIS_REST_TOKEN")
+    if rest_url and token:
+        netloc = urlsplit(rest_url).netloc or rest_url
+        return f"rediss://default:{token}@{netloc}:6379"
+    return None
+
 
 class RedisClient:
     """
-    Wrapper for Upstash Redis client.
-    Handles connection and basic operations.
+    Async Redis client shared across services.
+
+    All commands go through one pooled connection set, so request handlers
+    never block the event loop on cache I/O. Errors are logged and degrade to
+    cache misses, matching the old Upstash wrapper.
     """
-    
+
     def __init__(self):
-        url = os.environ.get("UPSTASH_REDIS_REST_URL")
-        token = os.environ.get("UPSTASH_REDIS_REST_TOKEN")
-        
-        if url and token:
-            self.redis = Redis(url=url, token=token)
+        url = _build_redis_url()
+
+        if url:
+            self.redis: Optional[Redis] = Redis.from_url(
+                url,
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=REDIS_CONNECT_TIMEOUT_SECONDS,
+                health_check_interval=30,
+            )
             self.enabled = True
         else:
-            print("Redis credentials not found. Caching disabled.")
+            logger.info("Redis credentials not found. Caching disabled.")
             self.enabled = False
             self.redis = None
 
-    def get(self, key: str) -> Optional[str]:
+    async def get(self, key: str) -> Optional[str]:
         """Get value from Redis."""
         if not self.enabled:
             return None
         try:
-            return self.redis.get(key)
+            return await self.redis.get(key)
         except Exception as e:
-            print(f"Redis GET error: {e}")
+            logger.warning("Redis GET error: %s", e)
             return None
 
-    def set(self, key: str, value: str, ex: int = 300) -> bool:
+    async def mget(self, keys: Sequence[str]) -> list[Optional[str]]:
+        """Get several values in one round trip; missing keys come back as None."""
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        try:
+            return list(await self.redis.mget(list(keys)))
+        except Exception as e:
+            logger.warning("Redis MGET error: %s", e)
+            return [None] * len(keys)
+
+    async def set(self, key: str, value: str, ex: int = 300) -> bool:
         """Set value in Redis with expiration (default 5 mins)."""
         if not self.enabled:
             return False
         try:
-            self.redis.set(key, value, ex=ex)
+            await self.redis.set(key, value, ex=ex)
             return True
         except Exception as e:
-            print(f"Redis SET error: {e}")
+            logger.warning("Redis SET error: %s", e)
             return False
 
-    def delete(self, key: str) -> bool:
-        """Delete key from Redis."""
-        if not self.enabled:
+    async def mset(self, mapping: Mapping[str, str], ex: int = 300) -> bool:
+        """Set several values with the same expiration in one pipelined round trip."""
+        if not self.enabled or not mapping:
             return False
         try:
-            self.redis.delete(key)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, value, ex=ex)
+                await pipe.execute()
             return True
         except Exception as e:
-            print(f"Redis DELETE error: {e}")
+            logger.warning("Redis MSET error: %s", e)
             return False
-            
-    def delete_pattern(self, match: str):
+
+    async def delete(self, *keys: str) -> bool:
+        """Delete one or more keys from Redis."""
+        if not self.enabled or not keys:
+            return False
+        try:
+            await self.redis.delete(*keys)
+            return True
+        except Exception as e:
+            logger.warning("Redis DELETE error: %s", e)
+            return False
+
+    def pipeline(self) -> Optional[Pipeline]:
+        """
+        Return a non-transactional pipeline, or None when Redis is disabled.
+
+        Commands are queued on the returned object and sent together by
+        `execute()`, e.g. ``pipe.get("a").incr("b")``.
+        """
+        if not self.enabled:
+            return None
+        return self.redis.pipeline(transaction=False)
+
+    async def execute(self, pipe: Optional[Pipeline]) -> list[Any]:
+        """Execute a pipeline from `pipeline()`; failures return an empty list."""
+        if pipe is None:
+            return []
+        try:
+            return list(await pipe.execute())
+        except Exception as e:
+            logger.warning("Redis PIPELINE error: %s", e)
+            return []
+
+    async def acquire_lock(self, key: str, ttl_seconds: float) -> Optional[str]:
+        """Try to take a short-lived lock (SET NX PX); return its token, or None if held elsewhere."""
+        if not self.enabled:
+            return None
+        token = uuid4().hex
+        try:
+            acquired = await self.redis.set(key, token, nx=True, px=max(1, int(ttl_seconds * 1000)))
+        except Exception as e:
+            logger.warning("Redis lock error: %s", e)
+            return None
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        """Release a lock taken with `acquire_lock` if this caller still holds it."""
+        if not self.enabled or not token:
+            return
+        try:
+            await self.redis.eval(_RELEASE_LOCK_LUA, 1, key, token)
+        except Exception as e:
+            logger.warning("Redis unlock error: %s", e)
+
+    @staticmethod
+    def _generation_keys(
+        *,
+        institution_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        global_scope: bool = False,
+    ) -> list[str]:
+        keys = [f"{GENERATION_KEY_PREFIX}global"] if global_scope else []
+        if institution_id:
+            keys.append(f"{GENERATION_KEY_PREFIX}institution:{institution_id}")
+        if user_id:
+            keys.append(f"{GENERATION_KEY_PREFIX}user:{user_id}")
+        return keys
+
+    async def generation_token(
+        self,
+        *,
+        institution_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        global_scope: bool = False,
+    ) -> str:
+        """
+        Return a cache-key fragment such as ``g12.3`` for the given scopes.
+
+        All counters are read with one MGET. Embed the token in cache keys;
+        `bump_generation` makes every older key unreachable without deleting it.
+        """
+        keys = self._generation_keys(
+            institution_id=institution_id, user_id=user_id, global_scope=global_scope
+        )
+        if not keys:
+            return "g0"
+        if self.enabled:
+            values = await self.mget(keys)
+        else:
+            values = [_LOCAL_GENERATIONS.get(key) for key in keys]
+        return "g" + ".".join(str(int(value or 0)) for value in values)
+
+    async def bump_generation(
+        self,
+        *,
+        institution_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> None:
+        """Advance the counters for the tenant a write touched (plus the admin-wide one)."""
+        keys = self._generation_keys(
+            institution_id=institution_id, user_id=user_id, global_scope=True
+        )
+        if not self.enabled:
+            for key in keys:
+                _LOCAL_GENERATIONS[key] = _LOCAL_GENERATIONS.get(key, 0) + 1
+            return
+        pipe = self.pipeline()
+        for key in keys:
+            pipe.incr(key)
+            pipe.expire(key, GENERATION_TTL_SECONDS)
+        await self.execute(pipe)
+
+    async def delete_pattern(self, match: str):
         """
         Delete keys matching pattern.
-        Note: Upstash/HTTP doesn't support SCAN cursor easily in one go, 
-        but we can use keys() carefully or just manage specific keys.
-        For safety/performance in serverless, best to delete specific keys.
-        We'll try to find keys and delete them.
+        Note: this walks the keyspace with SCAN; prefer `bump_generation` for
+        cache invalidation and keep this for maintenance scripts.
         """
         if not self.enabled:
             return
-            
+
         try:
-            # Get keys (be careful with large datasets)
-            keys = self.redis.keys(match)
+            keys = [key async for key in self.redis.scan_iter(match=match, count=500)]
             if keys:
-                self.redis.delete(*keys)
+                await self.redis.delete(*keys)
         except Exception as e:
-            print(f"Redis DELETE PATTERN error: {e}")
+            logger.warning("Redis DELETE PATTERN error: %s", e)
 
-    def invalidate_dashboard_cache(self):
-        """Invalidate cached dashboard metrics."""
-        if not self.enabled:
+    async def invalidate_dashboard_cache(
+        self,
+        *,
+        institution_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ):
+        """Invalidate cached dashboard/analytics/RAG/state data for one tenant in O(1)."""
+        try:
+            await self.bump_generation(institution_id=institution_id, user_id=user_id)
+        except Exception as e:
+            logger.warning("Redis invalidate_dashboard_cache error: %s", e)
+
+    async def close(self) -> None:
+        """Release pooled connections (called on application shutdown)."""
+        if not self.enabled or self.redis is None:
             return
         try:
-            self.delete_pattern("dashboard_metrics_counts*")
+            closer = getattr(self.redis, "aclose", None) or self.redis.close
+            await closer()
         except Exception as e:
-            print(f"Redis invalidate_dashboard_cache error: {e}")
+            logger.debug("Redis close error: %s", e)
 
 
 # Global redis client singleton used across services.
@@ -0,0 +1,180 @@
+"""Retention and archival for the append-heavy operational tables.
+
+`AsyncJob`, `AsyncJobAttempt`, `EventOutbox` and `AIUsageMetric` grow with every
+platform event and AI call. A periodic `maintenance.retention` job moves rows
+that reached a terminal state more than N days ago into compact
+`<Table>Archive` tables (id, timestamp and the row as JSONB), or deletes them
+for tables whose policy has no archive. The live tables therefore only hold
+recent and in-flight rows, and their hot-path indexes are partial indexes over
+live rows.
+
+Retention is configurable per table with RETENTION_DAYS_<TABLE> (e.g.
+RETENTION_DAYS_ASYNCJOB=14); 0 disables it for that table. Feature modules can
+add cleanup that needs more than SQL (e.g. removing storage objects) with
+`register_retention_hook`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from app.core.db import get_db
+from app.core.jobs import enqueue_job, register_job_handler
+
+logger = logging.getLogger(__name__)
+
+RETENTION_JOB_TYPE = "maintenance.retention"
+RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+# Bounds one run so a large backlog is worked off over several runs.
+RETENTION_MAX_BATCHES = int(os.getenv("RETENTION_MAX_BATCHES", "20"))
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    table: str
+    # SQL predicate selecting rows that are finished and safe to move.
+    terminal: str
+    # Column compared with the cutoff.
+    age_column: str
+    default_days: int
+    archive: bool = True
+
+    @property
+    def archive_table(self) -> str:
+        return f"{self.table}Archive"
+
+    @property
+    def days(self) -> int:
+        return int(os.getenv(f"RETENTION_DAYS_{self.table.upper()}", str(self.default_days)))
+
+
+RETENTION_POLICIES = [
+    RetentionPolicy("AsyncJob", "status IN ('succeeded', 'failed')", '"updatedAt"', 14),
+    RetentionPolicy("AsyncJobAttempt", '"finishedAt" IS NOT NULL', '"finishedAt"', 14, archive=False),
+    RetentionPolicy("EventOutbox", "status = 'processed'", '"processedAt"', 14),
+    RetentionPolicy("AIUsageMetric", "TRUE", '"createdAt"', 90),
+]
+
+CREATE_ARCHIVE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS "{archive}" (
+    id TEXT PRIMARY KEY,
+    "recordedAt" TIMESTAMPTZ,
+    "archivedAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    data JSONB NOT NULL
+)
+"""
+
+CREATE_ARCHIVE_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS "idx_{archive_lower}_recorded" ON "{archive}"("recordedAt")'
+)
+
+# Extra cleanup run by the retention job; each returns the number of rows removed.
+_RETENTION_HOOKS: dict[str, Callable[[], Awaitable[int]]] = {}
+
+_ENSURED = False
+
+
+def register_retention_hook(name: str, hook: Callable[[], Awaitable[int]]) -> None:
+    _RETENTION_HOOKS[name] = hook
+
+
+async def ensure_archive_tables() -> None:
+    global _ENSURED
+    if _ENSURED:
+        return
+    db = get_db()
+    for policy in RETENTION_POLICIES:
+        if not policy.archive:
+            continue
+        await db.execute_raw(CREATE_ARCHIVE_TABLE_SQL.format(archive=policy.archive_table))
+        await db.execute_raw(
+            CREATE_ARCHIVE_INDEX_SQL.format(
+                archive=policy.archive_table, archive_lower=policy.archive_table.lower()
+            )
+        )
+    _ENSURED = True
+
+
+def _move_batch_sql(policy: RetentionPolicy) -> str:
+    # Table and column names come from RETENTION_POLICIES, never from input.
+    select = f"""
+            SELECT id FROM "{policy.table}"
+            WHERE {policy.terminal}
+              AND {policy.age_column} < NOW() - ($1 || ' days')::interval
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+    """
+    if not policy.archive:
+        return f"""
+        WITH moved AS (
+            DELETE FROM "{policy.table}" WHERE id IN ({select})
+            RETURNING id
+        )
+        SELECT COUNT(*)::int AS moved FROM moved
+        """
+    return f"""
+        WITH moved AS (
+            DELETE FROM "{policy.table}" WHERE id IN ({select})
+            RETURNING *
+        ),
+        archived AS (
+            INSERT INTO "{policy.archive_table}" (id, "recordedAt", data)
+            SELECT moved.id::text, moved.{policy.age_column}, to_jsonb(moved) FROM moved
+            ON CONFLICT (id) DO NOTHING
+        )
+        SELECT COUNT(*)::int AS moved FROM moved
+        """
+
+
+async def apply_retention_policy(policy: RetentionPolicy) -> int:
+    """Archive (or delete) expired rows of one table in bounded batches; returns rows moved."""
+    days = policy.days
+    if days <= 0:
+        return 0
+    db = get_db()
+    sql = _move_batch_sql(policy)
+    total = 0
+    for _ in range(RETENTION_MAX_BATCHES):
+        rows = await db.query_raw(sql, days, RETENTION_BATCH_SIZE)
+        moved = int(rows[0].get("moved") or 0) if rows else 0
+        total += moved
+        if moved < RETENTION_BATCH_SIZE:
+            break
+    return total
+
+
+async def run_retention() -> dict[str, int]:
+    """Apply every policy; a failing table does not stop the others."""
+    await ensure_archive_tables()
+    results: dict[str, int] = {}
+    for policy in RETENTION_POLICIES:
+        try:
+            results[policy.table] = await apply_retention_policy(policy)
+        except Exception as exc:
+            logger.warning("Retention for %s failed: %s", policy.table, exc)
+            results[policy.table] = -1
+    for name, hook in _RETENTION_HOOKS.items():
+        try:
+            results[name] = await hook()
+        except Exception as exc:
+            logger.warning("Retention hook %s failed: %s", name, exc)
+            results[name] = -1
+    if any(results.values()):
+        logger.info("Retention moved rows: %s", results)
+    return results
+
+
+async def schedule_retention() -> str:
+    """Enqueue the retention job; a no-op while one is already queued or running."""
+    return await enqueue_job(RETENTION_JOB_TYPE, {}, priority=200, max_attempts=1, dedupe_key=RETENTION_JOB_TYPE)
+
+
+async def _retention_job(_payload: dict) -> None:
+    await run_retention()
+
+
+register_job_handler(RETENTION_JOB_TYPE, _retention_job)
@@ -0,0 +1,59 @@
+"""Per-request time accounting for the `Server-Timing` response header.
+
+`request_timing_middleware` opens a fresh accumulator per request; the database
+client, cache lookups and AI usage recording add their elapsed time to it.
+Tasks spawned while handling the request inherit the same accumulator. Outside
+a request (workers, scripts) recording is a no-op.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterator
+
+# Header metric names, in the order they are emitted.
+TIMING_METRICS = ("db", "cache", "ai")
+
+_timings: ContextVar[dict[str, float] | None] = ContextVar("server_timings", default=None)
+
+
+def start_request_timings() -> Token:
+    return _timings.set({})
+
+
+def reset_request_timings(token: Token) -> None:
+    _timings.reset(token)
+
+
+def current_timings() -> dict[str, float]:
+    return dict(_timings.get() or {})
+
+
+def add_timing(metric: str, elapsed_ms: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[metric] = timings.get(metric, 0.0) + float(elapsed_ms)
+
+
+@contextmanager
+def timed(metric: str) -> Iterator[None]:
+    if _timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(metric, (time.perf_counter() - start) * 1000)
+
+
+def format_server_timing(timings: dict[str, float], total_ms: float) -> str:
+    parts = [
+        f"{metric};dur={timings[metric]:.1f}"
+        for metric in TIMING_METRICS
+        if metric in timings
+    ]
+    parts.append(f"total;dur={total_ms:.1f}")
+    return ", ".join(parts)
@@ -1,13 +1,72 @@
 """Supabase Storage utility functions."""
 from supabase import create_client, Client
 from app.core.config import settings
+import asyncio
+import hashlib
 import logging
+import os
+import tempfile
+import time
 import uuid
+from dataclasses import dataclass
 from typing import Optional
 from urllib.parse import urlparse, unquote
 
+from fastapi import UploadFile
+
+from app.core.cache import TwoTierCache
+
 logger = logging.getLogger(__name__)
 
+UPLOAD_CHUNK_SIZE = int(os.getenv("EVIDENCE_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Signed URLs are cached per (object path, expiry) and handed out until a tenth
+# of their lifetime, and at least SIGNED_URL_MIN_REMAINING_SECONDS, is left.
+SIGNED_URL_MIN_REMAINING_SECONDS = int(os.getenv("SIGNED_URL_MIN_REMAINING_SECONDS", "60"))
+SIGNED_URL_BATCH_SIZE = int(os.getenv("SIGNED_URL_BATCH_SIZE", "500"))
+SIGNED_URL_CACHE_PREFIX = "storage:signed_url:"
+_SIGNED_URL_CACHE = TwoTierCache(
+    "storage.signed_url",
+    ttl_seconds=3600,
+    max_entries=4096,
+    l1_ttl_seconds=30,
+)
+
+
+@dataclass(frozen=True)
+class SignedUrl:
+    url: str
+    # Unix time the URL stops working.
+    expires_at: float
+
+    @property
+    def expires_in(self) -> int:
+        """Seconds of validity left."""
+        return max(0, int(self.expires_at - time.time()))
+
+
+class UploadTooLarge(Exception):
+    """Raised by `spool_upload` as soon as the stream exceeds the size limit."""
+
+
+@dataclass
+class SpooledUpload:
+    """An upload copied to a local temp file, with its size and SHA-256 computed on the way."""
+
+    path: str
+    size: int
+    sha256: str
+    filename: str
+    content_type: str
+
+    def cleanup(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove spooled upload {self.path}: {e}")
+
 
 def normalize_storage_object_path(raw: str) -> str:
     """
@@ -45,11 +104,121 @@ def get_supabase_client() -> Client:
     return supabase
 
 
+# The evidence bucket only has to be checked (and maybe created) once per process.
+_bucket_ready = False
+
+
+def _ensure_bucket(client: Client) -> None:
+    """Blocking; call from a worker thread."""
+    global _bucket_ready
+    if _bucket_ready:
+        return
+    bucket_exists = False
+    try:
+        # Some clients return list, others throw. List is safer.
+        buckets = client.storage.list_buckets()
+        bucket_exists = any(b.name == settings.SUPABASE_BUCKET for b in buckets)
+    except Exception:
+        # If list fails, fallback to get_bucket or assume checks failed
+        pass
+
+    if not bucket_exists:
+        try:
+            client.storage.create_bucket(settings.SUPABASE_BUCKET, options={"public": False})
+        except Exception as e:
+            logger.warning(f"Bucket creation failed/exists: {e}")
+    _bucket_ready = True
+
+
+def _new_object_path(filename: str, folder: str) -> str:
+    file_extension = filename.split(".")[-1] if "." in filename else ""
+    unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
+    return f"{folder}/{unique_filename}"
+
+
+async def spool_upload(
+    file: UploadFile,
+    *,
+    max_size: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> SpooledUpload:
+    """
+    Copy an upload to a local temp file in `chunk_size` reads.
+
+    Size and SHA-256 are computed while reading, and `UploadTooLarge` is raised
+    as soon as `max_size` is exceeded, so memory stays bounded by one chunk.
+    The caller owns the returned file and must call `cleanup()`.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="ayn-upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Upload exceeds {max_size} bytes")
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        raise
+    return SpooledUpload(
+        path=path,
+        size=size,
+        sha256=digest.hexdigest(),
+        filename=file.filename or "upload",
+        content_type=file.content_type or "application/octet-stream",
+    )
+
+
+async def upload_spooled_to_supabase(
+    upload: SpooledUpload,
+    folder: str = "evidence",
+    *,
+    object_path: Optional[str] = None,
+    upsert: bool = False,
+) -> str:
+    """Stream a spooled upload from disk to Supabase Storage; returns the object path."""
+    client = get_supabase_client()
+    file_path = object_path or _new_object_path(upload.filename, folder)
+
+    def _ensure_and_upload():
+        _ensure_bucket(client)
+        # storage3 sends an open BufferedReader as a streamed multipart part.
+        with open(upload.path, "rb") as handle:
+            return client.storage.from_(settings.SUPABASE_BUCKET).upload(
+                path=file_path,
+                file=handle,
+                file_options={
+                    "content-type": upload.content_type,
+                    "upsert": "true" if upsert else "false"
+                }
+            )
+
+    try:
+        await asyncio.to_thread(_ensure_and_upload)
+        logger.info(f"File uploaded successfully: {file_path} ({upload.size} bytes)")
+        return file_path
+    except Exception as e:
+        logger.error(f"Error uploading file to Supabase: {e}")
+        raise Exception(f"Failed to upload file: {str(e)}")
+
+
 async def upload_file_to_supabase(
     file_content: bytes,
     filename: str,
     content_type: str = "application/octet-stream",
-    folder: str = "evidence"
+    folder: str = "evidence",
+    *,
+    object_path: Optional[str] = None,
+    upsert: bool = False,
 ) -> tuple[str, str]:
     """
     Upload a file to Supabase Storage.
@@ -59,43 +228,27 @@ async def upload_file_to_supabase(
         filename: Original filename
         content_type: MIME type
         folder: Folder path in the bucket
+        object_path: Fixed object key (e.g. content-addressed) instead of a random one
+        upsert: Overwrite an existing object at the same key
     
     Returns:
         tuple: (storage_path, file_path)
     """
-    import asyncio
     client = get_supabase_client()
     
     # Generate unique filename
-    file_extension = filename.split(".")[-1] if "." in filename else ""
-    unique_filename = f"{uuid.uuid4()}.{file_extension}" if file_extension else str(uuid.uuid4())
-    file_path = f"{folder}/{unique_filename}"
+    file_path = object_path or _new_object_path(filename, folder)
     
-    # Upload to Supabase Storage (run blocking call in thread)
     # Upload to Supabase Storage (run blocking call in thread)
     try:
         def _ensure_and_upload():
-            bucket_exists = False
-            try:
-                # Some clients return list, others throw. List is safer.
-                buckets = client.storage.list_buckets()
-                bucket_exists = any(b.name == settings.SUPABASE_BUCKET for b in buckets)
-            except Exception:
-                # If list fails, fallback to get_bucket or assume checks failed
-                pass
-
-            if not bucket_exists:
-                try:
-                    client.storage.create_bucket(settings.SUPABASE_BUCKET, options={"public": False})
-                except Exception as e:
-                    logger.warning(f"Bucket creation failed/exists: {e}")
-
+            _ensure_bucket(client)
             return client.storage.from_(settings.SUPABASE_BUCKET).upload(
                 path=file_path,
                 file=file_content,
                 file_options={
                     "content-type": content_type,
-                    "upsert": "false"
+                    "upsert": "true" if upsert else "false"
                 }
             )
             
@@ -135,27 +288,105 @@ async def delete_file_from_supabase(file_path: str) -> bool:
         return False
 
 
-async def create_signed_url(file_path: str, expires_in: int = 300) -> str:
-    """Create a short-lived signed URL for a private evidence object."""
-    import asyncio
-
+async def delete_files_from_supabase(file_paths: list[str]) -> bool:
+    """Delete several objects in one Storage call (run in a worker thread)."""
+    paths = [normalize_storage_object_path(path) for path in file_paths if path]
+    if not paths:
+        return True
     client = get_supabase_client()
-    file_path = normalize_storage_object_path(file_path)
-
     try:
-        def _sign():
-            result = client.storage.from_(settings.SUPABASE_BUCKET).create_signed_url(
-                file_path,
-                expires_in,
-            )
-            if isinstance(result, dict):
-                return result.get("signedURL") or result.get("signedUrl") or result.get("signed_url")
-            return getattr(result, "signed_url", None) or getattr(result, "signedURL", None)
-
-        signed_url = await asyncio.to_thread(_sign)
-        if not signed_url:
-            raise RuntimeError("Storage provider did not return a signed URL")
-        return signed_url
+        await asyncio.to_thread(client.storage.from_(settings.SUPABASE_BUCKET).remove, paths)
+        logger.info(f"Deleted {len(paths)} files from Supabase")
+        return True
     except Exception as e:
-        logger.error(f"Error creating signed URL for {file_path}: {e}")
+        logger.error(f"Error deleting files from Supabase: {e}")
+        return False
+
+
+def _signed_url_from(result) -> Optional[str]:
+    if isinstance(result, dict):
+        return result.get("signedURL") or result.get("signedUrl") or result.get("signed_url")
+    return getattr(result, "signed_url", None) or getattr(result, "signedURL", None)
+
+
+def _signed_url_cache_key(file_path: str, expires_in: int) -> str:
+    return f"{SIGNED_URL_CACHE_PREFIX}{expires_in}:{file_path}"
+
+
+def _sign_paths(paths: list[str], expires_in: int) -> dict[str, str]:
+    """Sign `paths` with one Storage request per SIGNED_URL_BATCH_SIZE paths (blocking)."""
+    bucket = get_supabase_client().storage.from_(settings.SUPABASE_BUCKET)
+    signed: dict[str, str] = {}
+    for start in range(0, len(paths), SIGNED_URL_BATCH_SIZE):
+        batch = paths[start:start + SIGNED_URL_BATCH_SIZE]
+        try:
+            results = bucket.create_signed_urls(batch, expires_in)
+        except Exception as e:
+            # One missing object can fail the whole batch; sign the rest individually.
+            logger.warning(f"Batch signing of {len(batch)} paths failed, signing one by one: {e}")
+            results = []
+            for path in batch:
+                try:
+                    results.append({"path": path, **bucket.create_signed_url(path, expires_in)})
+                except Exception as item_error:
+                    logger.error(f"Error creating signed URL for {path}: {item_error}")
+        for item in results:
+            path = item.get("path") if isinstance(item, dict) else None
+            url = _signed_url_from(item)
+            if path and url and not (isinstance(item, dict) and item.get("error")):
+                signed[path] = url
+    return signed
+
+
+async def sign_urls(file_paths: list[str], expires_in: int = 300) -> dict[str, SignedUrl]:
+    """
+    Signed URLs for many private objects, keyed by the paths as given.
+
+    Cached URLs are reused until shortly before they expire, so callers must
+    report `SignedUrl.expires_in` rather than `expires_in`; the rest are signed
+    together in one Storage request. Paths that could not be signed are missing
+    from the result.
+    """
+    normalized = {path: normalize_storage_object_path(path) for path in file_paths if path}
+    # Other schemes (e.g. placeholder s3:// URIs) are not objects in the bucket.
+    normalized = {path: object_path for path, object_path in normalized.items() if "://" not in object_path}
+    if not normalized:
+        return {}
+    keys = {object_path: _signed_url_cache_key(object_path, expires_in) for object_path in set(normalized.values())}
+    cached = await _SIGNED_URL_CACHE.get_many(list(keys.values()))
+    urls = {
+        object_path: SignedUrl(cached[key]["url"], cached[key]["expiresAt"])
+        for object_path, key in keys.items()
+        if isinstance(cached.get(key), dict)
+    }
+
+    missing = sorted(object_path for object_path in keys if object_path not in urls)
+    if missing:
+        # Taken before the request, so the recorded expiry is never late.
+        expires_at = time.time() + expires_in
+        signed = {
+            object_path: SignedUrl(url, expires_at)
+            for object_path, url in (await asyncio.to_thread(_sign_paths, missing, expires_in)).items()
+        }
+        urls.update(signed)
+        cache_ttl = expires_in - max(SIGNED_URL_MIN_REMAINING_SECONDS, expires_in // 10)
+        if cache_ttl > 0:
+            await _SIGNED_URL_CACHE.set_many(
+                {keys[object_path]: {"url": url.url, "expiresAt": url.expires_at} for object_path, url in signed.items()},
+                ttl_seconds=cache_ttl,
+            )
+    return {path: urls[object_path] for path, object_path in normalized.items() if object_path in urls}
+
+
+async def create_signed_urls(file_paths: list[str], expires_in: int = 300) -> dict[str, str]:
+    """Like `sign_urls`, without the expiry."""
+    return {path: signed.url for path, signed in (await sign_urls(file_paths, expires_in)).items()}
+
+
+async def create_signed_url(file_path: str, expires_in: int = 300) -> SignedUrl:
+    """Create a short-lived signed URL for a private evidence object."""
+    signed = await sign_urls([file_path], expires_in=expires_in)
+    if file_path not in signed:
+        logger.error(f"Error creating signed URL for {file_path}")
         raise Exception("Failed to create signed evidence URL")
+    return signed[file_path]
@@ -7,6 +7,7 @@ from app.dashboard.models import DashboardMetricsResponse
 from app.activity.service import ActivityService
 from app.notifications.service import NotificationService
 from app.evidence.models import EvidenceResponse
+from app.core.cache import TwoTierCache
 from app.core.redis import redis_client
 from app.compliance.alignment_metrics import (
     count_distinct_criteria_with_evidence,
@@ -14,10 +15,18 @@ from app.compliance.alignment_metrics import (
 )
 import logging
 from datetime import datetime
-import json
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_COUNTS_TTL_SECONDS = 120
+DASHBOARD_COUNTS_STALE_SECONDS = 60
+_COUNTS_CACHE = TwoTierCache(
+    "dashboard.counts",
+    ttl_seconds=DASHBOARD_COUNTS_TTL_SECONDS,
+    max_entries=2048,
+    l1_ttl_seconds=30,
+)
+
 class DashboardService:
     """Service for dashboard analytics business logic."""
     
@@ -31,21 +40,18 @@ class DashboardService:
             institution_id = current_user.get("institutionId")
             
             # --- 1. Basic Metrics ---
-            cache_key = f"dashboard_metrics_counts:{'admin' if is_admin else institution_id or user_id}"
-            counts_cache = None
-            if redis_client.enabled:
-                try:
-                    counts_cache = redis_client.get(cache_key)
-                except Exception:
-                    counts_cache = None
-
-            if counts_cache:
-                counts = json.loads(counts_cache)
-                evidence_count = counts.get("evidence_count", 0)
-                total_gap_analyses = counts.get("total_gap_analyses", 0)
-                aligned_criteria_count = counts.get("aligned_criteria_count", 0)
-                total_criteria = counts.get("total_criteria", 0)
+            # Keys embed the tenant's data generation; writes bump it instead of deleting keys.
+            # evidence_count is per uploader, so non-admin keys are scoped to the user as well.
+            if is_admin:
+                generation = await redis_client.generation_token(global_scope=True)
+                cache_key = f"dashboard_metrics_counts:admin:{generation}"
             else:
+                generation = await redis_client.generation_token(
+                    institution_id=institution_id, user_id=user_id
+                )
+                cache_key = f"dashboard_metrics_counts:{institution_id or 'none'}:{user_id}:{generation}"
+
+            async def load_counts() -> Dict[str, int]:
                 if is_admin:
                     evidence_count, total_gap_analyses, total_criteria, aligned_criteria_count = await asyncio.gather(
                         db.evidence.count(),
@@ -79,21 +85,25 @@ class DashboardService:
                     else:
                         total_criteria = 0
                         aligned_criteria_count = 0
+                return {
+                    "evidence_count": evidence_count,
+                    "total_gap_analyses": total_gap_analyses,
+                    "aligned_criteria_count": aligned_criteria_count,
+                    "total_criteria": total_criteria,
+                }
 
-                if redis_client.enabled:
-                    try:
-                        redis_client.set(
-                            cache_key,
-                            json.dumps({
-                                "evidence_count": evidence_count,
-                                "total_gap_analyses": total_gap_analyses,
-                                "aligned_criteria_count": aligned_criteria_count,
-                                "total_criteria": total_criteria,
-                            }),
-                            ex=120,
-                        )
-                    except Exception:
-                        pass
+            # One computation per key across requests and workers; an expired entry
+            # keeps being served while a single refresh runs.
+            counts = await _COUNTS_CACHE.get_or_compute(
+                cache_key,
+                load_counts,
+                stale_ttl_seconds=DASHBOARD_COUNTS_STALE_SECONDS,
+                distributed=True,
+            )
+            evidence_count = counts.get("evidence_count", 0)
+            total_gap_analyses = counts.get("total_gap_analyses", 0)
+            aligned_criteria_count = counts.get("aligned_criteria_count", 0)
+            total_criteria = counts.get("total_criteria", 0)
 
             criteria_based_pct = (
                 round((aligned_criteria_count / total_criteria) * 100, 2) if total_criteria > 0 else 0.0
@@ -0,0 +1,193 @@
+"""Content-addressed evidence blobs.
+
+Evidence files are stored once per SHA-256 under ``evidence/sha256/<hash>`` and
+tracked in "EvidenceBlob" with a reference count. Uploading content that is
+already stored only bumps the count; deleting evidence decrements it. Blobs
+that stay unreferenced for EVIDENCE_BLOB_GRACE_DAYS are removed from storage by
+the retention job, so a delete followed by a re-upload still dedupes. The job
+holds the rows' locks while it removes the objects, so an upload of the same
+content waits for it and then starts from a fresh row.
+
+The row also keeps the text extracted from the content, so extraction is
+reused across uploads, users and chats.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Optional
+
+from app.core.db import get_db
+from app.core.retention import register_retention_hook
+from app.core.storage import delete_files_from_supabase
+
+logger = logging.getLogger(__name__)
+
+BLOB_FOLDER = "evidence/sha256"
+EVIDENCE_BLOB_GRACE_DAYS = int(os.getenv("EVIDENCE_BLOB_GRACE_DAYS", "7"))
+EVIDENCE_BLOB_GC_BATCH = int(os.getenv("EVIDENCE_BLOB_GC_BATCH", "500"))
+EVIDENCE_BLOB_GC_TX_TIMEOUT_SECONDS = int(os.getenv("EVIDENCE_BLOB_GC_TX_TIMEOUT_SECONDS", "120"))
+
+CREATE_EVIDENCE_BLOB_SQL = """
+CREATE TABLE IF NOT EXISTS "EvidenceBlob" (
+    sha256 TEXT PRIMARY KEY,
+    "storagePath" TEXT NOT NULL UNIQUE,
+    size BIGINT NOT NULL,
+    "contentType" TEXT,
+    "refCount" INTEGER NOT NULL DEFAULT 0,
+    uploaded BOOLEAN NOT NULL DEFAULT FALSE,
+    extraction JSONB,
+    "createdAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    "updatedAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    "releasedAt" TIMESTAMPTZ
+)
+"""
+
+EVIDENCE_BLOB_INDEX_SQL = [
+    'CREATE INDEX IF NOT EXISTS "idx_evidence_blob_unreferenced" ON "EvidenceBlob"("releasedAt") WHERE "refCount" <= 0',
+]
+
+_ENSURED = False
+
+
+async def ensure_evidence_blob_table() -> None:
+    global _ENSURED
+    if _ENSURED:
+        return
+    db = get_db()
+    await db.execute_raw(CREATE_EVIDENCE_BLOB_SQL)
+    for sql in EVIDENCE_BLOB_INDEX_SQL:
+        await db.execute_raw(sql)
+    _ENSURED = True
+
+
+def blob_path(sha256: str) -> str:
+    return f"{BLOB_FOLDER}/{sha256}"
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    sha256: str
+    storage_path: str
+    # False when the object still has to be uploaded (new content, or a
+    # concurrent first upload has not finished yet).
+    uploaded: bool
+
+
+async def acquire_blob(sha256: str, *, size: int, content_type: Optional[str]) -> BlobRef:
+    """Take a reference on the blob for `sha256`, creating its row if needed."""
+    await ensure_evidence_blob_table()
+    rows = await get_db().query_raw(
+        """
+        INSERT INTO "EvidenceBlob" (sha256, "storagePath", size, "contentType", "refCount")
+        VALUES ($1, $2, $3, $4, 1)
+        ON CONFLICT (sha256) DO UPDATE
+        SET "refCount" = GREATEST("EvidenceBlob"."refCount", 0) + 1,
+            "releasedAt" = NULL,
+            "updatedAt" = NOW()
+        RETURNING "storagePath", uploaded
+        """,
+        sha256,
+        blob_path(sha256),
+        int(size),
+        content_type,
+    )
+    row = rows[0]
+    return BlobRef(sha256=sha256, storage_path=row["storagePath"], uploaded=bool(row.get("uploaded")))
+
+
+async def mark_blob_uploaded(sha256: str) -> None:
+    await get_db().execute_raw(
+        'UPDATE "EvidenceBlob" SET uploaded = TRUE, "updatedAt" = NOW() WHERE sha256 = $1',
+        sha256,
+    )
+
+
+async def release_blob_path(storage_path: str) -> bool:
+    """
+    Drop one reference to the blob stored at `storage_path`.
+
+    Returns False when the path is not a blob (legacy per-upload objects), in
+    which case the caller deletes the object itself.
+    """
+    if not storage_path or not storage_path.startswith(f"{BLOB_FOLDER}/"):
+        return False
+    await ensure_evidence_blob_table()
+    rows = await get_db().query_raw(
+        """
+        UPDATE "EvidenceBlob"
+        SET "refCount" = GREATEST("refCount" - 1, 0),
+            "releasedAt" = CASE WHEN "refCount" <= 1 THEN NOW() ELSE "releasedAt" END,
+            "updatedAt" = NOW()
+        WHERE "storagePath" = $1
+        RETURNING "refCount"
+        """,
+        storage_path,
+    )
+    return bool(rows)
+
+
+async def get_blob_extraction(sha256: str) -> Optional[dict[str, Any]]:
+    await ensure_evidence_blob_table()
+    rows = await get_db().query_raw(
+        'SELECT extraction FROM "EvidenceBlob" WHERE sha256 = $1 AND extraction IS NOT NULL',
+        sha256,
+    )
+    if not rows:
+        return None
+    extraction = rows[0].get("extraction")
+    if isinstance(extraction, str):
+        extraction = json.loads(extraction)
+    return extraction if isinstance(extraction, dict) else None
+
+
+async def save_blob_extraction(sha256: str, extraction: dict[str, Any]) -> None:
+    """Persist extracted text on an existing blob; content never uploaded as evidence is skipped."""
+    await ensure_evidence_blob_table()
+    await get_db().execute_raw(
+        'UPDATE "EvidenceBlob" SET extraction = $2::jsonb, "updatedAt" = NOW() WHERE sha256 = $1',
+        sha256,
+        json.dumps(extraction, default=str),
+    )
+
+
+async def collect_unreferenced_blobs() -> int:
+    """
+    Delete blobs unreferenced for longer than the grace period.
+
+    The rows stay locked from selection until they are deleted, after their
+    objects, so `acquire_blob` cannot revive a blob whose object is being
+    removed. If storage removal fails, nothing is deleted and the next run retries.
+    """
+    if EVIDENCE_BLOB_GRACE_DAYS <= 0:
+        return 0
+    await ensure_evidence_blob_table()
+    async with get_db().tx(timeout=timedelta(seconds=EVIDENCE_BLOB_GC_TX_TIMEOUT_SECONDS)) as tx:
+        rows = await tx.query_raw(
+            """
+            SELECT sha256, "storagePath" FROM "EvidenceBlob"
+            WHERE "refCount" <= 0
+              AND "releasedAt" < NOW() - ($1 || ' days')::interval
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+            """,
+            EVIDENCE_BLOB_GRACE_DAYS,
+            EVIDENCE_BLOB_GC_BATCH,
+        )
+        if not rows:
+            return 0
+        if not await delete_files_from_supabase([row["storagePath"] for row in rows]):
+            logger.warning("Evidence blob GC: storage removal failed; %s blobs kept for the next run", len(rows))
+            return 0
+        await tx.execute_raw(
+            'DELETE FROM "EvidenceBlob" WHERE sha256 = ANY($1::text[])',
+            [row["sha256"] for row in rows],
+        )
+    return len(rows)
+
+
+register_retention_hook("EvidenceBlob", collect_unreferenced_blobs)
@@ -39,6 +39,9 @@ class EvidenceResponse(BaseModel):
     # Relations
     criteria: Optional[List[Any]] = Field(default_factory=list)
 
+    # Ready-to-use link to the file, set by list views
+    signedUrl: Optional[str] = None
+
     class Config:
         from_attributes = True
 
@@ -36,7 +36,7 @@ async def upload_evidence(
 @router.get("/export/csv")
 async def export_evidence_csv(current_user: dict = Depends(get_current_user)):
     """Export evidence list as CSV."""
-    evidence_list = await EvidenceService.list_evidence(current_user, page=1, limit=1000)
+    evidence_list = await EvidenceService.list_evidence(current_user, page=1, limit=1000, sign_urls=False)
     
     output = io.StringIO()
     writer = csv.writer(output)
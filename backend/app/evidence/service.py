@@ -1,13 +1,24 @@
 """Evidence service."""
 import base64
+import hashlib
 import json
 import re
 from datetime import datetime, timezone, timedelta
 from fastapi import HTTPException, status, UploadFile, BackgroundTasks
 from typing import List, Optional
 from app.core.db import get_db
-from app.core.storage import upload_file_to_supabase, delete_file_from_supabase, create_signed_url
+from app.core.storage import (
+    SpooledUpload,
+    UploadTooLarge,
+    create_signed_url,
+    create_signed_urls,
+    delete_file_from_supabase,
+    spool_upload,
+    upload_file_to_supabase,
+    upload_spooled_to_supabase,
+)
 from app.core.config import settings
+from app.evidence.blobs import acquire_blob, mark_blob_uploaded, release_blob_path
 from app.evidence.models import (
     EvidenceResponse,
     UploadEvidenceResponse,
@@ -32,6 +43,9 @@ ALLOWED_FILE_TYPES = {
     "text/plain",
 }
 MAX_FILE_SIZE = 25 * 1024 * 1024
+SIGNED_URL_EXPIRES_IN = 300
+# List links live longer since the page may stay open before a file is opened.
+LIST_SIGNED_URL_EXPIRES_IN = 3600
 
 class EvidenceService:
     """Service for evidence management business logic."""
@@ -103,46 +117,76 @@ class EvidenceService:
         ``file.read()`` is skipped. Callers that already consumed the stream (e.g.
         Horus ``process_file``) must pass bytes to avoid a second read / seek, which
         breaks on Starlette spooled files and causes "I/O operation on closed file".
+        Otherwise the upload is streamed in chunks to a temp file and from there to
+        storage, so memory per upload is bounded by the chunk size.
         """
         # 1. Validation
         if file.content_type not in ALLOWED_FILE_TYPES:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File type not allowed")
 
-        # Read content for validation and analysis (single read — never seek/rewind UploadFile)
+        too_large = HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large (max {MAX_FILE_SIZE//1024//1024}MB)",
+        )
+        spooled: Optional[SpooledUpload] = None
+        # Single pass over the stream — never seek/rewind UploadFile
         try:
             if file_content is None:
-                file_content = await file.read()
-            if len(file_content) > MAX_FILE_SIZE:
-                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File too large (max {MAX_FILE_SIZE//1024//1024}MB)")
+                spooled = await spool_upload(file, max_size=MAX_FILE_SIZE)
+            elif len(file_content) > MAX_FILE_SIZE:
+                raise too_large
+        except UploadTooLarge:
+            raise too_large
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"File read error: {e}")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Failed to read file")
 
+        try:
+            return await EvidenceService._store_evidence(
+                file, current_user, file_content=file_content, spooled=spooled
+            )
+        finally:
+            if spooled is not None:
+                spooled.cleanup()
+
+    @staticmethod
+    async def _store_evidence(
+        file: UploadFile,
+        current_user: dict,
+        *,
+        file_content: Optional[bytes],
+        spooled: Optional[SpooledUpload],
+    ) -> UploadEvidenceResponse:
         db = get_db()
         try:
             # 2. Critical Path: Storage + DB
-            # Upload to Supabase
-            storage_path, _ = await upload_file_to_supabase(
-                file_content=file_content,
-                filename=file.filename,
-                content_type=file.content_type
+            # Content-addressed: identical bytes share one stored object
+            storage_path = await EvidenceService._store_blob(
+                file, file_content=file_content, spooled=spooled
             )
-            
+
             # Create Record
-            evidence = await db.evidence.create(
-                data={
-                    "fileUrl": storage_path,
-                    "uploadedById": current_user["id"],
-                    "ownerId": current_user.get("institutionId"), # Use institutionId as ownerId for isolation
-                    "originalFilename": file.filename,
-                    "title": file.filename, # Default title is filename until AI analysis completes
-                    "status": "uploaded"
-                }
-            )
             try:
-                redis_client.invalidate_dashboard_cache()
+                evidence = await db.evidence.create(
+                    data={
+                        "fileUrl": storage_path,
+                        "uploadedById": current_user["id"],
+                        "ownerId": current_user.get("institutionId"), # Use institutionId as ownerId for isolation
+                        "originalFilename": file.filename,
+                        "title": file.filename, # Default title is filename until AI analysis completes
+                        "status": "uploaded"
+                    }
+                )
+            except Exception:
+                await release_blob_path(storage_path)
+                raise
+            try:
+                await redis_client.invalidate_dashboard_cache(
+                    institution_id=current_user.get("institutionId"),
+                    user_id=current_user["id"],
+                )
             except Exception as cache_err:
                 logger.warning(f"Failed to invalidate dashboard cache after evidence create: {cache_err}")
 
@@ -224,6 +268,43 @@ class EvidenceService:
                 detail={"error": "Valid upload failed", "stage": "persistence", "detail": str(e)}
             )
 
+    @staticmethod
+    async def _store_blob(
+        file: UploadFile,
+        *,
+        file_content: Optional[bytes],
+        spooled: Optional[SpooledUpload],
+    ) -> str:
+        """
+        Reference the content-addressed object for the upload, uploading it only
+        when no earlier upload stored the same bytes. Returns the storage path.
+        """
+        if spooled is not None:
+            sha256, size = spooled.sha256, spooled.size
+        else:
+            sha256, size = hashlib.sha256(file_content).hexdigest(), len(file_content)
+        blob = await acquire_blob(sha256, size=size, content_type=file.content_type)
+        if blob.uploaded:
+            logger.info(f"Evidence content {sha256[:12]} already stored; skipping upload")
+            return blob.storage_path
+        try:
+            # upsert: a concurrent first upload of the same bytes may have won the race
+            if spooled is not None:
+                await upload_spooled_to_supabase(spooled, object_path=blob.storage_path, upsert=True)
+            else:
+                await upload_file_to_supabase(
+                    file_content=file_content,
+                    filename=file.filename,
+                    content_type=file.content_type,
+                    object_path=blob.storage_path,
+                    upsert=True,
+                )
+        except Exception:
+            await release_blob_path(blob.storage_path)
+            raise
+        await mark_blob_uploaded(sha256)
+        return blob.storage_path
+
     @staticmethod
     async def queue_evidence_analysis(
         *,
@@ -318,11 +399,16 @@ class EvidenceService:
             except Exception as e:
                 logger.warning(f"RAG cleanup failed for {evidence_id}: {e}")
 
-            await delete_file_from_supabase(evidence.fileUrl)
-                
             await db.evidence.delete(where={"id": evidence_id})
+            # Only once the row is gone: shared blobs are removed by retention
+            # once unreferenced; legacy per-upload objects are deleted right away.
+            if not await release_blob_path(evidence.fileUrl):
+                await delete_file_from_supabase(evidence.fileUrl)
             try:
-                redis_client.invalidate_dashboard_cache()
+                await redis_client.invalidate_dashboard_cache(
+                    institution_id=evidence.ownerId,
+                    user_id=evidence.uploadedById,
+                )
             except Exception as cache_err:
                 logger.warning(f"Failed to invalidate dashboard cache after evidence delete: {cache_err}")
             logger.info(f"User {current_user['email']} deleted: {evidence_id}")
@@ -353,7 +439,10 @@ class EvidenceService:
             except Exception as e:
                 logger.debug(f"Duplicate evidence-criterion link skipped on attach: {e}")
             try:
-                redis_client.invalidate_dashboard_cache()
+                await redis_client.invalidate_dashboard_cache(
+                    institution_id=evidence.ownerId,
+                    user_id=evidence.uploadedById,
+                )
             except Exception as cache_err:
                 logger.warning(f"Failed to invalidate dashboard cache after evidence attach: {cache_err}")
 
@@ -394,12 +483,14 @@ class EvidenceService:
         evidence = await db.evidence.find_first(where=EvidenceService._evidence_access_where(evidence_id, current_user))
         if not evidence:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
-        signed_url = await create_signed_url(evidence.fileUrl, expires_in=300)
-        return {"url": signed_url, "expiresIn": 300}
+        signed_url = await create_signed_url(evidence.fileUrl, expires_in=SIGNED_URL_EXPIRES_IN)
+        return {"url": signed_url.url, "expiresIn": signed_url.expires_in}
 
     @staticmethod
-    async def list_evidence(current_user: dict, page: int = 1, limit: int = 20) -> List[EvidenceResponse]:
-        """List evidence with isolation and pagination."""
+    async def list_evidence(
+        current_user: dict, page: int = 1, limit: int = 20, *, sign_urls: bool = True
+    ) -> List[EvidenceResponse]:
+        """List evidence with isolation and pagination; each item carries a signed URL for the page."""
         db = get_db()
         try:
             where = EvidenceService._evidence_scope(current_user)
@@ -412,10 +503,21 @@ class EvidenceService:
                 skip=skip,
                 take=limit
             )
-            return [EvidenceResponse.model_validate(ev) for ev in evidence_list]
+            items = [EvidenceResponse.model_validate(ev) for ev in evidence_list]
         except Exception as e:
             logger.error(f"List error: {e}")
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="List failed")
 
+        if sign_urls and items:
+            try:
+                signed = await create_signed_urls([ev.fileUrl for ev in items], expires_in=LIST_SIGNED_URL_EXPIRES_IN)
+            except Exception as e:
+                # The list stays usable; clients fall back to /{id}/signed-url.
+                logger.warning(f"Batch URL signing failed for evidence list: {e}")
+                signed = {}
+            for ev in items:
+                ev.signedUrl = signed.get(ev.fileUrl)
+        return items
+
 
 register_job_handler("evidence.analyze", EvidenceService.analyze_evidence_job)
@@ -5,6 +5,7 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from typing import List
 import logging
 from app.core.middlewares import get_current_user
+from app.core.rate_limit import GAP_ANALYSIS_POLICY, rate_limit
 from app.gap_analysis.models import (
     GapAnalysisRequest,
     GapAnalysisResponse,
@@ -20,7 +21,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-@router.post("/generate", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/generate",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(rate_limit(GAP_ANALYSIS_POLICY))],
+)
 async def generate_gap_analysis_report(
     request: GapAnalysisRequest,
     background_tasks: BackgroundTasks,
@@ -278,7 +278,9 @@ class GapAnalysisService:
             }
         )
         try:
-            redis_client.invalidate_dashboard_cache()
+            await redis_client.invalidate_dashboard_cache(
+                institution_id=institution_id, user_id=current_user.id
+            )
         except Exception as cache_err:
             logger.warning(f"Failed to invalidate dashboard cache after gap analysis create: {cache_err}")
 
@@ -327,7 +329,9 @@ class GapAnalysisService:
                 data={"status": "running"}
             )
             try:
-                redis_client.invalidate_dashboard_cache()
+                await redis_client.invalidate_dashboard_cache(
+                    institution_id=institution_id, user_id=user_id
+                )
             except Exception as cache_err:
                 logger.warning(f"Failed to invalidate dashboard cache after gap analysis status running: {cache_err}")
 
@@ -366,7 +370,9 @@ class GapAnalysisService:
                 }
             )
             try:
-                redis_client.invalidate_dashboard_cache()
+                await redis_client.invalidate_dashboard_cache(
+                    institution_id=institution_id, user_id=user_id
+                )
             except Exception as cache_err:
                 logger.warning(f"Failed to invalidate dashboard cache after gap analysis completion: {cache_err}")
 
@@ -385,7 +391,9 @@ class GapAnalysisService:
                     }
                 )
                 try:
-                    redis_client.invalidate_dashboard_cache()
+                    await redis_client.invalidate_dashboard_cache(
+                        institution_id=institution_id, user_id=user_id
+                    )
                 except Exception as cache_err:
                     logger.warning(f"Failed to invalidate dashboard cache after gap analysis failure: {cache_err}")
             except Exception:
@@ -447,7 +455,7 @@ class GapAnalysisService:
             
         await db.gapanalysis.delete(where={"id": gap_analysis_id})
         try:
-            redis_client.invalidate_dashboard_cache()
+            await redis_client.invalidate_dashboard_cache(institution_id=record.institutionId)
         except Exception as cache_err:
             logger.warning(f"Failed to invalidate dashboard cache after gap analysis delete: {cache_err}")
         logger.info(f"User {current_user.email} deleted gap analysis {gap_analysis_id}")
@@ -465,7 +473,7 @@ class GapAnalysisService:
             
         await db.gapanalysis.update(where={"id": gap_analysis_id}, data={"archived": archived})
         try:
-            redis_client.invalidate_dashboard_cache()
+            await redis_client.invalidate_dashboard_cache(institution_id=record.institutionId)
         except Exception as cache_err:
             logger.warning(f"Failed to invalidate dashboard cache after gap analysis archive change: {cache_err}")
         logger.info(f"User {current_user.email} archived/unarchived {gap_analysis_id}")
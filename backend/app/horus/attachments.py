@@ -154,7 +154,7 @@ class TemporaryAttachmentService:
                 expires_at=expires_at,
                 body=body,
             )
-            cls._persist_metadata(attachment.metadata())
+            await cls._persist_metadata(attachment.metadata())
             return attachment
         except Exception:
             try:
@@ -164,15 +164,15 @@ class TemporaryAttachmentService:
             raise
 
     @classmethod
-    def _persist_metadata(cls, metadata: dict[str, Any]) -> None:
+    async def _persist_metadata(cls, metadata: dict[str, Any]) -> None:
         raw = json.dumps(metadata)
         if redis_client.enabled:
-            redis_client.set(cls._key(metadata["id"]), raw, ex=HORUS_ATTACHMENT_TTL_SECONDS)
+            await redis_client.set(cls._key(metadata["id"]), raw, ex=HORUS_ATTACHMENT_TTL_SECONDS)
         cls._sidecar_path(metadata["id"]).write_text(raw, encoding="utf-8")
 
     @classmethod
-    def get_metadata(cls, attachment_id: str) -> dict[str, Any] | None:
-        raw = redis_client.get(cls._key(attachment_id)) if redis_client.enabled else None
+    async def get_metadata(cls, attachment_id: str) -> dict[str, Any] | None:
+        raw = await redis_client.get(cls._key(attachment_id)) if redis_client.enabled else None
         if not raw:
             sidecar = cls._sidecar_path(attachment_id)
             if sidecar.exists():
@@ -185,15 +185,15 @@ class TemporaryAttachmentService:
             return None
         expires_at = datetime.fromisoformat(data["expires_at"])
         if expires_at < datetime.now(timezone.utc):
-            cls._delete_metadata(data)
+            await cls._delete_metadata(data)
             return None
         if not Path(data["temp_path"]).exists():
             return None
         return data
 
     @classmethod
-    def read_bytes(cls, attachment_id: str, user_id: str) -> tuple[dict[str, Any], bytes]:
-        metadata = cls.get_metadata(attachment_id)
+    async def read_bytes(cls, attachment_id: str, user_id: str) -> tuple[dict[str, Any], bytes]:
+        metadata = await cls.get_metadata(attachment_id)
         if not metadata:
             raise HTTPException(status_code=404, detail="Temporary attachment not found or expired")
         if metadata.get("user_id") != user_id:
@@ -201,12 +201,12 @@ class TemporaryAttachmentService:
         return metadata, Path(metadata["temp_path"]).read_bytes()
 
     @classmethod
-    def delete(cls, attachment_id: str) -> None:
-        metadata = cls.get_metadata(attachment_id) if not attachment_id.startswith("__raw__") else None
-        cls._delete_metadata(metadata or {"id": attachment_id})
+    async def delete(cls, attachment_id: str) -> None:
+        metadata = await cls.get_metadata(attachment_id) if not attachment_id.startswith("__raw__") else None
+        await cls._delete_metadata(metadata or {"id": attachment_id})
 
     @classmethod
-    def _delete_metadata(cls, metadata: dict[str, Any]) -> None:
+    async def _delete_metadata(cls, metadata: dict[str, Any]) -> None:
         attachment_id = metadata.get("id")
         if metadata:
             try:
@@ -220,10 +220,10 @@ class TemporaryAttachmentService:
         except (OSError, TypeError):
             pass
         if redis_client.enabled and attachment_id:
-            redis_client.delete(cls._key(attachment_id))
+            await redis_client.delete(cls._key(attachment_id))
 
     @classmethod
-    def cleanup_expired(cls) -> int:
+    async def cleanup_expired(cls) -> int:
         HORUS_ATTACHMENT_DIR.mkdir(parents=True, exist_ok=True)
         now = datetime.now(timezone.utc)
         cleaned = 0
@@ -240,7 +240,7 @@ class TemporaryAttachmentService:
                     pass
                 sidecar.unlink(missing_ok=True)
                 if redis_client.enabled:
-                    redis_client.delete(cls._key(attachment_id))
+                    await redis_client.delete(cls._key(attachment_id))
                 cleaned += 1
             except Exception:
                 continue
@@ -0,0 +1,139 @@
+"""Concurrent, budgeted assembly of Horus chat context.
+
+Each piece of context (identity, goal, platform state, activities, mappings,
+memory, RAG, history, ...) is declared as a `ContextSource` with the sources it
+depends on and a latency budget. Sources start as soon as their dependencies
+have settled, so independent lookups run concurrently and a chat turn waits for
+the slowest chain rather than the sum of all fetches. A source that fails or
+exceeds its budget resolves to its default, so the turn proceeds with partial
+context. Shared lookups (e.g. the caller's institution) are sources of their
+own that others depend on, and run once per turn. A source whose dependency
+failed or timed out is skipped (it resolves to its default without running),
+so e.g. tenant-scoped lookups never run without their scope.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ContextSource:
+    name: str
+    # Receives the settled values of `depends_on`, keyed by source name.
+    fetch: Callable[[dict[str, Any]], Awaitable[Any]]
+    budget_seconds: float
+    depends_on: tuple[str, ...] = ()
+    default: Any = None
+
+
+@dataclass
+class SourceTiming:
+    status: str  # "ok" | "timeout" | "error" | "cancelled" | "skipped"
+    duration_ms: int
+    waited_ms: int = 0  # time spent waiting for dependencies
+
+
+@dataclass
+class ContextAssembler:
+    sources: Iterable[ContextSource]
+    correlation_id: str | None = None
+    timings: dict[str, SourceTiming] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self._sources = {source.name: source for source in self.sources}
+        for source in self._sources.values():
+            missing = [dep for dep in source.depends_on if dep not in self._sources]
+            if missing:
+                raise ValueError(f"Context source {source.name!r} depends on unknown sources {missing}")
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._created = time.perf_counter()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sources
+
+    def start(self, *names: str) -> None:
+        """Start the named sources (all when none are given) and their dependencies."""
+        for name in names or tuple(self._sources):
+            self._task(name)
+
+    async def get(self, name: str) -> Any:
+        """Value of one source, starting it if needed; never raises for source failures."""
+        return await asyncio.shield(self._task(name))
+
+    async def gather(self, *names: str) -> dict[str, Any]:
+        names = names or tuple(self._sources)
+        values = await asyncio.gather(*(self.get(name) for name in names))
+        return dict(zip(names, values))
+
+    def cancel(self) -> None:
+        """Stop sources still running, e.g. when the turn ends before using them."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def timings_ms(self) -> dict[str, dict[str, Any]]:
+        return {
+            name: {"status": timing.status, "ms": timing.duration_ms, "waited_ms": timing.waited_ms}
+            for name, timing in self.timings.items()
+        }
+
+    def log_timings(self) -> None:
+        logger.info(
+            "Horus context assembled",
+            extra={
+                "context_timings": self.timings_ms(),
+                "elapsed_ms": int((time.perf_counter() - self._created) * 1000),
+                "correlation_id": self.correlation_id,
+            },
+        )
+
+    def _task(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is None:
+            source = self._sources[name]
+            for dep in source.depends_on:
+                self._task(dep)
+            task = self._tasks[name] = asyncio.create_task(self._run(source))
+        return task
+
+    async def _run(self, source: ContextSource) -> Any:
+        queued = time.perf_counter()
+        deps = {}
+        for dep in source.depends_on:
+            deps[dep] = await asyncio.shield(self._tasks[dep])
+        start = time.perf_counter()
+        waited_ms = int((start - queued) * 1000)
+        failed = [dep for dep in source.depends_on if self.timings[dep].status != "ok"]
+        if failed:
+            logger.info(
+                "Horus context source skipped after failed dependency",
+                extra={"context_task": source.name, "failed_dependencies": failed, "correlation_id": self.correlation_id},
+            )
+            self.timings[source.name] = SourceTiming("skipped", 0, waited_ms)
+            return source.default
+        status = "ok"
+        try:
+            return await asyncio.wait_for(source.fetch(deps), timeout=source.budget_seconds)
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.info(
+                "Horus context source skipped after budget",
+                extra={"context_task": source.name, "budget_ms": int(source.budget_seconds * 1000), "correlation_id": self.correlation_id},
+            )
+            return source.default
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        except Exception as err:
+            status = "error"
+            logger.debug("Horus context source failed: %s: %s", source.name, err, extra={"correlation_id": self.correlation_id})
+            return source.default
+        finally:
+            self.timings[source.name] = SourceTiming(status, int((time.perf_counter() - start) * 1000), waited_ms)
@@ -2,14 +2,20 @@
 
 from __future__ import annotations
 
-import json
 from typing import Any
 
-from app.core.redis import redis_client
+from app.core.cache import TwoTierCache
 
 CONTEXT_CACHE_PREFIX = "horus:brain_context:"
 CONTEXT_CACHE_TTL_SECONDS = 5 * 60
-_LOCAL_CONTEXT_CACHE: dict[str, dict[str, str]] = {}
+# Identity changes are invalidated explicitly; a short L1 TTL bounds how long
+# other processes can keep serving the old value.
+_CONTEXT_CACHE = TwoTierCache(
+    "horus.context",
+    ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+    max_entries=4096,
+    l1_ttl_seconds=60,
+)
 
 
 class HorusContextCache:
@@ -18,27 +24,14 @@ class HorusContextCache:
         return f"{CONTEXT_CACHE_PREFIX}{user_id}"
 
     @classmethod
-    def get(cls, user_id: str) -> dict[str, str] | None:
-        key = cls.key(user_id)
-        raw = redis_client.get(key) if redis_client.enabled else None
-        if raw:
-            try:
-                return json.loads(raw)
-            except json.JSONDecodeError:
-                pass
-        return _LOCAL_CONTEXT_CACHE.get(key)
+    async def get(cls, user_id: str) -> dict[str, str] | None:
+        return await _CONTEXT_CACHE.get(cls.key(user_id))
 
     @classmethod
-    def set(cls, user_id: str, value: dict[str, Any]) -> None:
+    async def set(cls, user_id: str, value: dict[str, Any]) -> None:
         normalized = {k: "" if v is None else str(v) for k, v in value.items()}
-        key = cls.key(user_id)
-        _LOCAL_CONTEXT_CACHE[key] = normalized
-        if redis_client.enabled:
-            redis_client.set(key, json.dumps(normalized), ex=CONTEXT_CACHE_TTL_SECONDS)
+        await _CONTEXT_CACHE.set(cls.key(user_id), normalized)
 
     @classmethod
-    def invalidate(cls, user_id: str) -> None:
-        key = cls.key(user_id)
-        _LOCAL_CONTEXT_CACHE.pop(key, None)
-        if redis_client.enabled:
-            redis_client.delete(key)
+    async def invalidate(cls, user_id: str) -> None:
+        await _CONTEXT_CACHE.delete(cls.key(user_id))
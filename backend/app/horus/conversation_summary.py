@@ -0,0 +1,193 @@
+"""Rolling per-chat summaries for long Horus conversations.
+
+Horus sends the model a stored summary of a chat plus only the turns after it,
+so input tokens stay roughly constant however long an audit-prep session runs.
+Once HORUS_SUMMARY_EVERY_TURNS turns have piled up on top of the
+HORUS_SUMMARY_RECENT_MESSAGES kept verbatim, the chat path enqueues a
+"horus.summarize_chat" job. The job folds the oldest unsummarized messages into
+the summary and moves the chat's "covered" marker past them.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from app.core.db import get_db
+from app.core.jobs import enqueue_job, register_job_handler
+from app.core.tokens import token_estimator
+
+logger = logging.getLogger(__name__)
+
+HORUS_SUMMARY_RECENT_MESSAGES = int(os.getenv("HORUS_SUMMARY_RECENT_MESSAGES", "6"))
+HORUS_SUMMARY_EVERY_TURNS = int(os.getenv("HORUS_SUMMARY_EVERY_TURNS", "3"))
+HORUS_SUMMARY_MAX_TOKENS = int(os.getenv("HORUS_SUMMARY_MAX_TOKENS", "600"))
+# Tokens of new transcript folded per job; a long backlog is folded over several turns.
+HORUS_SUMMARY_FOLD_TOKENS = int(os.getenv("HORUS_SUMMARY_FOLD_TOKENS", "6000"))
+HORUS_SUMMARY_MESSAGE_TOKENS = 1500
+# Messages the chat path loads: the verbatim tail plus room for one fold.
+HORUS_HISTORY_WINDOW = HORUS_SUMMARY_RECENT_MESSAGES + 2 * HORUS_SUMMARY_EVERY_TURNS
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain the running summary of a conversation between a user and Horus, "
+    "the compliance advisor of the Ayn platform. Merge the new messages into the current summary. "
+    "Keep facts, figures, decisions, standards and criteria discussed, files mentioned, open questions "
+    "and the user's stated preferences; drop greetings and repetition. Write in the language the user "
+    "writes in, in at most 250 words. Return only the updated summary."
+)
+
+CREATE_HORUS_CHAT_SUMMARY_SQL = """
+CREATE TABLE IF NOT EXISTS "HorusChatSummary" (
+    "chatId" TEXT PRIMARY KEY REFERENCES "Chat"(id) ON DELETE CASCADE,
+    summary TEXT NOT NULL,
+    "coveredMessageId" TEXT NOT NULL,
+    "coveredMessages" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+_ENSURED = False
+
+
+async def ensure_chat_summary_table() -> None:
+    global _ENSURED
+    if _ENSURED:
+        return
+    await get_db().execute_raw(CREATE_HORUS_CHAT_SUMMARY_SQL)
+    _ENSURED = True
+
+
+@dataclass(frozen=True)
+class ChatSummary:
+    summary: str
+    # Last message folded into the summary; later messages are sent verbatim.
+    covered_message_id: str
+    covered_messages: int
+
+
+async def get_summary(chat_id: str) -> ChatSummary | None:
+    await ensure_chat_summary_table()
+    rows = await get_db().query_raw(
+        'SELECT summary, "coveredMessageId", "coveredMessages" FROM "HorusChatSummary" WHERE "chatId" = $1',
+        chat_id,
+    )
+    if not rows:
+        return None
+    row = rows[0]
+    return ChatSummary(
+        summary=row["summary"],
+        covered_message_id=row["coveredMessageId"],
+        covered_messages=int(row.get("coveredMessages") or 0),
+    )
+
+
+def _message_id(message: Any) -> str | None:
+    return message.get("id") if isinstance(message, dict) else getattr(message, "id", None)
+
+
+def unsummarized(messages: Sequence[Any], summary: ChatSummary | None) -> list[Any]:
+    """The messages (oldest first) that come after the summary's covered message."""
+    if summary is None:
+        return list(messages)
+    for index, message in enumerate(messages):
+        if _message_id(message) == summary.covered_message_id:
+            return list(messages[index + 1:])
+    # The covered message is older than the loaded window.
+    return list(messages)
+
+
+def needs_fold(messages: Sequence[Any], summary: ChatSummary | None) -> bool:
+    return len(unsummarized(messages, summary)) >= HORUS_HISTORY_WINDOW
+
+
+async def enqueue_fold(chat_id: str, user_id: str) -> None:
+    try:
+        await enqueue_job(
+            "horus.summarize_chat",
+            {"chat_id": chat_id, "user_id": user_id},
+            priority=150,
+            max_attempts=2,
+            dedupe_key=f"horus.summarize_chat:{chat_id}",
+        )
+    except Exception as exc:
+        logger.debug("Chat summary enqueue skipped for %s: %s", chat_id, exc)
+
+
+def _transcript(messages: Sequence[dict[str, Any]]) -> list[str]:
+    lines = []
+    for message in messages:
+        role = str(message.get("role") or "").strip().upper()
+        body = str(message.get("content") or "").strip()
+        if role in ("USER", "ASSISTANT") and body:
+            lines.append(f"{role}: {token_estimator.truncate(body, HORUS_SUMMARY_MESSAGE_TOKENS)}")
+    return lines
+
+
+async def summarize_chat_job(payload: dict[str, Any]) -> None:
+    chat_id = payload.get("chat_id")
+    if not chat_id:
+        return
+    current = await get_summary(chat_id)
+    rows = await get_db().query_raw(
+        """
+        SELECT id, role, content FROM "Message"
+        WHERE "chatId" = $1
+          -- Same (timestamp, id) order as below, so messages sharing the
+          -- covered message's timestamp are not skipped.
+          AND (
+            NOT EXISTS (SELECT 1 FROM "Message" WHERE id = $2)
+            OR (timestamp, id) > (SELECT timestamp, id FROM "Message" WHERE id = $2)
+          )
+        ORDER BY timestamp ASC, id ASC
+        """,
+        chat_id,
+        current.covered_message_id if current else None,
+    )
+    foldable = (rows or [])[:-HORUS_SUMMARY_RECENT_MESSAGES] if HORUS_SUMMARY_RECENT_MESSAGES else list(rows or [])
+    batch: list[dict[str, Any]] = []
+    used = 0
+    for row in foldable:
+        used += min(token_estimator.estimate(row.get("content")), HORUS_SUMMARY_MESSAGE_TOKENS)
+        if batch and used > HORUS_SUMMARY_FOLD_TOKENS:
+            break
+        batch.append(row)
+    if not batch:
+        return
+
+    from app.ai.service import get_gemini_client
+
+    prompt = (
+        f"Current summary:\n{current.summary if current else '(none yet)'}\n\n"
+        "New messages:\n" + "\n\n".join(_transcript(batch))
+    )
+    summary = (await get_gemini_client().chat(
+        messages=[{"role": "user", "content": prompt}],
+        context=SUMMARY_INSTRUCTIONS,
+    ) or "").strip()
+    if not summary:
+        raise RuntimeError("empty summary from provider")
+    summary = token_estimator.truncate(summary, HORUS_SUMMARY_MAX_TOKENS)
+
+    # Only advance from the marker this fold started from, so overlapping runs cannot skip messages.
+    await get_db().execute_raw(
+        """
+        INSERT INTO "HorusChatSummary" ("chatId", summary, "coveredMessageId", "coveredMessages")
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT ("chatId") DO UPDATE
+        SET summary = EXCLUDED.summary,
+            "coveredMessageId" = EXCLUDED."coveredMessageId",
+            "coveredMessages" = "HorusChatSummary"."coveredMessages" + EXCLUDED."coveredMessages",
+            "updatedAt" = NOW()
+        WHERE "HorusChatSummary"."coveredMessageId" IS NOT DISTINCT FROM $5
+        """,
+        chat_id,
+        summary,
+        batch[-1]["id"],
+        len(batch),
+        current.covered_message_id if current else None,
+    )
+
+
+register_job_handler("horus.summarize_chat", summarize_chat_job)
@@ -1,20 +1,32 @@
-"""Fast file text extraction with cache."""
+"""Fast file text extraction with cache.
+
+Extraction results are keyed by the content SHA-256. Behind the TTL cache, text
+extracted from content that is also stored as evidence is persisted on its
+"EvidenceBlob" row, so the same bytes are never parsed twice.
+"""
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import io
-import json
 import logging
 from typing import Any
 
-from app.core.redis import redis_client
+from app.core.cache import TwoTierCache
 
 logger = logging.getLogger(__name__)
 
 EXTRACT_CACHE_PREFIX = "horus:file_extract:"
 EXTRACT_CACHE_TTL = 24 * 60 * 60
-_LOCAL_EXTRACT_CACHE: dict[str, dict[str, Any]] = {}
+# Each entry can hold up to max_chars of text, so L1 is byte-budgeted as well.
+_EXTRACT_CACHE = TwoTierCache(
+    "horus.extract",
+    ttl_seconds=EXTRACT_CACHE_TTL,
+    max_entries=256,
+    max_bytes=32 * 1024 * 1024,
+    l1_ttl_seconds=60 * 60,
+)
 
 
 def _cache_key(sha256: str) -> str:
@@ -36,7 +48,7 @@ def _extract_pdf_text(content: bytes, max_pages: int) -> tuple[str, dict[str, An
     return text, {"page_count": len(reader.pages), "pages_read": min(len(reader.pages), max_pages)}
 
 
-def extract_text_cached(
+async def extract_text_cached(
     *,
     content: bytes,
     filename: str,
@@ -47,16 +59,23 @@ def extract_text_cached(
 ) -> dict[str, Any]:
     sha = sha256 or _sha256(content)
     key = _cache_key(sha)
-    cached = redis_client.get(key)
+    cached = await _EXTRACT_CACHE.get(key)
     if cached:
-        try:
-            payload = json.loads(cached)
-            payload["cache_hit"] = True
-            return payload
-        except json.JSONDecodeError:
-            pass
-    if key in _LOCAL_EXTRACT_CACHE:
-        payload = dict(_LOCAL_EXTRACT_CACHE[key])
+        cached["cache_hit"] = True
+        return cached
+
+    from app.evidence.blobs import get_blob_extraction, save_blob_extraction
+
+    try:
+        stored = await get_blob_extraction(sha)
+    except Exception as exc:
+        logger.debug("Blob extraction lookup failed for %s: %s", sha, exc)
+        stored = None
+    stored_text = (stored or {}).get("text") or ""
+    # Usable when it holds the whole text or at least as much as asked for.
+    if stored_text and (len(stored_text) >= max_chars or len(stored_text) >= stored.get("text_length", 0)):
+        payload = {**stored, "filename": filename, "mime_type": mime_type, "text": stored_text[:max_chars]}
+        await _EXTRACT_CACHE.set(key, payload)
         payload["cache_hit"] = True
         return payload
 
@@ -64,7 +83,7 @@ def extract_text_cached(
     meta: dict[str, Any] = {"page_count": None, "pages_read": None}
     try:
         if mime_type == "application/pdf" or filename.lower().endswith(".pdf"):
-            text, meta = _extract_pdf_text(content, max_pages=max_pages)
+            text, meta = await asyncio.to_thread(_extract_pdf_text, content, max_pages)
         elif mime_type.startswith("text/") or filename.lower().endswith((".txt", ".md", ".csv")):
             text = content.decode("utf-8", errors="replace")
         else:
@@ -82,6 +101,10 @@ def extract_text_cached(
         "cache_hit": False,
         **meta,
     }
-    redis_client.set(key, json.dumps(payload), ex=EXTRACT_CACHE_TTL)
-    _LOCAL_EXTRACT_CACHE[key] = dict(payload)
+    await _EXTRACT_CACHE.set(key, payload)
+    if text:
+        try:
+            await save_blob_extraction(sha, payload)
+        except Exception as exc:
+            logger.debug("Blob extraction save failed for %s: %s", sha, exc)
     return payload
@@ -98,14 +98,14 @@ class HorusMemoryService:
                 digest,
             )
             if redis_client.enabled:
-                redis_client.delete(cls._cache_key(user_id, institution_id))
+                await redis_client.delete(cls._cache_key(user_id, institution_id))
         except Exception as exc:
             logger.debug("Horus memory write skipped: %s", exc)
 
     @classmethod
     async def get_context(cls, user_id: str, institution_id: str | None = None, limit: int = 6) -> str:
         cache_key = cls._cache_key(user_id, institution_id)
-        cached = redis_client.get(cache_key) if redis_client.enabled else None
+        cached = await redis_client.get(cache_key) if redis_client.enabled else None
         if cached:
             return cached
         try:
@@ -126,7 +126,7 @@ class HorusMemoryService:
             lines = [str(row.get("content") or "").strip() for row in rows or [] if row.get("content")]
             result = "Horus memory:\n" + "\n".join(f"- {line}" for line in lines) if lines else ""
             if result and redis_client.enabled:
-                redis_client.set(cache_key, result, ex=MEMORY_TTL_SECONDS)
+                await redis_client.set(cache_key, result, ex=MEMORY_TTL_SECONDS)
             return result
         except Exception as exc:
             logger.debug("Horus memory read skipped: %s", exc)
@@ -76,7 +76,7 @@ class ProgressiveFileAnalysis:
             return
 
         await progress("extracting")
-        extraction = extract_text_cached(
+        extraction = await extract_text_cached(
             content=content,
             filename=filename,
             mime_type=attachment.get("mime_type") or "application/octet-stream",
@@ -12,7 +12,8 @@ from uuid import uuid4
 from pydantic import BaseModel
 import json
 import asyncio
-from fastapi import APIRouter, Depends, Query, HTTPException, File, UploadFile, Form, BackgroundTasks
+import re
+from fastapi import APIRouter, Depends, Query, HTTPException, File, UploadFile, Form, BackgroundTasks, Header
 import io
 from fastapi.responses import StreamingResponse
 
@@ -21,6 +22,7 @@ logger = logging.getLogger(__name__)
 from app.auth.dependencies import get_current_user
 from app.auth.dependencies import require_horus_access
 from app.core.db import get_db, Prisma
+from app.core.rate_limit import HORUS_CHAT_POLICY, ai_governor, raise_ai_busy, rate_limit, tenant_key
 from app.horus.service import HorusService
 from app.ai.service import transcribe_audio
 from app.horus.agent_tools import build_tool_manifest, requires_explicit_confirmation
@@ -122,7 +124,7 @@ def get_user_id(current_user):
     raise HTTPException(status_code=401, detail="Invalid user format")
 
 
-@router.post("/chat", response_model=Observation)
+@router.post("/chat", response_model=Observation, dependencies=[Depends(rate_limit(HORUS_CHAT_POLICY))])
 async def horus_chat_post(
     background_tasks: BackgroundTasks,
     message: str = Form(...),
@@ -140,21 +142,24 @@ async def horus_chat_post(
         horus_service = HorusService(state_service)
         buffered_files = await _buffer_upload_files(files, user_id)
         
-        return await horus_service.chat(
-            user_id=user_id,
-            message=message,
-            chat_id=chat_id,
-            files=buffered_files,
-            background_tasks=background_tasks,
-            db=db,
-            current_user=current_user
-        )
+        async with ai_governor.slot(tenant_key(current_user)):
+            return await horus_service.chat(
+                user_id=user_id,
+                message=message,
+                chat_id=chat_id,
+                files=buffered_files,
+                background_tasks=background_tasks,
+                db=db,
+                current_user=current_user
+            )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Horus Chat Error: {e}\n{traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/chat/stream")
+@router.post("/chat/stream", dependencies=[Depends(rate_limit(HORUS_CHAT_POLICY))])
 async def horus_chat_stream(
     background_tasks: BackgroundTasks,
     message: str = Form(...),
@@ -172,31 +177,40 @@ async def horus_chat_stream(
     state_service = StateService(db)
     horus_service = HorusService(state_service)
     buffered_files = await _buffer_upload_files(files, user_id)
+    # Held (and its lease renewed) for the whole stream. Released by the
+    # generator, or by the response's background tasks if it never starts;
+    # releasing twice is a no-op.
+    slot_tenant = tenant_key(current_user)
+    slot_token = await ai_governor.acquire(slot_tenant)
+    if slot_token is None:
+        raise_ai_busy()
+    background_tasks.add_task(ai_governor.release, slot_tenant, slot_token)
     
     async def event_generator():
-        try:
-            async for chunk in horus_service.stream_chat(
-                user_id=user_id,
-                message=message,
-                chat_id=chat_id,
-                files=buffered_files,
-                background_tasks=background_tasks,
-                db=db,
-                current_user=current_user,
-                correlation_id=correlation_id,
-            ):
-                yield chunk
-        except Exception as e:
-            logger.error(f"Horus stream error: {e}", exc_info=True, extra={"correlation_id": correlation_id})
-            yield f"__STREAM_ERROR__:{str(e)[:200]}\n"
-            fallback_text = "The connection was interrupted due to an internal error. Please try sending your message again."
-            yield fallback_text
+        async with ai_governor.hold(slot_tenant, slot_token):
             try:
-                from app.chat.service import ChatService
-                if chat_id:
-                    background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", fallback_text)
-            except Exception as db_err:
-                logger.error(f"Failed to save fallback stream error message: {db_err}")
+                async for chunk in horus_service.stream_chat(
+                    user_id=user_id,
+                    message=message,
+                    chat_id=chat_id,
+                    files=buffered_files,
+                    background_tasks=background_tasks,
+                    db=db,
+                    current_user=current_user,
+                    correlation_id=correlation_id,
+                ):
+                    yield chunk
+            except Exception as e:
+                logger.error(f"Horus stream error: {e}", exc_info=True, extra={"correlation_id": correlation_id})
+                yield f"__STREAM_ERROR__:{str(e)[:200]}\n"
+                fallback_text = "The connection was interrupted due to an internal error. Please try sending your message again."
+                yield fallback_text
+                try:
+                    from app.chat.service import ChatService
+                    if chat_id:
+                        background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", fallback_text)
+                except Exception as db_err:
+                    logger.error(f"Failed to save fallback stream error message: {db_err}")
 
     return StreamingResponse(
         event_generator(),
@@ -234,47 +248,58 @@ async def horus_speech_to_text(
     return {"text": text}
 
 
+_STREAM_ID_RE = re.compile(r"^\d+-\d+$")
+
+
 @router.get("/events")
 async def horus_events_stream(
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    last_event_id_query: Optional[str] = Query(None, alias="last_event_id"),
     current_user = Depends(get_current_user)
 ):
     """
     Real-time platform event stream (SSE).
     Horus uses this to push system messages and global notifications.
+
+    Backed by the user's Redis Stream, so events emitted by the worker or any
+    API process arrive here. Each event carries its stream id as the SSE `id:`;
+    a reconnect sending `Last-Event-ID` (or `?last_event_id=`) resumes right
+    after it. Without Redis the process-local bus is used.
     """
     user_id = get_user_id(current_user)
-    
+    resume_from = last_event_id or last_event_id_query
+    if resume_from and not _STREAM_ID_RE.match(resume_from.strip()):
+        resume_from = None
+
     async def event_generator():
         from app.core.events import event_bus, HEARTBEAT_INTERVAL
-        queue = await event_bus.subscribe(user_id)
+        from app.core.redis import redis_client
+
+        stream = event_bus.stream(
+            user_id,
+            last_id=resume_from.strip() if resume_from else "$",
+            heartbeat_interval=HEARTBEAT_INTERVAL,
+        )
         try:
             # Initial heartbeat/sync
             yield f"data: {json.dumps({'type': 'sync', 'status': 'connected'})}\n\n"
 
-            while True:
-                try:
-                    event = await asyncio.wait_for(
-                        queue.get(), timeout=HEARTBEAT_INTERVAL
-                    )
-                except asyncio.TimeoutError:
+            async for event in stream:
+                if event is None:
                     # No event within heartbeat window - send keepalive ping
-                    event_bus.touch(queue)
                     yield ": keepalive\n\n"
                     continue
-
-                # Check if we were evicted by a newer connection
-                if isinstance(event, dict) and event.get("type") == "__evicted__":
-                    logger.info(f"SSE for user {user_id}: evicted by newer connection")
-                    return
-
-                event_bus.touch(queue)
-                yield f"data: {json.dumps(event)}\n\n"
+                # Local fallback ids are not stream ids and cannot be resumed from.
+                event_id = f"id: {event.id}\n" if redis_client.enabled and event.id else ""
+                yield f"{event_id}data: {json.dumps(event.payload, default=str)}\n\n"
+            # The stream ends when a newer connection evicted this one.
+            logger.info(f"SSE for user {user_id}: evicted by newer connection")
         except asyncio.CancelledError:
             raise
         except Exception as e:
             logger.error(f"SSE Error for user {user_id}: {e}")
         finally:
-            event_bus.unsubscribe(user_id, queue)
+            await stream.aclose()
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
@@ -0,0 +1,165 @@
+"""Semantic response cache for Horus, stored in pgvector.
+
+Each cached answer is one "HorusSemanticCache" row holding the query embedding.
+A lookup is a single top-1 cosine query within the tenant; a hit above the
+similarity threshold slides the entry's expiry forward and marks it used.
+Lookups scan the tenant's rows exactly: the table is shared by all tenants, and
+a global HNSW index would apply the tenant filter only after its approximate
+scan, so a tenant outside the first `hnsw.ef_search` neighbours would never
+hit. Each tenant holds at most HORUS_SEMANTIC_CACHE_MAX_PER_TENANT rows, read
+through the ("institutionId", ...) index.
+Inserts append one row. Entries expire HORUS_SEMANTIC_CACHE_TTL_SECONDS after
+their last hit, and the retention job drops expired rows and the least recently
+used ones beyond HORUS_SEMANTIC_CACHE_MAX_PER_TENANT.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+from typing import Sequence
+
+from app.core.db import get_db
+from app.core.retention import register_retention_hook
+
+logger = logging.getLogger(__name__)
+
+HORUS_SEMANTIC_CACHE_DIM = int(os.getenv("HORUS_SEMANTIC_CACHE_DIM", "768"))
+HORUS_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("HORUS_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+HORUS_SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("HORUS_SEMANTIC_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+HORUS_SEMANTIC_CACHE_MAX_PER_TENANT = int(os.getenv("HORUS_SEMANTIC_CACHE_MAX_PER_TENANT", "2000"))
+
+CREATE_HORUS_SEMANTIC_CACHE_SQL = f"""
+CREATE TABLE IF NOT EXISTS "HorusSemanticCache" (
+    id TEXT PRIMARY KEY DEFAULT gen_random_uuid()::text,
+    "institutionId" TEXT NOT NULL,
+    "queryHash" TEXT NOT NULL,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL,
+    embedding vector({HORUS_SEMANTIC_CACHE_DIM}) NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    "createdAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    "lastHitAt" TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    "expiresAt" TIMESTAMPTZ NOT NULL
+)
+"""
+
+HORUS_SEMANTIC_CACHE_INDEX_SQL = [
+    'CREATE UNIQUE INDEX IF NOT EXISTS "idx_horus_semantic_cache_query" ON "HorusSemanticCache"("institutionId", "queryHash")',
+    'CREATE INDEX IF NOT EXISTS "idx_horus_semantic_cache_lru" ON "HorusSemanticCache"("institutionId", "lastHitAt" DESC)',
+    'CREATE INDEX IF NOT EXISTS "idx_horus_semantic_cache_expires" ON "HorusSemanticCache"("expiresAt")',
+    # Superseded by exact per-tenant scans (see the module docstring).
+    'DROP INDEX IF EXISTS "idx_horus_semantic_cache_embedding_hnsw"',
+]
+
+_ENSURED = False
+
+
+async def ensure_semantic_cache_table() -> None:
+    global _ENSURED
+    if _ENSURED:
+        return
+    db = get_db()
+    await db.execute_raw(CREATE_HORUS_SEMANTIC_CACHE_SQL)
+    for sql in HORUS_SEMANTIC_CACHE_INDEX_SQL:
+        await db.execute_raw(sql)
+    _ENSURED = True
+
+
+def query_hash(message: str) -> str:
+    return hashlib.sha256(message.strip().lower().encode("utf-8")).hexdigest()
+
+
+def _vector_literal(vector: Sequence[float]) -> str | None:
+    if not vector or len(vector) != HORUS_SEMANTIC_CACHE_DIM:
+        return None
+    return "[" + ",".join(map(str, vector)) + "]"
+
+
+async def lookup(
+    institution_id: str,
+    vector: Sequence[float],
+    *,
+    threshold: float = HORUS_SEMANTIC_CACHE_THRESHOLD,
+) -> str | None:
+    """Return the closest cached response in the tenant if it is similar enough."""
+    literal = _vector_literal(vector)
+    if literal is None:
+        return None
+    await ensure_semantic_cache_table()
+    rows = await get_db().query_raw(
+        """
+        WITH best AS (
+            SELECT id, response, 1 - (embedding <=> $2::vector) AS similarity
+            FROM "HorusSemanticCache"
+            WHERE "institutionId" = $1 AND "expiresAt" > NOW()
+            ORDER BY embedding <=> $2::vector
+            LIMIT 1
+        ), touched AS (
+            UPDATE "HorusSemanticCache" AS entry
+            SET hits = entry.hits + 1,
+                "lastHitAt" = NOW(),
+                "expiresAt" = NOW() + ($4 || ' seconds')::interval
+            FROM best
+            WHERE entry.id = best.id AND best.similarity >= $3
+            RETURNING entry.id
+        )
+        SELECT response, similarity FROM best
+        """,
+        institution_id,
+        literal,
+        threshold,
+        HORUS_SEMANTIC_CACHE_TTL_SECONDS,
+    )
+    if not rows or float(rows[0].get("similarity") or 0.0) < threshold:
+        return None
+    return rows[0].get("response")
+
+
+async def store(institution_id: str, message: str, vector: Sequence[float], response: str) -> None:
+    """Append an entry; a query already cached for the tenant is left as is."""
+    literal = _vector_literal(vector)
+    if literal is None or not message or not response:
+        return
+    await ensure_semantic_cache_table()
+    await get_db().execute_raw(
+        """
+        INSERT INTO "HorusSemanticCache"
+            ("institutionId", "queryHash", query, response, embedding, "expiresAt")
+        VALUES ($1, $2, $3, $4, $5::vector, NOW() + ($6 || ' seconds')::interval)
+        ON CONFLICT ("institutionId", "queryHash") DO NOTHING
+        """,
+        institution_id,
+        query_hash(message),
+        message,
+        response,
+        literal,
+        HORUS_SEMANTIC_CACHE_TTL_SECONDS,
+    )
+
+
+async def evict() -> int:
+    """Drop expired entries and each tenant's least recently used ones beyond the cap."""
+    await ensure_semantic_cache_table()
+    db = get_db()
+    expired = await db.execute_raw('DELETE FROM "HorusSemanticCache" WHERE "expiresAt" <= NOW()')
+    overflow = await db.execute_raw(
+        """
+        DELETE FROM "HorusSemanticCache"
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY "institutionId" ORDER BY "lastHitAt" DESC
+                ) AS position
+                FROM "HorusSemanticCache"
+            ) AS ranked
+            WHERE position > $1
+        )
+        """,
+        HORUS_SEMANTIC_CACHE_MAX_PER_TENANT,
+    )
+    return int(expired or 0) + int(overflow or 0)
+
+
+register_retention_hook("HorusSemanticCache", evict)
@@ -17,12 +17,14 @@ from typing import List, Optional, Dict, Any, AsyncGenerator, Callable
 from pydantic import BaseModel, Field
 
 from app.ai.service import get_gemini_client, CONTEXT_LIMIT_SENTINEL
+from app.ai.model_router import MultiModelAIRouter
+from app.ai.prompt_packing import PackedPrompt, PromptPacker, PromptSegment
 from app.evidence.service import EvidenceService, ALLOWED_FILE_TYPES
 from app.notifications.service import NotificationService
 from app.notifications.models import NotificationCreateRequest
 from app.chat.service import ChatService
 from app.activity.service import ActivityService
-from app.rag.service import RagService
+from app.rag.service import RAG_CHUNK_SEPARATOR, RagService
 from app.horus.agent_context import build_agent_context
 from app.horus.agent_tools import (
     TOOL_REGISTRY,
@@ -37,6 +39,8 @@ from app.horus.progressive_analysis import ProgressiveFileAnalysis
 from app.horus.retrieval import SmartRetrievalPlanner
 from app.horus.context_cache import HorusContextCache
 from app.horus.memory import HorusMemoryService
+from app.horus.context_assembler import ContextAssembler, ContextSource
+from app.horus import conversation_summary, semantic_cache
 
 from app.core.db import Prisma
 logger = logging.getLogger(__name__)
@@ -62,29 +66,55 @@ STRUCTURED_RESULT_TYPES = {"audit_report", "gap_table", "remediation_plan", "rep
 CONTEXT_BUDGETS_SECONDS = {
     "identity": 0.5,
     "goal": 0.5,
+    "institution": 0.5,
     "state_summary": 1.0,
     "recent_activities": 0.5,
     "mappings": 0.5,
     "history": 1.5,
+    "summary": 0.5,
     "memory": 0.5,
     "rag": 1.5,
 }
 
+# Prompt segments degrade lowest priority first when a turn exceeds its
+# route's token budget.
+PROMPT_PRIORITIES = {
+    "system": 100,
+    "directives": 100,
+    "platform_state": 90,
+    "brain_results": 85,
+    "mappings": 80,
+    "rag": 70,
+    "summary": 65,
+    "memory": 60,
+    "activities": 55,
+    "history": 50,
+}
+# Order of the packed segments in the context string.
+CONTEXT_SEGMENT_ORDER = (
+    "memory", "system", "summary", "platform_state", "mappings", "rag", "brain_results", "activities", "directives",
+)
+PRIOR_TRANSCRIPT_HEADER = (
+    "[Prior conversation in this chat — use it for follow-up questions. "
+    "The user's CURRENT request and any newly attached files are in the main prompt below. "
+    "Answer the current request using this history; do not ignore prior assistant answers.]"
+)
+
 
-def _pending_set(confirm_id: str, data: dict[str, Any]) -> None:
+async def _pending_set(confirm_id: str, data: dict[str, Any]) -> None:
     """Store pending confirmation in Redis (or in-memory fallback) with TTL."""
     if redis_client.enabled:
         key = f"{PENDING_CONFIRM_KEY_PREFIX}{confirm_id}"
-        redis_client.set(key, json.dumps(data), ex=PENDING_CONFIRMATION_TTL_SECONDS)
+        await redis_client.set(key, json.dumps(data), ex=PENDING_CONFIRMATION_TTL_SECONDS)
     else:
         _PENDING_ACTION_CONFIRMATIONS_FALLBACK[confirm_id] = data
 
 
-def _pending_get(confirm_id: str) -> dict[str, Any] | None:
+async def _pending_get(confirm_id: str) -> dict[str, Any] | None:
     """Get pending confirmation from Redis or in-memory fallback."""
     if redis_client.enabled:
         key = f"{PENDING_CONFIRM_KEY_PREFIX}{confirm_id}"
-        raw = redis_client.get(key)
+        raw = await redis_client.get(key)
         if raw:
             try:
                 return json.loads(raw)
@@ -94,11 +124,11 @@ def _pending_get(confirm_id: str) -> dict[str, Any] | None:
     return _PENDING_ACTION_CONFIRMATIONS_FALLBACK.get(confirm_id)
 
 
-def _pending_pop(confirm_id: str) -> dict[str, Any] | None:
+async def _pending_pop(confirm_id: str) -> dict[str, Any] | None:
     """Get and remove pending confirmation."""
-    data = _pending_get(confirm_id)
+    data = await _pending_get(confirm_id)
     if data and redis_client.enabled:
-        redis_client.delete(f"{PENDING_CONFIRM_KEY_PREFIX}{confirm_id}")
+        await redis_client.delete(f"{PENDING_CONFIRM_KEY_PREFIX}{confirm_id}")
     elif data:
         _PENDING_ACTION_CONFIRMATIONS_FALLBACK.pop(confirm_id, None)
     return data
@@ -163,35 +193,6 @@ class HorusService:
     def _timing_ms(start: float) -> int:
         return int((time.perf_counter() - start) * 1000)
 
-    @staticmethod
-    async def _with_budget(
-        label: str,
-        awaitable,
-        *,
-        default=None,
-        correlation_id: str | None = None,
-        budget_seconds: float | None = None,
-    ):
-        """Run optional context work with a hard latency budget."""
-        budget = budget_seconds if budget_seconds is not None else CONTEXT_BUDGETS_SECONDS.get(label, 0.25)
-        start = time.perf_counter()
-        try:
-            result = await asyncio.wait_for(awaitable, timeout=budget)
-            logger.info(
-                "Horus context task completed",
-                extra={"context_task": label, "duration_ms": HorusService._timing_ms(start), "correlation_id": correlation_id},
-            )
-            return result
-        except asyncio.TimeoutError:
-            logger.info(
-                "Horus context task skipped after budget",
-                extra={"context_task": label, "budget_ms": int(budget * 1000), "correlation_id": correlation_id},
-            )
-            return default
-        except Exception as err:
-            logger.debug("Horus context task failed: %s: %s", label, err, extra={"correlation_id": correlation_id})
-            return default
-
     @staticmethod
     def _default_user_identity(current_user: Any = None) -> Dict[str, str]:
         if isinstance(current_user, dict):
@@ -340,16 +341,16 @@ class HorusService:
         *,
         current_user_message: Optional[str],
         max_messages: int = 14,
-        max_chars_per_message: int = 12000,
-    ) -> str:
+    ) -> List[str]:
         """
-        Text-only transcript of prior turns for multimodal (file) requests.
+        Text-only transcript lines of prior turns for multimodal (file) requests.
 
         stream_chat_with_files sends only the current user turn + attachments to Gemini,
         so follow-ups (e.g. 'summarize again') must inject earlier USER/ASSISTANT text here.
+        Lines are packed into the prompt budget by the caller, under PRIOR_TRANSCRIPT_HEADER.
         """
         if not messages:
-            return ""
+            return []
         msgs = list(messages)[-max_messages:]
         cur = (current_user_message or "").strip()
         if cur and msgs and (getattr(msgs[-1], "role", None) or "").strip().lower() == "user":
@@ -364,44 +365,53 @@ class HorusService:
             body = (getattr(m, "content", None) or "").strip()
             if not body:
                 continue
-            if len(body) > max_chars_per_message:
-                body = body[:max_chars_per_message] + "\n[...truncated for length...]"
             lines.append(f"{role}: {body}")
-        if not lines:
-            return ""
-        return (
-            "[Prior conversation in this chat — use it for follow-up questions. "
-            "The user's CURRENT request and any newly attached files are in the main prompt below. "
-            "Answer the current request using this history; do not ignore prior assistant answers.]\n\n"
-            + "\n\n".join(lines)
-        )
+        return lines
+
+    @staticmethod
+    def _history_segment(messages: List[Dict[str, Any]]) -> PromptSegment:
+        """Chat history degrades oldest first; the current turn always survives."""
+        return PromptSegment("history", PROMPT_PRIORITIES["history"], messages, drop_from="start", min_parts=1)
 
     @staticmethod
-    def _trim_history_to_budget(
-        messages: List[Dict[str, Any]],
-        max_tokens: int = 28_000,
-        chars_per_token: int = 4,
-    ) -> List[Dict[str, Any]]:
+    def _summarized_history(
+        chat_id: str,
+        user_id: str,
+        messages: List[Any] | None,
+        summary: "conversation_summary.ChatSummary | None",
+        background_tasks: Any = None,
+    ) -> tuple[List[Any], PromptSegment]:
         """
-        Keep the most recent messages that fit within `max_tokens`.
-        Always keeps at least the last user message.
-        Estimation: 1 token ≈ 4 chars (conservative for Arabic/English mix).
+        Split a chat's loaded messages into the turns after its rolling summary and a
+        summary segment; enqueue a fold once enough turns piled up after the summary.
         """
-        if not messages:
-            return messages
-        budget = max_tokens * chars_per_token
-        selected: List[Dict[str, Any]] = []
-        used = 0
-        for msg in reversed(messages):
-            length = len(msg.get("content") or "")
-            if used + length > budget and selected:
-                break
-            selected.insert(0, msg)
-            used += length
-        # Always keep at least the last message
-        if not selected:
-            selected = [messages[-1]]
-        return selected
+        recent = conversation_summary.unsummarized(messages or [], summary)
+        if conversation_summary.needs_fold(messages or [], summary):
+            if background_tasks:
+                background_tasks.add_task(conversation_summary.enqueue_fold, chat_id, user_id)
+            else:
+                asyncio.create_task(conversation_summary.enqueue_fold(chat_id, user_id))
+        text = f"Summary of the earlier conversation in this chat:\n{summary.summary}" if summary else ""
+        return recent, PromptSegment.text("summary", PROMPT_PRIORITIES["summary"], text)
+
+    @staticmethod
+    def _rag_segment(rag_context: str | None) -> PromptSegment:
+        """Retrieved chunks, most relevant first, so the least relevant are dropped first."""
+        chunks = [chunk.strip() for chunk in (rag_context or "").split(RAG_CHUNK_SEPARATOR) if chunk.strip()]
+        if chunks:
+            chunks[0] = f"Relevant document excerpts:\n{chunks[0]}"
+        return PromptSegment("rag", PROMPT_PRIORITIES["rag"], chunks, separator=RAG_CHUNK_SEPARATOR)
+
+    @staticmethod
+    def _pack_prompt(segments: List[PromptSegment], *, task: str | None = None) -> PackedPrompt:
+        """Fit the segments into the token budget of the route this prompt will take."""
+        if task is None:
+            history = [part for segment in segments if segment.name == "history" for part in segment.parts]
+            context = "\n\n".join(
+                str(part) for segment in segments if segment.name != "history" for part in segment.parts
+            )
+            task = MultiModelAIRouter.route("stream_chat", messages=history, context=context).task
+        return PromptPacker(MultiModelAIRouter.prompt_budget(task)).pack(segments)
 
     @staticmethod
     def _detect_language(
@@ -653,7 +663,9 @@ class HorusService:
         # 5. AI Interaction
         client = get_gemini_client()
         chat_user_identity = await self._resolve_user_identity(user_id, current_user)
-        context = await self._prepare_context(user_id, summary, message, user_identity=chat_user_identity, goal=active_goal)
+        context = await self._prepare_context(
+            user_id, summary, message, user_identity=chat_user_identity, goal=active_goal, current_user=current_user
+        )
         
         if file_references:
             visual_only = self._is_visual_only(files)
@@ -690,7 +702,7 @@ class HorusService:
 
     async def _resolve_user_identity(self, user_id: str, current_user: Any = None) -> Dict[str, str]:
         """Fetch user name/email/role/institution for AI context injection."""
-        cached = HorusContextCache.get(user_id)
+        cached = await HorusContextCache.get(user_id)
         if cached:
             return cached
         name = getattr(current_user, "name", None) or (current_user.get("name") if isinstance(current_user, dict) else None)
@@ -733,25 +745,102 @@ class HorusService:
             "role": str(role or "USER"),
             "institution": institution_name or "",
         }
-        HorusContextCache.set(user_id, resolved)
+        await HorusContextCache.set(user_id, resolved)
         return resolved
 
-    async def _get_conversation_memory(self, user_id: str, exclude_chat_id: str | None = None) -> str:
+    @staticmethod
+    async def _resolve_institution_id(user_id: str, current_user: Any = None) -> str | None:
+        """Institution of the caller; the authenticated principal already carries it."""
+        if isinstance(current_user, dict) and "institutionId" in current_user:
+            return current_user.get("institutionId")
+        from app.core.db import db as prisma_client
+        user_obj = await prisma_client.user.find_unique(where={"id": user_id})
+        return getattr(user_obj, "institutionId", None) if user_obj else None
+
+    @staticmethod
+    async def _mappings_context(institution_id: str | None) -> str:
+        if not institution_id:
+            return ""
+        from app.core.db import db as prisma_client
+        mappings = await prisma_client.criteriamapping.find_many(
+            where={"institutionId": institution_id},
+            include={"criterion": True}
+        )
+        if not mappings:
+            return ""
+        met = len([m for m in mappings if m.status == "met"])
+        total = len(mappings)
+        gap_mappings = [m for m in mappings if m.status == "gap"]
+        gap_titles = [m.criterion.title for m in gap_mappings[:3] if m.criterion]
+        gap_str = ", ".join(gap_titles) if gap_titles else "None"
+        return f"CRITERIA MAPPINGS: {met}/{total} criteria met across all standards.\nCritical gaps: {gap_str}"
+
+    def _context_sources(
+        self,
+        *,
+        user_id: str,
+        chat_id: str,
+        current_user: Any,
+        message: str,
+        with_platform_context: bool,
+    ) -> List[ContextSource]:
+        """Declare the context a streamed chat turn may need, with dependencies and budgets."""
+        budgets = CONTEXT_BUDGETS_SECONDS
+
+        async def fetch_rag(deps: Dict[str, Any]) -> str:
+            rag_context, _ = await RagService().retrieve_context(
+                message,
+                limit=retrieval_plan.limit,
+                user_id=user_id,
+                institution_id=deps["institution"],
+            )
+            return rag_context or ""
+
+        sources = [
+            ContextSource("identity", lambda _: self._resolve_user_identity(user_id, current_user), budgets["identity"],
+                          default=self._default_user_identity(current_user)),
+            ContextSource("goal", lambda _: self._get_active_goal(user_id, chat_id), budgets["goal"]),
+            ContextSource("institution", lambda _: self._resolve_institution_id(user_id, current_user), budgets["institution"]),
+            ContextSource("history", lambda _: ChatService.get_chat(
+                              chat_id, user_id, message_limit=conversation_summary.HORUS_HISTORY_WINDOW), budgets["history"]),
+            ContextSource("summary", lambda _: conversation_summary.get_summary(chat_id), budgets["summary"]),
+        ]
+        if not with_platform_context:
+            return sources
+        sources += [
+            ContextSource("state_summary", lambda _: self.state_manager.get_state_summary(user_id), budgets["state_summary"]),
+            ContextSource("recent_activities", lambda _: ActivityService.get_recent_activities(user_id, limit=5),
+                          budgets["recent_activities"], default=[]),
+            ContextSource("mappings", lambda deps: self._mappings_context(deps["institution"]), budgets["mappings"],
+                          depends_on=("institution",), default=""),
+            ContextSource("memory", lambda deps: self._get_conversation_memory(
+                              user_id, exclude_chat_id=chat_id, institution_id=deps["institution"]),
+                          budgets["memory"], depends_on=("institution",), default=""),
+        ]
+        retrieval_plan = SmartRetrievalPlanner.plan(message)
+        if message and self._should_use_rag(message) and retrieval_plan.should_retrieve:
+            sources.append(
+                ContextSource("rag", fetch_rag, retrieval_plan.budget_seconds, depends_on=("institution",), default="")
+            )
+        return sources
+
+    async def _get_conversation_memory(
+        self, user_id: str, exclude_chat_id: str | None = None, institution_id: str | None = None
+    ) -> str:
         """Build a lightweight memory string from recent chat summaries. Cached for 90s."""
         cache_key = f"horus:memory:{user_id}"
         if redis_client.enabled:
-            cached = redis_client.get(cache_key)
+            cached = await redis_client.get(cache_key)
             if cached:
-                return cached.decode("utf-8") if isinstance(cached, bytes) else str(cached)
+                return cached
 
         try:
             from app.core.db import db as prisma_client
-            institution_id = None
-            try:
-                user_obj = await prisma_client.user.find_unique(where={"id": user_id})
-                institution_id = getattr(user_obj, "institutionId", None) if user_obj else None
-            except Exception:
-                institution_id = None
+            if institution_id is None:
+                try:
+                    institution_id = await self._resolve_institution_id(user_id)
+                except Exception:
+                    institution_id = None
             durable_memory = await HorusMemoryService.get_context(user_id, institution_id=institution_id)
             recent_chats = await prisma_client.chat.find_many(
                 where={"userId": user_id},
@@ -785,7 +874,7 @@ class HorusService:
             full_memory = "\n\n".join(part for part in [durable_memory, recent_memory] if part)
             
             if redis_client.enabled:
-                redis_client.set(cache_key, full_memory, ex=90)
+                await redis_client.set(cache_key, full_memory, ex=90)
             
             return full_memory
         except Exception as e:
@@ -993,15 +1082,26 @@ class HorusService:
 
                 fast_messages = [{"role": "user", "content": message or ""}]
                 _fast_history_messages: List[Any] | None = None
+                fast_summary_segment = PromptSegment.text("summary", PROMPT_PRIORITIES["summary"], None)
                 try:
-                    history = await asyncio.wait_for(
-                        ChatService.get_chat(chat_id, user_id, message_limit=6),
+                    history, chat_summary = await asyncio.wait_for(
+                        asyncio.gather(
+                            ChatService.get_chat(chat_id, user_id, message_limit=conversation_summary.HORUS_HISTORY_WINDOW),
+                            conversation_summary.get_summary(chat_id),
+                            return_exceptions=True,
+                        ),
                         timeout=1.5,
                     )
+                    if isinstance(history, Exception):
+                        raise history
+                    if isinstance(chat_summary, Exception):
+                        chat_summary = None
                     if history and getattr(history, "messages", None):
                         _fast_history_messages = history.messages
-                        raw = [{"role": m.role, "content": m.content} for m in history.messages[-12:]]
-                        fast_messages = self._trim_history_to_budget(raw)
+                        recent_history, fast_summary_segment = self._summarized_history(
+                            chat_id, user_id, history.messages, chat_summary, background_tasks
+                        )
+                        fast_messages = [{"role": m.role, "content": m.content} for m in recent_history]
                         if message and not any(m["content"] == message for m in fast_messages):
                             fast_messages.append({"role": "user", "content": message})
                 except Exception:
@@ -1063,30 +1163,37 @@ class HorusService:
                             ),
                             timeout=retrieval_plan.budget_seconds,
                         )
-                        if rag_fast:
-                            rag_fast = "\n" + rag_fast
                     except Exception as e:
                         logger.debug(f"Fast path RAG skipped: {e}")
 
+                fast_context = (
+                    f"You are Horus, the AI compliance advisor built into the Ayn platform. "
+                    f"{AYN_PLATFORM_DESCRIPTION} "
+                    f"The user's name is {user_name} (email: {user_email}, role: {user_role}).{institution_line} "
+                    f"Address them naturally by name when appropriate in the final response (never in internal reasoning/thoughts). Never say 'Hello User' — use their actual name or a neutral 'Hello'/'Hi'. "
+                    f"Answer conversational and general questions immediately and clearly. Stream your response token-by-token; do not buffer. "
+                    f"Prefer the shortest complete useful answer. "
+                    f"Do not claim you accessed platform state unless explicitly requested. "
+                    f"{_fast_lang_directive}"
+                    f"{memory_line}"
+                )
+                fast_packed = self._pack_prompt([
+                    PromptSegment.text("system", PROMPT_PRIORITIES["system"], fast_context, truncatable=False),
+                    fast_summary_segment,
+                    self._rag_segment(rag_fast),
+                    self._history_segment(fast_messages),
+                ])
+                fast_messages = fast_packed.messages("history")
+                # The chat summary rides along with the excerpts in the fast context.
+                rag_fast = fast_packed.text("summary", "rag")
+                if rag_fast:
+                    rag_fast = "\n" + rag_fast
+
                 # Emit citations before streaming when RAG sources available
                 if rag_sources:
                     yield f"__CITATION__:{json.dumps(rag_sources)}\n"
                     await asyncio.sleep(0)
-                gen = client.stream_chat(
-                    messages=fast_messages,
-                    context=(
-                        f"You are Horus, the AI compliance advisor built into the Ayn platform. "
-                        f"{AYN_PLATFORM_DESCRIPTION} "
-                        f"The user's name is {user_name} (email: {user_email}, role: {user_role}).{institution_line} "
-                        f"Address them naturally by name when appropriate in the final response (never in internal reasoning/thoughts). Never say 'Hello User' — use their actual name or a neutral 'Hello'/'Hi'. "
-                        f"Answer conversational and general questions immediately and clearly. Stream your response token-by-token; do not buffer. "
-                        f"Prefer the shortest complete useful answer. "
-                        f"Do not claim you accessed platform state unless explicitly requested. "
-                        f"{_fast_lang_directive}"
-                        f"{memory_line}"
-                        f"{rag_fast}"
-                    ),
-                )
+                gen = client.stream_chat(messages=fast_messages, context=f"{fast_context}{rag_fast}")
                 try:
                     first = await asyncio.wait_for(gen.__anext__(), timeout=8.0)
                 except StopAsyncIteration:
@@ -1207,17 +1314,6 @@ class HorusService:
         yield "__THINKING__:Preparing your request...\n"
         await asyncio.sleep(0)
 
-        user_identity_task = asyncio.create_task(self._resolve_user_identity(user_id, current_user))
-        active_goal_task = asyncio.create_task(self._get_active_goal(user_id, chat_id))
-        user_identity = await self._with_budget(
-            "identity",
-            user_identity_task,
-            default=self._default_user_identity(current_user),
-            correlation_id=corr_id,
-        )
-        active_goal = await self._with_budget("goal", active_goal_task, default=None, correlation_id=corr_id)
-
-        # ── AGENT PLANNER + TOOL EXECUTION ────────────────────────────────────
         # Allow agent with files when: Agent mode selected, or message has platform keywords (e.g. "حلل", "analyze", "gaps")
         allow_agent_with_files = agent_intent.get("intent") in {"platform_action", "multi_step_workflow"}
         is_confirmation_control = bool(
@@ -1233,874 +1329,887 @@ class HorusService:
             and request_mode != "think"
             and (not files or allow_agent_with_files)
         )
-        if message and (is_confirmation_control or should_run_agent_planner):
-            try:
-                prisma_client = db
-                user_obj = await prisma_client.user.find_unique(where={"id": user_id})
-                institution_id = getattr(user_obj, "institutionId", None) if user_obj else None
-                current_user_dict = current_user if isinstance(current_user, dict) else {
-                    "id": user_id,
-                    "email": getattr(current_user, "email", ""),
-                    "role": getattr(current_user, "role", "USER"),
-                    "institutionId": institution_id,
-                }
-
-                # 1) Resolve pending confirmation command first.
-                _pending_cleanup_stale()
-                confirm_id = self._extract_control_token(message, "__CONFIRM_ACTION__:")
-                cancel_id = self._extract_control_token(message, "__CANCEL_ACTION__:")
-
-                if message.startswith("__CONFIRM_ACTION__:"):
-                    pending = _pending_get(confirm_id)
-                    if not confirm_id or not pending or not self._pending_matches_scope(pending, user_id, chat_id):
-                        invalid_text = "That confirmation request is invalid or expired. Please run the action again."
-                        yield invalid_text
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", invalid_text)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", invalid_text)
-                        return
-
-                    tool_name = pending["tool_name"]
-                    args = pending.get("args", {})
-                    yield "__THINKING__:Executing confirmed action...\n"
-
-                    if tool_name == "__plan__":
-                        plan_steps = pending.get("plan_steps", [])
-                        plan_output = await self._execute_agent_plan(
-                            plan_steps=plan_steps,
-                            db=prisma_client,
-                            user_id=user_id,
-                            institution_id=institution_id,
-                            current_user=current_user_dict,
-                            background_tasks=background_tasks,
-                            correlation_id=corr_id,
-                            confirmed=True,
-                        )
-                        _pending_pop(confirm_id)
-                        if plan_output["last_structured"]:
-                            yield f"__ACTION_RESULT__:{json.dumps(plan_output['last_structured'])}\n"
-                        if plan_output["summary_text"]:
-                            yield ("\n" if plan_output["last_structured"] else "") + plan_output["summary_text"]
-                        plan_meta = {"structuredResult": plan_output["last_structured"]} if plan_output["last_structured"] else None
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
-                        return
-                    else:
-                        tool_result = await execute_tool(
-                            tool_name=tool_name,
-                            args=args,
-                            db=prisma_client,
-                            user_id=user_id,
-                            institution_id=institution_id,
-                            current_user=current_user_dict,
-                            request_mode=request_mode,
-                            confirmed=True,
-                        )
-                        _pending_pop(confirm_id)
+        runs_agent_path = bool(message and (is_confirmation_control or should_run_agent_planner))
 
-                        if tool_result.get("type") in STRUCTURED_RESULT_TYPES:
-                            yield f"__ACTION_RESULT__:{json.dumps(tool_result)}\n"
+        # Every context source starts now and runs concurrently within its budget.
+        # The agent path often answers on its own, so there only identity and goal
+        # start up front; the rest starts if it falls through to chat.
+        context_assembler = ContextAssembler(
+            self._context_sources(
+                user_id=user_id,
+                chat_id=chat_id,
+                current_user=current_user,
+                message=message,
+                with_platform_context=not files,
+            ),
+            correlation_id=corr_id,
+        )
+        if runs_agent_path:
+            context_assembler.start("identity", "goal")
+        else:
+            context_assembler.start()
+        try:
+            user_identity = await context_assembler.get("identity")
+            active_goal = await context_assembler.get("goal")
 
-                        await self._log_agent_action(
-                            user_id=user_id,
-                            tool_name=tool_name,
-                            args=args,
-                            result=tool_result,
-                            background_tasks=background_tasks,
-                            phase="confirmed",
-                            correlation_id=corr_id,
-                        )
+            # ── AGENT PLANNER + TOOL EXECUTION ────────────────────────────────────
+            if runs_agent_path:
+                try:
+                    prisma_client = db
+                    # Not budgeted: tools must never run without the caller's institution scope.
+                    institution_id = await self._resolve_institution_id(user_id, current_user)
+                    current_user_dict = current_user if isinstance(current_user, dict) else {
+                        "id": user_id,
+                        "email": getattr(current_user, "email", ""),
+                        "role": getattr(current_user, "role", "USER"),
+                        "institutionId": institution_id,
+                    }
+
+                    # 1) Resolve pending confirmation command first.
+                    _pending_cleanup_stale()
+                    confirm_id = self._extract_control_token(message, "__CONFIRM_ACTION__:")
+                    cancel_id = self._extract_control_token(message, "__CANCEL_ACTION__:")
+
+                    if message.startswith("__CONFIRM_ACTION__:"):
+                        pending = await _pending_get(confirm_id)
+                        if not confirm_id or not pending or not self._pending_matches_scope(pending, user_id, chat_id):
+                            invalid_text = "That confirmation request is invalid or expired. Please run the action again."
+                            yield invalid_text
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", invalid_text)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "assistant", invalid_text)
+                            return
 
-                        narrative_text = self._summarize_tool_result(tool_name, tool_result, message)
-                        if narrative_text:
-                            yield ("\n" if tool_result.get("type") in STRUCTURED_RESULT_TYPES else "") + narrative_text
+                        tool_name = pending["tool_name"]
+                        args = pending.get("args", {})
+                        yield "__THINKING__:Executing confirmed action...\n"
 
-                        msg_metadata = {"structuredResult": tool_result} if tool_result.get("type") in STRUCTURED_RESULT_TYPES else None
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", narrative_text, msg_metadata)
+                        if tool_name == "__plan__":
+                            plan_steps = pending.get("plan_steps", [])
+                            plan_output = await self._execute_agent_plan(
+                                plan_steps=plan_steps,
+                                db=prisma_client,
+                                user_id=user_id,
+                                institution_id=institution_id,
+                                current_user=current_user_dict,
+                                background_tasks=background_tasks,
+                                correlation_id=corr_id,
+                                confirmed=True,
+                            )
+                            await _pending_pop(confirm_id)
+                            if plan_output["last_structured"]:
+                                yield f"__ACTION_RESULT__:{json.dumps(plan_output['last_structured'])}\n"
+                            if plan_output["summary_text"]:
+                                yield ("\n" if plan_output["last_structured"] else "") + plan_output["summary_text"]
+                            plan_meta = {"structuredResult": plan_output["last_structured"]} if plan_output["last_structured"] else None
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
+                            return
                         else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", narrative_text, msg_metadata)
-                        return
+                            tool_result = await execute_tool(
+                                tool_name=tool_name,
+                                args=args,
+                                db=prisma_client,
+                                user_id=user_id,
+                                institution_id=institution_id,
+                                current_user=current_user_dict,
+                                request_mode=request_mode,
+                                confirmed=True,
+                            )
+                            await _pending_pop(confirm_id)
 
-                if message.startswith("__CANCEL_ACTION__:"):
-                    pending = _pending_get(cancel_id)
-                    if not cancel_id or not pending or not self._pending_matches_scope(pending, user_id, chat_id):
-                        cancelled_text = "That confirmation request is no longer active."
-                        yield cancelled_text
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", cancelled_text)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", cancelled_text)
-                        return
+                            if tool_result.get("type") in STRUCTURED_RESULT_TYPES:
+                                yield f"__ACTION_RESULT__:{json.dumps(tool_result)}\n"
 
-                    _pending_pop(cancel_id)
-                    cancelled_text = "Understood. I canceled that action."
-                    yield cancelled_text
-                    if background_tasks:
-                        background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", cancelled_text)
-                    else:
-                        await ChatService.save_message(chat_id, user_id, "assistant", cancelled_text)
-                    return
+                            await self._log_agent_action(
+                                user_id=user_id,
+                                tool_name=tool_name,
+                                args=args,
+                                result=tool_result,
+                                background_tasks=background_tasks,
+                                phase="confirmed",
+                                correlation_id=corr_id,
+                            )
 
-                # 2) Normal planner path.
-                snapshot = await build_agent_context(
-                    db=prisma_client,
-                    user_id=user_id,
-                    institution_id=institution_id,
-                    user_identity=user_identity,
-                )
-                plan = await self._plan_agent_action(
-                    client=client,
-                    message=message,
-                    platform_snapshot=snapshot,
-                    goal=active_goal,
-                    mode=request_mode,
-                    agent_intent=agent_intent,
-                )
+                            narrative_text = self._summarize_tool_result(tool_name, tool_result, message)
+                            if narrative_text:
+                                yield ("\n" if tool_result.get("type") in STRUCTURED_RESULT_TYPES else "") + narrative_text
 
-                if plan and plan.get("mode") == "tool":
-                    tool_name = plan.get("tool")
-                    args = plan.get("arguments", {}) or {}
-                    if tool_name in TOOL_REGISTRY:
-                        yield f"__AGENT_RUN__:{json.dumps({'mode': request_mode or 'agent', 'intent': agent_intent['intent'] if agent_intent else 'platform_action', 'route': 'tool', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': plan.get('reason') or 'A single tool can answer this request most directly.', 'tool': tool_name, 'step_count': 1})}\n"
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "user", message, user_metadata)
-
-                        tool_meta = get_tool_ui_meta(tool_name)
-                        yield "__THINKING__:Fetching platform data...\n"
-                        yield f"__THINKING__:Identified action: {tool_meta['title']}\n"
-                        yield f"__THINKING__:Preparing {tool_meta['prepare_text']}...\n"
-
-                        if requires_explicit_confirmation(tool_name):
-                            confirm_id = str(uuid4())
-                            description = tool_meta["description"]
-                            _pending_set(confirm_id, {
-                                "user_id": user_id,
-                                "chat_id": chat_id,
-                                "tool_name": tool_name,
-                                "args": args,
-                                "description": description,
-                                "created_at": datetime.now(timezone.utc).isoformat(),
-                            })
-                            confirm_payload = {
-                                "id": confirm_id,
-                                "tool": tool_name,
-                                "title": tool_meta["title"],
-                                "description": description,
-                            }
-                            yield f"__ACTION_CONFIRM__:{json.dumps(confirm_payload)}\n"
+                            msg_metadata = {"structuredResult": tool_result} if tool_result.get("type") in STRUCTURED_RESULT_TYPES else None
                             if background_tasks:
-                                background_tasks.add_task(
-                                    ChatService.save_message,
-                                    chat_id,
-                                    user_id,
-                                    "assistant",
-                                    f"Confirmation required before '{tool_meta['title']}'.",
-                                )
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", narrative_text, msg_metadata)
                             else:
-                                await ChatService.save_message(
-                                    chat_id,
-                                    user_id,
-                                    "assistant",
-                                    f"Confirmation required before '{tool_meta['title']}'.",
-                                )
+                                await ChatService.save_message(chat_id, user_id, "assistant", narrative_text, msg_metadata)
                             return
 
-                        yield f"__TOOL_STEP__:{json.dumps({'step': 1, 'total': 1, 'tool': tool_name, 'title': tool_meta['title'], 'status': 'running', 'estimated_duration_ms': tool_meta.get('estimated_duration_ms', 3000)})}\n"
-                        tool_result = await execute_tool(
-                            tool_name=tool_name,
-                            args=args,
-                            db=prisma_client,
-                            user_id=user_id,
-                            institution_id=institution_id,
-                            current_user=current_user_dict,
-                            request_mode=request_mode,
-                            confirmed=False,
-                        )
-                        yield f"__TOOL_STEP__:{json.dumps({'step': 1, 'total': 1, 'tool': tool_name, 'title': tool_meta['title'], 'status': 'done' if tool_result.get('type') != 'action_error' else 'error', 'result_type': tool_result.get('type', 'unknown')})}\n"
-
-                        if tool_result.get("type") in STRUCTURED_RESULT_TYPES and tool_result.get("type") != "action_error":
-                            yield f"__ACTION_RESULT__:{json.dumps(tool_result)}\n"
-
-                        await self._log_agent_action(
-                            user_id=user_id,
-                            tool_name=tool_name,
-                            args=args,
-                            result=tool_result,
-                            background_tasks=background_tasks,
-                            phase="auto",
-                            correlation_id=corr_id,
-                        )
-
-                        narrative_text = self._summarize_tool_result(tool_name, tool_result, message)
-                        if narrative_text:
-                            if tool_result.get("type") in STRUCTURED_RESULT_TYPES:
-                                yield "\n" + narrative_text
+                    if message.startswith("__CANCEL_ACTION__:"):
+                        pending = await _pending_get(cancel_id)
+                        if not cancel_id or not pending or not self._pending_matches_scope(pending, user_id, chat_id):
+                            cancelled_text = "That confirmation request is no longer active."
+                            yield cancelled_text
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", cancelled_text)
                             else:
-                                yield narrative_text
+                                await ChatService.save_message(chat_id, user_id, "assistant", cancelled_text)
+                            return
 
-                        msg_metadata = {"structuredResult": tool_result} if tool_result.get("type") in STRUCTURED_RESULT_TYPES else None
+                        await _pending_pop(cancel_id)
+                        cancelled_text = "Understood. I canceled that action."
+                        yield cancelled_text
                         if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", narrative_text, msg_metadata)
+                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", cancelled_text)
                         else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", narrative_text, msg_metadata)
+                            await ChatService.save_message(chat_id, user_id, "assistant", cancelled_text)
                         return
-                elif plan and plan.get("mode") == "plan":
-                    raw_steps = plan.get("steps", [])
-                    plan_steps = self._normalize_plan_steps(raw_steps)
-                    if plan_steps:
-                        yield f"__AGENT_RUN__:{json.dumps({'mode': request_mode or 'agent', 'intent': agent_intent['intent'] if agent_intent else 'multi_step_workflow', 'route': 'plan', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': plan.get('reason') or 'This request is best handled as a short multi-step workflow.', 'step_count': len(plan_steps), 'tools': [step['tool'] for step in plan_steps]})}\n"
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "user", message, user_metadata)
-
-                        has_mutating = any(requires_explicit_confirmation(step["tool"]) for step in plan_steps)
-                        if has_mutating:
-                            confirm_id = str(uuid4())
-                            _pending_set(confirm_id, {
-                                "user_id": user_id,
-                                "chat_id": chat_id,
-                                "tool_name": "__plan__",
-                                "plan_steps": plan_steps,
-                                "description": f"Run a {len(plan_steps)}-step agent plan including write operations.",
-                                "created_at": datetime.now(timezone.utc).isoformat(),
-                            })
-                            confirm_payload = {
-                                "id": confirm_id,
-                                "tool": "__plan__",
-                                "title": "Execute multi-step plan",
-                                "description": f"Horus prepared {len(plan_steps)} steps. Confirmation required for mutating actions.",
-                            }
-                            yield "__THINKING__:Prepared a multi-step plan...\n"
-                            yield f"__ACTION_CONFIRM__:{json.dumps(confirm_payload)}\n"
-                            if background_tasks:
-                                background_tasks.add_task(
-                                    ChatService.save_message,
-                                    chat_id,
-                                    user_id,
-                                    "assistant",
-                                    "Confirmation required before executing the multi-step plan.",
-                                )
-                            else:
-                                await ChatService.save_message(
-                                    chat_id,
-                                    user_id,
-                                    "assistant",
-                                    "Confirmation required before executing the multi-step plan.",
-                                )
-                            return
 
-                        yield "__THINKING__:Executing multi-step plan...\n"
-                        chunk_queue: asyncio.Queue[str | None] = asyncio.Queue()
+                    # 2) Normal planner path.
+                    snapshot = await build_agent_context(
+                        db=prisma_client,
+                        user_id=user_id,
+                        institution_id=institution_id,
+                        user_identity=user_identity,
+                    )
+                    plan = await self._plan_agent_action(
+                        client=client,
+                        message=message,
+                        platform_snapshot=snapshot,
+                        goal=active_goal,
+                        mode=request_mode,
+                        agent_intent=agent_intent,
+                    )
 
-                        def put_chunk(c: str) -> None:
-                            chunk_queue.put_nowait(c)
+                    if plan and plan.get("mode") == "tool":
+                        tool_name = plan.get("tool")
+                        args = plan.get("arguments", {}) or {}
+                        if tool_name in TOOL_REGISTRY:
+                            yield f"__AGENT_RUN__:{json.dumps({'mode': request_mode or 'agent', 'intent': agent_intent['intent'] if agent_intent else 'platform_action', 'route': 'tool', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': plan.get('reason') or 'A single tool can answer this request most directly.', 'tool': tool_name, 'step_count': 1})}\n"
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "user", message, user_metadata)
+
+                            tool_meta = get_tool_ui_meta(tool_name)
+                            yield "__THINKING__:Fetching platform data...\n"
+                            yield f"__THINKING__:Identified action: {tool_meta['title']}\n"
+                            yield f"__THINKING__:Preparing {tool_meta['prepare_text']}...\n"
+
+                            if requires_explicit_confirmation(tool_name):
+                                confirm_id = str(uuid4())
+                                description = tool_meta["description"]
+                                await _pending_set(confirm_id, {
+                                    "user_id": user_id,
+                                    "chat_id": chat_id,
+                                    "tool_name": tool_name,
+                                    "args": args,
+                                    "description": description,
+                                    "created_at": datetime.now(timezone.utc).isoformat(),
+                                })
+                                confirm_payload = {
+                                    "id": confirm_id,
+                                    "tool": tool_name,
+                                    "title": tool_meta["title"],
+                                    "description": description,
+                                }
+                                yield f"__ACTION_CONFIRM__:{json.dumps(confirm_payload)}\n"
+                                if background_tasks:
+                                    background_tasks.add_task(
+                                        ChatService.save_message,
+                                        chat_id,
+                                        user_id,
+                                        "assistant",
+                                        f"Confirmation required before '{tool_meta['title']}'.",
+                                    )
+                                else:
+                                    await ChatService.save_message(
+                                        chat_id,
+                                        user_id,
+                                        "assistant",
+                                        f"Confirmation required before '{tool_meta['title']}'.",
+                                    )
+                                return
 
-                        async def run_plan() -> dict:
-                            return await self._execute_agent_plan(
-                                plan_steps=plan_steps,
+                            yield f"__TOOL_STEP__:{json.dumps({'step': 1, 'total': 1, 'tool': tool_name, 'title': tool_meta['title'], 'status': 'running', 'estimated_duration_ms': tool_meta.get('estimated_duration_ms', 3000)})}\n"
+                            tool_result = await execute_tool(
+                                tool_name=tool_name,
+                                args=args,
                                 db=prisma_client,
                                 user_id=user_id,
                                 institution_id=institution_id,
                                 current_user=current_user_dict,
-                                background_tasks=background_tasks,
-                                yield_chunk=put_chunk,
-                                correlation_id=corr_id,
+                                request_mode=request_mode,
                                 confirmed=False,
                             )
+                            yield f"__TOOL_STEP__:{json.dumps({'step': 1, 'total': 1, 'tool': tool_name, 'title': tool_meta['title'], 'status': 'done' if tool_result.get('type') != 'action_error' else 'error', 'result_type': tool_result.get('type', 'unknown')})}\n"
 
-                        plan_task = asyncio.create_task(run_plan())
-                        emitted_action_result = False
-                        while True:
-                            try:
-                                chunk = await asyncio.wait_for(chunk_queue.get(), timeout=0.05)
-                            except asyncio.TimeoutError:
-                                if plan_task.done():
-                                    break
-                                continue
-                            if chunk is None:
-                                break
-                            if "__ACTION_RESULT__" in chunk:
-                                emitted_action_result = True
-                            yield chunk
-                        while not chunk_queue.empty():
-                            try:
-                                chunk = chunk_queue.get_nowait()
-                            except asyncio.QueueEmpty:
-                                break
-                            if chunk and chunk is not None:
-                                if "__ACTION_RESULT__" in chunk:
-                                    emitted_action_result = True
-                                yield chunk
-                        plan_output = await plan_task
-                        tool_results = plan_output.get("tool_results", [])
-                        has_failures = any(tr.get("result", {}).get("type") == "action_error" for tr in tool_results)
-
-                        # Reflection: re-plan on failure (once)
-                        if has_failures and tool_results:
-                            yield "__THINKING__:Reflecting after failure…\n"
-                            re_plan = await self._plan_with_observations(
-                                client=client,
-                                message=message,
-                                platform_snapshot=snapshot,
-                                tool_results=tool_results,
-                                goal=active_goal,
+                            if tool_result.get("type") in STRUCTURED_RESULT_TYPES and tool_result.get("type") != "action_error":
+                                yield f"__ACTION_RESULT__:{json.dumps(tool_result)}\n"
+
+                            await self._log_agent_action(
+                                user_id=user_id,
+                                tool_name=tool_name,
+                                args=args,
+                                result=tool_result,
+                                background_tasks=background_tasks,
+                                phase="auto",
+                                correlation_id=corr_id,
                             )
-                            if re_plan and re_plan.get("mode") == "chat":
-                                fallback_msg = re_plan.get("response") or re_plan.get("reason") or plan_output["summary_text"]
-                                if fallback_msg:
-                                    yield fallback_msg
+
+                            narrative_text = self._summarize_tool_result(tool_name, tool_result, message)
+                            if narrative_text:
+                                if tool_result.get("type") in STRUCTURED_RESULT_TYPES:
+                                    yield "\n" + narrative_text
+                                else:
+                                    yield narrative_text
+
+                            msg_metadata = {"structuredResult": tool_result} if tool_result.get("type") in STRUCTURED_RESULT_TYPES else None
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", narrative_text, msg_metadata)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "assistant", narrative_text, msg_metadata)
+                            return
+                    elif plan and plan.get("mode") == "plan":
+                        raw_steps = plan.get("steps", [])
+                        plan_steps = self._normalize_plan_steps(raw_steps)
+                        if plan_steps:
+                            yield f"__AGENT_RUN__:{json.dumps({'mode': request_mode or 'agent', 'intent': agent_intent['intent'] if agent_intent else 'multi_step_workflow', 'route': 'plan', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': plan.get('reason') or 'This request is best handled as a short multi-step workflow.', 'step_count': len(plan_steps), 'tools': [step['tool'] for step in plan_steps]})}\n"
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "user", message, user_metadata)
+
+                            has_mutating = any(requires_explicit_confirmation(step["tool"]) for step in plan_steps)
+                            if has_mutating:
+                                confirm_id = str(uuid4())
+                                await _pending_set(confirm_id, {
+                                    "user_id": user_id,
+                                    "chat_id": chat_id,
+                                    "tool_name": "__plan__",
+                                    "plan_steps": plan_steps,
+                                    "description": f"Run a {len(plan_steps)}-step agent plan including write operations.",
+                                    "created_at": datetime.now(timezone.utc).isoformat(),
+                                })
+                                confirm_payload = {
+                                    "id": confirm_id,
+                                    "tool": "__plan__",
+                                    "title": "Execute multi-step plan",
+                                    "description": f"Horus prepared {len(plan_steps)} steps. Confirmation required for mutating actions.",
+                                }
+                                yield "__THINKING__:Prepared a multi-step plan...\n"
+                                yield f"__ACTION_CONFIRM__:{json.dumps(confirm_payload)}\n"
                                 if background_tasks:
-                                    background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", fallback_msg)
+                                    background_tasks.add_task(
+                                        ChatService.save_message,
+                                        chat_id,
+                                        user_id,
+                                        "assistant",
+                                        "Confirmation required before executing the multi-step plan.",
+                                    )
                                 else:
-                                    await ChatService.save_message(chat_id, user_id, "assistant", fallback_msg)
+                                    await ChatService.save_message(
+                                        chat_id,
+                                        user_id,
+                                        "assistant",
+                                        "Confirmation required before executing the multi-step plan.",
+                                    )
                                 return
 
-                        if plan_output["last_structured"] and not emitted_action_result:
-                            yield f"__ACTION_RESULT__:{json.dumps(plan_output['last_structured'])}\n"
-                        if plan_output["summary_text"]:
-                            yield ("\n" if plan_output["last_structured"] else "") + plan_output["summary_text"]
-                        plan_meta = {"structuredResult": plan_output["last_structured"]} if plan_output["last_structured"] else None
-                        if background_tasks:
-                            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
-                        else:
-                            await ChatService.save_message(chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
-                        return
-            except Exception as agent_err:
-                logger.error(f"Agent planner/tool execution failed: {agent_err}", exc_info=True)
-        
-        # 2. Parallelize ALL initial operations for speed
-        async def process_file(part: dict[str, Any]):
-            content = self._read_buffered_body(part)
-            file_payload = self._build_file_payload(part)
-            extraction = extract_text_cached(
-                content=content,
-                filename=file_payload["filename"],
-                mime_type=file_payload["mime_type"],
-                sha256=file_payload.get("sha256"),
-            )
-            if extraction.get("text"):
-                file_payload["extracted_text"] = extraction["text"]
-                file_payload["extraction_cache_hit"] = extraction.get("cache_hit", False)
-            mime_for_upload = file_payload["mime_type"] if file_payload["mime_type"] in ALLOWED_FILE_TYPES else "application/octet-stream"
-            if store_as_evidence and content:
-                meta = SimpleNamespace(filename=file_payload["filename"], content_type=mime_for_upload)
-                try:
-                    upload_result = await EvidenceService.upload_evidence(
-                        meta,  # duck-typed; body passed as file_content
-                        current_user,
-                        background_tasks,
-                        file_content=content,
-                    )
-                    if upload_result.success:
-                        file_payload["evidenceId"] = upload_result.evidenceId
-                except Exception as upload_err:
-                    logger.warning(f"Evidence upload failed, continuing with AI analysis: {upload_err}")
-            return file_payload
+                            yield "__THINKING__:Executing multi-step plan...\n"
+                            chunk_queue: asyncio.Queue[str | None] = asyncio.Queue()
 
-        async def fetch_mappings_context(uid: str):
-            try:
-                from app.core.db import db as prisma_client
-                user_obj = await prisma_client.user.find_unique(where={"id": uid})
-                if user_obj and user_obj.institutionId:
-                    mappings = await prisma_client.criteriamapping.find_many(
-                        where={"institutionId": user_obj.institutionId},
-                        include={"criterion": True}
-                    )
-                    if mappings:
-                        met = len([m for m in mappings if m.status == "met"])
-                        total = len(mappings)
-                        gap_mappings = [m for m in mappings if m.status == "gap"]
-                        gap_titles = [m.criterion.title for m in gap_mappings[:3] if m.criterion]
-                        gap_str = ", ".join(gap_titles) if gap_titles else "None"
-                        return f"CRITERIA MAPPINGS: {met}/{total} criteria met across all standards.\nCritical gaps: {gap_str}"
-            except Exception as e:
-                logger.error(f"Failed to fetch criteria mappings context: {e}")
-            return ""
+                            def put_chunk(c: str) -> None:
+                                chunk_queue.put_nowait(c)
 
-        tasks = []
-        if not files:
-            tasks.extend([
-                self._with_budget("state_summary", self.state_manager.get_state_summary(user_id), default=None, correlation_id=corr_id),
-                self._with_budget("recent_activities", ActivityService.get_recent_activities(user_id, limit=5), default=[], correlation_id=corr_id),
-                self._with_budget("mappings", fetch_mappings_context(user_id), default="", correlation_id=corr_id),
-            ])
+                            async def run_plan() -> dict:
+                                return await self._execute_agent_plan(
+                                    plan_steps=plan_steps,
+                                    db=prisma_client,
+                                    user_id=user_id,
+                                    institution_id=institution_id,
+                                    current_user=current_user_dict,
+                                    background_tasks=background_tasks,
+                                    yield_chunk=put_chunk,
+                                    correlation_id=corr_id,
+                                    confirmed=False,
+                                )
+
+                            plan_task = asyncio.create_task(run_plan())
+                            emitted_action_result = False
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(chunk_queue.get(), timeout=0.05)
+                                except asyncio.TimeoutError:
+                                    if plan_task.done():
+                                        break
+                                    continue
+                                if chunk is None:
+                                    break
+                                if "__ACTION_RESULT__" in chunk:
+                                    emitted_action_result = True
+                                yield chunk
+                            while not chunk_queue.empty():
+                                try:
+                                    chunk = chunk_queue.get_nowait()
+                                except asyncio.QueueEmpty:
+                                    break
+                                if chunk and chunk is not None:
+                                    if "__ACTION_RESULT__" in chunk:
+                                        emitted_action_result = True
+                                    yield chunk
+                            plan_output = await plan_task
+                            tool_results = plan_output.get("tool_results", [])
+                            has_failures = any(tr.get("result", {}).get("type") == "action_error" for tr in tool_results)
+
+                            # Reflection: re-plan on failure (once)
+                            if has_failures and tool_results:
+                                yield "__THINKING__:Reflecting after failure…\n"
+                                re_plan = await self._plan_with_observations(
+                                    client=client,
+                                    message=message,
+                                    platform_snapshot=snapshot,
+                                    tool_results=tool_results,
+                                    goal=active_goal,
+                                )
+                                if re_plan and re_plan.get("mode") == "chat":
+                                    fallback_msg = re_plan.get("response") or re_plan.get("reason") or plan_output["summary_text"]
+                                    if fallback_msg:
+                                        yield fallback_msg
+                                    if background_tasks:
+                                        background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", fallback_msg)
+                                    else:
+                                        await ChatService.save_message(chat_id, user_id, "assistant", fallback_msg)
+                                    return
+
+                            if plan_output["last_structured"] and not emitted_action_result:
+                                yield f"__ACTION_RESULT__:{json.dumps(plan_output['last_structured'])}\n"
+                            if plan_output["summary_text"]:
+                                yield ("\n" if plan_output["last_structured"] else "") + plan_output["summary_text"]
+                            plan_meta = {"structuredResult": plan_output["last_structured"]} if plan_output["last_structured"] else None
+                            if background_tasks:
+                                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
+                            else:
+                                await ChatService.save_message(chat_id, user_id, "assistant", plan_output["summary_text"], plan_meta)
+                            return
+                except Exception as agent_err:
+                    logger.error(f"Agent planner/tool execution failed: {agent_err}", exc_info=True)
         
-        # Add file processing tasks if any
-        if files:
-            tasks.extend([process_file(f) for f in files])
+            # 2. Parallelize ALL initial operations for speed
+            async def process_file(part: dict[str, Any]):
+                content = self._read_buffered_body(part)
+                file_payload = self._build_file_payload(part)
+                extraction = await extract_text_cached(
+                    content=content,
+                    filename=file_payload["filename"],
+                    mime_type=file_payload["mime_type"],
+                    sha256=file_payload.get("sha256"),
+                )
+                if extraction.get("text"):
+                    file_payload["extracted_text"] = extraction["text"]
+                    file_payload["extraction_cache_hit"] = extraction.get("cache_hit", False)
+                mime_for_upload = file_payload["mime_type"] if file_payload["mime_type"] in ALLOWED_FILE_TYPES else "application/octet-stream"
+                if store_as_evidence and content:
+                    meta = SimpleNamespace(filename=file_payload["filename"], content_type=mime_for_upload)
+                    try:
+                        upload_result = await EvidenceService.upload_evidence(
+                            meta,  # duck-typed; body passed as file_content
+                            current_user,
+                            background_tasks,
+                            file_content=content,
+                        )
+                        if upload_result.success:
+                            file_payload["evidenceId"] = upload_result.evidenceId
+                    except Exception as upload_err:
+                        logger.warning(f"Evidence upload failed, continuing with AI analysis: {upload_err}")
+                return file_payload
+
+            # No-op unless the agent path deferred the remaining context sources.
+            context_assembler.start()
+            tasks = [process_file(f) for f in files] if files else []
         
-        # Save user message in background to avoid blocking
-        if message:
-            if background_tasks:
-                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
+            # Save user message in background to avoid blocking
+            if message:
+                if background_tasks:
+                    background_tasks.add_task(ChatService.save_message, chat_id, user_id, "user", message, user_metadata)
+                else:
+                    asyncio.create_task(ChatService.save_message(chat_id, user_id, "user", message, user_metadata))
+
+            # Yield immediately so user sees feedback before any await (avoids 2–5s silence)
+            if files:
+                yield "__THINKING__:Got it, analyzing your file...\n"
+                for f in files:
+                    fn = self._buffered_part_filename(f)
+                    yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'routing', 'storage': self._file_storage(f), 'size': self._file_size(f)})}\n"
+                await asyncio.sleep(0)
             else:
-                asyncio.create_task(ChatService.save_message(chat_id, user_id, "user", message, user_metadata))
-
-        # Yield immediately so user sees feedback before any await (avoids 2–5s silence)
-        if files:
-            yield "__THINKING__:Got it, analyzing your file...\n"
-            for f in files:
-                fn = self._buffered_part_filename(f)
-                yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'routing', 'storage': self._file_storage(f), 'size': self._file_size(f)})}\n"
-            await asyncio.sleep(0)
-        else:
-            yield "__THINKING__:Checking your platform context...\n"
-            await asyncio.sleep(0)
-
-        results = await asyncio.gather(*tasks) if tasks else []
+                yield "__THINKING__:Checking your platform context...\n"
+                await asyncio.sleep(0)
 
-        if files:
-            yield "__THINKING__:Processing attached files...\n"
-            await asyncio.sleep(0)
+            results = await asyncio.gather(*tasks) if tasks else []
 
-        summary = None if files else results[0]
-        recent_activities = [] if files else results[1]
-        mapping_context = "" if files else results[2]
-        
-        # Handle dynamic results (files)
-        offset = 0 if files else 3
-        file_results = []
-        if files:
-            file_results = [r for r in results[offset:offset+len(files)] if r is not None]
-            for res in file_results:
-                fn = res.get("filename") or "file"
-                yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'done'})}\n"
-                yield f"__FILE__:{fn}\n"
+            if files:
+                yield "__THINKING__:Processing attached files...\n"
                 await asyncio.sleep(0)
-                if res.get("temp_attachment_id"):
-                    try:
-                        if background_tasks:
-                            background_tasks.add_task(
-                                ProgressiveFileAnalysis.enqueue,
-                                user_id=user_id,
-                                attachment=res,
-                                message=message,
-                            )
-                        else:
-                            asyncio.create_task(
-                                ProgressiveFileAnalysis.enqueue(
+
+            # Handle dynamic results (files)
+            file_results = []
+            if files:
+                file_results = [r for r in results if r is not None]
+                for res in file_results:
+                    fn = res.get("filename") or "file"
+                    yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'done'})}\n"
+                    yield f"__FILE__:{fn}\n"
+                    await asyncio.sleep(0)
+                    if res.get("temp_attachment_id"):
+                        try:
+                            if background_tasks:
+                                background_tasks.add_task(
+                                    ProgressiveFileAnalysis.enqueue,
                                     user_id=user_id,
                                     attachment=res,
                                     message=message,
                                 )
-                            )
-                        yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'background_queued'})}\n"
-                    except Exception as progressive_err:
-                        logger.debug("Progressive file analysis enqueue skipped: %s", progressive_err)
-
-        # Log file uploads in background
-        for res in file_results:
-            evidence_id = res.get("evidenceId")
-            if evidence_id and background_tasks:
-                background_tasks.add_task(
-                    ActivityService.log_activity,
-                    user_id=user_id,
-                    type="evidence_uploaded",
-                    title=f"File uploaded: {res['filename']}",
-                    entity_id=evidence_id,
-                    entity_type="evidence"
-                )
+                            else:
+                                asyncio.create_task(
+                                    ProgressiveFileAnalysis.enqueue(
+                                        user_id=user_id,
+                                        attachment=res,
+                                        message=message,
+                                    )
+                                )
+                            yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'background_queued'})}\n"
+                        except Exception as progressive_err:
+                            logger.debug("Progressive file analysis enqueue skipped: %s", progressive_err)
 
-        # 3. AI Interaction (Streaming)
-        # File requests use a minimal context so the model call is not blocked by
-        # platform state, RAG, or memory lookups. Text requests still get bounded
-        # context enrichment.
-        if files:
-            context = self._minimal_context(message, user_identity=user_identity, goal=active_goal)
-            memory = ""
-        else:
-            memory_task = asyncio.create_task(self._get_conversation_memory(user_id, exclude_chat_id=chat_id))
-            context_task = asyncio.create_task(self._prepare_context_sync(
-                summary,
-                recent_activities,
-                message=message,
-                mapping_context=mapping_context,
-                user_identity=user_identity,
-                goal=active_goal,
-                user_id=user_id,
-                allow_rag=self._should_use_rag(message),
-                correlation_id=corr_id,
-            ))
-            memory, context = await asyncio.gather(
-                self._with_budget("memory", memory_task, default="", correlation_id=corr_id),
-                context_task,
-            )
-            if memory:
-                context = memory + "\n\n" + context
-        
-        full_response = ""
-        
-        # Lazily fetch history without blocking initial file processing or state fetching
-        history_task = asyncio.create_task(ChatService.get_chat(chat_id, user_id, message_limit=10))
-
-        if file_results:
-            # Multimodal path only sends the current turn + files to Gemini — inject prior
-            # chat text so follow-ups (e.g. summarize) still see the last assistant answer.
-            history_for_files = await self._with_budget(
-                "history",
-                history_task,
-                default=None,
-                correlation_id=corr_id,
-            )
-            prior_transcript = self._format_prior_messages_for_file_model(
-                getattr(history_for_files, "messages", None) if history_for_files else None,
-                current_user_message=message,
-            )
-            if prior_transcript:
-                context = prior_transcript + "\n\n---\n" + context
-
-            if request_mode == "agent":
-                yield f"__AGENT_RUN__:{json.dumps({'mode': 'agent', 'intent': (agent_intent or {}).get('intent', 'file_analysis'), 'route': 'file_analysis', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': 'Agent mode stayed on direct file analysis because the attached document is the main source of truth.', 'step_count': 1})}\n"
-                await asyncio.sleep(0)
-            visual_only = all((f.get("type") == "image") for f in file_results)
-            _file_lang = self._detect_language(
-                message,
-                history=getattr(history_for_files, "messages", None) if history_for_files else None,
-            )
-            language_hint = (
-                "IMPORTANT: The user is writing in Arabic. You MUST respond in Arabic throughout your entire reply. Do not switch to English."
-                if _file_lang == "ar"
-                else "Respond in English. If the user writes in Arabic, switch to Arabic immediately."
-            )
-
-            domain_hint = (
-                f"You are Horus, the AI compliance advisor built into the Ayn platform. "
-                f"{AYN_PLATFORM_DESCRIPTION} "
-                "Always analyze the attached file(s) and answer in a normal chat style."
-            )
-            if not needs_analysis:
-                domain_hint += " Do not return JSON unless the user explicitly asked for JSON."
-            domain_hint += (
-                " If the content relates to education quality, accreditation, or academic standards, map key points to common frameworks "
-                "such as NAQAAE, ISO 21001, AACSB, ABET, or other clearly indicated frameworks, and highlight compliance gaps or missing evidence. "
-                "Do not assume a Saudi context or mention NCAAA unless the user or the document explicitly points to it. "
-                "If the user asks about Ayn itself without country context, treat Ayn as Egypt-first. "
-                "Be explicit when a mapping is uncertain."
-            )
-            if language_hint:
-                domain_hint += f" {language_hint}"
+            # Log file uploads in background
             for res in file_results:
-                fn = res.get("filename") or "file"
-                yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'analyzing'})}\n"
-            await asyncio.sleep(0)
-
-            if store_as_evidence:
-                if background_tasks:
+                evidence_id = res.get("evidenceId")
+                if evidence_id and background_tasks:
                     background_tasks.add_task(
-                        self._execute_brain_pipeline,
-                        user_id,
-                        current_user,
-                        file_results,
-                        db,
-                        needs_analysis
-                    )
-                else:
-                    asyncio.create_task(
-                        self._execute_brain_pipeline(user_id, current_user, file_results, db, needs_analysis)
+                        ActivityService.log_activity,
+                        user_id=user_id,
+                        type="evidence_uploaded",
+                        title=f"File uploaded: {res['filename']}",
+                        entity_id=evidence_id,
+                        entity_type="evidence"
                     )
-            
-            if visual_only:
-                yield "__THINKING__:Phase 1: Reading visual content...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 2: Identifying key UI elements...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 3: Summarizing observations...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 4: Finalizing response...\n"
-                await asyncio.sleep(0)
+
+            # 3. AI Interaction (Streaming)
+            # File requests use a minimal context so the model call is not blocked by
+            # platform state, RAG, or memory lookups. Text requests still get bounded
+            # context enrichment. Either way the context is kept as prompt segments and
+            # packed into the route's token budget together with the history below.
+            if files:
+                context_segments = [PromptSegment.text(
+                    "system",
+                    PROMPT_PRIORITIES["system"],
+                    self._minimal_context(message, user_identity=user_identity, goal=active_goal),
+                    truncatable=False,
+                )]
             else:
-                yield "__THINKING__:Phase 1 (Identify): Scanning document category...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 2 (Deconstruct): Splitting PDF into semantic chunks and metadata...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 3 (Analyze): Cross-referencing against internal Quality Constitution...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 4 (Score): Calculating weighted Compliance Score...\n"
-                await asyncio.sleep(0)
-                yield "__THINKING__:Phase 5 (Synthesize): Preparing Audit Report and Optimized Content...\n"
+                platform = await context_assembler.gather(
+                    "state_summary", "recent_activities", "mappings", "memory",
+                    *(["rag"] if "rag" in context_assembler else []),
+                )
+                context_segments = self._context_segments(
+                    platform["state_summary"],
+                    platform["recent_activities"],
+                    message=message,
+                    mapping_context=platform["mappings"],
+                    user_identity=user_identity,
+                    goal=active_goal,
+                    rag_context=platform.get("rag", ""),
+                )
+                context_segments.append(PromptSegment.text("memory", PROMPT_PRIORITIES["memory"], platform["memory"]))
+        
+            full_response = ""
+
+            if file_results:
+                # Multimodal path only sends the current turn + files to Gemini — inject prior
+                # chat text so follow-ups (e.g. summarize) still see the last assistant answer.
+                fetched = await context_assembler.gather("history", "summary")
+                context_assembler.log_timings()
+                history_for_files = fetched["history"]
+                recent_history, summary_segment = self._summarized_history(
+                    chat_id,
+                    user_id,
+                    getattr(history_for_files, "messages", None) if history_for_files else None,
+                    fetched["summary"],
+                    background_tasks,
+                )
+                prior_lines = self._format_prior_messages_for_file_model(recent_history, current_user_message=message)
+                packed = self._pack_prompt(
+                    [
+                        *context_segments,
+                        summary_segment,
+                        PromptSegment("history", PROMPT_PRIORITIES["history"], prior_lines, drop_from="start"),
+                    ],
+                    task="multimodal",
+                )
+                context = packed.text(*CONTEXT_SEGMENT_ORDER)
+                if packed.segments["history"]:
+                    context = f"{PRIOR_TRANSCRIPT_HEADER}\n\n{packed.text('history')}\n\n---\n{context}"
+
+                if request_mode == "agent":
+                    yield f"__AGENT_RUN__:{json.dumps({'mode': 'agent', 'intent': (agent_intent or {}).get('intent', 'file_analysis'), 'route': 'file_analysis', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': 'Agent mode stayed on direct file analysis because the attached document is the main source of truth.', 'step_count': 1})}\n"
+                    await asyncio.sleep(0)
+                visual_only = all((f.get("type") == "image") for f in file_results)
+                _file_lang = self._detect_language(
+                    message,
+                    history=getattr(history_for_files, "messages", None) if history_for_files else None,
+                )
+                language_hint = (
+                    "IMPORTANT: The user is writing in Arabic. You MUST respond in Arabic throughout your entire reply. Do not switch to English."
+                    if _file_lang == "ar"
+                    else "Respond in English. If the user writes in Arabic, switch to Arabic immediately."
+                )
+
+                domain_hint = (
+                    f"You are Horus, the AI compliance advisor built into the Ayn platform. "
+                    f"{AYN_PLATFORM_DESCRIPTION} "
+                    "Always analyze the attached file(s) and answer in a normal chat style."
+                )
+                if not needs_analysis:
+                    domain_hint += " Do not return JSON unless the user explicitly asked for JSON."
+                domain_hint += (
+                    " If the content relates to education quality, accreditation, or academic standards, map key points to common frameworks "
+                    "such as NAQAAE, ISO 21001, AACSB, ABET, or other clearly indicated frameworks, and highlight compliance gaps or missing evidence. "
+                    "Do not assume a Saudi context or mention NCAAA unless the user or the document explicitly points to it. "
+                    "If the user asks about Ayn itself without country context, treat Ayn as Egypt-first. "
+                    "Be explicit when a mapping is uncertain."
+                )
+                if language_hint:
+                    domain_hint += f" {language_hint}"
+                for res in file_results:
+                    fn = res.get("filename") or "file"
+                    yield f"__FILE_STATUS__:{json.dumps({'filename': fn, 'status': 'analyzing'})}\n"
                 await asyncio.sleep(0)
+
+                if store_as_evidence:
+                    if background_tasks:
+                        background_tasks.add_task(
+                            self._execute_brain_pipeline,
+                            user_id,
+                            current_user,
+                            file_results,
+                            db,
+                            needs_analysis
+                        )
+                    else:
+                        asyncio.create_task(
+                            self._execute_brain_pipeline(user_id, current_user, file_results, db, needs_analysis)
+                        )
             
-            if visual_only:
-                if needs_analysis:
-                    ai_message = (message or "").strip() + "\n\nAnalyze the attached image(s) with a brief compliance-focused summary. Respond in plain language. Do not return JSON or code."
+                if visual_only:
+                    yield "__THINKING__:Phase 1: Reading visual content...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 2: Identifying key UI elements...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 3: Summarizing observations...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 4: Finalizing response...\n"
+                    await asyncio.sleep(0)
                 else:
-                    ai_message = message or "Please analyze the attached image(s) and respond in plain language. If it's a UI screenshot, summarize the key elements and any obvious issues. Do not return JSON or code."
-            else:
-                user_line = (message or "").strip()
-                if needs_analysis:
-                    ai_message = user_line or "Analyze these files."
-                    ai_message += (
-                        "\n\nRespond for an end user in plain language, not as raw JSON. "
-                        "Use short readable sections when helpful. Include: "
-                        "1) a concise summary, "
-                        "2) an overall score from 0-100, "
-                        "3) key findings as bullet points, and "
-                        "4) improvement suggestions as actionable bullet points. "
-                        "Do not say 'JSON-formatted analysis'. Do not return code blocks unless the user explicitly asked for them."
-                    )
+                    yield "__THINKING__:Phase 1 (Identify): Scanning document category...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 2 (Deconstruct): Splitting PDF into semantic chunks and metadata...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 3 (Analyze): Cross-referencing against internal Quality Constitution...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 4 (Score): Calculating weighted Compliance Score...\n"
+                    await asyncio.sleep(0)
+                    yield "__THINKING__:Phase 5 (Synthesize): Preparing Audit Report and Optimized Content...\n"
+                    await asyncio.sleep(0)
+            
+                if visual_only:
+                    if needs_analysis:
+                        ai_message = (message or "").strip() + "\n\nAnalyze the attached image(s) with a brief compliance-focused summary. Respond in plain language. Do not return JSON or code."
+                    else:
+                        ai_message = message or "Please analyze the attached image(s) and respond in plain language. If it's a UI screenshot, summarize the key elements and any obvious issues. Do not return JSON or code."
                 else:
-                    ai_message = user_line or "Please look at the attached file(s)."
-                    ai_message += (
-                        "\n\nYou have direct access to the attached file(s) as vision/document input. "
-                        "Use their real content. Answer in the same language as the user (e.g. Arabic if they wrote in Arabic). "
-                        "Explain clearly what the document is, what it contains, and anything useful you notice. "
-                        "Do NOT say you cannot see or access the attachment. "
-                        "Do NOT reply with only JSON unless the user explicitly asked for JSON."
-                    )
-            ai_message = f"{ai_message}\n\n{domain_hint}"
+                    user_line = (message or "").strip()
+                    if needs_analysis:
+                        ai_message = user_line or "Analyze these files."
+                        ai_message += (
+                            "\n\nRespond for an end user in plain language, not as raw JSON. "
+                            "Use short readable sections when helpful. Include: "
+                            "1) a concise summary, "
+                            "2) an overall score from 0-100, "
+                            "3) key findings as bullet points, and "
+                            "4) improvement suggestions as actionable bullet points. "
+                            "Do not say 'JSON-formatted analysis'. Do not return code blocks unless the user explicitly asked for them."
+                        )
+                    else:
+                        ai_message = user_line or "Please look at the attached file(s)."
+                        ai_message += (
+                            "\n\nYou have direct access to the attached file(s) as vision/document input. "
+                            "Use their real content. Answer in the same language as the user (e.g. Arabic if they wrote in Arabic). "
+                            "Explain clearly what the document is, what it contains, and anything useful you notice. "
+                            "Do NOT say you cannot see or access the attachment. "
+                            "Do NOT reply with only JSON unless the user explicitly asked for JSON."
+                        )
+                ai_message = f"{ai_message}\n\n{domain_hint}"
 
-            try:
-                gen = client.stream_chat_with_files(
-                    message=ai_message,
-                    files=file_results,
-                    context=context # Pass the enriched brain context
-                )
                 try:
-                    first = await asyncio.wait_for(gen.__anext__(), timeout=10.0)
-                except StopAsyncIteration:
-                    first = ""
-                except asyncio.TimeoutError:
-                    first = None
-                if first is None:
+                    gen = client.stream_chat_with_files(
+                        message=ai_message,
+                        files=file_results,
+                        context=context # Pass the enriched brain context
+                    )
                     try:
-                        fallback_response = await asyncio.wait_for(
-                            client.chat_with_files(
-                                message=ai_message,
-                                files=file_results,
-                                context=context,
-                            ),
-                            timeout=30.0,
-                        )
+                        first = await asyncio.wait_for(gen.__anext__(), timeout=10.0)
+                    except StopAsyncIteration:
+                        first = ""
                     except asyncio.TimeoutError:
-                        fallback_response = "The AI analysis service is taking longer than expected. Your file was received — please try again or select an action below."
-                    if fallback_response:
-                        full_response = (fallback_response or "").strip()
-                        async for piece in _yield_text_chunks(full_response):
-                            yield piece
-                else:
-                    if first:
-                        full_response += first
-                        logger.info(
-                            "Horus first file token",
-                            extra={"correlation_id": corr_id, "elapsed_ms": self._timing_ms(request_started)},
-                        )
-                        yield first
-                    async for chunk in gen:
-                        if chunk == CONTEXT_LIMIT_SENTINEL:
-                            yield "\n__CONTEXT_LIMIT__:true\n"
-                            await asyncio.sleep(0)
-                            continue
-                        if chunk:
-                            full_response += chunk
-                            yield chunk
-                            await asyncio.sleep(0)  # Yield control so chunk is sent immediately
-            except Exception as file_stream_err:
-                logger.error(f"File analysis stream failed: {file_stream_err}", exc_info=True)
-                if not full_response.strip():
-                    # Streaming sometimes fails even when a normal multimodal completion still works.
-                    # Try one final non-streaming pass before returning a generic fallback.
-                    try:
-                        fallback_response = await asyncio.wait_for(
-                            client.chat_with_files(
-                                message=ai_message,
-                                files=file_results,
-                                context=context,
-                            ),
-                            timeout=30.0,
-                        )
-                    except Exception as fallback_err:
-                        logger.error(
-                            "File analysis fallback failed after stream error: %s",
-                            fallback_err,
-                            exc_info=True,
-                        )
-                        fallback_response = ""
-
-                    if fallback_response and fallback_response.strip():
-                        full_response = fallback_response.strip()
-                        async for piece in _yield_text_chunks(full_response):
-                            yield piece
+                        first = None
+                    if first is None:
+                        try:
+                            fallback_response = await asyncio.wait_for(
+                                client.chat_with_files(
+                                    message=ai_message,
+                                    files=file_results,
+                                    context=context,
+                                ),
+                                timeout=30.0,
+                            )
+                        except asyncio.TimeoutError:
+                            fallback_response = "The AI analysis service is taking longer than expected. Your file was received — please try again or select an action below."
+                        if fallback_response:
+                            full_response = (fallback_response or "").strip()
+                            async for piece in _yield_text_chunks(full_response):
+                                yield piece
                     else:
-                        is_arabic = self._detect_language(message) == "ar"
-                        if self._is_provider_unavailable_err(file_stream_err):
-                            # Provider unavailable — give intentional message; suggestions will still fire
-                            full_response = (
-                                "تعذّر تحليل الملف الآن بسبب عدم توفر خدمة الذكاء الاصطناعي مؤقتًا. يمكنك اختيار إجراء من الخيارات أدناه."
-                                if is_arabic
-                                else "The AI analysis service is temporarily unavailable. Your file was received — select an action below to continue."
+                        if first:
+                            full_response += first
+                            logger.info(
+                                "Horus first file token",
+                                extra={"correlation_id": corr_id, "elapsed_ms": self._timing_ms(request_started)},
+                            )
+                            yield first
+                        async for chunk in gen:
+                            if chunk == CONTEXT_LIMIT_SENTINEL:
+                                yield "\n__CONTEXT_LIMIT__:true\n"
+                                await asyncio.sleep(0)
+                                continue
+                            if chunk:
+                                full_response += chunk
+                                yield chunk
+                                await asyncio.sleep(0)  # Yield control so chunk is sent immediately
+                except Exception as file_stream_err:
+                    logger.error(f"File analysis stream failed: {file_stream_err}", exc_info=True)
+                    if not full_response.strip():
+                        # Streaming sometimes fails even when a normal multimodal completion still works.
+                        # Try one final non-streaming pass before returning a generic fallback.
+                        try:
+                            fallback_response = await asyncio.wait_for(
+                                client.chat_with_files(
+                                    message=ai_message,
+                                    files=file_results,
+                                    context=context,
+                                ),
+                                timeout=30.0,
+                            )
+                        except Exception as fallback_err:
+                            logger.error(
+                                "File analysis fallback failed after stream error: %s",
+                                fallback_err,
+                                exc_info=True,
                             )
+                            fallback_response = ""
+
+                        if fallback_response and fallback_response.strip():
+                            full_response = fallback_response.strip()
+                            async for piece in _yield_text_chunks(full_response):
+                                yield piece
                         else:
-                            attachment_label = "الصورة المرفقة" if visual_only else "الملف المرفق"
-                            attachment_hint = "صورة أوضح" if visual_only else "ملفًا أوضح أو صيغة مختلفة"
-                            full_response = (
-                                f"حصل خطأ أثناء تحليل {attachment_label}. جرّب إرسال {attachment_hint} أو اكتب لي بالتحديد ماذا تريد أن أستخرج منه."
-                                if is_arabic
-                                else (
-                                    "I hit an error while analyzing the attached image. Try sending a clearer image or tell me exactly what you want extracted."
-                                    if visual_only
-                                    else "I hit an error while analyzing the attached file. Try re-uploading the file or tell me exactly what you want extracted."
+                            is_arabic = self._detect_language(message) == "ar"
+                            if self._is_provider_unavailable_err(file_stream_err):
+                                # Provider unavailable — give intentional message; suggestions will still fire
+                                full_response = (
+                                    "تعذّر تحليل الملف الآن بسبب عدم توفر خدمة الذكاء الاصطناعي مؤقتًا. يمكنك اختيار إجراء من الخيارات أدناه."
+                                    if is_arabic
+                                    else "The AI analysis service is temporarily unavailable. Your file was received — select an action below to continue."
                                 )
-                            )
+                            else:
+                                attachment_label = "الصورة المرفقة" if visual_only else "الملف المرفق"
+                                attachment_hint = "صورة أوضح" if visual_only else "ملفًا أوضح أو صيغة مختلفة"
+                                full_response = (
+                                    f"حصل خطأ أثناء تحليل {attachment_label}. جرّب إرسال {attachment_hint} أو اكتب لي بالتحديد ماذا تريد أن أستخرج منه."
+                                    if is_arabic
+                                    else (
+                                        "I hit an error while analyzing the attached image. Try sending a clearer image or tell me exactly what you want extracted."
+                                        if visual_only
+                                        else "I hit an error while analyzing the attached file. Try re-uploading the file or tell me exactly what you want extracted."
+                                    )
+                                )
+                            yield full_response
+                if not full_response.strip():
+                    # Some multimodal providers may stream empty chunks for certain files.
+                    # Ensure the user never sees a silent response.
+                    fallback_response = await client.chat_with_files(
+                        message=ai_message,
+                        files=file_results,
+                        context=context,
+                    )
+                    if fallback_response and fallback_response.strip():
+                        full_response = fallback_response.strip()
                         yield full_response
-            if not full_response.strip():
-                # Some multimodal providers may stream empty chunks for certain files.
-                # Ensure the user never sees a silent response.
-                fallback_response = await client.chat_with_files(
-                    message=ai_message,
-                    files=file_results,
-                    context=context,
+                    else:
+                        full_response = (
+                            "I received your image, but I couldn't extract a clear answer from it. Try sending a clearer image or add more context."
+                            if visual_only
+                            else "I received your file, but I couldn't extract a clear answer from it. Try re-uploading the file or add more context."
+                        )
+                        yield full_response
+            else:
+                if request_mode == "agent":
+                    yield f"__AGENT_RUN__:{json.dumps({'mode': 'agent', 'intent': (agent_intent or {}).get('intent', 'agent_chat'), 'route': 'chat', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': 'No tool or file workflow was necessary, so Horus is answering directly in Agent mode.'})}\n"
+                    await asyncio.sleep(0)
+                fetched = await context_assembler.gather("history", "summary")
+                context_assembler.log_timings()
+                history = fetched["history"]
+                yield "__THINKING__:Reviewing conversation history...\n"
+                await asyncio.sleep(0)
+                recent_history, summary_segment = self._summarized_history(
+                    chat_id, user_id, history.messages if history else [], fetched["summary"], background_tasks
                 )
-                if fallback_response and fallback_response.strip():
-                    full_response = fallback_response.strip()
-                    yield full_response
-                else:
-                    full_response = (
-                        "I received your image, but I couldn't extract a clear answer from it. Try sending a clearer image or add more context."
-                        if visual_only
-                        else "I received your file, but I couldn't extract a clear answer from it. Try re-uploading the file or add more context."
-                    )
-                    yield full_response
-        else:
-            if request_mode == "agent":
-                yield f"__AGENT_RUN__:{json.dumps({'mode': 'agent', 'intent': (agent_intent or {}).get('intent', 'agent_chat'), 'route': 'chat', 'goal': (agent_intent or {}).get('goal') or self._infer_agent_goal(message, files), 'reason': 'No tool or file workflow was necessary, so Horus is answering directly in Agent mode.'})}\n"
+                messages = [{"role": m.role, "content": m.content} for m in recent_history]
+                if message and not any(m["content"] == message for m in messages):
+                    messages.append({"role": "user", "content": message})
+
+                # Re-check language with history in case the current message was ambiguous
+                _hist_lang = self._detect_language(message, history=getattr(history, "messages", None))
+                _hist_lang_override = (
+                    "[LANGUAGE OVERRIDE] The user is communicating in Arabic. You MUST respond in Arabic throughout. Do not switch to English."
+                    if _hist_lang == "ar"
+                    else "[LANGUAGE OVERRIDE] The user is communicating in English. Respond in English."
+                )
+                directives = [_hist_lang_override]
+                # When user refers to a file they sent earlier but no file in this request:
+                # we don't have file content in history — add context so AI explains they must re-attach
+                file_ref_keywords = ["بعته", "ارسلت", "اللي فوق", "السابق", "الملف", "الفايل", "file", "sent", "attached", "uploaded", "حلل", "analyze"]
+                msg_lower = (message or "").lower()
+                if any(kw in msg_lower for kw in file_ref_keywords):
+                    has_recent_attachment_context = self._history_has_recent_attachment_context(history.messages if history else [])
+                    if has_recent_attachment_context:
+                        directives.append(
+                            "[IMPORTANT] The user is likely referring to an attachment shared earlier in this same chat. "
+                            "Use the recent conversation context about that attachment to answer the follow-up naturally. "
+                            "Do NOT say you cannot access past files unless the answer truly requires raw file content that is not available from the conversation context."
+                        )
+                    else:
+                        directives.append(
+                            "[IMPORTANT] The user may be referring to a file that is not attached in this request. "
+                            "Use the recent conversation context if it is enough to answer. "
+                            "Only ask them to re-attach the file if the needed document details are genuinely unavailable in this chat."
+                        )
+                packed = self._pack_prompt([
+                    *context_segments,
+                    summary_segment,
+                    PromptSegment("directives", PROMPT_PRIORITIES["directives"], directives, truncatable=False),
+                    self._history_segment(messages),
+                ])
+                context = packed.text(*CONTEXT_SEGMENT_ORDER)
+                messages = packed.messages("history")
+                yield "__THINKING__:Preparing response...\n"
                 await asyncio.sleep(0)
-            history = await self._with_budget("history", history_task, default=None, correlation_id=corr_id)
-            yield "__THINKING__:Reviewing conversation history...\n"
-            await asyncio.sleep(0)
-            raw_messages = [{"role": m.role, "content": m.content} for m in (history.messages if history else [])]
-            messages = self._trim_history_to_budget(raw_messages)
-            if message and not any(m["content"] == message for m in messages):
-                messages.append({"role": "user", "content": message})
-
-            # Re-check language with history in case the current message was ambiguous
-            _hist_lang = self._detect_language(message, history=getattr(history, "messages", None))
-            _hist_lang_override = (
-                "\n[LANGUAGE OVERRIDE] The user is communicating in Arabic. You MUST respond in Arabic throughout. Do not switch to English."
-                if _hist_lang == "ar"
-                else "\n[LANGUAGE OVERRIDE] The user is communicating in English. Respond in English."
-            )
-            context += _hist_lang_override
-            # When user refers to a file they sent earlier but no file in this request:
-            # we don't have file content in history — add context so AI explains they must re-attach
-            file_ref_keywords = ["بعته", "ارسلت", "اللي فوق", "السابق", "الملف", "الفايل", "file", "sent", "attached", "uploaded", "حلل", "analyze"]
-            msg_lower = (message or "").lower()
-            if any(kw in msg_lower for kw in file_ref_keywords):
-                has_recent_attachment_context = self._history_has_recent_attachment_context(history.messages if history else [])
-                if has_recent_attachment_context:
-                    context += (
-                        "\n\n[IMPORTANT] The user is likely referring to an attachment shared earlier in this same chat. "
-                        "Use the recent conversation context about that attachment to answer the follow-up naturally. "
-                        "Do NOT say you cannot access past files unless the answer truly requires raw file content that is not available from the conversation context."
-                    )
-                else:
-                    context += (
-                        "\n\n[IMPORTANT] The user may be referring to a file that is not attached in this request. "
-                        "Use the recent conversation context if it is enough to answer. "
-                        "Only ask them to re-attach the file if the needed document details are genuinely unavailable in this chat."
-                    )
-            yield "__THINKING__:Preparing response...\n"
-            await asyncio.sleep(0)
             
-            try:
-                gen = client.stream_chat(messages=messages, context=context)
                 try:
-                    first = await asyncio.wait_for(gen.__anext__(), timeout=8.0)
-                except StopAsyncIteration:
-                    first = ""
-                except asyncio.TimeoutError:
-                    first = None
-                if first is None:
+                    gen = client.stream_chat(messages=messages, context=context)
                     try:
-                        fallback_response = await asyncio.wait_for(
-                            client.chat(messages=messages, context=context),
-                            timeout=18.0,
-                        )
+                        first = await asyncio.wait_for(gen.__anext__(), timeout=8.0)
+                    except StopAsyncIteration:
+                        first = ""
                     except asyncio.TimeoutError:
-                        fallback_response = "The AI service is taking longer than expected. Please try again in a moment."
-                    if fallback_response and fallback_response.strip():
-                        full_response = fallback_response.strip()
-                        async for piece in _yield_text_chunks(full_response):
-                            yield piece
-                else:
-                    if first:
-                        full_response += first
-                        logger.info(
-                            "Horus first text token",
-                            extra={"correlation_id": corr_id, "elapsed_ms": self._timing_ms(request_started)},
-                        )
-                        yield first
-                    async for chunk in gen:
-                        if chunk == CONTEXT_LIMIT_SENTINEL:
-                            yield "\n__CONTEXT_LIMIT__:true\n"
-                            await asyncio.sleep(0)
-                            continue
-                        if chunk:
-                            full_response += chunk
-                            yield chunk
-                            await asyncio.sleep(0)  # Yield control so chunk is sent immediately
-                if not full_response.strip():
-                    fallback_response = await client.chat(messages=messages, context=context)
-                    if fallback_response and fallback_response.strip():
-                        full_response = fallback_response.strip()
-                        async for piece in _yield_text_chunks(full_response):
-                            yield piece
-            except Exception as stream_err:
-                logger.error(f"Stream chat failed mid-response: {stream_err}", exc_info=True)
-                if not full_response.strip():
-                    if self._is_provider_unavailable_err(stream_err):
-                        full_response = (
-                            "My AI provider is temporarily unavailable right now. "
-                            "Please try again in a few minutes, or ask a simpler question and I’ll do my best."
-                        )
-                        yield full_response
+                        first = None
+                    if first is None:
+                        try:
+                            fallback_response = await asyncio.wait_for(
+                                client.chat(messages=messages, context=context),
+                                timeout=18.0,
+                            )
+                        except asyncio.TimeoutError:
+                            fallback_response = "The AI service is taking longer than expected. Please try again in a moment."
+                        if fallback_response and fallback_response.strip():
+                            full_response = fallback_response.strip()
+                            async for piece in _yield_text_chunks(full_response):
+                                yield piece
                     else:
-                        yield "__STREAM_ERROR__:Request failed. Please try again.\n"
-                        full_response = "The connection was interrupted. Please try sending your message again."
-                        yield full_response
+                        if first:
+                            full_response += first
+                            logger.info(
+                                "Horus first text token",
+                                extra={"correlation_id": corr_id, "elapsed_ms": self._timing_ms(request_started)},
+                            )
+                            yield first
+                        async for chunk in gen:
+                            if chunk == CONTEXT_LIMIT_SENTINEL:
+                                yield "\n__CONTEXT_LIMIT__:true\n"
+                                await asyncio.sleep(0)
+                                continue
+                            if chunk:
+                                full_response += chunk
+                                yield chunk
+                                await asyncio.sleep(0)  # Yield control so chunk is sent immediately
+                    if not full_response.strip():
+                        fallback_response = await client.chat(messages=messages, context=context)
+                        if fallback_response and fallback_response.strip():
+                            full_response = fallback_response.strip()
+                            async for piece in _yield_text_chunks(full_response):
+                                yield piece
+                except Exception as stream_err:
+                    logger.error(f"Stream chat failed mid-response: {stream_err}", exc_info=True)
+                    if not full_response.strip():
+                        if self._is_provider_unavailable_err(stream_err):
+                            full_response = (
+                                "My AI provider is temporarily unavailable right now. "
+                                "Please try again in a few minutes, or ask a simpler question and I’ll do my best."
+                            )
+                            yield full_response
+                        else:
+                            yield "__STREAM_ERROR__:Request failed. Please try again.\n"
+                            full_response = "The connection was interrupted. Please try sending your message again."
+                            yield full_response
 
-        # 4. Emit contextual next-step suggestions
-        # File analysis: always suggest (suggestions are generated locally; provider not needed).
-        # Text chat: only suggest when the response is substantive and compliance-related.
-        try:
-            if file_results:
-                primary = file_results[0] if file_results else {}
-                sug = self._get_file_suggestions(
-                    filename=primary.get("filename", "file"),
-                    message=message,
-                    file_type=primary.get("mime_type", ""),
-                )
-            elif (
-                self._is_substantive_response(full_response)
-                and (self._needs_compliance_analysis(message) or self._has_explicit_platform_action_intent(message))
-            ):
-                sug = self._get_chat_suggestions(message, full_response)
-            else:
-                sug = []
-            if sug:
-                # Leading \n guarantees clean line separation even when the previous
-                # content chunk was coalesced with this yield by the ASGI transport.
-                yield f"\n__AGENT_SUGGESTIONS__:{json.dumps(sug)}\n"
-        except Exception as _sug_err:
-            logger.debug(f"Suggestion generation skipped: {_sug_err}")
-
-        # 5. Save Assistant Response in Background to release the generator faster
-        if full_response and background_tasks:
-            background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", full_response)
-            background_tasks.add_task(self._remember_exchange_async, user_id=user_id, chat_id=chat_id, user_message=message, assistant_response=full_response)
-            if message:
-                background_tasks.add_task(self._generate_chat_title, message, full_response, None, chat_id)
-        elif full_response:
-            await ChatService.save_message(chat_id, user_id, "assistant", full_response)
-            asyncio.create_task(self._remember_exchange_async(user_id=user_id, chat_id=chat_id, user_message=message, assistant_response=full_response))
-            if message:
-                asyncio.create_task(self._generate_chat_title(message, full_response, None, chat_id))
+            # 4. Emit contextual next-step suggestions
+            # File analysis: always suggest (suggestions are generated locally; provider not needed).
+            # Text chat: only suggest when the response is substantive and compliance-related.
+            try:
+                if file_results:
+                    primary = file_results[0] if file_results else {}
+                    sug = self._get_file_suggestions(
+                        filename=primary.get("filename", "file"),
+                        message=message,
+                        file_type=primary.get("mime_type", ""),
+                    )
+                elif (
+                    self._is_substantive_response(full_response)
+                    and (self._needs_compliance_analysis(message) or self._has_explicit_platform_action_intent(message))
+                ):
+                    sug = self._get_chat_suggestions(message, full_response)
+                else:
+                    sug = []
+                if sug:
+                    # Leading \n guarantees clean line separation even when the previous
+                    # content chunk was coalesced with this yield by the ASGI transport.
+                    yield f"\n__AGENT_SUGGESTIONS__:{json.dumps(sug)}\n"
+            except Exception as _sug_err:
+                logger.debug(f"Suggestion generation skipped: {_sug_err}")
+
+            # 5. Save Assistant Response in Background to release the generator faster
+            if full_response and background_tasks:
+                background_tasks.add_task(ChatService.save_message, chat_id, user_id, "assistant", full_response)
+                background_tasks.add_task(self._remember_exchange_async, user_id=user_id, chat_id=chat_id, user_message=message, assistant_response=full_response)
+                if message:
+                    background_tasks.add_task(self._generate_chat_title, message, full_response, None, chat_id)
+            elif full_response:
+                await ChatService.save_message(chat_id, user_id, "assistant", full_response)
+                asyncio.create_task(self._remember_exchange_async(user_id=user_id, chat_id=chat_id, user_message=message, assistant_response=full_response))
+                if message:
+                    asyncio.create_task(self._generate_chat_title(message, full_response, None, chat_id))
+        finally:
+            context_assembler.cancel()
 
     async def _execute_brain_pipeline(self, user_id, current_user, file_results, db, needs_analysis: bool = False):
         """Legacy hook: Horus no longer runs evidence writes or gap jobs from chat (read-only assistant)."""
@@ -2114,7 +2223,7 @@ class HorusService:
             "dashboard_updated": False,
         }
 
-    async def _prepare_context_sync(
+    def _context_segments(
         self,
         summary,
         recent_activities,
@@ -2123,12 +2232,11 @@ class HorusService:
         mapping_context: str = "",
         user_identity: Dict[str, str] | None = None,
         goal: str | None = None,
-        user_id: str | None = None,
-        allow_rag: bool = True,
-        correlation_id: str | None = None,
-    ) -> str:
-        """Build a clean, deliberate system prompt for Horus. Instructions come first so the
-        model always knows who it is before reading any data."""
+        rag_context: str | None = None,
+    ) -> List[PromptSegment]:
+        """Build a clean, deliberate system prompt for Horus as prompt segments. Instructions
+        come first so the model always knows who it is before reading any data. ``rag_context``
+        holds the excerpts the context assembler retrieved."""
 
         # ── Language detection (message + history fallback) ──────────────────────
         _lang = self._detect_language(message)
@@ -2175,7 +2283,8 @@ Behavioral rules:
 - If the user asks about uploading, evidence, or standards, reference the relevant platform section.
 """
 
-        parts = [instructions.strip()]
+        priorities = PROMPT_PRIORITIES
+        segments = [PromptSegment.text("system", priorities["system"], instructions.strip(), truncatable=False)]
 
         # ── Platform state (only when compliance-relevant) ────────────────────
         compliance_keywords = [
@@ -2193,45 +2302,21 @@ Behavioral rules:
             linked_str = str(getattr(summary, "linked_evidence", "—"))
             gaps_str = str(getattr(summary, "total_gaps", "—"))
             closed_str = str(getattr(summary, "closed_gaps", "—"))
-            parts.append(
+            segments.append(PromptSegment.text(
+                "platform_state",
+                priorities["platform_state"],
                 f"Platform state:\n"
                 f"  Compliance score: {score_str}\n"
                 f"  Files: {files_str} total, {analyzed_str} analyzed\n"
                 f"  Evidence vault: {evidence_str} items, {linked_str} mapped to criteria\n"
-                f"  Open gaps: {gaps_str} detected, {closed_str} resolved"
-            )
+                f"  Open gaps: {gaps_str} detected, {closed_str} resolved",
+            ))
 
         # ── Criteria mapping context ──────────────────────────────────────────
-        if mapping_context and mapping_context.strip():
-            parts.append(mapping_context.strip())
+        segments.append(PromptSegment.text("mappings", priorities["mappings"], (mapping_context or "").strip()))
 
         # ── RAG: retrieve relevant document excerpts ──────────────────────────
-        retrieval_plan = SmartRetrievalPlanner.plan(message)
-        if allow_rag and message and user_id and retrieval_plan.should_retrieve:
-            try:
-                async def retrieve_rag_with_scope():
-                    from app.core.db import db as _prisma
-                    _user = await _prisma.user.find_unique(where={"id": user_id})
-                    _inst_id = getattr(_user, "institutionId", None) if _user else None
-                    rag = RagService()
-                    return await rag.retrieve_context(
-                        message,
-                        limit=retrieval_plan.limit,
-                        user_id=user_id,
-                        institution_id=_inst_id,
-                    )
-
-                rag_context, _ = await self._with_budget(
-                    "rag",
-                    retrieve_rag_with_scope(),
-                    default=("", []),
-                    budget_seconds=retrieval_plan.budget_seconds,
-                    correlation_id=correlation_id,
-                )
-                if rag_context and rag_context.strip():
-                    parts.append(f"Relevant document excerpts:\n{rag_context.strip()}")
-            except Exception as _rag_err:
-                logger.debug(f"RAG retrieval skipped: {_rag_err}")
+        segments.append(self._rag_segment(rag_context))
 
         # ── Brain pipeline results (file uploads) ────────────────────────────
         if brain_results and brain_results.get("gap_reports"):
@@ -2242,23 +2327,59 @@ Behavioral rules:
                 report_lines.append(
                     f"  - {r['title']}: score {r.get('score', '—')}% | gaps: {gaps} | report ID: {r['id']}"
                 )
-            parts.append(
+            segments.append(PromptSegment.text(
+                "brain_results",
+                priorities["brain_results"],
                 f"Files analyzed this session: {brain_results['files_analyzed']}\n"
-                f"Gap reports generated:\n" + "\n".join(report_lines)
-            )
+                f"Gap reports generated:\n" + "\n".join(report_lines),
+            ))
 
         # ── Recent activity context ────────────────────────────────────────────
         activity_str = self._format_activities(recent_activities)
         if activity_str and activity_str.strip():
-            parts.append(f"Recent platform activity:\n{activity_str.strip()}")
+            segments.append(PromptSegment.text(
+                "activities", priorities["activities"], f"Recent platform activity:\n{activity_str.strip()}"
+            ))
 
-        return "\n\n".join(p for p in parts if p and p.strip())
+        return segments
 
 
-    async def _prepare_context(self, user_id: str, summary, message: str = "", user_identity: Dict[str, str] | None = None, goal: str | None = None) -> str:
+    async def _prepare_context(
+        self,
+        user_id: str,
+        summary,
+        message: str = "",
+        user_identity: Dict[str, str] | None = None,
+        goal: str | None = None,
+        current_user: Any = None,
+    ) -> str:
         """Prepare deep platform state context for AI."""
-        # Fetch extra context
-        recent_activities = await ActivityService.get_recent_activities(user_id, limit=5)
+        # Activities, mappings and RAG are fetched concurrently; the institution
+        # lookup is shared by mappings and RAG, which are skipped if it fails so
+        # they never run unscoped.
+        async def fetch_rag(deps: Dict[str, Any]):
+            rag_context, _ = await RagService().retrieve_context(
+                message, limit=4, user_id=user_id, institution_id=deps["institution"]
+            )
+            return rag_context
+
+        sources = [
+            ContextSource("recent_activities", lambda _: ActivityService.get_recent_activities(user_id, limit=5),
+                          CONTEXT_BUDGETS_SECONDS["recent_activities"], default=[]),
+            ContextSource("institution", lambda _: self._resolve_institution_id(user_id, current_user),
+                          CONTEXT_BUDGETS_SECONDS["institution"]),
+            ContextSource("mappings", lambda deps: self._mappings_context(deps["institution"]),
+                          CONTEXT_BUDGETS_SECONDS["mappings"], depends_on=("institution",), default=""),
+        ]
+        if message:
+            sources.append(ContextSource("rag", fetch_rag, CONTEXT_BUDGETS_SECONDS["rag"], depends_on=("institution",)))
+        context_assembler = ContextAssembler(sources)
+        try:
+            fetched = await context_assembler.gather()
+        finally:
+            context_assembler.cancel()
+        context_assembler.log_timings()
+        recent_activities = fetched["recent_activities"]
         
         compliance_keywords = ["gap", "compliance", "standard", "criteria", "NCAAA", "ISO", "accreditation", "analysis"]
         message_lower = (message or "").lower()
@@ -2281,40 +2402,18 @@ Behavioral rules:
             logger_msg = message[:20].replace('\n', ' ') if message else ""
             logger.info(f"Skipping heavy context injection for '{logger_msg}...': skipped ~300 tokens.")
             
-        user_obj = None
-        try:
-            from app.core.db import db as prisma_client
-            user_obj = await prisma_client.user.find_unique(where={"id": user_id})
-            if user_obj and user_obj.institutionId:
-                mappings = await prisma_client.criteriamapping.find_many(
-                    where={"institutionId": user_obj.institutionId},
-                    include={"criterion": True}
-                )
-                if mappings:
-                    met = len([m for m in mappings if m.status == "met"])
-                    total = len(mappings)
-                    gap_mappings = [m for m in mappings if m.status == "gap"]
-                    gap_titles = [m.criterion.title for m in gap_mappings[:3] if m.criterion]
-                    gap_str = ", ".join(gap_titles) if gap_titles else "None"
-                    context_parts.append(f"CRITERIA MAPPINGS: {met}/{total} criteria met across all standards.\nCritical gaps: {gap_str}")
-        except Exception as e:
-            logger.error(f"Failed to fetch criteria mappings context: {e}")
-            
+        if fetched["mappings"]:
+            context_parts.append(fetched["mappings"])
+
         # 🚀 TRUE RAG: scoped by user/institution for multi-tenant security
-        institution_id_ctx = getattr(user_obj, "institutionId", None) if user_obj else None
         if message:
-            try:
-                rag = RagService()
-                rag_context, _ = await rag.retrieve_context(
-                    message, limit=4, user_id=user_id, institution_id=institution_id_ctx
-                )
-                if rag_context:
-                    context_parts.append(rag_context)
-                else:
-                    context_parts.append("[Note: RAG retrieval returned no results. Embeddings may require Gemini. Proceed without document context.]")
-            except Exception as e:
-                logger.error(f"RAG Context retrieval failed during chat loop: {e}")
-                context_parts.append(f"[Note: RAG retrieval failed ({e}). Proceed without document context.]")
+            rag_context = fetched["rag"]
+            if rag_context:
+                context_parts.append(rag_context)
+            elif rag_context is None:
+                context_parts.append("[Note: RAG retrieval failed or timed out. Proceed without document context.]")
+            else:
+                context_parts.append("[Note: RAG retrieval returned no results. Embeddings may require Gemini. Proceed without document context.]")
         
         _lang2 = self._detect_language(message)
         language_instruction = (
@@ -2724,88 +2823,40 @@ Behavioral rules:
     async def _check_semantic_cache(self, client: Any, message: str, institution_id: str) -> str | None:
         if not message:
             return None
-        
-        # 1. Exact match fallback (0ms, extremely fast, no embedding cost)
-        import hashlib
-        msg_hash = hashlib.sha256(message.strip().lower().encode("utf-8")).hexdigest()
-        exact_key = f"horus:exact_cache:{institution_id}:{msg_hash}"
-        try:
-            exact_match = redis_client.get(exact_key)
-            if exact_match:
-                return exact_match
-        except Exception as e:
-            logger.warning(f"Exact cache read failed: {e}")
 
-        # 2. Semantic lookup
-        index_key = f"horus:semantic_cache_index:{institution_id}"
-        try:
-            raw_index = redis_client.get(index_key)
-        except Exception as e:
-            logger.warning(f"Semantic cache index read failed: {e}")
-            raw_index = None
-            
-        if not raw_index:
-            return None
-        
-        try:
-            cached_items = json.loads(raw_index)
-        except Exception:
-            return None
-            
-        if not cached_items:
-            return None
+        # 1. Exact match fallback (0ms, extremely fast, no embedding cost)
+        exact_key = f"horus:exact_cache:{institution_id}:{semantic_cache.query_hash(message)}"
+        exact_match = await redis_client.get(exact_key)
+        if exact_match:
+            return exact_match
 
-        # Retrieve embedding of the incoming query
+        # 2. Semantic lookup: one top-1 cosine query in the tenant's pgvector entries
         try:
             query_vector = await client.create_embedding(message)
         except Exception as e:
             logger.warning(f"Could not generate embedding for cache search: {e}")
             return None
-            
+
         if not query_vector:
             return None
 
-        # Compare with cached queries using cosine similarity
-        import math
-        best_sim = 0.0
-        best_response = None
-        
-        for item in cached_items:
-            cached_vector = item.get("vector")
-            if not cached_vector or len(cached_vector) != len(query_vector):
-                continue
-            
-            # Cosine similarity in pure Python
-            dot_product = sum(a * b for a, b in zip(query_vector, cached_vector))
-            mag_a = math.sqrt(sum(a * a for a in query_vector))
-            mag_b = math.sqrt(sum(b * b for b in cached_vector))
-            sim = dot_product / (mag_a * mag_b) if mag_a > 0 and mag_b > 0 else 0.0
-            
-            if sim > best_sim:
-                best_sim = sim
-                best_response = item.get("response")
+        try:
+            best_response = await semantic_cache.lookup(institution_id, query_vector)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup failed: {e}")
+            return None
 
-        if best_sim >= 0.95 and best_response:
+        if best_response:
             # Populate exact cache for faster future hits
-            try:
-                redis_client.set(exact_key, best_response, ex=3600 * 24)
-            except Exception:
-                pass
-            return best_response
-            
-        return None
+            await redis_client.set(exact_key, best_response, ex=3600 * 24)
+        return best_response
 
     async def _save_semantic_cache(self, client: Any, message: str, response: str, institution_id: str) -> None:
         if not message or not response:
             return
-            
-        import hashlib
-        msg_hash = hashlib.sha256(message.strip().lower().encode("utf-8")).hexdigest()
-        exact_key = f"horus:exact_cache:{institution_id}:{msg_hash}"
-        try:
-            redis_client.set(exact_key, response, ex=3600 * 24)
-        except Exception as e:
-            logger.warning(f"Exact cache write failed: {e}")
+
+        exact_key = f"horus:exact_cache:{institution_id}:{semantic_cache.query_hash(message)}"
+        await redis_client.set(exact_key, response, ex=3600 * 24)
 
         # Retrieve embedding
         try:
@@ -2813,41 +2864,14 @@ Behavioral rules:
         except Exception as e:
             logger.warning(f"Could not generate embedding for cache write: {e}")
             return
-            
+
         if not query_vector:
             return
 
-        index_key = f"horus:semantic_cache_index:{institution_id}"
-        try:
-            raw_index = redis_client.get(index_key)
-        except Exception:
-            raw_index = None
-            
-        cached_items = []
-        if raw_index:
-            try:
-                cached_items = json.loads(raw_index)
-            except Exception:
-                pass
-
-        # Check for duplicates
-        for item in cached_items:
-            if item.get("query").strip().lower() == message.strip().lower():
-                return
-
-        new_item = {
-            "query": message,
-            "vector": query_vector,
-            "response": response
-        }
-        cached_items.append(new_item)
-        if len(cached_items) > 100:
-            cached_items.pop(0)
-
         try:
-            redis_client.set(index_key, json.dumps(cached_items), ex=3600 * 24)
+            await semantic_cache.store(institution_id, message, query_vector, response)
         except Exception as e:
-            logger.warning(f"Semantic cache index write failed: {e}")
+            logger.warning(f"Semantic cache write failed: {e}")
 
     async def _plan_agent_action(
         self,
@@ -2,6 +2,7 @@
 from fastapi import HTTPException, status
 from typing import List
 from app.core.db import get_db
+from app.core.principal_cache import invalidate_principal
 from app.institutions.models import (
     InstitutionCreateRequest,
     InstitutionUpdateRequest,
@@ -113,6 +114,7 @@ class InstitutionService:
                 where={"id": request.userId},
                 data={"institutionId": institution_id}
             )
+            await invalidate_principal(request.userId)
             logger.info(f"Admin {admin_email} assigned user {request.userId} to institution {institution_id}")
             return AssignUserResponse(
                 message="User assigned to institution successfully",
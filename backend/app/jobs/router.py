@@ -0,0 +1,26 @@
+"""Admin endpoints for the durable job queue."""
+from fastapi import APIRouter, Depends, Query
+
+from app.auth.dependencies import require_admin
+from app.core.job_metrics import job_queue_stats, latest_job_metrics_snapshot
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_job_stats(
+    window_minutes: int = Query(60, ge=1, le=24 * 60, description="Timing window for the histograms."),
+    current_user: dict = Depends(require_admin),
+):
+    """
+    Live queue health per job type (ADMIN only).
+
+    Returns queued/due/running/failed counts, the age of the oldest runnable
+    queued job, and cumulative wait-time and run-time histograms (with p50/p95/
+    p99) for attempts finished within the window. `snapshot` is the last
+    periodic snapshot published by the workers, if any.
+    """
+    return {
+        **await job_queue_stats(window_minutes=window_minutes),
+        "snapshot": await latest_job_metrics_snapshot(),
+    }
@@ -9,8 +9,17 @@ from datetime import datetime, timezone
 from typing import List, Optional
 
 from .models import PlatformStateManager, PlatformFile, PlatformEvidence, PlatformGap, PlatformMetric, StateSummary
+from app.core.cache import TwoTierCache
 from app.core.redis import redis_client
-import json
+
+STATE_SUMMARY_TTL_SECONDS = 120
+STATE_SUMMARY_STALE_SECONDS = 60
+_STATE_SUMMARY_CACHE = TwoTierCache(
+    "platform.state_summary",
+    ttl_seconds=STATE_SUMMARY_TTL_SECONDS,
+    max_entries=2048,
+    l1_ttl_seconds=30,
+)
 
 class StateService:
     """
@@ -39,7 +48,7 @@ class StateService:
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         })
-        if result: self.redis.delete(f"state_summary:{user_id}")
+        if result: await self.redis.bump_generation(user_id=user_id)
         return result
     
     async def record_file_analysis(self, file_id: str, standards: List[str], document_type: Optional[str] = None, clauses: List[str] = None, confidence: float = 0) -> PlatformFile:
@@ -54,7 +63,7 @@ class StateService:
             "clauses": clauses or [],
             "confidence": confidence
         })
-        if result: self.redis.delete(f"state_summary:{result.user_id}")
+        if result: await self.redis.bump_generation(user_id=result.user_id)
         return result
     
     # ═══════════════════════════════════════════════════════════════════════════
@@ -72,7 +81,7 @@ class StateService:
             "created_at": datetime.now(timezone.utc),
             "updated_at": datetime.now(timezone.utc)
         })
-        if result: self.redis.delete(f"state_summary:{user_id}")
+        if result: await self.redis.bump_generation(user_id=user_id)
         return result
     
     async def record_evidence_linked(self, evidence_id: str, file_ids: List[str]):
@@ -112,7 +121,7 @@ class StateService:
         except Exception as e:
             print(f"Failed to send notification: {e}")
             
-        if gap: self.redis.delete(f"state_summary:{user_id}")
+        if gap: await self.redis.bump_generation(user_id=user_id)
         return gap
     
     async def record_gap_addressed(self, gap_id: str, evidence_id: str):
@@ -144,10 +153,12 @@ class StateService:
             "updated_at": datetime.now(timezone.utc)
         })
         
+        has_changed = bool(metric) and (
+            (metric.previous_value is None) or (abs(metric.value - metric.previous_value) > 0.001)
+        )
+
         # Notify only on SIGNIFICANT score changes/updates that actually changed the value
         if metric and ("alignment" in name.lower() or "score" in name.lower()):
-            has_changed = (metric.previous_value is None) or (abs(metric.value - metric.previous_value) > 0.001)
-            
             if has_changed:
                  try:
                     from app.notifications.service import NotificationService
@@ -163,7 +174,8 @@ class StateService:
                  except Exception as e:
                     print(f"Failed to send notification: {e}")
         
-        if metric: self.redis.delete(f"state_summary:{user_id}")
+        # Dashboard loads re-record the same score; only a real change invalidates caches.
+        if has_changed: await self.redis.bump_generation(user_id=user_id)
         return metric
     
     # ═══════════════════════════════════════════════════════════════════════════
@@ -172,31 +184,21 @@ class StateService:
     
     async def get_current_state(self, user_id: str) -> StateSummary:
         """Get current platform state summary. Cached."""
-        cache_key = f"state_summary:{user_id}"
+        generation = await self.redis.generation_token(user_id=user_id)
+        cache_key = f"state_summary:{user_id}:{generation}"
         
-        # Try Cache
-        cached = self.redis.get(cache_key)
-        if cached:
-            try:
-                data = json.loads(cached)
-                # Need to convert string dates back to datetime if sticking simply to dicts, 
-                # or rely on Pydantic to parse. 
-                # Simplest for now: The consumers of this usually just read fields.
-                # But StateSummary has fields. Let's start with recreating the object.
-                return StateSummary(**data)
-            except Exception as e:
-                print(f"Cache parse error: {e}")
-        
-        # DB Fetch
+        # Concurrent misses (dashboard + Horus on the same load) share one DB read;
+        # an expired summary is served while a single refresh runs.
+        data = await _STATE_SUMMARY_CACHE.get_or_compute(
+            cache_key,
+            lambda: self._load_state_summary(user_id),
+            stale_ttl_seconds=STATE_SUMMARY_STALE_SECONDS,
+        )
+        return StateSummary(**data)
+
+    async def _load_state_summary(self, user_id: str) -> dict:
         summary = await self.manager.get_state_summary(user_id)
-        
-        # Set Cache (Serialize with Pydantic .json() or .model_dump_json())
-        try:
-            self.redis.set(cache_key, summary.model_dump_json(), ex=120) # 2 mins cache
-        except Exception as e:
-            print(f"Cache set error: {e}")
-            
-        return summary
+        return summary.model_dump(mode="json")
 
     async def get_state_summary(self, user_id: str) -> StateSummary:
         """Alias for horus."""
@@ -10,15 +10,28 @@ from typing import List, Dict, Any, Optional, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from app.ai.service import get_gemini_client
 from app.core.db import db as prisma_client
+from app.core.cache import TwoTierCache
 from app.core.redis import redis_client
 from app.core.jobs import enqueue_job, register_job_handler
 
 logger = logging.getLogger(__name__)
 
 _VECTOR_DOCUMENT_COLUMNS: Optional[set[str]] = None
+_CONTENT_HASH_ENSURED = False
+# Chunks carry the SHA-256 of the document text they were split from, so the
+# same text indexed again (another upload, user or institution) copies the
+# existing embeddings instead of calling the embedding model per chunk.
+VECTOR_DOCUMENT_CONTENT_HASH_SQL = [
+    'ALTER TABLE "VectorDocument" ADD COLUMN IF NOT EXISTS "contentSha256" TEXT',
+    'CREATE INDEX IF NOT EXISTS "idx_vector_document_content_sha" ON "VectorDocument"("contentSha256", "chunkIndex")',
+]
 RAG_CACHE_TTL_SECONDS = 5 * 60
 RAG_CACHE_PREFIX = "rag:ctx:"
-_LOCAL_RAG_CACHE: dict[str, tuple[str, list[dict[str, Any]]]] = {}
+# Past the TTL a cached answer is still served while one refresh runs.
+RAG_CACHE_STALE_SECONDS = 60
+# Joins retrieved chunks in the context string, most relevant first.
+RAG_CHUNK_SEPARATOR = "\n...[Document Chunk]...\n"
+_RAG_CACHE = TwoTierCache("rag", ttl_seconds=RAG_CACHE_TTL_SECONDS, max_entries=512)
 
 class RagService:
     """Handles Vector Embeddings, Chunking, and Retrieval for Horus AI."""
@@ -51,6 +64,74 @@ class RagService:
         }
         return _VECTOR_DOCUMENT_COLUMNS
 
+    async def _ensure_content_hash_column(self) -> None:
+        global _CONTENT_HASH_ENSURED, _VECTOR_DOCUMENT_COLUMNS
+        if _CONTENT_HASH_ENSURED:
+            return
+        for sql in VECTOR_DOCUMENT_CONTENT_HASH_SQL:
+            await prisma_client.execute_raw(sql)
+        _CONTENT_HASH_ENSURED = True
+        _VECTOR_DOCUMENT_COLUMNS = None
+
+    async def _reuse_indexed_content(
+        self,
+        content_sha: str,
+        columns: set[str],
+        document_id: Optional[str],
+        standard_id: Optional[str],
+        user_id: Optional[str],
+        institution_id: Optional[str],
+    ) -> bool:
+        """
+        Index `content_sha` from chunks already embedded for the same text.
+        Returns False when no such chunks exist and the caller must embed.
+        """
+        rows = await prisma_client.query_raw(
+            """
+            SELECT
+                COUNT(*) FILTER (
+                    WHERE "documentId" IS NOT DISTINCT FROM $2 AND "standardId" IS NOT DISTINCT FROM $3
+                ) AS own,
+                COUNT(*) AS total
+            FROM "VectorDocument"
+            WHERE "contentSha256" = $1
+            """,
+            content_sha,
+            document_id,
+            standard_id,
+        )
+        counts = rows[0] if rows else {}
+        if int(counts.get("own") or 0):
+            logger.info(f"RAG: Document {document_id or standard_id} already indexed for this content; skipping.")
+            return True
+        if not int(counts.get("total") or 0):
+            return False
+
+        insert_columns = ['"id"', '"content"', '"embedding"', '"documentId"', '"standardId"', '"chunkIndex"', '"updatedAt"', '"contentSha256"']
+        select_values = ["gen_random_uuid()", '"content"', '"embedding"', "$2", "$3", '"chunkIndex"', "NOW()", "$1"]
+        params: List[Any] = [content_sha, document_id, standard_id]
+        for column, value in (("userId", user_id), ("institutionId", institution_id)):
+            if column in columns:
+                params.append(value)
+                insert_columns.append(f'"{column}"')
+                select_values.append(f"${len(params)}")
+
+        copied = await prisma_client.execute_raw(
+            f"""
+            INSERT INTO "VectorDocument" ({", ".join(insert_columns)})
+            SELECT {", ".join(select_values)}
+            FROM (
+                SELECT DISTINCT ON ("chunkIndex") "content", "embedding", "chunkIndex"
+                FROM "VectorDocument"
+                WHERE "contentSha256" = $1
+                ORDER BY "chunkIndex", "updatedAt" DESC
+            ) AS source
+            """,
+            *params,
+        )
+        logger.info(f"RAG: Reused {copied} embedded chunks for document {document_id or standard_id}.")
+        return True
+
     async def index_document(
         self,
         content: str,
@@ -64,9 +145,20 @@ class RagService:
             logger.warning(f"RAG: Empty content provided for indexing (doc_id={document_id})")
             return
 
+        content_sha = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        try:
+            await self._ensure_content_hash_column()
+        except Exception as e:
+            logger.warning(f"RAG: Could not ensure VectorDocument content hash column: {e}")
+        columns = await self._get_vector_document_columns()
+        if "contentSha256" in columns and await self._reuse_indexed_content(
+            content_sha, columns, document_id, standard_id, user_id, institution_id
+        ):
+            await redis_client.bump_generation(institution_id=institution_id, user_id=user_id)
+            return
+
         chunks = self.text_splitter.split_text(content)
         logger.info(f"RAG: Split document into {len(chunks)} chunks for embedding.")
-        columns = await self._get_vector_document_columns()
 
         async def embed_chunk(i: int, chunk: str):
             try:
@@ -96,6 +188,11 @@ class RagService:
             params: List[Any] = [chunk, embedding_str, document_id, standard_id, i]
             param_idx = 6
 
+            if "contentSha256" in columns:
+                insert_columns.append('"contentSha256"')
+                insert_values.append(f"${param_idx}")
+                params.append(content_sha)
+                param_idx += 1
             if "userId" in columns:
                 insert_columns.append('"userId"')
                 insert_values.append(f"${param_idx}")
@@ -112,6 +209,10 @@ class RagService:
             """
             await prisma_client.execute_raw(query, *params)
 
+        # New chunks make this tenant's cached retrievals stale. Unscoped documents
+        # are left to RAG_CACHE_TTL_SECONDS rather than evicting every tenant.
+        await redis_client.bump_generation(institution_id=institution_id, user_id=user_id)
+
 
     async def delete_document(self, document_id: str):
         """Remove all chunks for a document from the vector store."""
@@ -135,104 +236,116 @@ class RagService:
         """Embeds a query, searches the vector DB, and returns relevant text chunks.
         Scoped by user_id and/or institution_id when provided for multi-tenant security."""
         try:
-            cache_key = self._retrieve_cache_key(query, limit, document_id, user_id, institution_id)
-            cached = redis_client.get(cache_key)
-            if cached:
-                try:
-                    raw = json.loads(cached)
-                    return raw.get("context", ""), raw.get("sources", [])
-                except json.JSONDecodeError:
-                    pass
-            if cache_key in _LOCAL_RAG_CACHE:
-                return _LOCAL_RAG_CACHE[cache_key]
-            # 1. Generate query embedding (requires Gemini; OpenRouter-only has no embeddings)
-            try:
-                query_embedding = await self.ai_client.create_embedding(query)
-            except NotImplementedError:
-                logger.warning("RAG: Embeddings unavailable (Gemini not configured). Skipping retrieval.")
-                return "", []
-            if not query_embedding:
-                logger.warning("RAG: Empty query embedding returned. Skipping retrieval.")
+            generation = await redis_client.generation_token(
+                institution_id=institution_id, user_id=user_id
+            )
+            cache_key = self._retrieve_cache_key(query, limit, document_id, user_id, institution_id, generation)
+            # Concurrent identical queries share one embedding + vector search.
+            cached = await _RAG_CACHE.get_or_compute(
+                cache_key,
+                lambda: self._search_context(query, limit, document_id, user_id, institution_id),
+                stale_ttl_seconds=RAG_CACHE_STALE_SECONDS,
+            )
+            if not cached:
                 return "", []
-            embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
-            columns = await self._get_vector_document_columns()
-            
-            # 2. Build WHERE clause for scoping (user/institution for row-level security)
-            where_parts = []
-            params: List[Any] = [embedding_str]
-            param_idx = 2
-            if document_id:
-                where_parts.append(f'"documentId" = ${param_idx}')
-                params.append(document_id)
-                param_idx += 1
-            if user_id and "userId" in columns:
-                where_parts.append(f'("userId" = ${param_idx} OR "userId" IS NULL)')
-                params.append(user_id)
-                param_idx += 1
-            if institution_id and "institutionId" in columns:
-                where_parts.append(f'("institutionId" = ${param_idx} OR "institutionId" IS NULL)')
-                params.append(institution_id)
-                param_idx += 1
-            where_sql = " AND ".join(where_parts) if where_parts else "1=1"
-            params.append(limit)
-            limit_param = f"${param_idx}"
+            return cached.get("context", ""), cached.get("sources", [])
+
+        except Exception as e:
+            logger.error(f"RAG Retrieval failed: {e}")
+            return "", []  # Caller should handle empty; horus injects note when needed
+
+    async def _search_context(
+        self,
+        query: str,
+        limit: int,
+        document_id: Optional[str],
+        user_id: Optional[str],
+        institution_id: Optional[str],
+    ) -> Optional[Dict[str, Any]]:
+        """Embed and search; None means nothing relevant (and is not cached)."""
+        # 1. Generate query embedding (requires Gemini; OpenRouter-only has no embeddings)
+        try:
+            query_embedding = await self.ai_client.create_embedding(query)
+        except NotImplementedError:
+            logger.warning("RAG: Embeddings unavailable (Gemini not configured). Skipping retrieval.")
+            return None
+        if not query_embedding:
+            logger.warning("RAG: Empty query embedding returned. Skipping retrieval.")
+            return None
+        embedding_str = "[" + ",".join(map(str, query_embedding)) + "]"
+        columns = await self._get_vector_document_columns()
+        
+        # 2. Build WHERE clause for scoping (user/institution for row-level security)
+        where_parts = []
+        params: List[Any] = [embedding_str]
+        param_idx = 2
+        if document_id:
+            where_parts.append(f'"documentId" = ${param_idx}')
+            params.append(document_id)
+            param_idx += 1
+        if user_id and "userId" in columns:
+            where_parts.append(f'("userId" = ${param_idx} OR "userId" IS NULL)')
+            params.append(user_id)
+            param_idx += 1
+        if institution_id and "institutionId" in columns:
+            where_parts.append(f'("institutionId" = ${param_idx} OR "institutionId" IS NULL)')
+            params.append(institution_id)
+            param_idx += 1
+        where_sql = " AND ".join(where_parts) if where_parts else "1=1"
+        params.append(limit)
+        limit_param = f"${param_idx}"
+        
+        sql_query = f"""
+            SELECT "content", "documentId", 1 - ("embedding" <=> $1::vector) AS similarity
+            FROM "VectorDocument"
+            WHERE {where_sql}
+            ORDER BY "embedding" <=> $1::vector
+            LIMIT {limit_param}
+        """
+        results = await prisma_client.query_raw(sql_query, *params)
             
-            sql_query = f"""
-                SELECT "content", "documentId", 1 - ("embedding" <=> $1::vector) AS similarity
-                FROM "VectorDocument"
-                WHERE {where_sql}
-                ORDER BY "embedding" <=> $1::vector
-                LIMIT {limit_param}
-            """
-            results = await prisma_client.query_raw(sql_query, *params)
-                
-            if not results:
-                return "", []
-                
-            # 3. Format into context string and build sources
-            context_blocks = []
-            sources: List[Dict[str, Any]] = []
-            seen_doc_ids: set = set()
-            for idx, item in enumerate(results):
-                if item.get("similarity", 0) <= 0.6:
-                    continue
-                context_blocks.append(item["content"])
-                doc_id = item.get("documentId")
-                if doc_id and doc_id not in seen_doc_ids:
-                    seen_doc_ids.add(doc_id)
-                    excerpt = (item.get("content") or "")[:200].replace("\n", " ")
-                    sources.append({
-                        "document_id": doc_id,
-                        "title": None,  # Fetched below if needed
-                        "excerpt": excerpt,
-                        "similarity": round(item.get("similarity", 0), 2),
-                    })
-                    
-            if not context_blocks:
-                return "", []
+        if not results:
+            return None
             
-            # Resolve titles from Evidence when documentId is evidence id
-            for s in sources:
-                try:
-                    ev = await prisma_client.evidence.find_unique(
-                        where={"id": s["document_id"]},
-                    )
-                    if ev and ev.originalFilename:
-                        s["title"] = ev.originalFilename
-                    else:
-                        s["title"] = f"Document {s['document_id'][:8]}..."
-                except Exception:
-                    s["title"] = s["title"] or f"Source {len(sources)}"
+        # 3. Format into context string and build sources
+        context_blocks = []
+        sources: List[Dict[str, Any]] = []
+        seen_doc_ids: set = set()
+        for idx, item in enumerate(results):
+            if item.get("similarity", 0) <= 0.6:
+                continue
+            context_blocks.append(item["content"])
+            doc_id = item.get("documentId")
+            if doc_id and doc_id not in seen_doc_ids:
+                seen_doc_ids.add(doc_id)
+                excerpt = (item.get("content") or "")[:200].replace("\n", " ")
+                sources.append({
+                    "document_id": doc_id,
+                    "title": None,  # Fetched below if needed
+                    "excerpt": excerpt,
+                    "similarity": round(item.get("similarity", 0), 2),
+                })
                 
-            combined_context = "\n...[Document Chunk]...\n".join(context_blocks)
-            response = f"\n[RELEVANT RETRIEVED KNOWLEDGE]\n{combined_context}\n", sources
-            redis_client.set(cache_key, json.dumps({"context": response[0], "sources": response[1]}), ex=RAG_CACHE_TTL_SECONDS)
-            _LOCAL_RAG_CACHE[cache_key] = response
-            return response
+        if not context_blocks:
+            return None
+        
+        # Resolve titles from Evidence when documentId is evidence id (one query for all sources)
+        titles: Dict[str, str] = {}
+        try:
+            evidence_rows = await prisma_client.evidence.find_many(
+                where={"id": {"in": [s["document_id"] for s in sources]}},
+            )
+            titles = {ev.id: ev.originalFilename for ev in evidence_rows if ev.originalFilename}
+        except Exception:
+            titles = {}
+        for s in sources:
+            s["title"] = titles.get(s["document_id"]) or f"Document {s['document_id'][:8]}..."
             
-        except Exception as e:
-            logger.error(f"RAG Retrieval failed: {e}")
-            return "", []  # Caller should handle empty; horus injects note when needed
+        combined_context = RAG_CHUNK_SEPARATOR.join(context_blocks)
+        return {
+            "context": f"\n[RELEVANT RETRIEVED KNOWLEDGE]\n{combined_context}\n",
+            "sources": sources,
+        }
 
     async def retrieve_context_with_sources(
         self,
@@ -252,6 +365,7 @@ class RagService:
         document_id: Optional[str],
         user_id: Optional[str],
         institution_id: Optional[str],
+        generation: str = "g0",
     ) -> str:
         normalized = " ".join((query or "").lower().split())
         digest = hashlib.sha256(
@@ -266,7 +380,7 @@ class RagService:
                 sort_keys=True,
             ).encode("utf-8")
         ).hexdigest()
-        return f"{RAG_CACHE_PREFIX}{digest}"
+        return f"{RAG_CACHE_PREFIX}{generation}:{digest}"
 
     @staticmethod
     async def index_document_job(payload: dict):
@@ -298,7 +412,15 @@ class RagService:
                 "institution_id": institution_id,
             },
             priority=80,
+            dedupe_key=RagService._index_dedupe_key(content, document_id, standard_id),
         )
 
+    @staticmethod
+    def _index_dedupe_key(content: str, document_id: Optional[str], standard_id: Optional[str]) -> str:
+        # Keyed on the content hash so an edited document still gets re-indexed
+        # while an identical request is already queued or running.
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+        return f"rag.index_document:{document_id or standard_id or '-'}:{digest}"
+
 
 register_job_handler("rag.index_document", RagService.index_document_job)
@@ -2,12 +2,14 @@
 
 from __future__ import annotations
 
+import hmac
 import logging
+import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
@@ -17,8 +19,12 @@ from app.auth.router import router as auth_router
 from app.bootstrap.standards_seed import seed_missing_standards
 from app.core.config import settings
 from app.core.db import connect_db, disconnect_db
+from app.core.events import event_bus
+from app.core.http_metrics import http_metrics, render_prometheus
+from app.core.metrics import ai_usage_buffer
 from app.core.middlewares import ai_provider_preference_middleware, request_timing_middleware
 from app.core.rate_limit import limiter
+from app.core.redis import redis_client
 from app.evidence.router import router as evidence_router
 from app.gap_analysis.router import router as gap_analysis_router
 from app.dashboard.router import router as dashboard_router
@@ -29,6 +35,7 @@ from app.demo_request.router import router as demo_request_router
 from app.access_request.router import router as access_request_router
 
 from app.horus.router import router as horus_router
+from app.jobs.router import router as jobs_router
 from app.institutions.router import router as institutions_router
 from app.standards.router import router as standards_router
 
@@ -44,6 +51,10 @@ async def lifespan(app: FastAPI):
     await seed_missing_standards()
     yield
     logger.info("Shutting down Ayn Platform API...")
+    await ai_usage_buffer.close()
+    await event_bus.multiplexer.close()
+    await http_metrics.close()
+    await redis_client.close()
     await disconnect_db()
 
 
@@ -104,6 +115,7 @@ app.include_router(access_request_router, prefix="/api", tags=["Access Requests"
 
 app.include_router(horus_router, prefix="/api", tags=["Horus"])
 app.include_router(analytics_router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(jobs_router, prefix="/api/jobs", tags=["Jobs"])
 
 from v2.main import v2_router
 app.include_router(v2_router, prefix="/api")
@@ -134,6 +146,22 @@ async def health_check():
         return {"status": "degraded", "database": "disconnected"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics(request: Request):
+    """Prometheus scrape endpoint; HTTP metrics merged across every live API process."""
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        # Without a token the endpoint only exists for local development.
+        if not settings.DEBUG:
+            return PlainTextResponse("Not Found", status_code=404)
+    else:
+        supplied = request.headers.get("authorization") or ""
+        if not hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode()):
+            return PlainTextResponse("Unauthorized", status_code=401)
+    snapshots = await http_metrics.collect()
+    return PlainTextResponse(render_prometheus(snapshots), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
 
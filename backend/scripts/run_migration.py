@@ -102,12 +102,35 @@ STATEMENTS = [
         "runAfter" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
         "lockedAt" TIMESTAMP WITH TIME ZONE,
         "lockedBy" TEXT,
+        "lockedUntil" TIMESTAMP WITH TIME ZONE,
+        "dedupeKey" TEXT,
         "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
         "updatedAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
     )''',
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_status_run_after" ON "AsyncJob"(status, "runAfter", priority)',
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_type_status" ON "AsyncJob"(type, status)',
-    'CREATE INDEX IF NOT EXISTS "idx_async_job_created_at" ON "AsyncJob"("createdAt" DESC)',
+    'ALTER TABLE "AsyncJob" ADD COLUMN IF NOT EXISTS "lockedUntil" TIMESTAMP WITH TIME ZONE',
+    'ALTER TABLE "AsyncJob" ADD COLUMN IF NOT EXISTS "dedupeKey" TEXT',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_queued" ON "AsyncJob"("runAfter", priority) WHERE status = \'queued\'',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_live_type" ON "AsyncJob"(type, status) WHERE status <> \'succeeded\'',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_finished" ON "AsyncJob"("updatedAt") WHERE status IN (\'succeeded\', \'failed\')',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_lease" ON "AsyncJob"("lockedUntil") WHERE status = \'running\'',
+    'CREATE UNIQUE INDEX IF NOT EXISTS "uq_async_job_dedupe_live" ON "AsyncJob"("dedupeKey") WHERE "dedupeKey" IS NOT NULL AND status IN (\'queued\', \'running\')',
+    'DROP INDEX IF EXISTS "idx_async_job_status_run_after"',
+    'DROP INDEX IF EXISTS "idx_async_job_type_status"',
+    'DROP INDEX IF EXISTS "idx_async_job_created_at"',
+    '''CREATE TABLE IF NOT EXISTS "AsyncJobAttempt" (
+        id BIGSERIAL PRIMARY KEY,
+        "jobId" TEXT NOT NULL,
+        type TEXT NOT NULL,
+        attempt INTEGER NOT NULL,
+        "workerId" TEXT,
+        status TEXT NOT NULL DEFAULT 'running',
+        "waitMs" DOUBLE PRECISION NOT NULL DEFAULT 0,
+        "runMs" DOUBLE PRECISION,
+        "startedAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        "finishedAt" TIMESTAMP WITH TIME ZONE
+    )''',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_attempt_open" ON "AsyncJobAttempt"("jobId") WHERE "finishedAt" IS NULL',
+    'CREATE INDEX IF NOT EXISTS "idx_async_job_attempt_finished" ON "AsyncJobAttempt"("finishedAt", type)',
     '''CREATE TABLE IF NOT EXISTS "EventOutbox" (
         id TEXT PRIMARY KEY,
         "userId" TEXT NOT NULL REFERENCES "User"(id) ON DELETE CASCADE,
@@ -121,9 +144,12 @@ STATEMENTS = [
         "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
         "processedAt" TIMESTAMP WITH TIME ZONE
     )''',
-    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_status_created" ON "EventOutbox"(status, "createdAt")',
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_pending_created" ON "EventOutbox"("createdAt") WHERE status <> \'processed\'',
     'CREATE INDEX IF NOT EXISTS "idx_event_outbox_user_created" ON "EventOutbox"("userId", "createdAt" DESC)',
-    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_type_status" ON "EventOutbox"(type, status)',
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_pending_type" ON "EventOutbox"(type) WHERE status <> \'processed\'',
+    'CREATE INDEX IF NOT EXISTS "idx_event_outbox_processed" ON "EventOutbox"("processedAt") WHERE status = \'processed\'',
+    'DROP INDEX IF EXISTS "idx_event_outbox_status_created"',
+    'DROP INDEX IF EXISTS "idx_event_outbox_type_status"',
     '''CREATE TABLE IF NOT EXISTS "HorusMemory" (
         id TEXT PRIMARY KEY,
         "userId" TEXT NOT NULL REFERENCES "User"(id) ON DELETE CASCADE,
@@ -161,6 +187,16 @@ STATEMENTS = [
     'CREATE INDEX IF NOT EXISTS "idx_ai_usage_created" ON "AIUsageMetric"("createdAt" DESC)',
     'CREATE INDEX IF NOT EXISTS "idx_ai_usage_user_created" ON "AIUsageMetric"("userId", "createdAt" DESC)',
     'CREATE INDEX IF NOT EXISTS "idx_ai_usage_feature_operation" ON "AIUsageMetric"(feature, operation, "createdAt" DESC)',
+    # Archive tables written by app.core.retention.
+    *[
+        f'''CREATE TABLE IF NOT EXISTS "{archive}" (
+        id TEXT PRIMARY KEY,
+        "recordedAt" TIMESTAMP WITH TIME ZONE,
+        "archivedAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        data JSONB NOT NULL
+    )'''
+        for archive in ("AsyncJobArchive", "EventOutboxArchive", "AIUsageMetricArchive")
+    ],
     'CREATE INDEX IF NOT EXISTS "idx_message_chat_timestamp" ON "Message"("chatId", "timestamp" DESC)',
     'CREATE INDEX IF NOT EXISTS "idx_chat_user_updated" ON "Chat"("userId", "updatedAt" DESC)',
     'CREATE INDEX IF NOT EXISTS "idx_activity_user_created" ON "Activity"("userId", "createdAt" DESC)',
@@ -168,6 +204,48 @@ STATEMENTS = [
     'CREATE INDEX IF NOT EXISTS "idx_vector_document_user_document" ON "VectorDocument"("userId", "documentId")',
     'CREATE INDEX IF NOT EXISTS "idx_vector_document_institution_standard" ON "VectorDocument"("institutionId", "standardId")',
     'CREATE INDEX IF NOT EXISTS "idx_vector_document_document_chunk" ON "VectorDocument"("documentId", "chunkIndex")',
+    # Content-addressed evidence blobs and embedding reuse (app.evidence.blobs, app.rag.service).
+    '''CREATE TABLE IF NOT EXISTS "EvidenceBlob" (
+        sha256 TEXT PRIMARY KEY,
+        "storagePath" TEXT NOT NULL UNIQUE,
+        size BIGINT NOT NULL,
+        "contentType" TEXT,
+        "refCount" INTEGER NOT NULL DEFAULT 0,
+        uploaded BOOLEAN NOT NULL DEFAULT FALSE,
+        extraction JSONB,
+        "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        "updatedAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        "releasedAt" TIMESTAMP WITH TIME ZONE
+    )''',
+    'CREATE INDEX IF NOT EXISTS "idx_evidence_blob_unreferenced" ON "EvidenceBlob"("releasedAt") WHERE "refCount" <= 0',
+    'ALTER TABLE "VectorDocument" ADD COLUMN IF NOT EXISTS "contentSha256" TEXT',
+    'CREATE INDEX IF NOT EXISTS "idx_vector_document_content_sha" ON "VectorDocument"("contentSha256", "chunkIndex")',
+    # Rolling Horus chat summaries (app.horus.conversation_summary).
+    '''CREATE TABLE IF NOT EXISTS "HorusChatSummary" (
+        "chatId" TEXT PRIMARY KEY REFERENCES "Chat"(id) ON DELETE CASCADE,
+        summary TEXT NOT NULL,
+        "coveredMessageId" TEXT NOT NULL,
+        "coveredMessages" INTEGER NOT NULL DEFAULT 0,
+        "updatedAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+    )''',
+    # Horus semantic response cache (app.horus.semantic_cache).
+    '''CREATE TABLE IF NOT EXISTS "HorusSemanticCache" (
+        id TEXT PRIMARY KEY DEFAULT gen_random_uuid()::text,
+        "institutionId" TEXT NOT NULL,
+        "queryHash" TEXT NOT NULL,
+        query TEXT NOT NULL,
+        response TEXT NOT NULL,
+        embedding vector(768) NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        "createdAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        "lastHitAt" TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+        "expiresAt" TIMESTAMP WITH TIME ZONE NOT NULL
+    )''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS "idx_horus_semantic_cache_query" ON "HorusSemanticCache"("institutionId", "queryHash")',
+    'CREATE INDEX IF NOT EXISTS "idx_horus_semantic_cache_lru" ON "HorusSemanticCache"("institutionId", "lastHitAt" DESC)',
+    'CREATE INDEX IF NOT EXISTS "idx_horus_semantic_cache_expires" ON "HorusSemanticCache"("expiresAt")',
+    # Lookups scan one tenant's rows exactly; a global HNSW index filters by tenant too late.
+    'DROP INDEX IF EXISTS "idx_horus_semantic_cache_embedding_hnsw"',
     '''DO $$
     BEGIN
         CREATE INDEX IF NOT EXISTS "idx_vector_document_embedding_hnsw"
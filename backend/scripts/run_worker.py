@@ -2,6 +2,11 @@
 
 Usage:
     python backend/scripts/run_worker.py
+
+Knobs (environment):
+    AYN_WORKER_CONCURRENCY       jobs run at once by this process (default 4)
+    AYN_WORKER_TYPE_LIMITS       per-type caps, e.g. "rag.index_document=2,horus.observe_event=8"
+    AYN_WORKER_SHUTDOWN_TIMEOUT  seconds to let running jobs finish on SIGTERM before requeueing them
 """
 
 from __future__ import annotations
@@ -9,6 +14,7 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
+import signal
 import sys
 from pathlib import Path
 
@@ -17,10 +23,13 @@ if str(BACKEND_DIR) not in sys.path:
     sys.path.insert(0, str(BACKEND_DIR))
 
 from app.core.db import connect_db, disconnect_db
-from app.core.jobs import run_worker_loop
+from app.core.jobs import JobWorker, parse_type_limits
+from app.core.metrics import ai_usage_buffer
 
 # Import modules that register job handlers.
+import app.core.retention  # noqa: F401
 import app.evidence.service  # noqa: F401
+import app.horus.conversation_summary  # noqa: F401
 import app.horus.observer  # noqa: F401
 import app.horus.progressive_analysis  # noqa: F401
 import app.rag.service  # noqa: F401
@@ -30,13 +39,26 @@ logging.basicConfig(level=logging.INFO)
 
 async def main() -> None:
     await connect_db()
+    worker = JobWorker(
+        worker_id=os.getenv("AYN_WORKER_ID"),
+        concurrency=int(os.getenv("AYN_WORKER_CONCURRENCY", "4")),
+        type_limits=parse_type_limits(os.getenv("AYN_WORKER_TYPE_LIMITS", "rag.index_document=2")),
+        batch_size=int(os.getenv("AYN_WORKER_BATCH_SIZE", "5")),
+        poll_interval=float(os.getenv("AYN_WORKER_POLL_INTERVAL", "1.0")),
+        listen=os.getenv("AYN_WORKER_LISTEN", "true").lower() in ("1", "true", "yes"),
+        fallback_poll_interval=float(os.getenv("AYN_WORKER_FALLBACK_POLL_INTERVAL", "30")),
+        shutdown_timeout=float(os.getenv("AYN_WORKER_SHUTDOWN_TIMEOUT", "30")),
+    )
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, worker.stop)
+        except NotImplementedError:  # Windows
+            pass
     try:
-        await run_worker_loop(
-            worker_id=os.getenv("AYN_WORKER_ID"),
-            poll_interval=float(os.getenv("AYN_WORKER_POLL_INTERVAL", "1.0")),
-            limit=int(os.getenv("AYN_WORKER_BATCH_SIZE", "5")),
-        )
+        await worker.run()
     finally:
+        await ai_usage_buffer.close()
         await disconnect_db()
 
 
@@ -23,13 +23,13 @@ async def test_redis():
     val = "hello_redis"
     
     print(f"Setting {key}={val}")
-    success = redis_client.set(key, val)
+    success = await redis_client.set(key, val)
     if not success:
         print("Failed to SET.")
         return
 
     print("Getting value...")
-    fetched = redis_client.get(key)
+    fetched = await redis_client.get(key)
     print(f"Got: {fetched}")
     
     if fetched == val:
@@ -38,7 +38,7 @@ async def test_redis():
         print("FAILURE: Values do not match.")
         
     print("Deleting key...")
-    redis_client.delete(key)
+    await redis_client.delete(key)
     print("Done.")
 
 async def verify_service_import():
@@ -0,0 +1,39 @@
+from app.ai.prompt_packing import PromptPacker, PromptSegment
+
+
+def _words(n: int, word: str = "criterion") -> str:
+    return " ".join([word] * n)
+
+
+def test_prompt_within_budget_is_untouched():
+    segments = [
+        PromptSegment.text("system", 100, "You are Horus.", truncatable=False),
+        PromptSegment("history", 50, [{"role": "user", "content": "hi"}], drop_from="start", min_parts=1),
+    ]
+    packed = PromptPacker(1000).pack(segments)
+
+    assert packed.degraded == {}
+    assert packed.text("system") == "You are Horus."
+    assert packed.messages("history") == [{"role": "user", "content": "hi"}]
+
+
+def test_lowest_priority_segments_degrade_first():
+    history = [{"role": "user", "content": _words(200)} for _ in range(4)]
+    history.append({"role": "user", "content": "current question"})
+    segments = [
+        PromptSegment.text("system", 100, _words(50), truncatable=False),
+        PromptSegment("rag", 70, [_words(100, "first"), _words(100, "second"), _words(100, "third")]),
+        PromptSegment("history", 50, history, drop_from="start", min_parts=1),
+    ]
+    packed = PromptPacker(400).pack(segments)
+
+    # History loses its oldest turns before any retrieved chunk is touched,
+    # and the current turn always survives.
+    assert packed.messages("history") == [{"role": "user", "content": "current question"}]
+    assert packed.degraded["history"]["dropped"] == 4
+    # The least relevant chunk goes first; the boundary chunk is truncated.
+    rag = packed.segments["rag"]
+    assert rag[0] == _words(100, "first")
+    assert len(rag) == 2 and rag[1].startswith("second") and rag[1].endswith("[...truncated for length...]")
+    assert packed.text("system") == _words(50)
+    assert packed.tokens <= 400
@@ -0,0 +1,108 @@
+from app.core.redis import RedisClient
+
+
+async def test_generation_token_changes_only_for_bumped_tenant(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.delenv("UPSTASH_REDIS_REST_URL", raising=False)
+    client = RedisClient()
+    assert client.enabled is False
+
+    before_a = await client.generation_token(institution_id="inst-a", user_id="user-a")
+    before_b = await client.generation_token(institution_id="inst-b")
+    before_admin = await client.generation_token(global_scope=True)
+
+    await client.invalidate_dashboard_cache(institution_id="inst-a", user_id="user-a")
+
+    assert await client.generation_token(institution_id="inst-a", user_id="user-a") != before_a
+    assert await client.generation_token(institution_id="inst-b") == before_b
+    assert await client.generation_token(global_scope=True) != before_admin
+
+
+async def test_two_tier_cache_is_bounded_and_counts_hits(monkeypatch):
+    from app.core import cache as cache_module
+
+    monkeypatch.setattr(cache_module.redis_client, "enabled", False)
+    cache = cache_module.TwoTierCache("test.bounded", ttl_seconds=60, max_entries=2)
+
+    await cache.set("a", {"v": 1})
+    await cache.set("b", {"v": 2})
+    assert await cache.get("a") == {"v": 1}
+    await cache.set("c", {"v": 3})  # evicts "b", the least recently used
+
+    assert await cache.get("b") is None
+    assert await cache.get("c") == {"v": 3}
+    stats = cache_module.cache_stats()["test.bounded"]
+    assert stats["l1_hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["l1_entries"] == 2
+
+
+def test_lru_byte_budget_and_ttl(monkeypatch):
+    from app.core import cache as cache_module
+
+    clock = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+    lru = cache_module.LRUCache(max_entries=10, ttl_seconds=5, max_bytes=10)
+
+    lru.set("big", "x" * 11)
+    assert lru.get("big") is None
+    lru.set("a", "aaaaaa")
+    lru.set("b", "bbbbbb")
+    assert lru.get("a") is None
+    assert lru.size_bytes == 6
+
+    clock[0] += 6
+    assert lru.get("b") is None
+    assert lru.stats.expirations == 1
+
+
+async def test_get_or_compute_coalesces_misses_and_serves_stale(monkeypatch):
+    import asyncio
+
+    from app.core import cache as cache_module
+
+    monkeypatch.setattr(cache_module.redis_client, "enabled", False)
+    cache = cache_module.TwoTierCache("test.coalesce", ttl_seconds=60)
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return {"n": len(calls)}
+
+    waiters = [asyncio.create_task(cache.get_or_compute("k", compute, stale_ttl_seconds=30)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert [await w for w in waiters] == [{"n": 1}] * 5
+    assert len(calls) == 1
+
+    # Past the fresh window: the old value comes back at once and one refresh runs.
+    wall = [cache_module.time.time() + 61]
+    monkeypatch.setattr(cache_module.time, "time", lambda: wall[0])
+    assert await cache.get_or_compute("k", compute, stale_ttl_seconds=30) == {"n": 1}
+    assert await cache.get_or_compute("k", compute, stale_ttl_seconds=30) == {"n": 1}
+    await asyncio.gather(*cache._refresh_tasks.values())
+    assert len(calls) == 2
+    assert await cache.get_or_compute("k", compute, stale_ttl_seconds=30) == {"n": 2}
+    assert cache.stats.stale_hits == 2
+    assert cache.stats.refreshes == 1
+
+
+async def test_principal_cache_is_keyed_by_issue_time_and_invalidated_per_user():
+    from app.core.principal_cache import PrincipalCache
+
+    cache = PrincipalCache(ttl_seconds=60, l1_ttl_seconds=60, max_entries=10)
+    principal = {"id": "u1", "role": "ADMIN"}
+    await cache.set("u1", "100", principal)
+    await cache.set("u1", "200", principal)
+    await cache.set("u2", "100", {"id": "u2"})
+
+    assert await cache.get("u1", "100") == principal
+    assert await cache.get("u1", "300") is None
+
+    await cache.invalidate("u1")
+    assert await cache.get("u1", "100") is None
+    assert await cache.get("u1", "200") is None
+    assert await cache.get("u2", "100") == {"id": "u2"}
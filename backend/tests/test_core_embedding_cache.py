@@ -0,0 +1,47 @@
+import asyncio
+import json
+import random
+
+from app.core import embedding_cache as embedding_cache_module
+from app.core.embedding_cache import EmbeddingCache, pack_vector, unpack_vector
+
+
+async def test_same_text_is_embedded_once(monkeypatch):
+    monkeypatch.setattr(embedding_cache_module.redis_client, "enabled", False)
+    cache = EmbeddingCache()
+    calls = []
+
+    async def embed(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return [0.25, -0.5, 1.0]
+
+    first, second = await asyncio.gather(
+        cache.get_or_embed("m", 3, "What is  ISO 21001?", embed),
+        cache.get_or_embed("m", 3, "What is ISO 21001?\n", embed),
+    )
+    third = await cache.get_or_embed("m", 3, "What is ISO 21001?", embed)
+    assert first == second == third == [0.25, -0.5, 1.0]
+    assert len(calls) == 1
+
+    await cache.get_or_embed("other-model", 3, "What is ISO 21001?", embed)
+    assert len(calls) == 2
+
+
+async def test_failed_embeddings_are_not_cached(monkeypatch):
+    monkeypatch.setattr(embedding_cache_module.redis_client, "enabled", False)
+    cache = EmbeddingCache()
+    results = [[], [0.5]]
+
+    async def embed(text):
+        return results.pop(0)
+
+    assert await cache.get_or_embed("m", 1, "hello", embed) == []
+    assert await cache.get_or_embed("m", 1, "hello", embed) == [0.5]
+
+
+def test_vectors_are_packed_as_float32():
+    vector = [random.uniform(-0.1, 0.1) for _ in range(768)]
+    raw = pack_vector(vector)
+    assert len(raw) < len(json.dumps(vector)) / 3
+    assert all(abs(a - b) < 1e-8 for a, b in zip(unpack_vector(raw), vector))
@@ -0,0 +1,123 @@
+import asyncio
+
+from app.core import events as events_module
+from app.core.events import EventBus, StreamMultiplexer
+
+
+class FakeStreams:
+    """Minimal in-memory stand-in for the Redis stream commands the bus uses."""
+
+    def __init__(self):
+        self.streams: dict[str, list[tuple[str, dict]]] = {}
+        self.xread_calls: list[dict[str, str]] = []
+        self._seq = 0
+        self._changed = asyncio.Event()
+
+    def add(self, key, payload):
+        self._seq += 1
+        entry_id = f"{self._seq}-0"
+        self.streams.setdefault(key, []).append((entry_id, {"event": events_module.json.dumps(payload)}))
+        self._changed.set()
+        return entry_id
+
+    @staticmethod
+    def _after(entries, last_id):
+        last = events_module._parse_stream_id(last_id)
+        return [entry for entry in entries if events_module._parse_stream_id(entry[0]) > last]
+
+    async def xrevrange(self, key, count=None):
+        return list(reversed(self.streams.get(key, [])))[:count]
+
+    async def xrange(self, key, min="-", max="+", count=None):
+        return self._after(self.streams.get(key, []), min.lstrip("("))[:count]
+
+    async def xread(self, streams, count=None, block=None):
+        self.xread_calls.append(dict(streams))
+        response = []
+        for key, last_id in streams.items():
+            entries = self._after(self.streams.get(key, []), last_id)[:count]
+            if entries:
+                response.append((key, entries))
+        if response:
+            return response
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=(block or 0) / 1000)
+        except asyncio.TimeoutError:
+            pass
+        return []
+
+
+def _use_fake_redis(monkeypatch, fake):
+    monkeypatch.setattr(events_module.redis_client, "enabled", True)
+    monkeypatch.setattr(events_module.redis_client, "redis", fake)
+
+
+async def test_multiplexer_reads_all_keys_in_one_call_and_routes_entries(monkeypatch):
+    fake = FakeStreams()
+    _use_fake_redis(monkeypatch, fake)
+    mux = StreamMultiplexer(block_ms=50)
+    alice = await mux.subscribe("s:alice")
+    alice_2 = await mux.subscribe("s:alice")
+    bob = await mux.subscribe("s:bob")
+
+    fake.add("s:alice", {"type": "a"})
+    fake.add("s:bob", {"type": "b"})
+    got = [await asyncio.wait_for(sub.queue.get(), 1) for sub in (alice, alice_2, bob)]
+    assert [event.payload["type"] for event in got] == ["a", "a", "b"]
+    assert any(set(call) == {"s:alice", "s:bob"} for call in fake.xread_calls)
+
+    mux.unsubscribe(bob)
+    assert mux.keys == ["s:alice"]
+    mux.unsubscribe(alice)
+    mux.unsubscribe(alice_2)
+    await asyncio.sleep(0.1)
+    assert not mux.running
+    await mux.close()
+
+
+async def test_stream_resumes_after_last_id_without_duplicates(monkeypatch):
+    fake = FakeStreams()
+    _use_fake_redis(monkeypatch, fake)
+    bus = EventBus()
+    bus.multiplexer = StreamMultiplexer(block_ms=50)
+    key = bus.stream_key("u1")
+    first = fake.add(key, {"type": "one"})
+    fake.add(key, {"type": "two"})
+
+    stream = bus.stream("u1", last_id=first, heartbeat_interval=1)
+    caught_up = await asyncio.wait_for(stream.__anext__(), 1)
+    assert caught_up.payload["type"] == "two"
+
+    fake.add(key, {"type": "three"})
+    live = await asyncio.wait_for(stream.__anext__(), 1)
+    assert live.payload["type"] == "three"
+
+    await stream.aclose()
+    assert bus.multiplexer.keys == []
+    await bus.multiplexer.close()
+
+
+async def test_emit_falls_back_to_local_delivery_when_xadd_fails(monkeypatch):
+    fake = FakeStreams()
+
+    async def failing_xadd(*args, **kwargs):
+        raise ConnectionError("redis down")
+
+    fake.xadd = failing_xadd
+    _use_fake_redis(monkeypatch, fake)
+    bus = EventBus()
+    bus.multiplexer = StreamMultiplexer(block_ms=50)
+
+    stream = bus.stream("u1", heartbeat_interval=1)
+    pending = asyncio.ensure_future(stream.__anext__())
+    while not bus.multiplexer.keys:
+        await asyncio.sleep(0.01)
+    await bus.emit("u1", "activity", {"title": "x"}, durable=False)
+
+    event = await asyncio.wait_for(pending, 1)
+    assert event.id == ""
+    assert event.payload["type"] == "activity"
+
+    await stream.aclose()
+    await bus.multiplexer.close()
@@ -0,0 +1,42 @@
+from app.core.http_metrics import HttpMetrics, render_prometheus
+from app.core.server_timing import (
+    add_timing,
+    current_timings,
+    format_server_timing,
+    reset_request_timings,
+    start_request_timings,
+)
+
+
+def test_render_merges_process_snapshots_into_cumulative_histograms():
+    first, second = HttpMetrics(process_id="a"), HttpMetrics(process_id="b")
+    first.observe("/api/items/{id}", "GET", 200, 0.003)
+    first.observe("/api/items/{id}", "GET", 201, 0.2)
+    second.observe("/api/items/{id}", "GET", 204, 40.0)
+    second.request_started("POST")
+
+    text = render_prometheus([first.snapshot(), second.snapshot()])
+
+    labels = 'route="/api/items/{id}",method="GET",status="2xx"'
+    assert f'ayn_http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1' in text
+    assert f'ayn_http_request_duration_seconds_bucket{{{labels},le="0.25"}} 2' in text
+    assert f'ayn_http_request_duration_seconds_bucket{{{labels},le="30.0"}} 2' in text
+    assert f'ayn_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    assert f"ayn_http_request_duration_seconds_count{{{labels}}} 3" in text
+    assert 'ayn_http_requests_in_flight{method="POST"} 1' in text
+    assert 'ayn_event_loop_lag_seconds{process="b"}' in text
+
+
+def test_server_timing_only_records_inside_a_request():
+    add_timing("db", 5)
+    assert current_timings() == {}
+
+    token = start_request_timings()
+    try:
+        add_timing("db", 2.5)
+        add_timing("db", 1.0)
+        add_timing("ai", 100)
+        assert format_server_timing(current_timings(), 120) == "db;dur=3.5, ai;dur=100.0, total;dur=120.0"
+    finally:
+        reset_request_timings(token)
+    assert current_timings() == {}
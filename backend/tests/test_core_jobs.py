@@ -0,0 +1,331 @@
+import asyncio
+
+from app.core import job_metrics, jobs, retention
+
+
+async def _schedule_retention():
+    return "retention-job"
+
+
+def _stub_maintenance(monkeypatch, leases=None):
+    async def extend_leases(job_ids, *, worker_id):
+        if leases is not None:
+            leases.append(list(job_ids))
+        return set(job_ids)
+
+    async def reap_expired_jobs(*, limit=100):
+        return 0
+
+    async def publish_job_metrics_snapshot(**_kwargs):
+        return None
+
+    monkeypatch.setattr(jobs, "extend_leases", extend_leases)
+    monkeypatch.setattr(jobs, "reap_expired_jobs", reap_expired_jobs)
+    monkeypatch.setattr(job_metrics, "publish_job_metrics_snapshot", publish_job_metrics_snapshot)
+    monkeypatch.setattr(retention, "schedule_retention", _schedule_retention)
+
+
+def test_listen_dsn_prefers_direct_url_and_drops_prisma_params(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "postgresql://u:p@pooler:6543/db?pgbouncer=true&connection_limit=10")
+    monkeypatch.setenv("DIRECT_URL", "postgresql://u:p@direct:5432/db?sslmode=require&pool_timeout=30")
+
+    assert jobs._listen_dsn() == "postgresql://u:p@direct:5432/db?sslmode=require"
+
+
+async def test_job_wakeup_returns_on_notify_and_times_out_otherwise(monkeypatch):
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    monkeypatch.delenv("DIRECT_URL", raising=False)
+    wakeup = jobs.JobWakeup()
+    assert await wakeup.start() is False
+
+    assert await wakeup.wait(0.01) is False
+    asyncio.get_running_loop().call_soon(wakeup._on_notify, None, 0, jobs.JOB_NOTIFY_CHANNEL, "rag.index_document")
+    assert await wakeup.wait(1) is True
+
+
+
+async def test_job_wakeup_never_connects_when_listening_is_disabled(monkeypatch):
+    def no_dsn():
+        raise AssertionError("a disabled wakeup must not open a LISTEN connection")
+
+    monkeypatch.setattr(jobs, "_listen_dsn", no_dsn)
+    worker = jobs.JobWorker(worker_id="w1", listen=False)
+
+    assert await worker.wakeup.start() is False
+    assert await worker.wakeup.wait(0.01) is False
+    asyncio.get_running_loop().call_soon(worker.wakeup.wake)
+    assert await worker.wakeup.wait(1) is True
+
+def test_parse_type_limits_ignores_malformed_entries():
+    assert jobs.parse_type_limits("rag.index_document=2, horus.observe_event=8,bad,x=") == {
+        "rag.index_document": 2,
+        "horus.observe_event": 8,
+    }
+
+
+async def test_job_worker_runs_concurrently_within_type_caps(monkeypatch):
+    queue = [{"id": f"rag-{i}", "type": "rag.index_document", "payload": {}} for i in range(3)]
+    queue += [{"id": f"obs-{i}", "type": "horus.observe_event", "payload": {}} for i in range(3)]
+    by_id = {job["id"]: job for job in queue}
+    running = {"rag.index_document": 0, "peak_rag": 0, "total": 0, "peak_total": 0}
+    done: list[str] = []
+    worker = jobs.JobWorker(
+        worker_id="w1",
+        concurrency=3,
+        type_limits={"rag.index_document": 1},
+        listen=False,
+        poll_interval=0.01,
+    )
+
+    async def claim_jobs(*, worker_id, limit, exclude_types=None):
+        picked = [job for job in queue if job["type"] not in (exclude_types or [])][:limit]
+        for job in picked:
+            queue.remove(job)
+        return picked
+
+    async def release_jobs(job_ids, *, worker_id):
+        queue.extend(by_id[job_id] for job_id in job_ids)
+
+    async def handler(_payload):
+        running["total"] += 1
+        running["peak_total"] = max(running["peak_total"], running["total"])
+        await asyncio.sleep(0.01)
+        running["total"] -= 1
+
+    async def rag_handler(payload):
+        running["rag.index_document"] += 1
+        running["peak_rag"] = max(running["peak_rag"], running["rag.index_document"])
+        await handler(payload)
+        running["rag.index_document"] -= 1
+
+    async def complete_job(job, *, worker_id):
+        done.append(job["id"])
+        if len(done) == 6:
+            worker.stop()
+
+    async def seconds_until_next_job():
+        return None
+
+    monkeypatch.setattr(jobs, "claim_jobs", claim_jobs)
+    monkeypatch.setattr(jobs, "release_jobs", release_jobs)
+    monkeypatch.setattr(jobs, "complete_job", complete_job)
+    monkeypatch.setattr(jobs, "seconds_until_next_job", seconds_until_next_job)
+    monkeypatch.setitem(jobs._HANDLERS, "rag.index_document", rag_handler)
+    monkeypatch.setitem(jobs._HANDLERS, "horus.observe_event", handler)
+    _stub_maintenance(monkeypatch)
+
+    await asyncio.wait_for(worker.run(), timeout=5)
+
+    assert sorted(done) == sorted([f"rag-{i}" for i in range(3)] + [f"obs-{i}" for i in range(3)])
+    assert running["peak_rag"] == 1
+    assert running["peak_total"] > 1
+
+
+async def test_job_worker_heartbeats_and_requeues_unfinished_jobs_on_shutdown(monkeypatch):
+    released: list[str] = []
+    started = asyncio.Event()
+    worker = jobs.JobWorker(worker_id="w1", concurrency=2, listen=False, shutdown_timeout=0.01)
+    batches = [[{"id": "slow", "type": "slow", "payload": {}}]]
+
+    async def claim_jobs(*, worker_id, limit, exclude_types=None):
+        return batches.pop() if batches else []
+
+    async def release_jobs(job_ids, *, worker_id):
+        released.extend(job_ids)
+
+    async def slow(_payload):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def seconds_until_next_job():
+        return None
+
+    monkeypatch.setattr(jobs, "claim_jobs", claim_jobs)
+    monkeypatch.setattr(jobs, "release_jobs", release_jobs)
+    monkeypatch.setattr(jobs, "seconds_until_next_job", seconds_until_next_job)
+    monkeypatch.setitem(jobs._HANDLERS, "slow", slow)
+    leases: list[list[str]] = []
+    _stub_maintenance(monkeypatch, leases)
+
+    run = asyncio.create_task(worker.run())
+    await started.wait()
+    await asyncio.sleep(0)  # let the heartbeat renew the running job's lease
+    worker.stop()
+    await asyncio.wait_for(run, timeout=5)
+
+    assert ["slow"] in leases
+    assert released == ["slow"]
+
+
+async def test_job_worker_cancels_jobs_whose_lease_was_lost(monkeypatch):
+    completed: list[str] = []
+    worker = jobs.JobWorker(worker_id="w1", concurrency=1, listen=False, poll_interval=0.01)
+    batches = [[{"id": "stale", "type": "slow", "payload": {}, "attempts": 1}]]
+
+    async def claim_jobs(*, worker_id, limit, exclude_types=None):
+        return batches.pop() if batches else []
+
+    async def slow(_payload):
+        await asyncio.sleep(10)
+
+    async def complete_job(job, *, worker_id):
+        completed.append(job["id"])
+
+    async def seconds_until_next_job():
+        return None
+
+    monkeypatch.setattr(jobs, "claim_jobs", claim_jobs)
+    monkeypatch.setattr(jobs, "complete_job", complete_job)
+    monkeypatch.setattr(jobs, "seconds_until_next_job", seconds_until_next_job)
+    monkeypatch.setitem(jobs._HANDLERS, "slow", slow)
+    _stub_maintenance(monkeypatch)
+
+    async def extend_leases(job_ids, *, worker_id):
+        # The reaper took the job back; another worker owns it now.
+        return set()
+
+    monkeypatch.setattr(jobs, "extend_leases", extend_leases)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0)
+
+    run = asyncio.create_task(worker.run())
+    while batches or worker._running:
+        await asyncio.sleep(0.05)
+    worker.stop()
+    await asyncio.wait_for(run, timeout=5)
+
+    assert completed == []
+
+
+async def test_complete_and_fail_job_are_fenced_to_the_current_claim(monkeypatch):
+    calls: list[tuple[str, tuple]] = []
+
+    class FakeDB:
+        async def query_raw(self, sql, *params):
+            calls.append((sql, params))
+            return []
+
+    monkeypatch.setattr(jobs, "get_db", lambda: FakeDB())
+    job = {"id": "j1", "type": "t", "attempts": 2, "maxAttempts": 3}
+
+    assert await jobs.complete_job(job, worker_id="w1") is False
+    assert await jobs.fail_job(job, RuntimeError("boom"), worker_id="w1") is False
+
+    complete_sql, complete_params = calls[0]
+    assert '"lockedBy" = $2 AND attempts = $3' in complete_sql
+    assert 'a.attempt = $3 AND a."workerId" = $2' in complete_sql
+    assert complete_params == ("j1", "w1", 2)
+    fail_sql, fail_params = calls[1]
+    assert '"lockedBy" = $5 AND attempts = $6' in fail_sql
+    assert fail_params[4:] == ("w1", 2)
+
+
+async def test_enqueue_jobs_uses_one_insert_and_maps_deduplicated_ids(monkeypatch):
+    import json
+
+    calls: list[tuple[str, tuple]] = []
+
+    class FakeDB:
+        async def query_raw(self, sql, *params):
+            calls.append((sql, params))
+            if "jsonb_to_recordset" in sql:
+                rows = json.loads(params[0])
+                # The second row collides with a live job.
+                return [{"id": rows[0]["id"], "notified": ""}]
+            return [{"id": "existing-job", "dedupeKey": "rag:doc-1"}]
+
+    async def ensure_jobs_table():
+        return None
+
+    monkeypatch.setattr(jobs, "get_db", lambda: FakeDB())
+    monkeypatch.setattr(jobs, "ensure_jobs_table", ensure_jobs_table)
+
+    ids = await jobs.enqueue_jobs(
+        [
+            jobs.JobRequest(type="horus.observe_event", payload={"n": 1}),
+            jobs.JobRequest(type="rag.index_document", payload={"n": 2}, dedupe_key="rag:doc-1"),
+        ]
+    )
+
+    assert len(calls) == 2
+    inserted_rows = json.loads(calls[0][1][0])
+    assert [row["type"] for row in inserted_rows] == ["horus.observe_event", "rag.index_document"]
+    assert ids == [inserted_rows[0]["id"], "existing-job"]
+    assert await jobs.enqueue_jobs([]) == []
+
+
+def test_build_job_stats_merges_depth_and_timings():
+    depth = [
+        {"type": "rag.index_document", "queued": 4, "due": 3, "running": 2, "failed": 1, "oldest_queued_seconds": 12.3456},
+        {"type": "horus.observe_event", "queued": 0, "due": 0, "running": 1, "failed": 0, "oldest_queued_seconds": None},
+    ]
+    timing = {"type": "rag.index_document", "attempts": 10, "succeeded": 9, "failed_attempts": 1, "expired": 0}
+    for index, _bound in enumerate(job_metrics.HISTOGRAM_BUCKETS_MS):
+        timing[f"wait_le_{index}"] = min(10, index * 2)
+        timing[f"run_le_{index}"] = 10 if index >= 5 else 0
+    timing.update(wait_p50=40.0, wait_p95=90.0, wait_p99=99.0, run_p50=800.0, run_p95=950.0, run_p99=990.0)
+
+    stats = job_metrics.build_job_stats(depth, [timing], window_minutes=60)
+
+    rag = stats["types"]["rag.index_document"]
+    assert rag["queued"] == 4 and rag["running"] == 2 and rag["oldest_queued_seconds"] == 12.346
+    assert rag["run"]["p95_ms"] == 950.0
+    assert rag["run"]["buckets"][5] == {"le_ms": 1000, "count": 10}
+    assert stats["types"]["horus.observe_event"]["run"] is None
+    assert stats["totals"] == {"queued": 4, "running": 3, "failed": 1, "oldest_queued_seconds": 12.346}
+
+
+def test_retention_policies_are_configurable_and_batch_bounded(monkeypatch):
+    policies = {policy.table: policy for policy in retention.RETENTION_POLICIES}
+    monkeypatch.setenv("RETENTION_DAYS_EVENTOUTBOX", "3")
+
+    assert policies["EventOutbox"].days == 3
+    assert policies["AIUsageMetric"].days == 90
+    archive_sql = retention._move_batch_sql(policies["EventOutbox"])
+    assert 'INSERT INTO "EventOutboxArchive"' in archive_sql and "status = 'processed'" in archive_sql
+    assert "Archive" not in retention._move_batch_sql(policies["AsyncJobAttempt"])
+
+
+async def test_apply_retention_policy_stops_after_a_partial_batch(monkeypatch):
+    batches = [retention.RETENTION_BATCH_SIZE, 7, 0]
+
+    class FakeDB:
+        async def query_raw(self, sql, days, limit):
+            return [{"moved": batches.pop(0)}]
+
+    monkeypatch.setattr(retention, "get_db", lambda: FakeDB())
+    policy = retention.RetentionPolicy("AsyncJob", "TRUE", '"updatedAt"', 14)
+
+    assert await retention.apply_retention_policy(policy) == retention.RETENTION_BATCH_SIZE + 7
+    assert batches == [0]
+    monkeypatch.setenv("RETENTION_DAYS_ASYNCJOB", "0")
+    assert await retention.apply_retention_policy(policy) == 0
+
+
+async def test_append_event_writes_outbox_row_and_job_in_one_statement(monkeypatch):
+    import json
+
+    from app.core import event_outbox
+
+    calls: list[tuple[str, tuple]] = []
+
+    class FakeDB:
+        async def query_raw(self, sql, *params):
+            calls.append((sql, params))
+            return [{"notified": ""}]
+
+        async def execute_raw(self, sql, *params):
+            raise AssertionError("append_event should not issue separate writes")
+
+    async def ensured():
+        return None
+
+    monkeypatch.setattr(event_outbox, "get_db", lambda: FakeDB())
+    monkeypatch.setattr(event_outbox, "ensure_event_outbox_table", ensured)
+    monkeypatch.setattr(event_outbox, "ensure_jobs_table", ensured)
+
+    event_id = await event_outbox.append_event(user_id="u1", event_type="activity", payload={"title": "x"})
+
+    assert len(calls) == 1
+    sql, params = calls[0]
+    assert 'INSERT INTO "EventOutbox"' in sql and 'INSERT INTO "AsyncJob"' in sql
+    assert json.loads(params[9])["event_id"] == event_id
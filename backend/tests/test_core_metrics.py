@@ -0,0 +1,85 @@
+import asyncio
+
+from app.core import metrics
+
+
+async def test_ai_usage_buffer_batches_writes_and_drains_on_close(monkeypatch):
+    batches: list[list[dict]] = []
+
+    async def insert(rows):
+        batches.append(rows)
+
+    monkeypatch.setattr(metrics, "_insert_ai_usage_rows", insert)
+    buffer = metrics.AIUsageMetricBuffer(max_pending=100, flush_size=3, flush_interval=60)
+
+    for i in range(3):
+        assert buffer.add({"id": str(i)}) is True
+    await asyncio.sleep(0.01)  # size threshold wakes the flusher
+    assert [len(batch) for batch in batches] == [3]
+
+    buffer.add({"id": "3"})  # below the threshold: stays pending until close
+    await asyncio.sleep(0.01)
+    assert len(buffer) == 1
+
+    await buffer.close()
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert buffer.snapshot() == {
+        "accepted": 4, "written": 4, "dropped": 0, "write_errors": 0, "batches": 2, "pending": 0,
+    }
+
+
+async def test_ai_usage_buffer_close_waits_for_an_in_flight_insert(monkeypatch):
+    batches: list[list[dict]] = []
+    inserting = asyncio.Event()
+
+    async def slow_insert(rows):
+        inserting.set()
+        await asyncio.sleep(0.05)
+        batches.append(rows)
+
+    monkeypatch.setattr(metrics, "_insert_ai_usage_rows", slow_insert)
+    buffer = metrics.AIUsageMetricBuffer(max_pending=100, flush_size=2, flush_interval=60)
+
+    buffer.add({"id": "a"})
+    buffer.add({"id": "b"})
+    await inserting.wait()
+    buffer.add({"id": "c"})
+    await buffer.close()
+
+    assert [[row["id"] for row in batch] for batch in batches] == [["a", "b"], ["c"]]
+    assert buffer.snapshot()["written"] == 3 and buffer.snapshot()["dropped"] == 0
+
+
+async def test_ai_usage_buffer_drops_under_backpressure_and_on_write_errors(monkeypatch):
+    async def insert(rows):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(metrics, "_insert_ai_usage_rows", insert)
+    buffer = metrics.AIUsageMetricBuffer(max_pending=2, flush_size=10, flush_interval=60)
+
+    assert buffer.add({"id": "a"}) and buffer.add({"id": "b"})
+    assert buffer.add({"id": "c"}) is False
+    await buffer.close()
+
+    stats = buffer.snapshot()
+    assert stats["dropped"] == 3 and stats["write_errors"] == 1 and stats["pending"] == 0
+
+
+async def test_record_ai_usage_does_not_touch_the_database(monkeypatch):
+    buffer = metrics.AIUsageMetricBuffer(flush_interval=60)
+    monkeypatch.setattr(metrics, "ai_usage_buffer", buffer)
+    monkeypatch.setattr(metrics, "get_db", lambda: (_ for _ in ()).throw(AssertionError("no DB on the hot path")))
+
+    await metrics.record_ai_usage(
+        operation="chat", provider="gemini", model="m", route_reason="default",
+        input_tokens=10, output_tokens=5, estimated_cost_usd=0.001, latency_ms=42,
+    )
+
+    assert len(buffer) == 1
+
+    async def insert(rows):
+        assert rows[0]["operation"] == "chat" and rows[0]["latencyMs"] == 42
+
+    monkeypatch.setattr(metrics, "_insert_ai_usage_rows", insert)
+    await buffer.close()
+    assert buffer.snapshot()["written"] == 1
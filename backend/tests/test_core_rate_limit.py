@@ -0,0 +1,54 @@
+import asyncio
+
+from app.core import rate_limit as rate_limit_module
+from app.core.rate_limit import AIConcurrencyGovernor, BucketPolicy, TokenBucketLimiter, tenant_key
+
+
+async def test_token_bucket_charges_user_and_institution_together(monkeypatch):
+    monkeypatch.setattr(rate_limit_module.redis_client, "enabled", False)
+    limiter = TokenBucketLimiter()
+    policy = BucketPolicy(name="test", user_per_minute=2, institution_per_minute=3)
+
+    assert (await limiter.take(policy, user_id="u1", institution_id="i1"))[0]
+    assert (await limiter.take(policy, user_id="u1", institution_id="i1"))[0]
+    allowed, retry_after = await limiter.take(policy, user_id="u1", institution_id="i1")
+    assert not allowed and retry_after > 0
+
+    # A colleague still has user tokens but shares the institution bucket.
+    assert (await limiter.take(policy, user_id="u2", institution_id="i1"))[0]
+    assert not (await limiter.take(policy, user_id="u3", institution_id="i1"))[0]
+    # Other tenants are unaffected.
+    assert (await limiter.take(policy, user_id="u4", institution_id="i2"))[0]
+
+
+async def test_ai_governor_caps_in_flight_calls_per_tenant(monkeypatch):
+    monkeypatch.setattr(rate_limit_module.redis_client, "enabled", False)
+    governor = AIConcurrencyGovernor(limit=2)
+    tenant = tenant_key({"id": "u1", "institutionId": "i1"})
+
+    first = await governor.acquire(tenant, wait_seconds=0)
+    second = await governor.acquire(tenant, wait_seconds=0)
+    assert first and second
+    assert await governor.acquire(tenant, wait_seconds=0) is None
+    assert await governor.acquire(tenant_key({"id": "u9", "institutionId": None}), wait_seconds=0)
+
+    await governor.release(tenant, first)
+    assert await governor.acquire(tenant, wait_seconds=0)
+
+
+async def test_ai_governor_renews_held_slots_and_expires_abandoned_ones(monkeypatch):
+    monkeypatch.setattr(rate_limit_module.redis_client, "enabled", False)
+    monkeypatch.setattr(rate_limit_module, "AI_SLOT_LEASE_SECONDS", 0.2)
+    monkeypatch.setattr(rate_limit_module, "AI_SLOT_RENEW_SECONDS", 0.05)
+    governor = AIConcurrencyGovernor(limit=1)
+
+    held = await governor.acquire("institution:i1", wait_seconds=0)
+    async with governor.hold("institution:i1", held):
+        await asyncio.sleep(0.3)
+        assert await governor.acquire("institution:i1", wait_seconds=0) is None
+    await governor.release("institution:i1", held)
+
+    abandoned = await governor.acquire("institution:i1", wait_seconds=0)
+    assert abandoned
+    await asyncio.sleep(0.3)
+    assert await governor.acquire("institution:i1", wait_seconds=0)
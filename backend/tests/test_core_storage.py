@@ -0,0 +1,107 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import UploadFile
+
+from app.core.storage import UploadTooLarge, spool_upload
+
+
+class CountingFile(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.read_sizes: list[int] = []
+
+    def read(self, size=-1):
+        self.read_sizes.append(size)
+        return super().read(size)
+
+
+async def test_spool_upload_hashes_in_bounded_chunks():
+    data = os.urandom(10_000)
+    source = CountingFile(data)
+    upload = UploadFile(file=source, filename="policy.pdf")
+
+    spooled = await spool_upload(upload, max_size=20_000, chunk_size=4096)
+    try:
+        assert spooled.size == len(data)
+        assert spooled.sha256 == hashlib.sha256(data).hexdigest()
+        assert set(source.read_sizes) == {4096}
+        with open(spooled.path, "rb") as handle:
+            assert handle.read() == data
+    finally:
+        spooled.cleanup()
+    assert not os.path.exists(spooled.path)
+
+
+async def test_spool_upload_stops_at_size_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr("tempfile.tempdir", str(tmp_path))
+    upload = UploadFile(file=io.BytesIO(b"x" * 10_000), filename="big.pdf")
+
+    with pytest.raises(UploadTooLarge):
+        await spool_upload(upload, max_size=5_000, chunk_size=1024)
+    assert list(tmp_path.iterdir()) == []
+
+
+class FakeBucket:
+    def __init__(self):
+        self.batch_calls: list[list[str]] = []
+
+    def create_signed_urls(self, paths, expires_in):
+        self.batch_calls.append(list(paths))
+        return [
+            {"path": path, "error": "not found" if "missing" in path else None, "signedURL": f"https://signed/{path}?e={expires_in}"}
+            for path in paths
+        ]
+
+
+async def test_create_signed_urls_batches_and_caches(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.core import cache, storage
+
+    bucket = FakeBucket()
+    client = SimpleNamespace(storage=SimpleNamespace(from_=lambda name: bucket))
+    monkeypatch.setattr(storage, "get_supabase_client", lambda: client)
+    monkeypatch.setattr(cache.redis_client, "enabled", False)
+    storage._SIGNED_URL_CACHE.l1.clear()
+
+    paths = ["evidence/a.pdf", "evidence/b.pdf", "evidence/missing.pdf", "s3://vault/evidence/c.pdf"]
+    first = await storage.create_signed_urls(paths, expires_in=300)
+    assert first == {
+        "evidence/a.pdf": "https://signed/evidence/a.pdf?e=300",
+        "evidence/b.pdf": "https://signed/evidence/b.pdf?e=300",
+    }
+    assert bucket.batch_calls == [["evidence/a.pdf", "evidence/b.pdf", "evidence/missing.pdf"]]
+
+    again = await storage.create_signed_urls(["evidence/a.pdf", "evidence/b.pdf"], expires_in=300)
+    assert again == first
+    assert len(bucket.batch_calls) == 1
+
+    # A different expiry is a different cache entry.
+    await storage.create_signed_urls(["evidence/a.pdf"], expires_in=3600)
+    assert bucket.batch_calls[-1] == ["evidence/a.pdf"]
+
+
+async def test_cached_signed_urls_report_remaining_lifetime(monkeypatch):
+    from types import SimpleNamespace
+
+    from app.core import cache, storage
+
+    bucket = FakeBucket()
+    client = SimpleNamespace(storage=SimpleNamespace(from_=lambda name: bucket))
+    monkeypatch.setattr(storage, "get_supabase_client", lambda: client)
+    monkeypatch.setattr(cache.redis_client, "enabled", False)
+    storage._SIGNED_URL_CACHE.l1.clear()
+    now = [1_000_000.0]
+    monkeypatch.setattr(storage.time, "time", lambda: now[0])
+
+    first = await storage.create_signed_url("evidence/a.pdf", expires_in=3600)
+    assert first.expires_in == 3600
+
+    now[0] += 1200
+    again = await storage.create_signed_url("evidence/a.pdf", expires_in=3600)
+    assert again.url == first.url
+    assert again.expires_in == 2400
+    assert len(bucket.batch_calls) == 1
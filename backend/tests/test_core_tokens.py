@@ -0,0 +1,27 @@
+from app.core.tokens import TRUNCATION_MARKER, TokenEstimator
+
+
+def test_arabic_costs_more_tokens_per_character_than_english():
+    estimator = TokenEstimator()
+    english = "What is the current compliance score of the institution?"
+    arabic = "ما هي نسبة الامتثال الحالية للمؤسسة؟"
+
+    assert estimator.estimate(english) >= len(english) / 5
+    # len/4 undercounts Arabic; the estimate charges well above it.
+    assert estimator.estimate(arabic) > len(arabic) / 3
+    assert estimator.estimate("") == 0
+
+
+def test_long_texts_are_memoized_and_truncation_fits_the_budget():
+    estimator = TokenEstimator()
+    text = "Evidence for criterion 4.2 is missing. " * 40 + "الأدلة غير مكتملة " * 40
+
+    first = estimator.estimate(text)
+    assert estimator.estimate(text) == first
+    assert estimator.stats.l1_hits == 1 and estimator.stats.misses == 1
+
+    truncated = estimator.truncate(text, 50)
+    assert truncated.endswith(TRUNCATION_MARKER)
+    assert estimator.estimate(truncated) <= 50
+    assert text.startswith(truncated[: -len(TRUNCATION_MARKER)])
+    assert estimator.truncate("short", 50) == "short"
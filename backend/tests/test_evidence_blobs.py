@@ -0,0 +1,123 @@
+import hashlib
+import io
+
+from fastapi import UploadFile
+
+from app.evidence import blobs
+from app.evidence import service as evidence_service
+from app.evidence.blobs import BlobRef, blob_path, release_blob_path
+from app.evidence.service import EvidenceService
+
+
+class FakeBlobTable:
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+
+    async def acquire(self, sha256, *, size, content_type):
+        row = self.rows.setdefault(sha256, {"refs": 0, "uploaded": False})
+        row["refs"] += 1
+        return BlobRef(sha256=sha256, storage_path=blob_path(sha256), uploaded=row["uploaded"])
+
+    async def mark_uploaded(self, sha256):
+        self.rows[sha256]["uploaded"] = True
+
+    async def release(self, path):
+        self.rows[path.rsplit("/", 1)[-1]]["refs"] -= 1
+        return True
+
+
+async def test_duplicate_content_is_uploaded_once(monkeypatch):
+    table = FakeBlobTable()
+    uploads = []
+
+    async def fake_upload(**kwargs):
+        uploads.append(kwargs)
+        return kwargs["object_path"], kwargs["object_path"]
+
+    monkeypatch.setattr(evidence_service, "acquire_blob", table.acquire)
+    monkeypatch.setattr(evidence_service, "mark_blob_uploaded", table.mark_uploaded)
+    monkeypatch.setattr(evidence_service, "release_blob_path", table.release)
+    monkeypatch.setattr(evidence_service, "upload_file_to_supabase", fake_upload)
+
+    data = b"%PDF-1.7 quality manual"
+    sha = hashlib.sha256(data).hexdigest()
+    paths = []
+    for name in ("manual.pdf", "manual-copy.pdf"):
+        file = UploadFile(file=io.BytesIO(data), filename=name, headers={"content-type": "application/pdf"})
+        paths.append(await EvidenceService._store_blob(file, file_content=data, spooled=None))
+
+    assert paths == [blob_path(sha), blob_path(sha)]
+    assert len(uploads) == 1
+    assert uploads[0]["upsert"] is True
+    assert table.rows[sha] == {"refs": 2, "uploaded": True}
+
+
+async def test_failed_upload_releases_reference(monkeypatch):
+    table = FakeBlobTable()
+
+    async def failing_upload(**kwargs):
+        raise RuntimeError("storage down")
+
+    monkeypatch.setattr(evidence_service, "acquire_blob", table.acquire)
+    monkeypatch.setattr(evidence_service, "release_blob_path", table.release)
+    monkeypatch.setattr(evidence_service, "upload_file_to_supabase", failing_upload)
+
+    file = UploadFile(file=io.BytesIO(b"x"), filename="a.txt", headers={"content-type": "text/plain"})
+    try:
+        await EvidenceService._store_blob(file, file_content=b"x", spooled=None)
+    except RuntimeError:
+        pass
+    assert table.rows[hashlib.sha256(b"x").hexdigest()] == {"refs": 0, "uploaded": False}
+
+
+async def test_legacy_paths_are_not_blobs():
+    assert await release_blob_path("evidence/20240101_abcd1234_policy.pdf") is False
+    assert await release_blob_path("") is False
+    assert blob_path("ab" * 32).startswith(f"{blobs.BLOB_FOLDER}/")
+
+
+class FakeGCTransaction:
+    def __init__(self, rows, events):
+        self.rows = rows
+        self.events = events
+
+    async def __aenter__(self):
+        self.events.append("begin")
+        return self
+
+    async def __aexit__(self, *exc):
+        self.events.append("commit")
+
+    async def query_raw(self, sql, *params):
+        assert "FOR UPDATE" in sql
+        return self.rows
+
+    async def execute_raw(self, sql, *params):
+        self.events.append(("delete_rows", params[0]))
+        return len(params[0])
+
+
+async def test_gc_removes_objects_before_rows_inside_the_lock(monkeypatch):
+    events = []
+    rows = [{"sha256": "a" * 64, "storagePath": blob_path("a" * 64)}]
+    removal_ok = True
+
+    async def remove(paths):
+        events.append(("remove_objects", paths))
+        return removal_ok
+
+    class FakeDB:
+        def tx(self, **kwargs):
+            return FakeGCTransaction(rows, events)
+
+    monkeypatch.setattr(blobs, "get_db", lambda: FakeDB())
+    monkeypatch.setattr(blobs, "_ENSURED", True)
+    monkeypatch.setattr(blobs, "delete_files_from_supabase", remove)
+
+    assert await blobs.collect_unreferenced_blobs() == 1
+    assert events == ["begin", ("remove_objects", [blob_path("a" * 64)]), ("delete_rows", ["a" * 64]), "commit"]
+
+    events.clear()
+    removal_ok = False
+    assert await blobs.collect_unreferenced_blobs() == 0
+    assert [event for event in events if event[0] == "delete_rows"] == []
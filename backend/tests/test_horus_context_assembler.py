@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from app.horus.context_assembler import ContextAssembler, ContextSource
+
+
+def _sleeping(value, seconds):
+    async def fetch(_deps):
+        await asyncio.sleep(seconds)
+        return value
+
+    return fetch
+
+
+async def test_independent_sources_run_concurrently():
+    assembler = ContextAssembler([
+        ContextSource("a", _sleeping("A", 0.1), 1.0),
+        ContextSource("b", _sleeping("B", 0.1), 1.0),
+        ContextSource("c", _sleeping("C", 0.1), 1.0),
+    ])
+    started = time.perf_counter()
+    values = await assembler.gather()
+    elapsed = time.perf_counter() - started
+
+    assert values == {"a": "A", "b": "B", "c": "C"}
+    assert elapsed < 0.25
+    assert {timing.status for timing in assembler.timings.values()} == {"ok"}
+
+
+async def test_shared_dependency_runs_once_and_is_passed_along():
+    calls = []
+
+    async def institution(_deps):
+        calls.append("institution")
+        return "inst-1"
+
+    async def mappings(deps):
+        return f"mappings:{deps['institution']}"
+
+    async def rag(deps):
+        return f"rag:{deps['institution']}"
+
+    assembler = ContextAssembler([
+        ContextSource("institution", institution, 1.0),
+        ContextSource("mappings", mappings, 1.0, depends_on=("institution",)),
+        ContextSource("rag", rag, 1.0, depends_on=("institution",)),
+    ])
+    values = await assembler.gather("mappings", "rag")
+
+    assert values == {"mappings": "mappings:inst-1", "rag": "rag:inst-1"}
+    assert calls == ["institution"]
+
+
+async def test_slow_or_failing_sources_fall_back_to_defaults():
+    async def broken(_deps):
+        raise RuntimeError("db down")
+
+    assembler = ContextAssembler([
+        ContextSource("slow", _sleeping("late", 1.0), 0.05, default=""),
+        ContextSource("broken", broken, 1.0, default=[]),
+        ContextSource("fast", _sleeping("ok", 0), 1.0),
+    ])
+    values = await assembler.gather()
+
+    assert values == {"slow": "", "broken": [], "fast": "ok"}
+    timings = assembler.timings_ms()
+    assert timings["slow"]["status"] == "timeout"
+    assert timings["broken"]["status"] == "error"
+    assert timings["fast"]["status"] == "ok"
+
+
+async def test_sources_are_skipped_when_a_dependency_fails():
+    calls = []
+
+    async def scoped_search(deps):
+        calls.append(deps)
+        return "unscoped results"
+
+    assembler = ContextAssembler([
+        ContextSource("institution", _sleeping("inst-1", 1.0), 0.05),
+        ContextSource("rag", scoped_search, 1.0, depends_on=("institution",), default=None),
+    ])
+    values = await assembler.gather()
+
+    assert values == {"institution": None, "rag": None}
+    assert calls == []
+    assert assembler.timings_ms()["rag"]["status"] == "skipped"
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from app.horus import conversation_summary as cs
+
+
+class FakeDB:
+    def __init__(self, summary_rows, message_rows):
+        self.summary_rows = summary_rows
+        self.message_rows = message_rows
+        self.executed: list[tuple[str, tuple]] = []
+
+    async def query_raw(self, sql, *params):
+        return self.summary_rows if '"HorusChatSummary"' in sql else self.message_rows
+
+    async def execute_raw(self, sql, *params):
+        self.executed.append((sql, params))
+        return 1
+
+
+class FakeClient:
+    def __init__(self):
+        self.prompts: list[str] = []
+
+    async def chat(self, messages, context=None):
+        self.prompts.append(messages[0]["content"])
+        return "User is preparing NAQAAE criterion 3 evidence."
+
+
+def _messages(n):
+    return [{"id": f"m{i}", "role": "user" if i % 2 == 0 else "assistant", "content": f"message {i}"} for i in range(n)]
+
+
+def test_unsummarized_turns_follow_the_covered_message():
+    messages = [SimpleNamespace(id=f"m{i}") for i in range(5)]
+    summary = cs.ChatSummary("earlier", covered_message_id="m1", covered_messages=2)
+
+    assert [m.id for m in cs.unsummarized(messages, summary)] == ["m2", "m3", "m4"]
+    assert cs.unsummarized(messages, None) == messages
+    # Covered message older than the loaded window: everything loaded is newer.
+    assert cs.unsummarized(messages, cs.ChatSummary("s", "m-old", 40)) == messages
+    assert cs.needs_fold(_messages(cs.HORUS_HISTORY_WINDOW), None)
+    assert not cs.needs_fold(_messages(cs.HORUS_HISTORY_WINDOW - 1), None)
+
+
+async def test_fold_keeps_recent_messages_verbatim_and_advances_from_its_marker(monkeypatch):
+    rows = _messages(cs.HORUS_HISTORY_WINDOW)
+    db = FakeDB([{"summary": "Earlier summary.", "coveredMessageId": "m-prev", "coveredMessages": 8}], rows)
+    client = FakeClient()
+    monkeypatch.setattr(cs, "get_db", lambda: db)
+    monkeypatch.setattr(cs, "_ENSURED", True)
+    monkeypatch.setattr("app.ai.service.get_gemini_client", lambda: client)
+
+    await cs.summarize_chat_job({"chat_id": "chat-1"})
+
+    folded = len(rows) - cs.HORUS_SUMMARY_RECENT_MESSAGES
+    assert "Earlier summary." in client.prompts[0]
+    assert f"message {folded - 1}" in client.prompts[0]
+    assert f"message {folded}" not in client.prompts[0]
+    (sql, params), = db.executed
+    assert params == (
+        "chat-1", "User is preparing NAQAAE criterion 3 evidence.", f"m{folded - 1}", folded, "m-prev",
+    )
+
+
+async def test_fold_is_a_no_op_while_only_recent_messages_are_unsummarized(monkeypatch):
+    db = FakeDB([], _messages(cs.HORUS_SUMMARY_RECENT_MESSAGES))
+    monkeypatch.setattr(cs, "get_db", lambda: db)
+    monkeypatch.setattr(cs, "_ENSURED", True)
+
+    await cs.summarize_chat_job({"chat_id": "chat-1"})
+
+    assert db.executed == []
@@ -0,0 +1,58 @@
+from app.horus import semantic_cache
+
+
+class FakeDB:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.queries: list[tuple[str, tuple]] = []
+
+    async def execute_raw(self, sql, *params):
+        self.queries.append((sql, params))
+        return 1
+
+    async def query_raw(self, sql, *params):
+        self.queries.append((sql, params))
+        return self.rows
+
+
+def _use_db(monkeypatch, db):
+    monkeypatch.setattr(semantic_cache, "get_db", lambda: db)
+    monkeypatch.setattr(semantic_cache, "_ENSURED", True)
+
+
+async def test_lookup_is_one_top1_query_and_applies_threshold(monkeypatch):
+    vector = [0.1] * semantic_cache.HORUS_SEMANTIC_CACHE_DIM
+    db = FakeDB(rows=[{"response": "cached answer", "similarity": 0.97}])
+    _use_db(monkeypatch, db)
+
+    assert await semantic_cache.lookup("inst-1", vector) == "cached answer"
+    assert len(db.queries) == 1
+    sql, params = db.queries[0]
+    assert "LIMIT 1" in sql and "<=>" in sql
+    assert params[0] == "inst-1" and params[1].startswith("[0.1,")
+
+    db.rows = [{"response": "too far", "similarity": 0.80}]
+    assert await semantic_cache.lookup("inst-1", vector) is None
+
+
+async def test_wrong_dimension_skips_the_database(monkeypatch):
+    db = FakeDB()
+    _use_db(monkeypatch, db)
+
+    assert await semantic_cache.lookup("inst-1", [0.1, 0.2]) is None
+    await semantic_cache.store("inst-1", "hello", [0.1, 0.2], "hi")
+    assert db.queries == []
+
+    vector = [0.2] * semantic_cache.HORUS_SEMANTIC_CACHE_DIM
+    await semantic_cache.store("inst-1", "  Hello ", vector, "hi")
+    (sql, params), = db.queries
+    assert "ON CONFLICT" in sql
+    assert params[1] == semantic_cache.query_hash("hello")
+
+
+def test_lookups_are_not_served_by_a_global_ann_index():
+    # An approximate index over every tenant's rows would filter by tenant after
+    # its candidate scan and miss tenants outside the top ef_search neighbours.
+    index_sql = " ".join(semantic_cache.HORUS_SEMANTIC_CACHE_INDEX_SQL).lower()
+    assert "using hnsw" not in index_sql and "using ivfflat" not in index_sql
+    assert 'drop index if exists "idx_horus_semantic_cache_embedding_hnsw"' in index_sql
@@ -9,6 +9,7 @@ from pydantic import BaseModel, Field
 from google import genai
 from google.genai import types
 
+from app.core.embedding_cache import embedding_cache
 from v2.modules.ai_signals.circuit_breaker import AICircuitBreaker, CircuitState
 
 logger = logging.getLogger(__name__)
@@ -31,23 +32,28 @@ class AISignalsClient:
         # Instantiate circuit breaker
         self.circuit_breaker = AICircuitBreaker(failure_threshold=3, cooldown_window=30.0)
 
-    def generate_embedding(self, text: str) -> list[float]:
+    async def generate_embedding(self, text: str) -> list[float]:
         """
         Generate a vector embedding for a text chunk using Gemini text-embedding-004.
+        Results are memoized in the shared embedding cache; fallbacks are not cached.
         """
         if not self.client:
             return [0.1] * 768
+        vector = await embedding_cache.get_or_embed("text-embedding-004", 768, text, self._embed_content)
+        return vector or [0.1] * 768
+
+    async def _embed_content(self, text: str) -> list[float]:
         try:
-            response = self.client.models.embed_content(
+            response = await self.client.aio.models.embed_content(
                 model="text-embedding-004",
                 contents=text
             )
             if response.embeddings:
                 return response.embeddings[0].values
-            return [0.1] * 768
+            return []
         except Exception as e:
             logger.error(f"[AISignalsClient] Error calling embed_content: {e}")
-            return [0.1] * 768
+            return []
 
     async def analyze_document_relevance(
         self, 
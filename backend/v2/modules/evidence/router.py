@@ -7,6 +7,7 @@ from sqlalchemy import select, delete
 
 from v2.core.database import get_db_session
 from app.core.middlewares import get_current_user
+from app.core.storage import create_signed_urls, sign_urls
 from v2.modules.evidence.models import Evidence, EvidenceStatus, EvidenceValidation
 from v2.modules.evidence.services import EvidenceService
 from v2.modules.standards.router import get_active_campus_id
@@ -18,6 +19,8 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/evidence", tags=["evidence"])
 
+SIGNED_URL_EXPIRES_IN = 3600
+
 @router.post("/upload")
 async def upload_evidence(
     file: UploadFile = File(...),
@@ -102,6 +105,13 @@ async def list_evidence(
         
     stmt = stmt.order_by(Evidence.created_at.desc())
     results = (await db.execute(stmt)).scalars().all()
+
+    # One storage request for every link on the page instead of one per item
+    try:
+        signed_urls = await create_signed_urls([ev.file_url for ev in results], expires_in=SIGNED_URL_EXPIRES_IN)
+    except Exception as e:
+        logger.warning(f"Batch URL signing failed for evidence list: {e}")
+        signed_urls = {}
     
     # Process & filter by validation status/standards on the database side where necessary
     evidence_list = []
@@ -153,6 +163,7 @@ async def list_evidence(
             "originalFilename": ev.filename,
             "title": ev.filename.replace("_", " ").replace(".pdf", ""),
             "fileUrl": ev.file_url,
+            "signedUrl": signed_urls.get(ev.file_url),
             "status": ev.status.lower(),
             "createdAt": ev.created_at.isoformat() if ev.created_at else None,
             "confidenceScore": avg_confidence or 85, # Default fallback if validation hasn't run yet
@@ -181,10 +192,13 @@ async def get_evidence_signed_url(
     if not evidence:
         raise HTTPException(status_code=404, detail="Evidence not found")
         
-    # Return S3 signed URL or fallback
+    # Return a (cached) signed URL for bucket objects, the stored URL otherwise
+    signed = (await sign_urls([evidence.file_url], expires_in=SIGNED_URL_EXPIRES_IN)).get(evidence.file_url)
+    if signed is None:
+        return {"url": evidence.file_url, "expiresIn": SIGNED_URL_EXPIRES_IN}
     return {
-        "url": evidence.file_url,
-        "expiresIn": 3600
+        "url": signed.url,
+        "expiresIn": signed.expires_in
     }
 
 
@@ -111,7 +111,7 @@ class EvidenceService:
                 await db.flush() # Flush to generate chunk.id
                 
                 # Generate real embedding vector
-                vector = ai_client.generate_embedding(chunk_content)
+                vector = await ai_client.generate_embedding(chunk_content)
                 embedding = EvidenceEmbedding(
                     chunk_id=chunk.id,
                     embedding=vector
@@ -24,6 +24,7 @@ export async function GET(req: NextRequest) {
 
   const authHeader = req.headers.get("authorization") ?? req.headers.get("Authorization") ?? ""
   const cookie = req.headers.get("cookie") ?? ""
+  const lastEventId = req.headers.get("last-event-id") ?? ""
 
   let backendResponse: Response
   try {
@@ -32,6 +33,7 @@ export async function GET(req: NextRequest) {
       headers: {
         ...(authHeader ? { Authorization: authHeader } : {}),
         ...(cookie ? { Cookie: cookie } : {}),
+        ...(lastEventId ? { "Last-Event-ID": lastEventId } : {}),
         Accept: "text/event-stream",
         ...forwardAiProviderFromNextRequest(req),
       },
@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useMemo, useEffect } from "react"
+import { useState, useMemo, useEffect, useRef } from "react"
 import { useSearchParams, useRouter } from "next/navigation"
 import { AnimatePresence, motion } from "framer-motion"
 import { usePageTitle } from "@/hooks/use-page-title"
@@ -19,6 +19,9 @@ import { cn } from "@/lib/utils"
 import { useUiLanguage } from "@/lib/ui-language-context"
 import { EvidenceVaultV2 } from "@/components/platform/evidence/evidence-vault-v2"
 
+// Signed links in the list response have at least 6 minutes left when it is
+// served; past this age, ask /signed-url for a fresh one instead.
+const LIST_SIGNED_URL_MAX_AGE_MS = 5 * 60 * 1000
 
 export default function EvidencePage() {
   return (
@@ -74,9 +77,14 @@ function EvidenceContent() {
   const { isArabic } = useUiLanguage()
   const router = useRouter()
   usePageTitle(isArabic ? "مخزن الأدلة" : "Evidence Vault")
+  const evidenceListFetchedAt = useRef(0)
   const { data: evidenceList, isLoading, error, mutate: localMutate } = useSWR<Evidence[]>(
     user ? [`evidence`, user.id] : null,
-    () => api.getEvidence(),
+    async () => {
+      const list = await api.getEvidence()
+      evidenceListFetchedAt.current = Date.now()
+      return list
+    },
     {
       revalidateOnFocus: false,
       revalidateOnReconnect: false,
@@ -308,6 +316,16 @@ function EvidenceContent() {
       return
     }
 
+    // List responses already carry a signed link; only fetch one when it is
+    // missing or the list is old enough that the link may have expired.
+    const listAge = Date.now() - evidenceListFetchedAt.current
+    if (selectedEvidence.signedUrl && listAge < LIST_SIGNED_URL_MAX_AGE_MS) {
+      setEvidenceFileUrl(selectedEvidence.signedUrl)
+      setEvidenceFileUrlLoading(false)
+      setEvidenceFileUrlError(false)
+      return
+    }
+
     setEvidenceFileUrl(null)
     setEvidenceFileUrlError(false)
     setEvidenceFileUrlLoading(true)
@@ -192,6 +192,9 @@ export const HorusProvider = ({ children }: { children: React.ReactNode }) => {
 
         let retryCount = 0
         let retryTimer: ReturnType<typeof setTimeout> | null = null
+        // Stream id of the last event received; sent back on reconnect so the
+        // backend resumes right after it instead of dropping or replaying events.
+        let lastEventId: string | null = null
         const MAX_RETRIES = 10
         let disposed = false
 
@@ -231,6 +234,7 @@ export const HorusProvider = ({ children }: { children: React.ReactNode }) => {
                 Accept: "text/event-stream",
                 ...getAIProviderFetchHeaders(),
                 ...(token ? { Authorization: `Bearer ${token}` } : {}),
+                ...(lastEventId ? { "Last-Event-ID": lastEventId } : {}),
             }
 
             try {
@@ -262,6 +266,8 @@ export const HorusProvider = ({ children }: { children: React.ReactNode }) => {
                         for (const line of rawBlock.split("\n")) {
                             if (line.startsWith("data:")) {
                                 dataPayload += line.slice(5).trimStart() + "\n"
+                            } else if (line.startsWith("id:")) {
+                                lastEventId = line.slice(3).trim() || lastEventId
                             }
                         }
                         dispatchSseData(dataPayload.trimEnd())
@@ -103,6 +103,7 @@ export interface EvidenceResponse {
   confidenceScore?: number | null;
   status: string;
   criteria?: any[];
+  signedUrl?: string | null;
 }
 
 export interface ExplainRequest {